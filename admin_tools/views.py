@@ -13,6 +13,7 @@ from django.shortcuts import render
 from django.urls import reverse
 
 import wevote_functions
+from analytics.controllers_action_buffer import retrieve_analytics_action_buffer_stats
 from ballot.models import BallotReturned, VoterBallotSaved
 from candidate.controllers import candidates_import_from_sample_file
 from candidate.models import CandidateCampaign, CandidateManager
@@ -22,6 +23,7 @@ from election.models import Election
 from email_outbound.models import EmailAddress
 from follow.models import FollowOrganizationList
 from friend.models import CurrentFriend, FriendManager, SuggestedFriend
+from geoip.models import retrieve_geocode_cache_daily_summaries
 from import_export_ctcl.models import CTCLApiCounterManager
 from import_export_facebook.models import FacebookLinkToVoter, FacebookManager
 from import_export_google_civic.models import GoogleCivicApiCounterManager
@@ -38,6 +40,7 @@ from position.models import PositionEntered, PositionForFriends, PositionMetrics
 from share.models import ShareManager
 from twitter.functions import retrieve_twitter_rate_limit_info
 from twitter.models import TwitterApiCounterManager, TwitterLinkToOrganization, TwitterLinkToVoter, TwitterUserManager
+from voter.controllers_voter_heal_queue import retrieve_voter_heal_queue_stats
 from voter.models import Voter, VoterAddress, VoterAddressManager, VoterDeviceLinkManager, \
     VoterManager, VoterMetricsManager, \
     voter_has_authority, voter_setup
@@ -1946,12 +1949,20 @@ def statistics_summary_view(request):
     vote_usa_api_counter_manager = VoteUSAApiCounterManager()
     vote_usa_daily_summary_list = vote_usa_api_counter_manager.retrieve_daily_summaries(days_to_display=15)
 
+    geocode_cache_daily_summary_list = retrieve_geocode_cache_daily_summaries(days_to_display=15)
+
+    analytics_action_buffer_stats_list = retrieve_analytics_action_buffer_stats()
+    voter_heal_queue_stats_list = retrieve_voter_heal_queue_stats()
+
     template_values = {
+        'analytics_action_buffer_stats_list':   analytics_action_buffer_stats_list,
         'ctcl_daily_summary_list':          ctcl_daily_summary_list,
+        'geocode_cache_daily_summary_list': geocode_cache_daily_summary_list,
         'google_civic_daily_summary_list':  google_civic_daily_summary_list,
         'twitter_daily_summary_list':       twitter_daily_summary_list,
         'twitter_api_limits':               twitter_api_limits,
         'vote_usa_daily_summary_list':      vote_usa_daily_summary_list,
+        'voter_heal_queue_stats_list':      voter_heal_queue_stats_list,
         # 'ballotpedia_daily_summary_list':   ballotpedia_daily_summary_list,
         # 'sendgrid_daily_summary_list':      sendgrid_daily_summary_list,
         # 'vote_smart_daily_summary_list':    vote_smart_daily_summary_list,
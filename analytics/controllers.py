@@ -2,11 +2,16 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from .controllers_action_buffer import ANALYTICS_ACTION_BUFFER_ENABLED, generate_analytics_action_values, \
+    get_analytics_action_buffer
+from .controllers_daily_rollup import does_analytics_daily_rollup_exist, \
+    is_analytics_daily_rollup_continuous_through, retrieve_analytics_daily_rollup_values, rollup_analytics_actions_for_one_date
 from .models import AnalyticsAction, AnalyticsCountManager, AnalyticsManager, \
-    ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS
+    ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS, ROLLUP_AUTHENTICATED_VISITORS, ROLLUP_BALLOT_VIEWERS, ROLLUP_VISITORS, \
+    ROLLUP_VOTER_GUIDES_VIEWED
 from candidate.models import CandidateManager
 from config.base import get_environment_variable
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 from django.db.models import Q
 from django.utils.timezone import localtime, now
 from exception.models import print_to_log
@@ -818,7 +823,8 @@ def save_analytics_action_for_api(  # saveAnalyticsAction
         ballot_item_we_vote_id=None,
         politician_we_vote_id=None,
         seo_friendly_path='',
-        voter_device_id=None):
+        voter_device_id=None,
+        use_buffer=ANALYTICS_ACTION_BUFFER_ENABLED):
     analytics_manager = AnalyticsManager()
     success = True
     status = "SAVE_ANALYTICS_ACTION "
@@ -872,6 +878,55 @@ def save_analytics_action_for_api(  # saveAnalyticsAction
         }
         return results
 
+    if positive_value_exists(use_buffer):
+        # Queue the action for this worker's AnalyticsActionBuffer, which saves actions in bulk every few seconds.
+        #  The politician_we_vote_id for seo_friendly_path is looked up then, too.
+        action_values = generate_analytics_action_values(
+            action_constant=action_constant,
+            voter_we_vote_id=voter_we_vote_id,
+            voter_id=voter_id,
+            is_signed_in=is_signed_in,
+            state_code=state_code,
+            organization_we_vote_id=organization_we_vote_id,
+            organization_id=organization_id,
+            google_civic_election_id=google_civic_election_id,
+            user_agent_string=user_agent_string,
+            is_bot=is_bot,
+            is_mobile=is_mobile,
+            is_desktop=is_desktop,
+            is_tablet=is_tablet,
+            ballot_item_we_vote_id=ballot_item_we_vote_id,
+            politician_we_vote_id=politician_we_vote_id,
+            seo_friendly_path=seo_friendly_path,
+            voter_device_id=voter_device_id)
+        try:
+            get_analytics_action_buffer().enqueue(action_values)
+            date_as_integer = action_values['date_as_integer']
+            status += "ACTION_QUEUED "
+        except Exception as e:
+            status += "ACTION_NOT_QUEUED: " + str(e) + " "
+            success = False
+        results = {
+            'status':                   status,
+            'success':                  success,
+            'voter_device_id':          voter_device_id,
+            'action_constant':          action_constant,
+            'is_signed_in':             is_signed_in,
+            'state_code':               state_code,
+            'google_civic_election_id': google_civic_election_id,
+            'organization_we_vote_id':  organization_we_vote_id,
+            'organization_id':          organization_id,
+            'politician_we_vote_id':    politician_we_vote_id,
+            'ballot_item_we_vote_id':   ballot_item_we_vote_id,
+            'date_as_integer':          date_as_integer,
+            'user_agent':               user_agent_string,
+            'is_bot':                   is_bot,
+            'is_mobile':                is_mobile,
+            'is_desktop':               is_desktop,
+            'is_tablet':                is_tablet,
+        }
+        return results
+
     if positive_value_exists(seo_friendly_path) and not positive_value_exists(politician_we_vote_id):
         # Look up the politician_we_vote_id based on the seo_friendly_path
         try:
@@ -1031,17 +1086,39 @@ def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_d
     position_metrics_manager = PositionMetricsManager()
     follow_organization_list = FollowOrganizationList()
 
-    date_as_integer = convert_to_int(date)
-    visitors_total = analytics_count_manager.fetch_visitors(google_civic_election_id_zero, organization_we_vote_id)
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, 0, 0, limit_to_authenticated)
-
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer, 0, limit_to_authenticated)
-
+    date_as_integer = convert_to_int(limit_to_one_date_as_integer)
     new_visitors_today = None
+    rollup_values_by_kind = None
+    if is_analytics_daily_rollup_continuous_through(date_as_integer):
+        if not does_analytics_daily_rollup_exist(date_as_integer):
+            rollup_results = rollup_analytics_actions_for_one_date(date_as_integer)
+            status += rollup_results['status']
+        rollup_results = retrieve_analytics_daily_rollup_values(date_as_integer, organization_we_vote_id)
+        status += rollup_results['status']
+        if rollup_results['success']:
+            rollup_values_by_kind = rollup_results['rollup_values_by_kind']
+    else:
+        status += "ANALYTICS_DAILY_ROLLUP_NEEDS_BACKFILL "
+
+    if rollup_values_by_kind is not None:
+        visitors_rollup = rollup_values_by_kind[ROLLUP_VISITORS]
+        authenticated_visitors_rollup = rollup_values_by_kind[ROLLUP_AUTHENTICATED_VISITORS]
+        visitors_total = visitors_rollup['running_total']
+        authenticated_visitors_total = authenticated_visitors_rollup['running_total']
+        visitors_today = visitors_rollup['distinct_today']
+        authenticated_visitors_today = authenticated_visitors_rollup['distinct_today']
+        new_visitors_today = visitors_rollup['first_seen_today']
+    else:
+        visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, 0, date_as_integer)
+        authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, 0, date_as_integer, limit_to_authenticated)
+        visitors_today = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer)
+        authenticated_visitors_today = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id, limit_to_one_date_as_integer, 0,
+            limit_to_authenticated)
+
     voter_guide_entrants_today = None
     entrants_visiting_ballot = None
     followers_visiting_ballot = None
@@ -1080,7 +1157,12 @@ def calculate_organization_daily_metrics(organization_we_vote_id, limit_to_one_d
     return results
 
 
-def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
+def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer, update_rollup=True):
+    """
+    :param limit_to_one_date_as_integer:
+    :param update_rollup: False when backfill_analytics_daily_rollups has already rolled up this date
+    :return:
+    """
     status = ""
     success = False
 
@@ -1096,27 +1178,52 @@ def calculate_sitewide_daily_metrics(limit_to_one_date_as_integer):
     limit_to_one_date_as_integer = convert_to_int(limit_to_one_date_as_integer)
     count_through_this_date_as_integer = limit_to_one_date_as_integer
 
-    visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
-        count_through_this_date_as_integer)
-    visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty, limit_to_one_date_as_integer)
+    # The "total" figures come from running totals, so we only read this day's AnalyticsAction entries
+    rollup_values_by_kind = None
+    rollup_success = True
+    if update_rollup:
+        rollup_results = rollup_analytics_actions_for_one_date(limit_to_one_date_as_integer)
+        status += rollup_results['status']
+        rollup_success = rollup_results['success']
+    if rollup_success and is_analytics_daily_rollup_continuous_through(limit_to_one_date_as_integer):
+        rollup_results = retrieve_analytics_daily_rollup_values(limit_to_one_date_as_integer)
+        status += rollup_results['status']
+        if rollup_results['success']:
+            rollup_values_by_kind = rollup_results['rollup_values_by_kind']
+    elif rollup_success:
+        status += "ANALYTICS_DAILY_ROLLUP_NEEDS_BACKFILL "
+
     new_visitors_today = None
     voter_guide_entrants_today = None
     welcome_page_entrants_today = None
     friend_entrants_today = None
-    authenticated_visitors_total = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
-    authenticated_visitors_today = analytics_count_manager.fetch_visitors(
-        google_civic_election_id_zero, organization_we_vote_id_empty,
-        limit_to_one_date_as_integer, date_as_integer_zero, limit_to_authenticated)
-    ballot_views_today = analytics_count_manager.fetch_ballot_views(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
-    voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
-    voter_guides_viewed_today = analytics_count_manager.fetch_voter_guides_viewed(
-        google_civic_election_id_zero, limit_to_one_date_as_integer)
+    if rollup_values_by_kind is not None:
+        visitors_total = rollup_values_by_kind[ROLLUP_VISITORS]['running_total']
+        visitors_today = rollup_values_by_kind[ROLLUP_VISITORS]['distinct_today']
+        new_visitors_today = rollup_values_by_kind[ROLLUP_VISITORS]['first_seen_today']
+        authenticated_visitors_total = rollup_values_by_kind[ROLLUP_AUTHENTICATED_VISITORS]['running_total']
+        authenticated_visitors_today = rollup_values_by_kind[ROLLUP_AUTHENTICATED_VISITORS]['distinct_today']
+        ballot_views_today = rollup_values_by_kind[ROLLUP_BALLOT_VIEWERS]['distinct_today']
+        voter_guides_viewed_total = rollup_values_by_kind[ROLLUP_VOTER_GUIDES_VIEWED]['running_total']
+        voter_guides_viewed_today = rollup_values_by_kind[ROLLUP_VOTER_GUIDES_VIEWED]['distinct_today']
+    else:
+        visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty, date_as_integer_zero,
+            count_through_this_date_as_integer)
+        visitors_today = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty, limit_to_one_date_as_integer)
+        authenticated_visitors_total = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty,
+            date_as_integer_zero, count_through_this_date_as_integer, limit_to_authenticated)
+        authenticated_visitors_today = analytics_count_manager.fetch_visitors(
+            google_civic_election_id_zero, organization_we_vote_id_empty,
+            limit_to_one_date_as_integer, date_as_integer_zero, limit_to_authenticated)
+        ballot_views_today = analytics_count_manager.fetch_ballot_views(
+            google_civic_election_id_zero, limit_to_one_date_as_integer)
+        voter_guides_viewed_total = analytics_count_manager.fetch_voter_guides_viewed(
+            google_civic_election_id_zero, date_as_integer_zero, count_through_this_date_as_integer)
+        voter_guides_viewed_today = analytics_count_manager.fetch_voter_guides_viewed(
+            google_civic_election_id_zero, limit_to_one_date_as_integer)
 
     issues_followed_total = follow_metrics_manager.fetch_issues_followed(
         voter_we_vote_id_empty, date_as_integer_zero, count_through_this_date_as_integer)
@@ -1594,7 +1701,8 @@ def save_sitewide_daily_metrics(date_as_integer, through_date_as_integer=0):
     date_as_integer_results = \
         analytics_manager.retrieve_list_of_dates_with_actions(date_as_integer, through_date_as_integer)
     if positive_value_exists(date_as_integer_results['date_as_integer_list_found']):
-        date_as_integer_list = date_as_integer_results['date_as_integer_list']
+        # In date order, so each day's running totals continue from the day before
+        date_as_integer_list = sorted(date_as_integer_results['date_as_integer_list'])
 
     sitewide_daily_metrics_saved_count = 0
     for one_date_as_integer in date_as_integer_list:
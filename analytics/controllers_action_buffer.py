@@ -0,0 +1,469 @@
+# analytics/controllers_action_buffer.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import atexit
+from collections import deque
+from datetime import datetime
+import json
+import os
+import socket
+import string
+import sys
+from threading import Event, Lock, Thread
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, DataError, IntegrityError, transaction
+from django.utils.timezone import now
+
+from config.base import get_environment_variable_default
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, generate_random_string, positive_value_exists
+from wevote_functions.functions_date import generate_date_as_integer
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+ANALYTICS_ACTION_BUFFER_ENABLED = positive_value_exists(
+    get_environment_variable_default('ANALYTICS_ACTION_BUFFER_ENABLED', True))
+# saveAnalyticsAction rows wait in this worker's memory until there are this many, or this many seconds have passed
+ANALYTICS_ACTION_BUFFER_FLUSH_SIZE = convert_to_int(
+    get_environment_variable_default('ANALYTICS_ACTION_BUFFER_FLUSH_SIZE', 250))
+ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS = convert_to_int(
+    get_environment_variable_default('ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS', 5))
+# Every queued row is also appended to a spill file, so rows still in memory when a worker dies are saved later
+ANALYTICS_ACTION_SPILL_DIRECTORY = get_environment_variable_default(
+    'ANALYTICS_ACTION_SPILL_DIRECTORY', '/tmp/analytics_action_spill')
+ANALYTICS_ACTION_SPILL_FILE_PREFIX = 'analytics_actions_'
+# Rows the database refused, one at a time. Kept for a person to look at, and never retried.
+ANALYTICS_ACTION_REJECTED_FILE_PREFIX = 'rejected_analytics_actions_'
+ANALYTICS_ACTION_BULK_CREATE_SIZE = 1000
+ANALYTICS_ACTION_BUFFER_STATS_TTL_SECONDS = 10 * 60
+ANALYTICS_ACTION_BUFFER_WORKERS_KEY = 'analytics_action_buffer:workers'
+# The database refused a row because of what is in it, not because it couldn't be reached
+ANALYTICS_ACTION_DATA_ERRORS = (DataError, IntegrityError, TypeError, ValidationError, ValueError)
+
+
+def is_process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def generate_analytics_action_worker_id():
+    """
+    The pid alone can be reused by a later worker, which would then append to, rotate and overwrite the spill files
+    of the worker that had it before. The random part keeps each worker's files its own.
+    """
+    return "{pid}-{token}".format(
+        pid=os.getpid(), token=generate_random_string(8, string.ascii_lowercase + string.digits))
+
+
+def convert_action_values_to_analytics_action(action_values, politician_we_vote_id_by_seo_friendly_path=None):
+    from analytics.models import AnalyticsAction
+    action_values = dict(action_values)
+    seo_friendly_path = action_values.pop('seo_friendly_path', '')
+    if positive_value_exists(seo_friendly_path) and not positive_value_exists(action_values['politician_we_vote_id']):
+        action_values['politician_we_vote_id'] = \
+            (politician_we_vote_id_by_seo_friendly_path or {}).get(seo_friendly_path)
+    action_values['exact_time'] = datetime.fromisoformat(action_values['exact_time'])
+    return AnalyticsAction(**action_values)
+
+
+def save_analytics_action_values_list(action_values_list):
+    """
+    Write queued saveAnalyticsAction rows to the analytics database, in bulk.
+    Politicians requested by seo_friendly_path are looked up here, with one query for the whole list,
+    so the API request doesn't have to.
+    If the database refuses the bulk_create because of the data in some row, the rows are saved one at a time,
+    so one bad row doesn't hold back the rest. A database that can't be reached raises, so the caller keeps every row.
+    :param action_values_list: dicts from generate_analytics_action_values
+    :return: (number of rows saved, list of the action_values the database refused)
+    """
+    from analytics.models import AnalyticsAction
+    from politician.models import Politician
+    seo_friendly_path_list = list(set(
+        action_values['seo_friendly_path'] for action_values in action_values_list
+        if positive_value_exists(action_values.get('seo_friendly_path')) and
+        not positive_value_exists(action_values.get('politician_we_vote_id'))))
+    politician_we_vote_id_by_seo_friendly_path = {}
+    if seo_friendly_path_list:
+        queryset = Politician.objects.all() if 'test' in sys.argv else Politician.objects.using('readonly').all()
+        for seo_friendly_path, we_vote_id in queryset.filter(seo_friendly_path__in=seo_friendly_path_list) \
+                .values_list('seo_friendly_path', 'we_vote_id'):
+            politician_we_vote_id_by_seo_friendly_path[seo_friendly_path] = we_vote_id
+
+    try:
+        analytics_action_list = [
+            convert_action_values_to_analytics_action(action_values, politician_we_vote_id_by_seo_friendly_path)
+            for action_values in action_values_list]
+        # All batches or none, so the rows saved one at a time below can't already be in the database
+        with transaction.atomic(using='analytics'):
+            AnalyticsAction.objects.using('analytics').bulk_create(
+                analytics_action_list, batch_size=ANALYTICS_ACTION_BULK_CREATE_SIZE)
+        return len(analytics_action_list), []
+    except ANALYTICS_ACTION_DATA_ERRORS as e:
+        logger.error("ANALYTICS_ACTION_BULK_CREATE_REFUSED, SAVING_ONE_AT_A_TIME: " + str(e))
+
+    actions_saved = 0
+    rejected_action_values_list = []
+    for action_values in action_values_list:
+        try:
+            with transaction.atomic(using='analytics'):
+                convert_action_values_to_analytics_action(
+                    action_values, politician_we_vote_id_by_seo_friendly_path).save(using='analytics')
+            actions_saved += 1
+        except ANALYTICS_ACTION_DATA_ERRORS:
+            rejected_action_values_list.append(action_values)
+    return actions_saved, rejected_action_values_list
+
+
+def save_rejected_analytics_action_values(spill_directory, worker_id, rejected_action_values_list):
+    if not rejected_action_values_list:
+        return
+    logger.error("ANALYTICS_ACTIONS_REJECTED: " + str(len(rejected_action_values_list)))
+    rejected_file_path = os.path.join(spill_directory, "{prefix}{worker_id}.jsonl".format(
+        prefix=ANALYTICS_ACTION_REJECTED_FILE_PREFIX, worker_id=worker_id))
+    try:
+        with open(rejected_file_path, 'a') as rejected_file:
+            for action_values in rejected_action_values_list:
+                rejected_file.write(json.dumps(action_values) + '\n')
+    except Exception as e:
+        logger.error("ANALYTICS_ACTIONS_REJECTED_NOT_KEPT: " + str(e))
+
+
+def recover_analytics_action_spill_files(spill_directory=ANALYTICS_ACTION_SPILL_DIRECTORY, include_running=False,
+                                         worker_id=''):
+    """
+    Save the rows in spill files left behind by workers that stopped before flushing, or by flushes that failed.
+    A row can be saved twice if a worker died between its bulk_create and removing the spill file, but never lost.
+    Rows the database refuses are moved to a rejected_analytics_actions_ file instead of being retried.
+    :param spill_directory:
+    :param include_running: recover every spill file, even those of workers that look like they are running.
+     Only for when the web workers are stopped.
+    :param worker_id: the calling buffer's worker id. Its own files are only recovered once they have failed.
+    :return:
+    """
+    status = ""
+    success = True
+    actions_recovered = 0
+    if not os.path.isdir(spill_directory):
+        return {
+            'success':              success,
+            'status':               "NO_ANALYTICS_ACTION_SPILL_DIRECTORY ",
+            'actions_recovered':    actions_recovered,
+        }
+
+    for file_name in sorted(os.listdir(spill_directory)):
+        if not file_name.startswith(ANALYTICS_ACTION_SPILL_FILE_PREFIX):
+            continue
+        # analytics_actions_<worker id>.jsonl is being written, analytics_actions_<worker id>.jsonl.flushing is
+        #  being saved, and analytics_actions_<worker id>.failed.<n>.jsonl could not be saved.
+        #  The worker id is <pid>-<random>.
+        file_worker_id = file_name[len(ANALYTICS_ACTION_SPILL_FILE_PREFIX):].split('.')[0]
+        file_pid = convert_to_int(file_worker_id.split('-')[0])
+        if not include_running:
+            if '.recovering.' in file_name:
+                continue
+            if file_worker_id == worker_id:
+                if '.failed.' not in file_name:
+                    continue
+            elif file_pid != os.getpid() and is_process_running(file_pid):
+                # That worker retries its own failed files. A file with our pid, but not our worker id, was left by
+                #  an earlier worker that had the same pid.
+                continue
+        file_path = os.path.join(spill_directory, file_name)
+        # Claim the file, so two workers starting at the same time don't both save it
+        recovering_file_path = "{path}.recovering.{pid}".format(path=file_path, pid=os.getpid())
+        try:
+            os.replace(file_path, recovering_file_path)
+        except FileNotFoundError:
+            continue
+        try:
+            with open(recovering_file_path) as spill_file:
+                action_values_list = [json.loads(one_line) for one_line in spill_file if one_line.strip()]
+            if action_values_list:
+                actions_saved, rejected_action_values_list = save_analytics_action_values_list(action_values_list)
+                actions_recovered += actions_saved
+                save_rejected_analytics_action_values(spill_directory, file_worker_id, rejected_action_values_list)
+            os.remove(recovering_file_path)
+        except Exception as e:
+            success = False
+            status += "ANALYTICS_ACTION_SPILL_FILE_NOT_RECOVERED " + file_name + ": " + str(e) + " "
+            try:
+                os.replace(recovering_file_path, file_path)
+            except Exception as e:
+                status += "ANALYTICS_ACTION_SPILL_FILE_NOT_RELEASED: " + str(e) + " "
+    status += "ANALYTICS_ACTIONS_RECOVERED: " + str(actions_recovered) + " "
+    return {
+        'success':              success,
+        'status':               status,
+        'actions_recovered':    actions_recovered,
+    }
+
+
+class AnalyticsActionBuffer:
+    """
+    A per-worker queue of saveAnalyticsAction rows. enqueue only appends to a list and a file, and a background
+    thread writes the rows with bulk_create when there are ANALYTICS_ACTION_BUFFER_FLUSH_SIZE of them,
+    or every ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS.
+    """
+
+    def __init__(self, spill_directory=ANALYTICS_ACTION_SPILL_DIRECTORY,
+                 flush_size=ANALYTICS_ACTION_BUFFER_FLUSH_SIZE, flush_seconds=ANALYTICS_ACTION_BUFFER_FLUSH_SECONDS,
+                 start_flush_thread=True):
+        self.spill_directory = spill_directory
+        self.flush_size = max(flush_size, 1)
+        self.flush_seconds = max(flush_seconds, 1)
+        self.pid = os.getpid()
+        self.worker_id = generate_analytics_action_worker_id()
+        self.worker_name = "{host}:{pid}".format(host=socket.gethostname(), pid=self.pid)
+        self.action_values_queue = deque()
+        self.queue_lock = Lock()
+        # Only one flush at a time, so spill files are removed in the order they were written
+        self.flush_lock = Lock()
+        self.flush_requested = Event()
+        self.spill_file = None
+        self.spill_file_path = os.path.join(
+            spill_directory, "{prefix}{worker_id}.jsonl".format(
+                prefix=ANALYTICS_ACTION_SPILL_FILE_PREFIX, worker_id=self.worker_id))
+        self.failed_spill_file_count = 0
+        self.actions_flushed = 0
+        self.flush_count = 0
+        self.last_flush_latency_ms = 0
+        self.max_flush_latency_ms = 0
+        self.date_last_flushed = None
+        try:
+            os.makedirs(spill_directory, exist_ok=True)
+            self.spill_file = open(self.spill_file_path, 'a')
+        except Exception as e:
+            logger.error("ANALYTICS_ACTION_SPILL_FILE_NOT_OPENED: " + str(e))
+        if start_flush_thread:
+            Thread(target=self.run_flush_loop, name='analytics_action_buffer', daemon=True).start()
+
+    def enqueue(self, action_values):
+        line = json.dumps(action_values) + '\n'
+        with self.queue_lock:
+            if self.spill_file is not None:
+                try:
+                    self.spill_file.write(line)
+                    self.spill_file.flush()
+                except Exception as e:
+                    logger.error("ANALYTICS_ACTION_SPILL_FILE_WRITE_FAILED: " + str(e))
+            self.action_values_queue.append(action_values)
+            queue_depth = len(self.action_values_queue)
+        if queue_depth >= self.flush_size:
+            self.flush_requested.set()
+        return queue_depth
+
+    def queue_depth(self):
+        return len(self.action_values_queue)
+
+    def rotate_spill_file(self):
+        """
+        Called with queue_lock held: the rows being flushed keep their own file until they are saved
+        """
+        if self.spill_file is None:
+            return ''
+        flushing_spill_file_path = self.spill_file_path + '.flushing'
+        try:
+            self.spill_file.close()
+            os.replace(self.spill_file_path, flushing_spill_file_path)
+            self.spill_file = open(self.spill_file_path, 'a')
+        except Exception as e:
+            logger.error("ANALYTICS_ACTION_SPILL_FILE_NOT_ROTATED: " + str(e))
+            return ''
+        return flushing_spill_file_path
+
+    def flush(self):
+        status = ""
+        success = True
+        actions_flushed = 0
+        with self.flush_lock:
+            with self.queue_lock:
+                action_values_list = list(self.action_values_queue)
+                self.action_values_queue.clear()
+                flushing_spill_file_path = self.rotate_spill_file() if action_values_list else ''
+            if action_values_list:
+                start_time = time.perf_counter()
+                try:
+                    actions_flushed, rejected_action_values_list = \
+                        save_analytics_action_values_list(action_values_list)
+                    save_rejected_analytics_action_values(
+                        self.spill_directory, self.worker_id, rejected_action_values_list)
+                    if rejected_action_values_list:
+                        status += "ANALYTICS_ACTIONS_REJECTED: " + str(len(rejected_action_values_list)) + " "
+                    if flushing_spill_file_path:
+                        os.remove(flushing_spill_file_path)
+                except Exception as e:
+                    success = False
+                    status += "ANALYTICS_ACTION_BUFFER_FLUSH_FAILED: " + str(e) + " "
+                    logger.error(status)
+                    if flushing_spill_file_path:
+                        # recover_analytics_action_spill_files retries these rows on the next flush
+                        self.failed_spill_file_count += 1
+                        try:
+                            os.replace(flushing_spill_file_path, "{path}.failed.{count}.jsonl".format(
+                                path=self.spill_file_path[:-len('.jsonl')], count=self.failed_spill_file_count))
+                        except Exception as e:
+                            logger.error("ANALYTICS_ACTION_SPILL_FILE_NOT_KEPT: " + str(e))
+                flush_latency_ms = int((time.perf_counter() - start_time) * 1000)
+                self.flush_count += 1
+                self.actions_flushed += actions_flushed
+                self.last_flush_latency_ms = flush_latency_ms
+                self.max_flush_latency_ms = max(self.max_flush_latency_ms, flush_latency_ms)
+                self.date_last_flushed = now()
+        status += "ANALYTICS_ACTIONS_FLUSHED: " + str(actions_flushed) + " "
+        return {
+            'success':          success,
+            'status':           status,
+            'actions_flushed':  actions_flushed,
+        }
+
+    def run_flush_loop(self):
+        recover_analytics_action_spill_files(self.spill_directory, worker_id=self.worker_id)
+        while True:
+            self.flush_requested.wait(timeout=self.flush_seconds)
+            self.flush_requested.clear()
+            # Like a request would: don't reuse a connection the database has closed, or one past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.flush()
+                if self.failed_spill_file_count:
+                    results = recover_analytics_action_spill_files(self.spill_directory, worker_id=self.worker_id)
+                    if results['success']:
+                        self.failed_spill_file_count = 0
+                self.store_stats_in_shared_cache()
+            except Exception as e:
+                logger.error("ANALYTICS_ACTION_BUFFER_FLUSH_LOOP_ERROR: " + str(e))
+            finally:
+                close_old_connections()
+
+    def generate_stats(self):
+        return {
+            'worker_name':              self.worker_name,
+            'queue_depth':              self.queue_depth(),
+            'actions_flushed':          self.actions_flushed,
+            'flush_count':              self.flush_count,
+            'last_flush_latency_ms':    self.last_flush_latency_ms,
+            'max_flush_latency_ms':     self.max_flush_latency_ms,
+            'date_last_flushed':        self.date_last_flushed.isoformat() if self.date_last_flushed else '',
+        }
+
+    def store_stats_in_shared_cache(self):
+        try:
+            shared_cache = caches['shared']
+            shared_cache.set('analytics_action_buffer:' + self.worker_name, self.generate_stats(),
+                             ANALYTICS_ACTION_BUFFER_STATS_TTL_SECONDS)
+            worker_name_list = shared_cache.get(ANALYTICS_ACTION_BUFFER_WORKERS_KEY) or []
+            if self.worker_name not in worker_name_list:
+                worker_name_list.append(self.worker_name)
+                shared_cache.set(ANALYTICS_ACTION_BUFFER_WORKERS_KEY, worker_name_list[-100:], None)
+        except Exception as e:
+            logger.error("ANALYTICS_ACTION_BUFFER_STATS_NOT_STORED: " + str(e))
+
+    def close(self):
+        self.flush()
+        with self.queue_lock:
+            if self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+        # Everything was saved, so the empty spill file can go
+        try:
+            if os.path.exists(self.spill_file_path) and not os.path.getsize(self.spill_file_path):
+                os.remove(self.spill_file_path)
+        except Exception as e:
+            logger.error("ANALYTICS_ACTION_SPILL_FILE_NOT_REMOVED: " + str(e))
+
+
+# One buffer per worker process. Recreated after a fork, since threads and open files don't carry over.
+analytics_action_buffer = None
+analytics_action_buffer_lock = Lock()
+
+
+def get_analytics_action_buffer():
+    global analytics_action_buffer
+    if analytics_action_buffer is None or analytics_action_buffer.pid != os.getpid():
+        with analytics_action_buffer_lock:
+            if analytics_action_buffer is None or analytics_action_buffer.pid != os.getpid():
+                # Tests call flush_analytics_action_buffer themselves
+                analytics_action_buffer = AnalyticsActionBuffer(start_flush_thread='test' not in sys.argv)
+                atexit.register(analytics_action_buffer.close)
+    return analytics_action_buffer
+
+
+def flush_analytics_action_buffer():
+    return get_analytics_action_buffer().flush()
+
+
+def generate_analytics_action_values(
+        action_constant=0,
+        voter_we_vote_id='',
+        voter_id=0,
+        is_signed_in=False,
+        state_code='',
+        organization_we_vote_id='',
+        organization_id=0,
+        google_civic_election_id=0,
+        user_agent_string='',
+        is_bot=False,
+        is_mobile=False,
+        is_desktop=False,
+        is_tablet=False,
+        ballot_item_we_vote_id=None,
+        politician_we_vote_id=None,
+        seo_friendly_path='',
+        voter_device_id=None):
+    """
+    The AnalyticsAction fields for one saveAnalyticsAction request, as JSON-friendly values.
+    exact_time and date_as_integer are the time of the request, not of the flush.
+    """
+    action_values = {
+        'action_constant':          action_constant,
+        'exact_time':               now().isoformat(),
+        'date_as_integer':          generate_date_as_integer(),
+        'voter_we_vote_id':         voter_we_vote_id,
+        'voter_id':                 voter_id,
+        'is_signed_in':             is_signed_in,
+        'state_code':               state_code,
+        'organization_we_vote_id':  organization_we_vote_id,
+        'organization_id':          organization_id if positive_value_exists(organization_id) else None,
+        'google_civic_election_id': google_civic_election_id,
+        'ballot_item_we_vote_id':   ballot_item_we_vote_id,
+        'politician_we_vote_id':    politician_we_vote_id,
+        'seo_friendly_path':        seo_friendly_path,
+        'voter_device_id':          voter_device_id,
+        'user_agent':               user_agent_string,
+        'is_bot':                   is_bot,
+        'is_mobile':                is_mobile,
+        'is_desktop':               is_desktop,
+        'is_tablet':                is_tablet,
+    }
+    # The flush saves with bulk_create, which doesn't check lengths, so one long value would fail the whole batch
+    from analytics.models import AnalyticsAction
+    for field in AnalyticsAction._meta.concrete_fields:
+        field_value = action_values.get(field.name)
+        if field.max_length and isinstance(field_value, str) and len(field_value) > field.max_length:
+            action_values[field.name] = field_value[:field.max_length]
+    return action_values
+
+
+def retrieve_analytics_action_buffer_stats():
+    """
+    Queue depth and flush latency for each worker that flushed in the last ANALYTICS_ACTION_BUFFER_STATS_TTL_SECONDS,
+    for the statistics summary page.
+    """
+    try:
+        shared_cache = caches['shared']
+        worker_name_list = shared_cache.get(ANALYTICS_ACTION_BUFFER_WORKERS_KEY) or []
+        stats_by_key = shared_cache.get_many(
+            ['analytics_action_buffer:' + worker_name for worker_name in worker_name_list])
+    except Exception as e:
+        logger.error("ANALYTICS_ACTION_BUFFER_STATS_NOT_RETRIEVED: " + str(e))
+        return []
+    return sorted(stats_by_key.values(), key=lambda worker_stats: worker_stats['worker_name'])
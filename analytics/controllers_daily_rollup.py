@@ -0,0 +1,354 @@
+# analytics/controllers_daily_rollup.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.db.models import Count, Max
+
+from .models import ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, AnalyticsAction, AnalyticsDailyRollup, \
+    AnalyticsFirstSeen, AnalyticsManager, ROLLUP_AUTHENTICATED_VISITORS, ROLLUP_BALLOT_VIEWERS, ROLLUP_VISITORS, \
+    ROLLUP_VOTER_GUIDES_VIEWED
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+ANALYTICS_ROLLUP_CHUNK_SIZE = 1000
+ANALYTICS_ROLLUP_BACKFILL_WORKERS = 4
+ANALYTICS_ROLLUP_KIND_LIST = [
+    ROLLUP_AUTHENTICATED_VISITORS, ROLLUP_BALLOT_VIEWERS, ROLLUP_VISITORS, ROLLUP_VOTER_GUIDES_VIEWED]
+
+
+def generate_we_vote_ids_by_rollup_group(action_values_list):
+    """
+    Sort one day's distinct (voter_we_vote_id, organization_we_vote_id, action_constant, is_signed_in) tuples into
+    the set of we_vote_ids counted for each (rollup_kind, organization_we_vote_id) group.
+    """
+    we_vote_ids_by_rollup_group = {}
+
+    def add_to_group(rollup_kind, organization_we_vote_id, we_vote_id):
+        we_vote_ids_by_rollup_group.setdefault((rollup_kind, organization_we_vote_id), set()).add(we_vote_id)
+
+    for voter_we_vote_id, organization_we_vote_id, action_constant, is_signed_in in action_values_list:
+        is_voter_guide_visit = action_constant == ACTION_VOTER_GUIDE_VISIT and \
+            positive_value_exists(organization_we_vote_id)
+        if is_voter_guide_visit:
+            add_to_group(ROLLUP_VOTER_GUIDES_VIEWED, '', organization_we_vote_id)
+        if not positive_value_exists(voter_we_vote_id):
+            continue
+        add_to_group(ROLLUP_VISITORS, '', voter_we_vote_id)
+        if is_signed_in:
+            add_to_group(ROLLUP_AUTHENTICATED_VISITORS, '', voter_we_vote_id)
+        if action_constant == ACTION_BALLOT_VISIT:
+            add_to_group(ROLLUP_BALLOT_VIEWERS, '', voter_we_vote_id)
+        if is_voter_guide_visit:
+            add_to_group(ROLLUP_VISITORS, organization_we_vote_id, voter_we_vote_id)
+            if is_signed_in:
+                add_to_group(ROLLUP_AUTHENTICATED_VISITORS, organization_we_vote_id, voter_we_vote_id)
+    return we_vote_ids_by_rollup_group
+
+
+def update_analytics_first_seen_for_one_date(date_as_integer):
+    """
+    Step one of the daily rollup, which only reads this day's AnalyticsAction entries: save today's distinct counts,
+    and make sure every voter (or voter guide) seen today has an AnalyticsFirstSeen date no later than today.
+    Dates can be processed in any order, and in parallel, since the earliest date always wins.
+    :param date_as_integer:
+    :return:
+    """
+    status = ""
+    success = True
+    date_as_integer = convert_to_int(date_as_integer)
+    we_vote_ids_by_rollup_group = {}
+
+    try:
+        action_query = AnalyticsAction.objects.using('readonly').filter(date_as_integer=date_as_integer)  # 'analytics'
+        action_query = action_query.values_list(
+            'voter_we_vote_id', 'organization_we_vote_id', 'action_constant', 'is_signed_in').distinct()
+        we_vote_ids_by_rollup_group = generate_we_vote_ids_by_rollup_group(action_query.iterator())
+    except Exception as e:
+        success = False
+        status += "ANALYTICS_ROLLUP_ACTIONS_NOT_RETRIEVED (" + str(date_as_integer) + "): " + str(e) + " "
+
+    if success:
+        try:
+            first_seen_list = [
+                AnalyticsFirstSeen(
+                    first_seen_kind=rollup_kind,
+                    organization_we_vote_id=organization_we_vote_id,
+                    we_vote_id=we_vote_id,
+                    first_seen_date_as_integer=date_as_integer)
+                for (rollup_kind, organization_we_vote_id), we_vote_id_set in we_vote_ids_by_rollup_group.items()
+                for we_vote_id in we_vote_id_set]
+            AnalyticsFirstSeen.objects.using('analytics').bulk_create(
+                first_seen_list, batch_size=ANALYTICS_ROLLUP_CHUNK_SIZE, ignore_conflicts=True)
+
+            # Entries that were first seen later than today came from a backfill of a later date range
+            we_vote_ids_by_rollup_kind = {}
+            for (rollup_kind, organization_we_vote_id), we_vote_id_set in we_vote_ids_by_rollup_group.items():
+                we_vote_ids_by_rollup_kind.setdefault(rollup_kind, set()).update(we_vote_id_set)
+            first_seen_id_list = []
+            for rollup_kind, we_vote_id_set in we_vote_ids_by_rollup_kind.items():
+                we_vote_id_list = sorted(we_vote_id_set)
+                for start in range(0, len(we_vote_id_list), ANALYTICS_ROLLUP_CHUNK_SIZE):
+                    later_query = AnalyticsFirstSeen.objects.using('analytics').filter(
+                        first_seen_kind=rollup_kind,
+                        we_vote_id__in=we_vote_id_list[start:start + ANALYTICS_ROLLUP_CHUNK_SIZE],
+                        first_seen_date_as_integer__gt=date_as_integer)
+                    for first_seen_id, organization_we_vote_id, we_vote_id in \
+                            later_query.values_list('id', 'organization_we_vote_id', 'we_vote_id'):
+                        if we_vote_id in we_vote_ids_by_rollup_group.get((rollup_kind, organization_we_vote_id), ()):
+                            first_seen_id_list.append(first_seen_id)
+            for start in range(0, len(first_seen_id_list), ANALYTICS_ROLLUP_CHUNK_SIZE):
+                AnalyticsFirstSeen.objects.using('analytics') \
+                    .filter(id__in=first_seen_id_list[start:start + ANALYTICS_ROLLUP_CHUNK_SIZE]) \
+                    .filter(first_seen_date_as_integer__gt=date_as_integer) \
+                    .update(first_seen_date_as_integer=date_as_integer)
+            if len(first_seen_id_list):
+                status += "ANALYTICS_FIRST_SEEN_MOVED_EARLIER: " + str(len(first_seen_id_list)) + " "
+
+            rollup_list = [
+                AnalyticsDailyRollup(
+                    date_as_integer=date_as_integer,
+                    rollup_kind=rollup_kind,
+                    organization_we_vote_id=organization_we_vote_id,
+                    distinct_today=len(we_vote_id_set))
+                for (rollup_kind, organization_we_vote_id), we_vote_id_set in we_vote_ids_by_rollup_group.items()]
+            AnalyticsDailyRollup.objects.using('analytics').bulk_create(
+                rollup_list,
+                batch_size=ANALYTICS_ROLLUP_CHUNK_SIZE,
+                update_conflicts=True,
+                unique_fields=['rollup_kind', 'organization_we_vote_id', 'date_as_integer'],
+                update_fields=['distinct_today'])
+        except Exception as e:
+            success = False
+            status += "ANALYTICS_FIRST_SEEN_NOT_UPDATED (" + str(date_as_integer) + "): " + str(e) + " "
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'date_as_integer':      date_as_integer,
+        'rollup_group_count':   len(we_vote_ids_by_rollup_group),
+    }
+    return results
+
+
+def update_analytics_daily_running_totals(date_as_integer, through_date_as_integer=0):
+    """
+    Step two of the daily rollup: fill in first_seen_today and running_total on the AnalyticsDailyRollup entries from
+    date_as_integer through through_date_as_integer, continuing from the latest running_total before the range.
+    Run this in date order, after step one has finished for every date up to through_date_as_integer.
+    :param date_as_integer:
+    :param through_date_as_integer:
+    :return:
+    """
+    status = ""
+    success = True
+    date_as_integer = convert_to_int(date_as_integer)
+    through_date_as_integer = convert_to_int(through_date_as_integer) or date_as_integer
+    rollup_updated_count = 0
+
+    try:
+        rollup_list = list(
+            AnalyticsDailyRollup.objects.using('analytics')
+            .filter(date_as_integer__gte=date_as_integer, date_as_integer__lte=through_date_as_integer)
+            .order_by('date_as_integer'))
+        organization_we_vote_id_list = list(set(rollup.organization_we_vote_id for rollup in rollup_list))
+
+        # Rollup groups only have entries on days with activity, so the latest entry before the range has the total
+        running_total_by_rollup_group = {}
+        previous_query = AnalyticsDailyRollup.objects.using('analytics').filter(
+            date_as_integer__lt=date_as_integer,
+            organization_we_vote_id__in=organization_we_vote_id_list)
+        previous_query = previous_query.order_by('rollup_kind', 'organization_we_vote_id', '-date_as_integer') \
+            .distinct('rollup_kind', 'organization_we_vote_id')
+        for rollup_kind, organization_we_vote_id, running_total in \
+                previous_query.values_list('rollup_kind', 'organization_we_vote_id', 'running_total'):
+            running_total_by_rollup_group[(rollup_kind, organization_we_vote_id)] = running_total
+
+        first_seen_count_by_rollup_group_and_date = {}
+        first_seen_query = AnalyticsFirstSeen.objects.using('analytics').filter(
+            first_seen_date_as_integer__gte=date_as_integer,
+            first_seen_date_as_integer__lte=through_date_as_integer)
+        first_seen_query = first_seen_query.values(
+            'first_seen_kind', 'organization_we_vote_id', 'first_seen_date_as_integer') \
+            .annotate(first_seen_count=Count('id'))
+        for first_seen_dict in first_seen_query:
+            first_seen_count_by_rollup_group_and_date[(
+                first_seen_dict['first_seen_kind'],
+                first_seen_dict['organization_we_vote_id'],
+                first_seen_dict['first_seen_date_as_integer'])] = first_seen_dict['first_seen_count']
+
+        for rollup in rollup_list:
+            rollup_group = (rollup.rollup_kind, rollup.organization_we_vote_id)
+            rollup.first_seen_today = first_seen_count_by_rollup_group_and_date.get(
+                rollup_group + (rollup.date_as_integer,), 0)
+            running_total_by_rollup_group[rollup_group] = \
+                running_total_by_rollup_group.get(rollup_group, 0) + rollup.first_seen_today
+            rollup.running_total = running_total_by_rollup_group[rollup_group]
+        AnalyticsDailyRollup.objects.using('analytics').bulk_update(
+            rollup_list, ['first_seen_today', 'running_total'], batch_size=ANALYTICS_ROLLUP_CHUNK_SIZE)
+        rollup_updated_count = len(rollup_list)
+    except Exception as e:
+        success = False
+        status += "ANALYTICS_DAILY_RUNNING_TOTALS_NOT_UPDATED: " + str(e) + " "
+
+    results = {
+        'success':              success,
+        'status':               status,
+        'rollup_updated_count': rollup_updated_count,
+    }
+    return results
+
+
+def rollup_analytics_actions_for_one_date(date_as_integer):
+    results = update_analytics_first_seen_for_one_date(date_as_integer)
+    status = results['status']
+    success = results['success']
+    if success:
+        total_results = update_analytics_daily_running_totals(date_as_integer)
+        status += total_results['status']
+        success = total_results['success']
+    results = {
+        'success':  success,
+        'status':   status,
+    }
+    return results
+
+
+def does_analytics_daily_rollup_exist(date_as_integer):
+    try:
+        return AnalyticsDailyRollup.objects.using('analytics').filter(
+            date_as_integer=convert_to_int(date_as_integer),
+            rollup_kind=ROLLUP_VISITORS,
+            organization_we_vote_id='').exists()
+    except Exception as e:
+        logger.error("ANALYTICS_DAILY_ROLLUP_EXISTS_CHECK_FAILED: " + str(e))
+        return False
+
+
+def is_analytics_daily_rollup_continuous_through(date_as_integer):
+    """
+    Running totals for date_as_integer are only right if the previous day with actions was rolled up too.
+    False until backfill_analytics_daily_rollups has been run over the history before date_as_integer.
+    """
+    try:
+        previous_date_as_integer = AnalyticsAction.objects.using('readonly') \
+            .filter(date_as_integer__lt=date_as_integer) \
+            .aggregate(Max('date_as_integer'))['date_as_integer__max']
+        if not positive_value_exists(previous_date_as_integer):
+            return True
+    except Exception as e:
+        logger.error("ANALYTICS_DAILY_ROLLUP_CONTINUITY_CHECK_FAILED: " + str(e))
+        return False
+    return does_analytics_daily_rollup_exist(previous_date_as_integer)
+
+
+def retrieve_analytics_daily_rollup_values(date_as_integer, organization_we_vote_id=''):
+    """
+    :param date_as_integer:
+    :param organization_we_vote_id: leave empty for the sitewide rollups
+    :return: 'rollup_values_by_kind' has distinct_today, first_seen_today and running_total for each rollup_kind
+    """
+    status = ""
+    success = True
+    rollup_values_by_kind = {
+        rollup_kind: {'distinct_today': 0, 'first_seen_today': 0, 'running_total': 0}
+        for rollup_kind in ANALYTICS_ROLLUP_KIND_LIST}
+    date_as_integer = convert_to_int(date_as_integer)
+    organization_we_vote_id = organization_we_vote_id if positive_value_exists(organization_we_vote_id) else ''
+
+    try:
+        rollup_query = AnalyticsDailyRollup.objects.using('analytics').filter(
+            organization_we_vote_id=organization_we_vote_id,
+            date_as_integer__lte=date_as_integer)
+        rollup_query = rollup_query.order_by('rollup_kind', '-date_as_integer').distinct('rollup_kind')
+        for rollup in rollup_query:
+            active_today = rollup.date_as_integer == date_as_integer
+            rollup_values_by_kind[rollup.rollup_kind] = {
+                'distinct_today':   rollup.distinct_today if active_today else 0,
+                'first_seen_today': rollup.first_seen_today if active_today else 0,
+                'running_total':    rollup.running_total,
+            }
+    except Exception as e:
+        success = False
+        status += "ANALYTICS_DAILY_ROLLUP_NOT_RETRIEVED: " + str(e) + " "
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'rollup_values_by_kind':    rollup_values_by_kind,
+    }
+    return results
+
+
+def update_analytics_first_seen_for_date_list(date_as_integer_list):
+    status = ""
+    success = True
+    try:
+        for date_as_integer in date_as_integer_list:
+            results = update_analytics_first_seen_for_one_date(date_as_integer)
+            if not results['success']:
+                success = False
+                status += results['status']
+    finally:
+        # Each backfill thread has its own database connections
+        connections.close_all()
+    results = {
+        'success':      success,
+        'status':       status,
+        'date_count':   len(date_as_integer_list),
+    }
+    return results
+
+
+def backfill_analytics_daily_rollups(
+        date_as_integer, through_date_as_integer=0, number_of_workers=ANALYTICS_ROLLUP_BACKFILL_WORKERS):
+    """
+    Rebuild the rollups for a range of dates. Step one runs on contiguous date ranges in parallel,
+    then one pass computes the running totals in date order.
+    :param date_as_integer:
+    :param through_date_as_integer:
+    :param number_of_workers:
+    :return:
+    """
+    status = ""
+    success = True
+
+    analytics_manager = AnalyticsManager()
+    date_results = analytics_manager.retrieve_list_of_dates_with_actions(date_as_integer, through_date_as_integer)
+    date_as_integer_list = sorted(date_results['date_as_integer_list'])
+    if not len(date_as_integer_list):
+        results = {
+            'success':      date_results['date_as_integer_list_found'],
+            'status':       "ANALYTICS_ROLLUP_BACKFILL-NO_DATES_WITH_ACTIONS ",
+            'date_count':   0,
+        }
+        return results
+
+    number_of_workers = max(min(convert_to_int(number_of_workers), len(date_as_integer_list)), 1)
+    dates_per_worker = -(-len(date_as_integer_list) // number_of_workers)
+    date_range_list = [date_as_integer_list[start:start + dates_per_worker]
+                       for start in range(0, len(date_as_integer_list), dates_per_worker)]
+    with ThreadPoolExecutor(max_workers=number_of_workers, thread_name_prefix='analytics_rollup') as executor:
+        for results in executor.map(update_analytics_first_seen_for_date_list, date_range_list):
+            status += results['status']
+            success = success and results['success']
+
+    if success:
+        # First seen dates may have moved earlier, so carry the totals through any later days already rolled up
+        latest_rollup_date_as_integer = AnalyticsDailyRollup.objects.using('analytics') \
+            .aggregate(Max('date_as_integer'))['date_as_integer__max'] or 0
+        results = update_analytics_daily_running_totals(
+            date_as_integer_list[0], max(date_as_integer_list[-1], latest_rollup_date_as_integer))
+        status += results['status']
+        success = results['success']
+
+    results = {
+        'success':      success,
+        'status':       status,
+        'date_count':   len(date_as_integer_list),
+    }
+    return results
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.controllers import calculate_sitewide_daily_metrics
+from analytics.controllers_daily_rollup import ANALYTICS_ROLLUP_BACKFILL_WORKERS, backfill_analytics_daily_rollups
+from analytics.models import AnalyticsManager
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily analytics rollups (first seen dates and running totals) that sitewide and ' \
+           'organization daily metrics are calculated from. Date ranges are rolled up in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=int, default=0, help='YYYYMMDD, defaults to the first action')
+        parser.add_argument('--through-date', type=int, default=0, help='YYYYMMDD, defaults to the last action')
+        parser.add_argument('--workers', type=int, default=ANALYTICS_ROLLUP_BACKFILL_WORKERS)
+        parser.add_argument('--save-sitewide-daily-metrics', action='store_true',
+                            help='Then recalculate SitewideDailyMetrics for every date in the range')
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        results = backfill_analytics_daily_rollups(
+            options['start_date'], options['through_date'], number_of_workers=options['workers'])
+        self.stdout.write("{status}Rolled up {date_count} dates in {seconds:.1f} seconds".format(
+            status=results['status'], date_count=results['date_count'], seconds=time.perf_counter() - start_time))
+        if not results['success'] or not options['save_sitewide_daily_metrics']:
+            return
+
+        analytics_manager = AnalyticsManager()
+        date_results = analytics_manager.retrieve_list_of_dates_with_actions(
+            options['start_date'], options['through_date'])
+        saved_count = 0
+        for date_as_integer in sorted(date_results['date_as_integer_list']):
+            results = calculate_sitewide_daily_metrics(date_as_integer, update_rollup=False)
+            if results['success']:
+                update_results = analytics_manager.save_sitewide_daily_metrics_values(
+                    results['sitewide_daily_metrics_values'])
+                if update_results['success']:
+                    saved_count += 1
+                    continue
+                results = update_results
+            self.stdout.write("{date}: {status}".format(date=date_as_integer, status=results['status']))
+        self.stdout.write("Saved SitewideDailyMetrics for {saved_count} dates".format(saved_count=saved_count))
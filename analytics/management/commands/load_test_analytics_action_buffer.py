@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.controllers_action_buffer import AnalyticsActionBuffer, generate_analytics_action_values
+from analytics.models import ACTION_BALLOT_VISIT, AnalyticsAction, AnalyticsManager
+
+LOAD_TEST_VOTER_WE_VOTE_ID_PREFIX = 'wvloadtestvoter'
+
+
+class Command(BaseCommand):
+    help = 'Measures sustained saveAnalyticsAction writes per second: one AnalyticsAction create per request ' \
+           '(how we used to do it) and the buffered bulk_create. The test rows are deleted afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actions', type=int, default=5000, help='Number of actions for each approach')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent requests')
+
+    def handle(self, *args, **options):
+        number_of_actions = options['actions']
+        analytics_manager = AnalyticsManager()
+
+        def save_one_action(number):
+            analytics_manager.save_action(
+                action_constant=ACTION_BALLOT_VISIT,
+                voter_we_vote_id=LOAD_TEST_VOTER_WE_VOTE_ID_PREFIX + str(number),
+                voter_id=number + 1,
+                google_civic_election_id=9000,
+                user_agent_string='load_test_analytics_action_buffer')
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(save_one_action, range(number_of_actions)))
+        self.write_actions_per_second('One create per request', number_of_actions, start_time)
+
+        with tempfile.TemporaryDirectory() as spill_directory:
+            analytics_action_buffer = AnalyticsActionBuffer(spill_directory=spill_directory)
+
+            def enqueue_one_action(number):
+                analytics_action_buffer.enqueue(generate_analytics_action_values(
+                    action_constant=ACTION_BALLOT_VISIT,
+                    voter_we_vote_id=LOAD_TEST_VOTER_WE_VOTE_ID_PREFIX + str(number),
+                    voter_id=number + 1,
+                    google_civic_election_id=9000,
+                    user_agent_string='load_test_analytics_action_buffer'))
+
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                list(executor.map(enqueue_one_action, range(number_of_actions)))
+            self.write_actions_per_second('Buffered (enqueue only)', number_of_actions, start_time)
+            # Sustained rate: until every action is in the database
+            analytics_action_buffer.close()
+            self.write_actions_per_second('Buffered (until saved)', number_of_actions, start_time)
+            self.stdout.write("Slowest flush: {max_flush_latency_ms} ms over {flush_count} flushes".format(
+                max_flush_latency_ms=analytics_action_buffer.max_flush_latency_ms,
+                flush_count=analytics_action_buffer.flush_count))
+
+        AnalyticsAction.objects.using('analytics') \
+            .filter(voter_we_vote_id__startswith=LOAD_TEST_VOTER_WE_VOTE_ID_PREFIX).delete()
+
+    def write_actions_per_second(self, label, number_of_actions, start_time):
+        elapsed_seconds = time.perf_counter() - start_time
+        self.stdout.write("{label:26} {actions_per_second:12,.0f} actions/second".format(
+            label=label, actions_per_second=number_of_actions / elapsed_seconds))
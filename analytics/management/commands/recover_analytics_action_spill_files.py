@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from analytics.controllers_action_buffer import ANALYTICS_ACTION_SPILL_DIRECTORY, \
+    recover_analytics_action_spill_files
+
+
+class Command(BaseCommand):
+    help = 'Saves saveAnalyticsAction rows left in spill files by web workers that stopped before flushing. ' \
+           'Running workers recover these files on their own when they start.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spill-directory', default=ANALYTICS_ACTION_SPILL_DIRECTORY)
+        parser.add_argument('--include-running', action='store_true',
+                            help='Also recover the spill files of workers that look like they are running. '
+                                 'Only use this when the web workers are stopped.')
+
+    def handle(self, *args, **options):
+        results = recover_analytics_action_spill_files(
+            spill_directory=options['spill_directory'], include_running=options['include_running'])
+        self.stdout.write(results['status'])
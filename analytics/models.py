@@ -105,6 +105,13 @@ ACTIONS_THAT_REQUIRE_ORGANIZATION_IDS = \
      ACTION_ORGANIZATION_FOLLOW, ACTION_ORGANIZATION_FOLLOW_IGNORE, ACTION_ORGANIZATION_STOP_FOLLOWING,
      ACTION_ORGANIZATION_STOP_IGNORING, ACTION_VOTER_GUIDE_VISIT]
 
+# AnalyticsDailyRollup.rollup_kind and AnalyticsFirstSeen.first_seen_kind. With an organization_we_vote_id, the
+#  VISITORS kinds count the voters who visited that organization's voter guide.
+ROLLUP_AUTHENTICATED_VISITORS = 'AUTHENTICATED_VISITORS'
+ROLLUP_BALLOT_VIEWERS = 'BALLOT_VIEWERS'
+ROLLUP_VISITORS = 'VISITORS'
+ROLLUP_VOTER_GUIDES_VIEWED = 'VOTER_GUIDES_VIEWED'
+
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -116,7 +123,8 @@ class AnalyticsAction(models.Model):
     action_constant = models.PositiveSmallIntegerField(
         verbose_name="constant representing action", null=True, unique=False, db_index=True)
 
-    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, auto_now_add=True)
+    # Not auto_now_add, so actions saved in bulk by the saveAnalyticsAction buffer keep the time of the request
+    exact_time = models.DateTimeField(verbose_name='date and time of action', null=False, default=now)
     # We store YYYYMMDD as an integer for very fast lookup (ex/ "20170901" for September, 1, 2017)
     date_as_integer = models.PositiveIntegerField(
         verbose_name="YYYYMMDD of the action", null=True, unique=False, db_index=True)
@@ -1707,6 +1715,57 @@ class AnalyticsManager(models.Manager):
         return results
 
 
+class AnalyticsDailyRollup(models.Model):
+    """
+    One day's distinct count for one rollup_kind, sitewide (organization_we_vote_id is '') or for one organization,
+    plus the running "all time" distinct count through that day. We only store a row for days with activity,
+    so the total on a quiet day is the running_total of the latest row before it.
+    """
+    date_as_integer = models.PositiveIntegerField(verbose_name="YYYYMMDD of the actions", null=False)
+    rollup_kind = models.CharField(max_length=50, null=False)
+    organization_we_vote_id = models.CharField(max_length=255, default='', null=False, blank=True)
+    # Distinct voters (or voter guides) with actions this day
+    distinct_today = models.PositiveIntegerField(default=0)
+    # ...of which this was the first day we ever saw them
+    first_seen_today = models.PositiveIntegerField(default=0)
+    # Sum of first_seen_today through this day
+    running_total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['rollup_kind', 'organization_we_vote_id', 'date_as_integer'],
+                name='analytics_daily_rollup_unique'),
+        ]
+
+
+class AnalyticsFirstSeen(models.Model):
+    """
+    The first day each voter (or voter guide) was counted for one first_seen_kind, so "all time" distinct counts can
+    be kept as running totals instead of scanning every AnalyticsAction.
+    """
+    first_seen_kind = models.CharField(max_length=50, null=False)
+    organization_we_vote_id = models.CharField(max_length=255, default='', null=False, blank=True)
+    # The voter_we_vote_id, or for ROLLUP_VOTER_GUIDES_VIEWED the organization_we_vote_id of the voter guide
+    we_vote_id = models.CharField(max_length=255, null=False)
+    first_seen_date_as_integer = models.PositiveIntegerField(verbose_name="YYYYMMDD", null=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['first_seen_kind', 'organization_we_vote_id', 'we_vote_id'],
+                name='analytics_first_seen_unique'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['first_seen_date_as_integer', 'first_seen_kind'],
+                name='analytics_first_seen_date'),
+            models.Index(
+                fields=['first_seen_kind', 'we_vote_id'],
+                name='analytics_first_seen_id'),
+        ]
+
+
 class AnalyticsProcessingStatus(models.Model):
     """
     When we have finished analyzing one element of the analytics data for a day, store our completion here
@@ -0,0 +1,157 @@
+import json
+import os
+import tempfile
+
+from django.test import TestCase, TransactionTestCase
+
+from analytics.controllers import calculate_organization_daily_metrics, calculate_sitewide_daily_metrics
+from analytics.controllers_action_buffer import AnalyticsActionBuffer, generate_analytics_action_values, \
+    recover_analytics_action_spill_files
+from analytics.controllers_daily_rollup import update_analytics_daily_running_totals, \
+    update_analytics_first_seen_for_one_date
+from analytics.models import ACTION_BALLOT_VISIT, ACTION_VOTER_GUIDE_VISIT, ACTION_WELCOME_VISIT, AnalyticsAction, \
+    AnalyticsCountManager, AnalyticsFirstSeen, ROLLUP_VISITORS
+
+
+class AnalyticsActionBufferTestCase(TestCase):
+    databases = ["default", "readonly", "analytics"]
+
+    def setUp(self):
+        self.spill_directory = tempfile.mkdtemp()
+        self.analytics_action_buffer = AnalyticsActionBuffer(
+            spill_directory=self.spill_directory, start_flush_thread=False)
+
+    @staticmethod
+    def generate_action_values(number):
+        return generate_analytics_action_values(
+            action_constant=ACTION_BALLOT_VISIT,
+            voter_we_vote_id='wvtestvoter' + str(number),
+            voter_id=number,
+            google_civic_election_id=9000)
+
+    def test_flush_saves_queued_actions_in_bulk(self):
+        for number in range(1, 6):
+            self.analytics_action_buffer.enqueue(self.generate_action_values(number))
+        self.assertEqual(self.analytics_action_buffer.queue_depth(), 5)
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 0)
+
+        results = self.analytics_action_buffer.flush()
+        self.assertEqual(results['actions_flushed'], 5)
+        self.assertEqual(self.analytics_action_buffer.queue_depth(), 0)
+        action = AnalyticsAction.objects.using('analytics').get(voter_we_vote_id='wvtestvoter3')
+        self.assertEqual(action.google_civic_election_id, 9000)
+        self.assertTrue(action.date_as_integer)
+        # The flushed actions are no longer in a spill file
+        self.assertEqual(recover_analytics_action_spill_files(
+            self.spill_directory, include_running=True)['actions_recovered'], 0)
+
+    def test_spill_file_from_stopped_worker_is_recovered(self):
+        stopped_worker_spill_file_path = os.path.join(self.spill_directory, 'analytics_actions_99999999.jsonl')
+        with open(stopped_worker_spill_file_path, 'w') as spill_file:
+            for number in range(1, 4):
+                spill_file.write(json.dumps(self.generate_action_values(number)) + '\n')
+
+        results = recover_analytics_action_spill_files(self.spill_directory)
+        self.assertEqual(results['actions_recovered'], 3)
+        self.assertFalse(os.path.exists(stopped_worker_spill_file_path))
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 3)
+
+    def test_spill_file_from_earlier_worker_with_same_pid_is_recovered(self):
+        earlier_worker_spill_file_path = os.path.join(
+            self.spill_directory, 'analytics_actions_{pid}-earlier1.jsonl'.format(pid=os.getpid()))
+        with open(earlier_worker_spill_file_path, 'w') as spill_file:
+            spill_file.write(json.dumps(self.generate_action_values(1)) + '\n')
+        self.analytics_action_buffer.enqueue(self.generate_action_values(2))
+
+        results = recover_analytics_action_spill_files(
+            self.spill_directory, worker_id=self.analytics_action_buffer.worker_id)
+        self.assertEqual(results['actions_recovered'], 1)
+        self.assertFalse(os.path.exists(earlier_worker_spill_file_path))
+        # This worker's own spill file is left for its flush
+        self.assertTrue(os.path.exists(self.analytics_action_buffer.spill_file_path))
+        self.assertEqual(self.analytics_action_buffer.flush()['actions_flushed'], 1)
+
+    def test_rejected_row_is_quarantined_and_the_rest_are_saved(self):
+        stopped_worker_spill_file_path = os.path.join(self.spill_directory, 'analytics_actions_99999999-abc.jsonl')
+        with open(stopped_worker_spill_file_path, 'w') as spill_file:
+            for number in range(1, 4):
+                action_values = self.generate_action_values(number)
+                if number == 2:
+                    action_values['ballot_item_we_vote_id'] = 'x' * 300
+                spill_file.write(json.dumps(action_values) + '\n')
+
+        results = recover_analytics_action_spill_files(self.spill_directory)
+        self.assertTrue(results['success'])
+        self.assertEqual(results['actions_recovered'], 2)
+        self.assertEqual(AnalyticsAction.objects.using('analytics').count(), 2)
+        self.assertEqual(os.listdir(self.spill_directory), ['rejected_analytics_actions_99999999-abc.jsonl'])
+        with open(os.path.join(self.spill_directory, 'rejected_analytics_actions_99999999-abc.jsonl')) as \
+                rejected_file:
+            rejected_action_values_list = [json.loads(line) for line in rejected_file]
+        self.assertEqual([action_values['voter_we_vote_id'] for action_values in rejected_action_values_list],
+                         ['wvtestvoter2'])
+        # Rejected rows are not retried
+        self.assertEqual(recover_analytics_action_spill_files(
+            self.spill_directory, include_running=True)['actions_recovered'], 0)
+
+    def test_long_values_are_truncated_when_queued(self):
+        action_values = generate_analytics_action_values(
+            action_constant=ACTION_BALLOT_VISIT, ballot_item_we_vote_id='x' * 300, user_agent_string='y' * 300)
+        self.assertEqual(len(action_values['ballot_item_we_vote_id']), 255)
+        self.assertEqual(len(action_values['user_agent']), 255)
+        self.analytics_action_buffer.enqueue(action_values)
+        self.assertEqual(self.analytics_action_buffer.flush()['actions_flushed'], 1)
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' queries see the actions saved on 'analytics'
+class AnalyticsDailyRollupTestCase(TransactionTestCase):
+    databases = ["default", "readonly", "analytics"]
+
+    def setUp(self):
+        for date_as_integer, voter_we_vote_id, action_constant, is_signed_in, organization_we_vote_id in [
+                (20240101, 'wvtestvotera', ACTION_WELCOME_VISIT, False, None),
+                (20240101, 'wvtestvoterb', ACTION_VOTER_GUIDE_VISIT, False, 'wvtestorg1'),
+                (20240102, 'wvtestvoterb', ACTION_BALLOT_VISIT, True, None),
+                (20240102, 'wvtestvoterc', ACTION_VOTER_GUIDE_VISIT, True, 'wvtestorg1'),
+                (20240103, 'wvtestvotera', ACTION_VOTER_GUIDE_VISIT, True, 'wvtestorg2'),
+                (20240103, 'wvtestvoterd', ACTION_BALLOT_VISIT, False, None)]:
+            AnalyticsAction.objects.using('analytics').create(
+                action_constant=action_constant,
+                voter_we_vote_id=voter_we_vote_id,
+                is_signed_in=is_signed_in,
+                organization_we_vote_id=organization_we_vote_id,
+                date_as_integer=date_as_integer)
+        # Like a parallel backfill, where a later date range can finish first
+        for date_as_integer in [20240103, 20240102, 20240101]:
+            self.assertTrue(update_analytics_first_seen_for_one_date(date_as_integer)['success'])
+        self.assertTrue(update_analytics_daily_running_totals(20240101, 20240103)['success'])
+
+    def test_first_seen_keeps_earliest_date(self):
+        first_seen = AnalyticsFirstSeen.objects.using('analytics').get(
+            first_seen_kind=ROLLUP_VISITORS, organization_we_vote_id='', we_vote_id='wvtestvotera')
+        self.assertEqual(first_seen.first_seen_date_as_integer, 20240101)
+
+    def test_sitewide_totals_match_full_history_counts(self):
+        analytics_count_manager = AnalyticsCountManager()
+        for date_as_integer in [20240101, 20240102, 20240103]:
+            results = calculate_sitewide_daily_metrics(date_as_integer, update_rollup=False)
+            self.assertNotIn('ANALYTICS_DAILY_ROLLUP_NEEDS_BACKFILL', results['status'])
+            values = results['sitewide_daily_metrics_values']
+            self.assertEqual(values['visitors_total'],
+                             analytics_count_manager.fetch_visitors(0, '', 0, date_as_integer))
+            self.assertEqual(values['authenticated_visitors_total'],
+                             analytics_count_manager.fetch_visitors(0, '', 0, date_as_integer, True))
+            self.assertEqual(values['voter_guides_viewed_total'],
+                             analytics_count_manager.fetch_voter_guides_viewed(0, 0, date_as_integer))
+            self.assertEqual(values['visitors_today'], analytics_count_manager.fetch_visitors(0, '', date_as_integer))
+            self.assertEqual(values['ballot_views_today'],
+                             analytics_count_manager.fetch_ballot_views(0, date_as_integer))
+        values = calculate_sitewide_daily_metrics(20240103, update_rollup=False)['sitewide_daily_metrics_values']
+        self.assertEqual(values['new_visitors_today'], 1)
+
+    def test_organization_total_carries_over_quiet_days(self):
+        values = calculate_organization_daily_metrics('wvtestorg1', 20240103)['organization_daily_metrics_values']
+        self.assertEqual(values['date_as_integer'], 20240103)
+        self.assertEqual(values['visitors_total'], 2)
+        self.assertEqual(values['authenticated_visitors_total'], 1)
+        self.assertEqual(values['visitors_today'], 0)
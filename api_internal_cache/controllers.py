@@ -2,10 +2,201 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from config.base import get_environment_variable
+from collections import OrderedDict
+from threading import Lock
+import time
+
+from django.core.cache import caches
+
+from .models import ApiInternalCacheManager
+from config.base import get_environment_variable, SHARED_CACHE_LOCATION
 import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
 
+# How long a worker serves a response from its own memory before checking the shared tier again
+API_RESPONSE_LOCAL_CACHE_TTL_SECONDS = 60
+# How many (api_name, election_id_list_serialized) responses each worker keeps in memory
+API_RESPONSE_LOCAL_CACHE_MAX_ENTRIES = 32
+# The longest the shared tier keeps a response. It is also never kept longer than the endpoint's refresh interval.
+API_RESPONSE_SHARED_CACHE_TTL_SECONDS = 2 * 60 * 60
+# Within this window only one request (across workers sharing the cache) checks the database for refresh scheduling
+API_REFRESH_SCHEDULING_WINDOW_SECONDS = 5 * 60
+
+# Process-local LRU: cache_key -> (cached_api_response_bytes, time stored)
+local_api_response_cache = OrderedDict()
+local_api_response_cache_lock = Lock()
+
+
+def generate_api_response_cache_key(api_name='', election_id_list_serialized=''):
+    return "api_internal_cache:{api_name}:{election_id_list_serialized}".format(
+        api_name=api_name.lower(),
+        election_id_list_serialized=election_id_list_serialized)
+
+
+def generate_api_response_shared_cache_ttl_seconds(refresh_minutes=0):
+    """
+    Without SHARED_CACHE_LOCATION the shared tier is this process's own memory, which never hears about refreshes made
+    by other processes, so there it keeps a response no longer than the local tier does.
+    :param refresh_minutes: How often the endpoint is refreshed
+    :return:
+    """
+    if not positive_value_exists(SHARED_CACHE_LOCATION):
+        return API_RESPONSE_LOCAL_CACHE_TTL_SECONDS
+    if positive_value_exists(refresh_minutes):
+        return min(API_RESPONSE_SHARED_CACHE_TTL_SECONDS, refresh_minutes * 60)
+    return API_RESPONSE_SHARED_CACHE_TTL_SECONDS
+
+
+def store_api_response_in_local_cache(cache_key, cached_api_response_bytes):
+    with local_api_response_cache_lock:
+        local_api_response_cache[cache_key] = (cached_api_response_bytes, time.monotonic())
+        local_api_response_cache.move_to_end(cache_key)
+        while len(local_api_response_cache) > API_RESPONSE_LOCAL_CACHE_MAX_ENTRIES:
+            local_api_response_cache.popitem(last=False)
+
+
+def retrieve_api_response_from_local_cache(cache_key):
+    with local_api_response_cache_lock:
+        if cache_key not in local_api_response_cache:
+            return None
+        cached_api_response_bytes, time_stored = local_api_response_cache[cache_key]
+        if time.monotonic() - time_stored > API_RESPONSE_LOCAL_CACHE_TTL_SECONDS:
+            del local_api_response_cache[cache_key]
+            return None
+        local_api_response_cache.move_to_end(cache_key)
+        return cached_api_response_bytes
+
+
+def retrieve_cached_api_response_bytes(api_name='', election_id_list_serialized='', refresh_minutes=0):
+    """
+    Return the most recent pre-generated response for this API as the serialized bytes we send to the client,
+    checking this worker's memory first, then the shared cache tier, then the ApiInternalCache table.
+    The response is never decoded here, so callers can return it as-is.
+    :param api_name:
+    :param election_id_list_serialized:
+    :param refresh_minutes: How often the endpoint is refreshed
+    :return:
+    """
+    status = ''
+    cache_key = generate_api_response_cache_key(api_name, election_id_list_serialized)
+
+    cached_api_response_bytes = retrieve_api_response_from_local_cache(cache_key)
+    if cached_api_response_bytes is not None:
+        status += "API_RESPONSE_FOUND_IN_LOCAL_CACHE "
+    else:
+        try:
+            cached_api_response_bytes = caches['shared'].get(cache_key)
+        except Exception as e:
+            status += "API_RESPONSE_SHARED_CACHE_ERROR: " + str(e) + " "
+        if cached_api_response_bytes is not None:
+            status += "API_RESPONSE_FOUND_IN_SHARED_CACHE "
+            store_api_response_in_local_cache(cache_key, cached_api_response_bytes)
+
+    if cached_api_response_bytes is None:
+        api_internal_cache_manager = ApiInternalCacheManager()
+        results = api_internal_cache_manager.retrieve_latest_api_internal_cache(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            decode_json=False)
+        status += results['status']
+        if results['api_internal_cache_found']:
+            status += "API_RESPONSE_FOUND_IN_DATABASE "
+            cached_api_response_bytes = results['api_internal_cache'].cached_api_response_serialized.encode('utf-8')
+            store_api_response_in_all_cache_tiers(
+                api_name=api_name,
+                cached_api_response_bytes=cached_api_response_bytes,
+                election_id_list_serialized=election_id_list_serialized,
+                refresh_minutes=refresh_minutes)
+
+    results = {
+        'success':                      True,
+        'status':                       status,
+        'cached_api_response_bytes':    cached_api_response_bytes,
+        'cached_api_response_found':    cached_api_response_bytes is not None,
+    }
+    return results
+
+
+def store_api_response_in_all_cache_tiers(
+        api_name='', cached_api_response_bytes=b'', election_id_list_serialized='', refresh_minutes=0):
+    cache_key = generate_api_response_cache_key(api_name, election_id_list_serialized)
+    store_api_response_in_local_cache(cache_key, cached_api_response_bytes)
+    try:
+        caches['shared'].set(cache_key, cached_api_response_bytes,
+                             generate_api_response_shared_cache_ttl_seconds(refresh_minutes))
+    except Exception as e:
+        logger.error("API_RESPONSE_SHARED_CACHE_SET_ERROR: " + str(e))
+
+
+def invalidate_cached_api_response(
+        api_name='', election_id_list_serialized='', cached_api_response_bytes=None, refresh_minutes=0):
+    """
+    Called when process_one_api_refresh_request_batch_process has stored a new ApiInternalCache entry.
+    If we have the new response, we write it through to both tiers, so the next request doesn't go to the database.
+    Other workers pick up the new response from the shared tier within API_RESPONSE_LOCAL_CACHE_TTL_SECONDS, or
+    from the database when there is no SHARED_CACHE_LOCATION.
+    :param api_name:
+    :param election_id_list_serialized:
+    :param cached_api_response_bytes:
+    :param refresh_minutes: How often the endpoint is refreshed
+    :return:
+    """
+    cache_key = generate_api_response_cache_key(api_name, election_id_list_serialized)
+    if cached_api_response_bytes is not None:
+        store_api_response_in_all_cache_tiers(
+            api_name=api_name,
+            cached_api_response_bytes=cached_api_response_bytes,
+            election_id_list_serialized=election_id_list_serialized,
+            refresh_minutes=refresh_minutes)
+        return
+    with local_api_response_cache_lock:
+        local_api_response_cache.pop(cache_key, None)
+    try:
+        caches['shared'].delete(cache_key)
+    except Exception as e:
+        logger.error("API_RESPONSE_SHARED_CACHE_DELETE_ERROR: " + str(e))
+
+
+def schedule_refresh_of_api_internal_cache_if_needed(
+        api_name='',
+        election_id_list_serialized='',
+        refresh_minutes=55,
+        staleness_budget_minutes=60):
+    """
+    Wrapper around ApiInternalCacheManager.schedule_refresh_of_api_internal_cache that only reaches the database
+    once per API_REFRESH_SCHEDULING_WINDOW_SECONDS for each (api_name, election_id_list_serialized).
+    :param api_name:
+    :param election_id_list_serialized:
+    :param refresh_minutes:
+    :param staleness_budget_minutes:
+    :return:
+    """
+    status = ''
+    scheduling_key = generate_api_response_cache_key(api_name, election_id_list_serialized) + ":refresh_scheduled"
+    try:
+        # add() only succeeds for the first caller in the window
+        scheduling_needed = caches['shared'].add(scheduling_key, True, API_REFRESH_SCHEDULING_WINDOW_SECONDS)
+    except Exception as e:
+        status += "API_REFRESH_SCHEDULING_SHARED_CACHE_ERROR: " + str(e) + " "
+        scheduling_needed = True
+    if positive_value_exists(scheduling_needed):
+        api_internal_cache_manager = ApiInternalCacheManager()
+        results = api_internal_cache_manager.schedule_refresh_of_api_internal_cache(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            refresh_minutes=refresh_minutes,
+            staleness_budget_minutes=staleness_budget_minutes)
+        status += results['status']
+    else:
+        status += "API_REFRESH_RECENTLY_SCHEDULED "
+
+    results = {
+        'success':  True,
+        'status':   status,
+    }
+    return results
+
@@ -0,0 +1,388 @@
+# api_internal_cache/controllers_precomputed_api.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.http import HttpResponse
+from django.utils.timezone import now
+import json
+from threading import Lock
+import time
+
+from .controllers import invalidate_cached_api_response, retrieve_cached_api_response_bytes, \
+    schedule_refresh_of_api_internal_cache_if_needed
+from .models import ApiInternalCacheManager
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, is_valid_state_code, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+JSON_CONTENT_TYPE = 'application/json'
+# Cache keys come from request parameters, so we only cache responses for parameter values we recognize
+PRECOMPUTED_API_MAX_ELECTION_IDS = 20
+PRECOMPUTED_API_KNOWN_ELECTIONS_TTL_SECONDS = 5 * 60
+
+# google_civic_election_ids of every election, and when we retrieved them
+known_google_civic_election_id_cache = {'google_civic_election_id_set': set(), 'time_retrieved': None}
+known_google_civic_election_id_cache_lock = Lock()
+
+
+# Each generate_* function takes the parameters dict for one cache key and returns the serialized response
+#  (what we store in ApiInternalCache.cached_api_response_serialized) and whether it is good enough to cache
+def generated_response_results(cached_api_response_serialized='', success=True):
+    return {
+        'success':                          success,
+        'cached_api_response_serialized':   cached_api_response_serialized,
+    }
+
+
+def generate_all_ballot_items_retrieve(parameters):  # allBallotItemsRetrieve
+    from ballot.controllers import all_ballot_items_retrieve_for_api
+    json_data = all_ballot_items_retrieve_for_api(
+        parameters.get('google_civic_election_id', 0), parameters.get('state_code', ''))
+    return generated_response_results(json.dumps(json_data), json_data.get('success', False))
+
+
+def generate_ballot_item_highlights_retrieve(parameters):  # ballotItemHighlightsRetrieve
+    from ballot.controllers import ballot_item_highlights_retrieve_for_api
+    json_data = ballot_item_highlights_retrieve_for_api(parameters.get('starting_year', 0))
+    return generated_response_results(json.dumps(json_data), json_data['success'])
+
+
+def generate_candidate_list_for_upcoming_elections_retrieve(parameters):  # candidateListForUpcomingElectionsRetrieve
+    from candidate.controllers import candidate_list_for_upcoming_elections_retrieve_for_api
+    json_data = candidate_list_for_upcoming_elections_retrieve_for_api(
+        google_civic_election_id_list=parameters.get('google_civic_election_id_list', []),
+        state_code=parameters.get('state_code', ''))
+    return generated_response_results(json.dumps(json_data), json_data['success'])
+
+
+def generate_elections_retrieve(parameters):  # electionsRetrieve
+    from election.controllers import elections_retrieve_for_api
+    results = elections_retrieve_for_api()
+    json_data = {
+        'status':               results['status'],
+        'success':              results['success'],
+        'election_list':        results['election_list'],
+    }
+    return generated_response_results(json.dumps(json_data), json_data['success'])
+
+
+def generate_measure_list_for_upcoming_elections_retrieve(parameters):  # measureListForUpcomingElectionsRetrieve
+    from measure.controllers import measure_list_for_upcoming_elections_retrieve_for_api
+    json_data = measure_list_for_upcoming_elections_retrieve_for_api(
+        google_civic_election_id_list=parameters.get('google_civic_election_id_list', []),
+        state_code=parameters.get('state_code', ''))
+    return generated_response_results(json.dumps(json_data), json_data['success'])
+
+
+def generate_voter_guides_upcoming(parameters):  # voterGuidesUpcoming
+    from voter_guide.controllers import voter_guides_upcoming_retrieve_for_api
+    results = voter_guides_upcoming_retrieve_for_api(
+        google_civic_election_id_list=parameters.get('google_civic_election_id_list', []))
+    json_data = results['json_data']
+    return generated_response_results(json.dumps(json_data), results['success'] and json_data['success'])
+
+
+def normalize_election_id_list(google_civic_election_id_list):
+    return sorted(set(convert_to_int(google_civic_election_id)
+                      for google_civic_election_id in google_civic_election_id_list))
+
+
+def normalize_precomputed_api_parameters(parameters):
+    # "ca" and "CA", or ["2", "1"] and [1, 2], are the same request, so they should share one cache key
+    normalized_parameters = dict(parameters)
+    if 'state_code' in normalized_parameters:
+        normalized_parameters['state_code'] = str(normalized_parameters['state_code'] or '').upper()
+    if 'google_civic_election_id' in normalized_parameters:
+        normalized_parameters['google_civic_election_id'] = \
+            convert_to_int(normalized_parameters['google_civic_election_id'])
+    if 'google_civic_election_id_list' in normalized_parameters:
+        normalized_parameters['google_civic_election_id_list'] = \
+            normalize_election_id_list(normalized_parameters['google_civic_election_id_list'])
+    return normalized_parameters
+
+
+# voterGuidesUpcoming was cached before this registry existed, so its cache key is the bare election id list
+def build_cache_key_from_election_id_list(parameters):
+    return json.dumps(normalize_election_id_list(parameters.get('google_civic_election_id_list', [])))
+
+
+def parse_cache_key_as_election_id_list(election_id_list_serialized):
+    return {'google_civic_election_id_list': json.loads(election_id_list_serialized)}
+
+
+def build_cache_key_from_parameters(parameters):
+    return json.dumps(normalize_precomputed_api_parameters(parameters), sort_keys=True)
+
+
+def parse_cache_key_as_parameters(election_id_list_serialized):
+    return json.loads(election_id_list_serialized) if positive_value_exists(election_id_list_serialized) else {}
+
+
+def prewarm_parameters_for_upcoming_elections(google_civic_election_id_list):
+    # The WebApp asks for "all upcoming elections" by sending an empty list
+    return [{'google_civic_election_id_list': [], 'state_code': ''}]
+
+
+def prewarm_parameters_for_each_election(google_civic_election_id_list):
+    return [{'google_civic_election_id': convert_to_int(google_civic_election_id), 'state_code': ''}
+            for google_civic_election_id in google_civic_election_id_list]
+
+
+def prewarm_parameters_for_highlights(google_civic_election_id_list):
+    return [{'starting_year': 0}]
+
+
+def prewarm_parameters_none(google_civic_election_id_list):
+    return [{}]
+
+
+def prewarm_parameters_for_voter_guides_upcoming(google_civic_election_id_list):
+    return [{'google_civic_election_id_list': []}]
+
+
+# Declare a read-only endpoint here to have it served from api_internal_cache.
+#  build_cache_key / parse_cache_key: parameters dict <-> ApiInternalCache.election_id_list_serialized
+#  generate_response: parameters dict -> serialized response, and whether it should be cached
+#  prewarm_parameters: google_civic_election_id_list -> parameter dicts to refresh after an election data import
+#  refresh_minutes: how often we refresh while the endpoint is being requested
+#  staleness_budget_minutes: how old a cached response can be before we refresh it immediately
+PRECOMPUTED_API_REGISTRY = {
+    'allBallotItemsRetrieve': {
+        'build_cache_key':          build_cache_key_from_parameters,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_all_ballot_items_retrieve,
+        'parse_cache_key':          parse_cache_key_as_parameters,
+        'prewarm_parameters':       prewarm_parameters_for_each_election,
+        'refresh_minutes':          55,
+        'staleness_budget_minutes': 60,
+    },
+    'ballotItemHighlightsRetrieve': {
+        'build_cache_key':          build_cache_key_from_parameters,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_ballot_item_highlights_retrieve,
+        'parse_cache_key':          parse_cache_key_as_parameters,
+        'prewarm_parameters':       prewarm_parameters_for_highlights,
+        'refresh_minutes':          55,
+        'staleness_budget_minutes': 60,
+    },
+    'candidateListForUpcomingElectionsRetrieve': {
+        'build_cache_key':          build_cache_key_from_parameters,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_candidate_list_for_upcoming_elections_retrieve,
+        'parse_cache_key':          parse_cache_key_as_parameters,
+        'prewarm_parameters':       prewarm_parameters_for_upcoming_elections,
+        'refresh_minutes':          55,
+        'staleness_budget_minutes': 60,
+    },
+    'electionsRetrieve': {
+        'build_cache_key':          build_cache_key_from_parameters,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_elections_retrieve,
+        'parse_cache_key':          parse_cache_key_as_parameters,
+        'prewarm_parameters':       prewarm_parameters_none,
+        'refresh_minutes':          25,
+        'staleness_budget_minutes': 30,
+    },
+    'measureListForUpcomingElectionsRetrieve': {
+        'build_cache_key':          build_cache_key_from_parameters,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_measure_list_for_upcoming_elections_retrieve,
+        'parse_cache_key':          parse_cache_key_as_parameters,
+        'prewarm_parameters':       prewarm_parameters_for_upcoming_elections,
+        'refresh_minutes':          55,
+        'staleness_budget_minutes': 60,
+    },
+    'voterGuidesUpcoming': {
+        'build_cache_key':          build_cache_key_from_election_id_list,
+        'content_type':             JSON_CONTENT_TYPE,
+        'generate_response':        generate_voter_guides_upcoming,
+        'parse_cache_key':          parse_cache_key_as_election_id_list,
+        'prewarm_parameters':       prewarm_parameters_for_voter_guides_upcoming,
+        'refresh_minutes':          55,
+        'staleness_budget_minutes': 60,
+    },
+}
+
+
+def retrieve_known_google_civic_election_id_set():
+    with known_google_civic_election_id_cache_lock:
+        time_retrieved = known_google_civic_election_id_cache['time_retrieved']
+        if time_retrieved is not None and \
+                time.monotonic() - time_retrieved < PRECOMPUTED_API_KNOWN_ELECTIONS_TTL_SECONDS:
+            return known_google_civic_election_id_cache['google_civic_election_id_set']
+    from election.models import Election
+    google_civic_election_id_set = set(
+        convert_to_int(google_civic_election_id) for google_civic_election_id in
+        Election.objects.using('readonly').values_list('google_civic_election_id', flat=True))
+    with known_google_civic_election_id_cache_lock:
+        known_google_civic_election_id_cache['google_civic_election_id_set'] = google_civic_election_id_set
+        known_google_civic_election_id_cache['time_retrieved'] = time.monotonic()
+    return google_civic_election_id_set
+
+
+def are_precomputed_api_parameters_cacheable(parameters):
+    """
+    Every cache key gets its own ApiInternalCache rows, ApiRefreshRequests and cache entries, so we only cache
+    parameters which name a state, a year, or at most PRECOMPUTED_API_MAX_ELECTION_IDS elections we have.
+    :param parameters:
+    :return:
+    """
+    for name, value in parameters.items():
+        if name == 'state_code':
+            if positive_value_exists(value) and not is_valid_state_code(value):
+                return False
+        elif name == 'starting_year':
+            if positive_value_exists(value) and not 2000 <= convert_to_int(value) <= now().year + 1:
+                return False
+        elif name == 'google_civic_election_id':
+            if positive_value_exists(value) and \
+                    convert_to_int(value) not in retrieve_known_google_civic_election_id_set():
+                return False
+        elif name == 'google_civic_election_id_list':
+            if not isinstance(value, list) or len(value) > PRECOMPUTED_API_MAX_ELECTION_IDS:
+                return False
+            if value and not set(convert_to_int(google_civic_election_id) for google_civic_election_id in value) \
+                    .issubset(retrieve_known_google_civic_election_id_set()):
+                return False
+        else:
+            return False
+    return True
+
+
+def precomputed_api_response(api_name='', parameters={}):
+    """
+    Serve a registered endpoint from api_internal_cache, scheduling a refresh when needed. If nothing has been
+    cached yet for these parameters, generate the response now (and the scheduled refresh will cache it).
+    Parameters we don't recognize are answered without the cache.
+    :param api_name:
+    :param parameters:
+    :return:
+    """
+    registry_entry = PRECOMPUTED_API_REGISTRY[api_name]
+    if not are_precomputed_api_parameters_cacheable(parameters):
+        results = registry_entry['generate_response'](parameters)
+        return HttpResponse(results['cached_api_response_serialized'], content_type=registry_entry['content_type'])
+
+    election_id_list_serialized = registry_entry['build_cache_key'](parameters)
+    results = retrieve_cached_api_response_bytes(
+        api_name=api_name,
+        election_id_list_serialized=election_id_list_serialized,
+        refresh_minutes=registry_entry['refresh_minutes'])
+    cached_api_response_found = results['cached_api_response_found']
+    cached_api_response_bytes = results['cached_api_response_bytes']
+
+    schedule_refresh_of_api_internal_cache_if_needed(
+        api_name=api_name,
+        election_id_list_serialized=election_id_list_serialized,
+        refresh_minutes=registry_entry['refresh_minutes'],
+        staleness_budget_minutes=registry_entry['staleness_budget_minutes'])
+
+    if not cached_api_response_found:
+        results = registry_entry['generate_response'](parameters)
+        cached_api_response_bytes = results['cached_api_response_serialized']
+    return HttpResponse(cached_api_response_bytes, content_type=registry_entry['content_type'])
+
+
+def refresh_precomputed_api_response(api_name='', election_id_list_serialized=''):
+    """
+    Called by process_one_api_refresh_request_batch_process to regenerate one registered endpoint and store it.
+    :param api_name:
+    :param election_id_list_serialized:
+    :return:
+    """
+    status = ''
+    api_internal_cache_id = 0
+    api_internal_cache_saved = False
+    api_results_retrieved = False
+    api_internal_cache_manager = ApiInternalCacheManager()
+
+    if api_name not in PRECOMPUTED_API_REGISTRY:
+        status += "API_NAME_NOT_RECOGNIZED: " + str(api_name) + " "
+        results = {
+            'success':                  False,
+            'status':                   status,
+            'api_internal_cache_id':    api_internal_cache_id,
+            'api_internal_cache_saved': api_internal_cache_saved,
+            'api_results_retrieved':    api_results_retrieved,
+        }
+        return results
+
+    registry_entry = PRECOMPUTED_API_REGISTRY[api_name]
+    status += "STARTING_PROCESS_ONE_API_REFRESH_REQUESTED-" + str(api_name) + "-" \
+              "(" + str(election_id_list_serialized) + ") "
+    try:
+        parameters = registry_entry['parse_cache_key'](election_id_list_serialized)
+        results = registry_entry['generate_response'](parameters)
+        cached_api_response_serialized = results['cached_api_response_serialized']
+        api_results_retrieved = results['success'] and positive_value_exists(cached_api_response_serialized)
+    except Exception as e:
+        status += "NEW_API_RESULTS_RETRIEVE_ERROR: " + str(e) + " "
+        cached_api_response_serialized = ''
+
+    if api_results_retrieved:
+        # Save the response in the cache
+        status += "NEW_API_RESULTS_RETRIEVED-CREATING_API_INTERNAL_CACHE "
+        results = api_internal_cache_manager.create_api_internal_cache(
+            api_name=api_name,
+            cached_api_response_serialized=cached_api_response_serialized,
+            election_id_list_serialized=election_id_list_serialized,
+        )
+        status += results['status']
+        api_internal_cache_saved = results['success']
+        api_internal_cache_id = results['api_internal_cache_id']
+    else:
+        status += "NEW_API_RESULTS_RETRIEVE_FAILED "
+
+    if api_internal_cache_saved and positive_value_exists(api_internal_cache_id):
+        results = api_internal_cache_manager.mark_prior_api_internal_cache_entries_as_replaced(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            excluded_api_internal_cache_id=api_internal_cache_id)
+        status += results['status']
+        # Replace the response served from the process-local and shared cache tiers
+        invalidate_cached_api_response(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            cached_api_response_bytes=cached_api_response_serialized.encode('utf-8'),
+            refresh_minutes=registry_entry['refresh_minutes'])
+
+    results = {
+        'success':                  api_internal_cache_saved,
+        'status':                   status,
+        'api_internal_cache_id':    api_internal_cache_id,
+        'api_internal_cache_saved': api_internal_cache_saved,
+        'api_results_retrieved':    api_results_retrieved,
+    }
+    return results
+
+
+def schedule_prewarm_of_precomputed_apis(google_civic_election_id_list=[]):
+    """
+    After an election data import, ask the batch process system to refresh every registered endpoint right away,
+    instead of waiting for the first voter to find stale data.
+    :param google_civic_election_id_list:
+    :return:
+    """
+    status = ''
+    api_internal_cache_manager = ApiInternalCacheManager()
+    api_refresh_request_count = 0
+    for api_name, registry_entry in PRECOMPUTED_API_REGISTRY.items():
+        if registry_entry['prewarm_parameters'] is None:
+            continue
+        for parameters in registry_entry['prewarm_parameters'](google_civic_election_id_list):
+            results = api_internal_cache_manager.create_api_refresh_request(
+                api_name=api_name,
+                election_id_list_serialized=registry_entry['build_cache_key'](parameters),
+                date_refresh_is_needed=now())
+            if results['api_refresh_request_saved']:
+                api_refresh_request_count += 1
+            else:
+                status += results['status']
+    status += "PRECOMPUTED_API_PREWARM_REQUESTS_CREATED: " + str(api_refresh_request_count) + " "
+
+    results = {
+        'success':  True,
+        'status':   status,
+    }
+    return results
@@ -227,7 +227,7 @@ class ApiInternalCacheManager(models.Manager):
         return results
 
     @staticmethod
-    def retrieve_latest_api_internal_cache(api_name='', election_id_list_serialized=''):
+    def retrieve_latest_api_internal_cache(api_name='', election_id_list_serialized='', decode_json=True):
         api_internal_cache = None
         api_internal_cache_found = False
         api_internal_cache_list = []
@@ -257,7 +257,7 @@ class ApiInternalCacheManager(models.Manager):
             if len(api_internal_cache_list):
                 api_internal_cache = api_internal_cache_list[0]
                 api_internal_cache_found = True
-                if positive_value_exists(api_internal_cache.cached_api_response_serialized):
+                if decode_json and positive_value_exists(api_internal_cache.cached_api_response_serialized):
                     cached_api_response_json_data = api_internal_cache.cached_api_response_json_data()
             success = True
         except ApiInternalCache.DoesNotExist:
@@ -281,7 +281,9 @@ class ApiInternalCacheManager(models.Manager):
             self,
             api_name='',
             election_id_list_serialized='',
-            api_internal_cache=None):
+            api_internal_cache=None,
+            refresh_minutes=55,
+            staleness_budget_minutes=60):
         api_internal_cache_found = False
         status = ''
         success = True
@@ -292,22 +294,24 @@ class ApiInternalCacheManager(models.Manager):
             status += "API_INTERNAL_CACHE_PASSED_IN "
         else:
             status += "API_INTERNAL_CACHE_NOT_PASSED_IN "
+            # We only need date_cached, so the response isn't decoded
             results = self.retrieve_latest_api_internal_cache(
                 api_name=api_name,
-                election_id_list_serialized=election_id_list_serialized)
+                election_id_list_serialized=election_id_list_serialized,
+                decode_json=False)
             if results['api_internal_cache_found']:
                 api_internal_cache_found = True
                 api_internal_cache = results['api_internal_cache']
                 status += "API_INTERNAL_CACHE_RETRIEVED "
 
-        # Was there an existing api_internal_cache retrieved in the last 60 minutes?
+        # Was there an existing api_internal_cache retrieved within the staleness budget (60 minutes by default)?
         # If not, schedule refresh immediately.
         create_entry_immediately = False
         if not api_internal_cache_found:
             create_entry_immediately = True
         elif api_internal_cache and hasattr(api_internal_cache, 'date_cached'):
-            sixty_minutes_ago = now() - timedelta(hours=1)
-            if api_internal_cache.date_cached < sixty_minutes_ago:
+            staleness_budget_start = now() - timedelta(minutes=staleness_budget_minutes)
+            if api_internal_cache.date_cached < staleness_budget_start:
                 create_entry_immediately = True
         if create_entry_immediately:
             # We don't pass in date_refresh_is_needed, so it assumes value is "immediately"
@@ -316,7 +320,8 @@ class ApiInternalCacheManager(models.Manager):
                 election_id_list_serialized=election_id_list_serialized)
             status += results['status']
 
-        # Do we have an ApiRefreshRequest entry scheduled in the future? If not, schedule one 55 minutes from now.
+        # Do we have an ApiRefreshRequest entry scheduled in the future? If not, schedule one refresh_minutes
+        #  (55 by default) from now.
         results = self.does_api_refresh_request_exist_in_future(
             api_name=api_name,
             election_id_list_serialized=election_id_list_serialized)
@@ -325,7 +330,7 @@ class ApiInternalCacheManager(models.Manager):
         elif results['api_refresh_request_found']:
             status += "API_REFRESH_REQUEST_FOUND "
         else:
-            date_refresh_is_needed = now() + timedelta(minutes=55)  # Schedule 55 minutes from now
+            date_refresh_is_needed = now() + timedelta(minutes=refresh_minutes)
             results = self.create_api_refresh_request(
                 api_name=api_name,
                 election_id_list_serialized=election_id_list_serialized,
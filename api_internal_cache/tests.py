@@ -0,0 +1,217 @@
+# api_internal_cache/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import timedelta
+import json
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.utils.timezone import now
+
+from api_internal_cache.controllers import API_REFRESH_SCHEDULING_WINDOW_SECONDS, \
+    API_RESPONSE_LOCAL_CACHE_MAX_ENTRIES, API_RESPONSE_LOCAL_CACHE_TTL_SECONDS, generate_api_response_cache_key, \
+    invalidate_cached_api_response, local_api_response_cache, retrieve_cached_api_response_bytes, \
+    schedule_refresh_of_api_internal_cache_if_needed, store_api_response_in_all_cache_tiers
+from api_internal_cache.controllers_precomputed_api import are_precomputed_api_parameters_cacheable, \
+    build_cache_key_from_election_id_list, build_cache_key_from_parameters, generated_response_results, \
+    PRECOMPUTED_API_MAX_ELECTION_IDS, PRECOMPUTED_API_REGISTRY, refresh_precomputed_api_response
+from api_internal_cache.models import ApiInternalCache, ApiRefreshRequest
+from import_export_batches.controllers_batch_process import process_one_api_refresh_request_batch_process
+from import_export_batches.models import API_REFRESH_REQUEST, BatchProcess
+
+
+class PrecomputedApiCacheKeyTestCase(SimpleTestCase):
+
+    def test_equivalent_parameters_share_one_key(self):
+        self.assertEqual(
+            build_cache_key_from_parameters({'google_civic_election_id_list': ['4185', 4184], 'state_code': 'ca'}),
+            build_cache_key_from_parameters({'state_code': 'CA', 'google_civic_election_id_list': [4184, 4185]}))
+        self.assertEqual(
+            build_cache_key_from_parameters({'google_civic_election_id': '4184', 'state_code': None}),
+            json.dumps({'google_civic_election_id': 4184, 'state_code': ''}, sort_keys=True))
+        self.assertEqual(build_cache_key_from_parameters({}), '{}')
+        self.assertEqual(build_cache_key_from_election_id_list({'google_civic_election_id_list': ['4185', '4184']}),
+                         '[4184, 4185]')
+        self.assertEqual(build_cache_key_from_election_id_list({}), '[]')
+
+    def test_key_parses_back_to_the_normalized_parameters(self):
+        for api_name in ['candidateListForUpcomingElectionsRetrieve', 'voterGuidesUpcoming']:
+            registry_entry = PRECOMPUTED_API_REGISTRY[api_name]
+            election_id_list_serialized = registry_entry['build_cache_key'](
+                {'google_civic_election_id_list': ['4185', '4184', '4185'], 'state_code': 'ca'})
+            parameters = registry_entry['parse_cache_key'](election_id_list_serialized)
+            self.assertEqual(parameters['google_civic_election_id_list'], [4184, 4185])
+
+
+@mock.patch('api_internal_cache.controllers_precomputed_api.retrieve_known_google_civic_election_id_set',
+            return_value={4184, 4185})
+class PrecomputedApiParametersCacheableTestCase(SimpleTestCase):
+
+    def test_known_values_are_cacheable(self, mock_known_election_ids):
+        self.assertTrue(are_precomputed_api_parameters_cacheable({}))
+        self.assertTrue(are_precomputed_api_parameters_cacheable({'google_civic_election_id': 4184, 'state_code': 'ca'}))
+        self.assertTrue(are_precomputed_api_parameters_cacheable(
+            {'google_civic_election_id_list': ['4185', 4184], 'state_code': ''}))
+        self.assertTrue(are_precomputed_api_parameters_cacheable({'starting_year': now().year}))
+        self.assertTrue(are_precomputed_api_parameters_cacheable({'starting_year': 0}))
+
+    def test_unknown_values_are_not_cacheable(self, mock_known_election_ids):
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'state_code': 'ZZ'}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'starting_year': 1999}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'starting_year': now().year + 2}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'google_civic_election_id': 9999}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'google_civic_election_id_list': [4184, 9999]}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'google_civic_election_id_list': '4184'}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable(
+            {'google_civic_election_id_list': [4184] * (PRECOMPUTED_API_MAX_ELECTION_IDS + 1)}))
+        self.assertFalse(are_precomputed_api_parameters_cacheable({'voter_device_id': 'abc'}))
+
+
+class ProcessOneApiRefreshRequestTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    @staticmethod
+    def create_batch_process(api_name, election_id_list_serialized):
+        ApiRefreshRequest.objects.create(
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized,
+            date_refresh_is_needed=now() - timedelta(minutes=1))
+        return BatchProcess.objects.create(
+            kind_of_process=API_REFRESH_REQUEST,
+            api_name=api_name,
+            election_id_list_serialized=election_id_list_serialized)
+
+    def test_registered_endpoint_is_regenerated_and_stored(self):
+        generate_response = mock.Mock(return_value=generated_response_results('{"success": true}'))
+        election_id_list_serialized = build_cache_key_from_parameters(
+            {'google_civic_election_id': 4184, 'state_code': 'CA'})
+        batch_process = self.create_batch_process('allBallotItemsRetrieve', election_id_list_serialized)
+        with mock.patch.dict(PRECOMPUTED_API_REGISTRY['allBallotItemsRetrieve'],
+                             {'generate_response': generate_response}):
+            results = process_one_api_refresh_request_batch_process(batch_process)
+
+        self.assertTrue(results['success'], results['status'])
+        generate_response.assert_called_once_with({'google_civic_election_id': 4184, 'state_code': 'CA'})
+        api_internal_cache = ApiInternalCache.objects.get(api_name='allBallotItemsRetrieve')
+        self.assertEqual(api_internal_cache.election_id_list_serialized, election_id_list_serialized)
+        self.assertEqual(api_internal_cache.cached_api_response_serialized, '{"success": true}')
+        batch_process.refresh_from_db()
+        self.assertIsNotNone(batch_process.date_completed)
+        self.assertIsNone(batch_process.date_checked_out)
+        self.assertTrue(ApiRefreshRequest.objects.get().refresh_completed)
+
+    def test_failed_or_unknown_endpoint_is_not_stored(self):
+        generate_response = mock.Mock(return_value=generated_response_results('', success=False))
+        batch_process = self.create_batch_process('electionsRetrieve', '{}')
+        with mock.patch.dict(PRECOMPUTED_API_REGISTRY['electionsRetrieve'], {'generate_response': generate_response}):
+            results = process_one_api_refresh_request_batch_process(batch_process)
+        self.assertFalse(results['success'])
+        self.assertIn('NEW_API_RESULTS_RETRIEVE_FAILED', results['status'])
+
+        batch_process = self.create_batch_process('notARegisteredApi', '{}')
+        results = process_one_api_refresh_request_batch_process(batch_process)
+        self.assertFalse(results['success'])
+        self.assertIn('API_NAME_NOT_RECOGNIZED', results['status'])
+
+        self.assertFalse(ApiInternalCache.objects.exists())
+        self.assertFalse(ApiRefreshRequest.objects.filter(refresh_completed=True).exists())
+        batch_process.refresh_from_db()
+        self.assertIsNone(batch_process.date_completed)
+
+
+class ApiResponseCacheTiersTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        local_api_response_cache.clear()
+        caches['shared'].clear()
+        self.addCleanup(local_api_response_cache.clear)
+
+    def test_local_cache_hit_does_not_reach_shared_tier_or_database(self):
+        store_api_response_in_all_cache_tiers(
+            api_name='electionsRetrieve', cached_api_response_bytes=b'{"local": true}', election_id_list_serialized='{}')
+        with mock.patch('api_internal_cache.controllers.caches') as mock_caches, self.assertNumQueries(0):
+            results = retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertIn('API_RESPONSE_FOUND_IN_LOCAL_CACHE', results['status'])
+        self.assertEqual(results['cached_api_response_bytes'], b'{"local": true}')
+        mock_caches.__getitem__.assert_not_called()
+
+        # After API_RESPONSE_LOCAL_CACHE_TTL_SECONDS the worker checks the shared tier again
+        caches['shared'].set(generate_api_response_cache_key('electionsRetrieve', '{}'), b'{"shared": true}')
+        with mock.patch('api_internal_cache.controllers.time.monotonic',
+                        return_value=time.monotonic() + API_RESPONSE_LOCAL_CACHE_TTL_SECONDS + 1):
+            results = retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertEqual(results['cached_api_response_bytes'], b'{"shared": true}')
+
+    def test_local_cache_drops_least_recently_used(self):
+        for number in range(API_RESPONSE_LOCAL_CACHE_MAX_ENTRIES):
+            store_api_response_in_all_cache_tiers(
+                api_name='electionsRetrieve', cached_api_response_bytes=b'{}', election_id_list_serialized=str(number))
+        retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='0')
+        store_api_response_in_all_cache_tiers(
+            api_name='electionsRetrieve', cached_api_response_bytes=b'{}', election_id_list_serialized='new')
+        self.assertEqual(len(local_api_response_cache), API_RESPONSE_LOCAL_CACHE_MAX_ENTRIES)
+        self.assertIn(generate_api_response_cache_key('electionsRetrieve', '0'), local_api_response_cache)
+        self.assertNotIn(generate_api_response_cache_key('electionsRetrieve', '1'), local_api_response_cache)
+
+    def test_shared_cache_hit_is_kept_locally(self):
+        cache_key = generate_api_response_cache_key('electionsRetrieve', '{}')
+        caches['shared'].set(cache_key, b'{"shared": true}')
+        with self.assertNumQueries(0):
+            results = retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertIn('API_RESPONSE_FOUND_IN_SHARED_CACHE', results['status'])
+        self.assertEqual(results['cached_api_response_bytes'], b'{"shared": true}')
+        self.assertEqual(local_api_response_cache[cache_key][0], b'{"shared": true}')
+
+    def test_database_hit_fills_both_tiers(self):
+        ApiInternalCache.objects.create(
+            api_name='electionsRetrieve', election_id_list_serialized='{}', cached_api_response_serialized='{"db": 1}')
+        results = retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertIn('API_RESPONSE_FOUND_IN_DATABASE', results['status'])
+        self.assertEqual(results['cached_api_response_bytes'], b'{"db": 1}')
+        cache_key = generate_api_response_cache_key('electionsRetrieve', '{}')
+        self.assertEqual(caches['shared'].get(cache_key), b'{"db": 1}')
+        self.assertIn(cache_key, local_api_response_cache)
+
+    def test_completed_refresh_replaces_cached_response(self):
+        store_api_response_in_all_cache_tiers(
+            api_name='electionsRetrieve', cached_api_response_bytes=b'{"old": true}', election_id_list_serialized='{}')
+        generate_response = mock.Mock(return_value=generated_response_results('{"new": true}'))
+        with mock.patch.dict(PRECOMPUTED_API_REGISTRY['electionsRetrieve'], {'generate_response': generate_response}):
+            results = refresh_precomputed_api_response(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertTrue(results['success'], results['status'])
+        cache_key = generate_api_response_cache_key('electionsRetrieve', '{}')
+        self.assertEqual(caches['shared'].get(cache_key), b'{"new": true}')
+        with self.assertNumQueries(0):
+            results = retrieve_cached_api_response_bytes(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertEqual(results['cached_api_response_bytes'], b'{"new": true}')
+
+        # Without the new response, both tiers are emptied so the next request reads the database
+        invalidate_cached_api_response(api_name='electionsRetrieve', election_id_list_serialized='{}')
+        self.assertNotIn(cache_key, local_api_response_cache)
+        self.assertIsNone(caches['shared'].get(cache_key))
+
+    def test_refresh_is_scheduled_once_per_window(self):
+        results = schedule_refresh_of_api_internal_cache_if_needed(
+            api_name='electionsRetrieve', election_id_list_serialized='{}', refresh_minutes=25)
+        # Nothing cached yet, so one refresh now and one refresh_minutes from now
+        self.assertNotIn('API_REFRESH_RECENTLY_SCHEDULED', results['status'])
+        self.assertEqual(ApiRefreshRequest.objects.count(), 2)
+
+        with self.assertNumQueries(0):
+            results = schedule_refresh_of_api_internal_cache_if_needed(
+                api_name='electionsRetrieve', election_id_list_serialized='{}', refresh_minutes=25)
+        self.assertIn('API_REFRESH_RECENTLY_SCHEDULED', results['status'])
+        self.assertEqual(ApiRefreshRequest.objects.count(), 2)
+
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + API_REFRESH_SCHEDULING_WINDOW_SECONDS + 1):
+            results = schedule_refresh_of_api_internal_cache_if_needed(
+                api_name='electionsRetrieve', election_id_list_serialized='{}', refresh_minutes=25)
+        self.assertNotIn('API_REFRESH_RECENTLY_SCHEDULED', results['status'])
+        # Still nothing cached, so another refresh now, but the one for later is already there
+        self.assertIn('API_REFRESH_REQUEST_FOUND', results['status'])
+        self.assertEqual(ApiRefreshRequest.objects.count(), 3)
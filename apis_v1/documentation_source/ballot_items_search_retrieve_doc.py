@@ -8,6 +8,11 @@ def ballot_items_search_retrieve_doc_template_values(url_root):
     Show documentation about ballotItemsSearchRetrieve: NOT FULLY IMPLEMENTED - see ballotItemOptionsRetrieve instead
     """
     required_query_parameter_list = [
+        {
+            'name':         'search_string',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'Candidates and measures from this year on whose names best match this text',
+        },
         {
             'name':         'voter_device_id',
             'value':        'string',  # boolean, integer, long, string
@@ -25,6 +25,17 @@ def search_all_doc_template_values(url_root):
         },
     ]
     optional_query_parameter_list = [
+        {
+            'name':         'search_scope_list[]',
+            'value':        'string',  # boolean, integer, long, string
+            'description':  'POLITICIAN, CANDIDATE, ORGANIZATION or MEASURE, one or more. Default: POLITICIAN',
+        },
+        {
+            'name':         'typeahead',
+            'value':        'boolean',  # boolean, integer, long, string
+            'description':  'The last word may be partly typed. Returns fewer results, '
+                            'with names that start with the search text first.',
+        },
     ]
 
     potential_status_codes_list = [
@@ -54,7 +65,7 @@ def search_all_doc_template_values(url_root):
                    '     "result_image": string,\n' \
                    '     "result_subtitle": string,\n' \
                    '     "result_summary": string,\n' \
-                   '     "result_score": integer,\n' \
+                   '     "result_score": integer (0 to 100, how closely the result matches),\n' \
                    '     "link_internal": string,\n' \
                    '     "kind_of_owner": string,\n' \
                    '     "google_civic_election_id": integer,\n' \
@@ -0,0 +1,50 @@
+# apis_v1/test_views_googlebot_site_map.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import gzip
+import os
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from googlebot_site_map.controllers import GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME
+
+
+@mock.patch('apis_v1.views.views_googlebot_site_map.log_request')
+class WeVoteAPIsV1TestsGooglebotSiteMap(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        os.chmod(temporary_directory.name, 0o700)
+        with gzip.open(os.path.join(temporary_directory.name, GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME), 'wt') as index_file:
+            index_file.write('<sitemapindex></sitemapindex>\n')
+        site_map_directory_patcher = mock.patch(
+            'googlebot_site_map.controllers.GOOGLEBOT_SITE_MAP_DIRECTORY', temporary_directory.name)
+        site_map_directory_patcher.start()
+        self.addCleanup(site_map_directory_patcher.stop)
+        self.site_map_index_url = reverse("apis_v1:googlebotSiteMapView")
+
+    def test_unchanged_site_map_is_not_sent_again(self, mock_log_request):
+        response = self.client.get(self.site_map_index_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'<sitemapindex></sitemapindex>\n')
+        gzip_etag = response['ETag']
+
+        response = self.client.get(self.site_map_index_url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # The decompressed body is a different representation, so the gzip ETag doesn't match it
+        response = self.client.get(self.site_map_index_url, HTTP_IF_NONE_MATCH=gzip_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), b'<sitemapindex></sitemapindex>\n')
+        self.assertNotEqual(response['ETag'], gzip_etag)
+        response = self.client.get(self.site_map_index_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
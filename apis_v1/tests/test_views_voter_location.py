@@ -4,7 +4,12 @@ from django.contrib.gis import geoip2
 from django.urls import reverse
 from django.test import Client, TestCase
 from functools import wraps
+import ipaddress
 import json
+from types import SimpleNamespace
+from unittest import mock
+
+from geoip.controllers import clear_geoip_location_cache
 
 
 # def print_geoip_instructions_on_exc(unittest):
@@ -36,6 +41,27 @@ class WeVoteAPIsV1TestsVoterVoterLocation(TestCase):
         self.assertEqual(json_data['success'], True)
         self.assertEqual(json_data['voter_location_found'], True)
 
+    def test_location_from_ipv6(self):
+        clear_geoip_location_cache()
+        # The free GeoLite2 database may not know this address, so answer for it
+        with mock.patch('geoip.controllers.get_geoip_reader') as mock_get_geoip_reader:
+            mock_city = mock_get_geoip_reader.return_value.city
+            mock_city.return_value = SimpleNamespace(
+                city=SimpleNamespace(name='Mountain View'),
+                subdivisions=SimpleNamespace(most_specific=SimpleNamespace(iso_code='CA')),
+                postal=SimpleNamespace(code='94043'),
+                country=SimpleNamespace(iso_code='US'),
+                traits=SimpleNamespace(network=ipaddress.ip_network('2001:4860:4860::/64')))
+            response = self.client.get(self.voter_location_url, {'ip_address': '2001:4860:4860::8888'})
+
+        mock_city.assert_called_once_with('2001:4860:4860::8888')
+        json_data = json.loads(response.content.decode())
+        self.assertEqual(json_data['success'], True)
+        self.assertEqual(json_data['status'], 'LOCATION_FOUND')
+        self.assertEqual(json_data['voter_location_found'], True)
+        self.assertEqual(json_data['voter_location'], 'Mountain View, CA 94043')
+        self.assertEqual(json_data['ip_address'], '2001:4860:4860::8888')
+
     def test_failure_no_ip_supplied(self):
         response = self.client.get(self.voter_location_url, REMOTE_ADDR=None)
         # self.assertEqual(response.status_code, 400)
@@ -158,6 +158,10 @@ urlpatterns = [
                   re_path(r'^fastLoadStatusUpdate/', views_retrieve_tables.fast_load_status_update_view,
                           name='fastLoadStatusUpdate'),
                   re_path(r'retrieveSQLTables/', views_retrieve_tables.retrieve_sql_tables, name='retrieveSQLTables'),
+                  re_path(r'retrieveSQLTablesStream/', views_retrieve_tables.retrieve_sql_tables_stream,
+                          name='retrieveSQLTablesStream'),
+                  re_path(r'retrieveSQLTablesChecksums/', views_retrieve_tables.retrieve_sql_tables_checksums,
+                          name='retrieveSQLTablesChecksums'),
                   re_path(r'retrieveSQLTablesRowCount/', views_retrieve_tables.retrieve_sql_tables_row_count,
                           name='retrieveSQLTablesRowCount'),
                   re_path(r'retrieveMaxID/', views_retrieve_tables.retrieve_max_id, name='retrieveMaxID'),
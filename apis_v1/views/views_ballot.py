@@ -1,8 +1,8 @@
 # apis_v1/views/views_ballot.py
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
-from ballot.controllers import all_ballot_items_retrieve_for_api, ballot_item_highlights_retrieve_for_api, \
-    ballot_item_options_retrieve_for_api, ballot_items_search_retrieve_for_api
+from api_internal_cache.controllers_precomputed_api import precomputed_api_response
+from ballot.controllers import ballot_item_options_retrieve_for_api, ballot_items_search_retrieve_for_api
 from candidate.controllers import candidate_retrieve_for_api
 from config.base import get_environment_variable
 from django.http import HttpResponse
@@ -33,16 +33,16 @@ def all_ballot_items_retrieve_view(request):  # allBallotItemsRetrieve
     if use_test_election:
         google_civic_election_id = 2000  # The Google Civic test election
 
-    json_data = all_ballot_items_retrieve_for_api(google_civic_election_id, state_code)
-
-    return HttpResponse(json.dumps(json_data), content_type='application/json')
+    return precomputed_api_response(
+        api_name='allBallotItemsRetrieve',
+        parameters={'google_civic_election_id': google_civic_election_id, 'state_code': state_code})
 
 
 def ballot_item_highlights_retrieve_view(request):  # ballotItemHighlightsRetrieve
-    starting_year = request.GET.get('starting_year', 0)
-    json_data = ballot_item_highlights_retrieve_for_api(starting_year)
-    response = HttpResponse(json.dumps(json_data), content_type='application/json')
-    return response
+    starting_year = convert_to_int(request.GET.get('starting_year', 0))
+    return precomputed_api_response(
+        api_name='ballotItemHighlightsRetrieve',
+        parameters={'starting_year': starting_year})
 
 
 def ballot_item_options_retrieve_view(request):  # ballotItemOptionsRetrieve
@@ -1,8 +1,8 @@
 # apis_v1/views/views_candidate.py
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
-from candidate.controllers import candidate_retrieve_for_api, candidates_query_for_api, candidates_retrieve_for_api, \
-    retrieve_candidate_list_for_all_upcoming_elections
+from api_internal_cache.controllers_precomputed_api import precomputed_api_response
+from candidate.controllers import candidate_retrieve_for_api, candidates_query_for_api, candidates_retrieve_for_api
 from candidate.views_admin import candidate_change_names
 from politician.views_admin import politician_change_names
 from django.contrib.auth.decorators import login_required
@@ -53,32 +53,11 @@ def candidate_list_for_upcoming_elections_retrieve_api_view(request):  # candida
     :param request:
     :return:
     """
-    status = ""
     google_civic_election_id_list = request.GET.getlist('google_civic_election_id_list[]')
     state_code = request.GET.get('state_code', '')
-
-    # We will need all candidates for all upcoming elections so we can search the HTML of
-    #  the possible voter guide for these names
-    candidate_list_light = []
-    super_light = True  # limit the response package
-    results = retrieve_candidate_list_for_all_upcoming_elections(google_civic_election_id_list,
-                                                                 limit_to_this_state_code=state_code,
-                                                                 super_light_candidate_list=super_light)
-    if results['candidate_list_found']:
-        candidate_list_light = results['candidate_list_light']
-
-    google_civic_election_id_list = results['google_civic_election_id_list']
-
-    status += results['status']
-    success = results['success']
-
-    json_data = {
-        'status':                           status,
-        'success':                          success,
-        'google_civic_election_id_list':    google_civic_election_id_list,
-        'candidate_list':                   candidate_list_light,
-    }
-    return HttpResponse(json.dumps(json_data), content_type='application/json')
+    return precomputed_api_response(
+        api_name='candidateListForUpcomingElectionsRetrieve',
+        parameters={'google_civic_election_id_list': google_civic_election_id_list, 'state_code': state_code})
 
 
 @login_required
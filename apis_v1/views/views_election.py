@@ -3,7 +3,8 @@
 # -*- coding: UTF-8 -*-
 from config.base import get_environment_variable
 from django.http import HttpResponse
-from election.controllers import elections_retrieve_for_api, elections_sync_out_list_for_api
+from api_internal_cache.controllers_precomputed_api import precomputed_api_response
+from election.controllers import elections_sync_out_list_for_api
 import json
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, get_voter_device_id, positive_value_exists
@@ -18,14 +19,7 @@ def elections_retrieve_view(request):  # electionsRetrieve
     :param request:
     :return:
     """
-
-    results = elections_retrieve_for_api()
-    json_data = {
-        'status':               results['status'],
-        'success':              results['success'],
-        'election_list':        results['election_list'],
-    }
-    return HttpResponse(json.dumps(json_data), content_type='application/json')
+    return precomputed_api_response(api_name='electionsRetrieve', parameters={})
 
 
 def elections_sync_out_view(request):  # electionsSyncOut
@@ -2,51 +2,93 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from django.http import HttpResponse
+import gzip
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
 
 import wevote_functions.admin
 from config.base import get_environment_variable
-from googlebot_site_map.views_admin import log_request, get_googlebot_map_file_body, get_googlebot_map_xml_body
-from politician.models import Politician
+from googlebot_site_map.controllers import GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, generate_precomputed_site_map_etag, \
+    generate_site_map_index_xml, retrieve_precomputed_site_map_file_path, \
+    retrieve_precomputed_site_map_last_modified, retrieve_site_map_count, site_map_file_name, \
+    stream_site_map_xml_from_database
+from googlebot_site_map.views_admin import log_request, get_googlebot_map_file_body
 
 logger = wevote_functions.admin.get_logger(__name__)
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
+GZIP_READ_SIZE = 64 * 1024
+
+
+def site_map_number_from_request(request):
+    map_num_result = re.findall(r'googlebotSiteMap\/map(\d+)', request.path)
+    return int(map_num_result[0]) if map_num_result else None
+
+
+def site_map_file_name_from_request(request):
+    map_number = site_map_number_from_request(request)
+    if map_number is None:
+        return GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME
+    return site_map_file_name(map_number)
+
+
+def is_gzip_accepted(request):
+    return 'gzip' in request.headers.get('accept-encoding', '')
+
+
+def site_map_etag(request):
+    return generate_precomputed_site_map_etag(
+        site_map_file_name_from_request(request), gzip_encoded=is_gzip_accepted(request))
+
+
+def site_map_last_modified(request):
+    return retrieve_precomputed_site_map_last_modified(site_map_file_name_from_request(request))
+
+
+def read_gzip_file_in_chunks(file_path):
+    with gzip.open(file_path, 'rb') as site_map_file:
+        while True:
+            chunk = site_map_file.read(GZIP_READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def precomputed_site_map_response(request, file_path):
+    """
+    The gzip file as is for clients that accept gzip (crawlers do), otherwise decompressed as we stream it
+    """
+    if is_gzip_accepted(request):
+        response = FileResponse(open(file_path, 'rb'), content_type='application/xml')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(read_gzip_file_in_chunks(file_path), content_type='application/xml')
+    response['Vary'] = 'Accept-Encoding'
+    return response
 
 
 # To test XML queries from Chrome try the "Tabbed Postman - REST Client"
 # https://chromewebstore.google.com/detail/tabbed-postman-rest-clien/coohjcphdfgbiolnekdpbcijmhambjff?hl=en-US&utm_source=ext_sidebar
 # Add a header "content-type" "application/xml", put in the URL and press Send
 # Test url is https://wevotedeveloper.com:8000/apis/v1/googlebotSiteMap/sitemap_index.xml
-def xml_for_n_maps(n):
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
-    for i in range(n):
-        xml += '  <sitemap>'
-        xml += '    <loc>https://wevote.us/map%s.xml</loc>' % (i)
-        xml += '  </sitemap>'
-    xml += '</sitemapindex>'
-    return xml
-
-
-# Test url is https://wevotedeveloper.com:8000/apis/v1/googlebotSiteMap/map1.xml
+@condition(etag_func=site_map_etag, last_modified_func=site_map_last_modified)
 def get_sitemap_index_xml(request):
     log_request(request)
 
+    file_path = retrieve_precomputed_site_map_file_path(GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME)
+    if file_path:
+        return precomputed_site_map_response(request, file_path)
+
+    # Not precomputed yet (see the generate_googlebot_site_maps command), so count the politicians
     try:
-        politician_count = Politician.objects.using('readonly').all().count()
-        float_n = politician_count / 40000
-        if float_n < 1:
-            n = 1
-        else:
-            n = int(float_n) + 1
-
-        xml = xml_for_n_maps(n)
+        xml = generate_site_map_index_xml(retrieve_site_map_count())
     except Exception as e:
         logger.error('googlebot_site_map get_sitemap_index_xml threw ', e)
         xml = "error"
 
-    return HttpResponse(xml)
+    return HttpResponse(xml, content_type='application/xml')
 
 
 def get_sitemap_text_file(request):
@@ -62,15 +104,14 @@ def get_sitemap_text_file(request):
     return HttpResponse(html)
 
 
+# Test url is https://wevotedeveloper.com:8000/apis/v1/googlebotSiteMap/map1.xml
+@condition(etag_func=site_map_etag, last_modified_func=site_map_last_modified)
 def get_sitemap_xml_file(request):
     log_request(request)
 
-    # print(request)
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    try:
-        xml += get_googlebot_map_xml_body(request)
-    except Exception as e:
-        logger.error('get_sitemap_xml_file get_googlebot_map_xml_body threw ', e)
-    xml += "</urlset>"
-    return HttpResponse(xml)
+    file_path = retrieve_precomputed_site_map_file_path(site_map_file_name_from_request(request))
+    if file_path:
+        return precomputed_site_map_response(request, file_path)
+
+    return StreamingHttpResponse(
+        stream_site_map_xml_from_database(site_map_number_from_request(request)), content_type='application/xml')
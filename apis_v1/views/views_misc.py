@@ -8,6 +8,7 @@ import sys
 from office.controllers import office_retrieve_for_api
 from quick_info.controllers import quick_info_retrieve_for_api
 from search.controllers import search_all_for_api
+from search.controllers_database_search import SEARCH_MODE_PREFIX, SEARCH_MODE_RANKED
 import wevote_functions.admin
 from voter.models import VoterDeviceLinkManager
 from wevote_functions.functions import generate_voter_device_id, get_voter_device_id, positive_value_exists
@@ -120,7 +121,8 @@ def search_all_view(request):  # searchAll
     search_scope_list = request.GET.getlist('search_scope_list[]')
     search_scope_list = list(filter(None, search_scope_list))
     # search_scope_list options
-    # PN = POLITICIAN_NAME
+    # PN = POLITICIAN_NAME, or POLITICIAN, CANDIDATE, ORGANIZATION, MEASURE
+    typeahead = positive_value_exists(request.GET.get('typeahead', False))
 
     if not positive_value_exists(text_from_search_field):
         status = 'MISSING_TEXT_FROM_SEARCH_FIELD'
@@ -136,7 +138,8 @@ def search_all_view(request):  # searchAll
     results = search_all_for_api(
         text_from_search_field=text_from_search_field,
         voter_device_id=voter_device_id,
-        search_scope_list=search_scope_list)
+        search_scope_list=search_scope_list,
+        search_mode=SEARCH_MODE_PREFIX if typeahead else SEARCH_MODE_RANKED)
     # results = search_all_elastic_for_api(text_from_search_field, voter_device_id)  #
     status = "UNABLE_TO_FIND_ANY_SEARCH_RESULTS "
     search_results = []
@@ -2,9 +2,7 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 import json
-import re
 
-import requests
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
@@ -15,7 +13,6 @@ from apis_v1.controllers import organization_count, organization_dislike, organi
     organization_stop_disliking, organization_follow_ignore, \
     organization_stop_following, organization_stop_ignoring
 from config.base import get_environment_variable
-from donate.models import DonationManager
 from follow.controllers import organization_suggestion_tasks_for_api
 from follow.models import UPDATE_SUGGESTIONS_FROM_TWITTER_IDS_I_FOLLOW, UPDATE_SUGGESTIONS_FROM_WHAT_FRIENDS_FOLLOW, \
     UPDATE_SUGGESTIONS_FROM_WHAT_FRIENDS_FOLLOW_ON_TWITTER, UPDATE_SUGGESTIONS_FROM_WHAT_FRIEND_FOLLOWS, \
@@ -23,11 +20,10 @@ from follow.models import UPDATE_SUGGESTIONS_FROM_TWITTER_IDS_I_FOLLOW, UPDATE_S
     FOLLOW_SUGGESTIONS_FROM_FRIENDS_ON_TWITTER, FOLLOW_SUGGESTIONS_FROM_FRIENDS, \
     FOLLOW_SUGGESTIONS_FROM_TWITTER_IDS_I_FOLLOW
 from organization.controllers import full_domain_string_available, organization_analytics_by_voter_for_api, \
-    organization_retrieve_for_api, organization_photos_save_for_api, \
+    organization_index_template_values_retrieve, organization_retrieve_for_api, organization_photos_save_for_api, \
     organization_save_for_api, organization_search_for_api, organizations_followed_retrieve_for_api, \
     site_configuration_retrieve_for_api, subdomain_string_available
-from organization.models import CHOSEN_FAVICON_ALLOWED, CHOSEN_GOOGLE_ANALYTICS_ALLOWED, \
-    CHOSEN_SOCIAL_SHARE_IMAGE_ALLOWED, CHOSEN_SOCIAL_SHARE_DESCRIPTION_ALLOWED, OrganizationManager
+from organization.models import OrganizationManager
 from voter.models import voter_has_authority, VoterManager
 from voter_guide.controllers_possibility import organizations_found_on_url
 from wevote_functions.functions import convert_to_int, extract_website_from_url, get_voter_device_id, \
@@ -281,141 +277,9 @@ def organization_index_view(request, organization_incoming_domain='', campaign_m
         organization_incoming_domain = request.GET.get('organization_incoming_domain', 'campaign.wevote.us')
     organization_incoming_domain = organization_incoming_domain.strip().lower()
 
-    # Default values
-    chosen_domain_type_is_campaign = True
-    chosen_favicon_url_https = None
-    chosen_google_analytics_tracking_id = ''
-    chosen_html_verification_string = None
-    chosen_prevent_sharing_opinions = None
-    chosen_social_share_description = \
-        "We Vote helps you vote your values, with help from your friends and other " \
-        "people you trust. Through our nonpartisan, open source platform, we'll help you become a " \
-        "better voter, up and down the ballot."
-    chosen_social_share_master_image_url_https = None
-    hide_favicon = False
-    hide_social_share_image = False
-    html_title = "We Vote"
-
-    if organization_incoming_domain == 'wevote.us':             # Only used to test the doc page
-        chosen_domain_type_is_campaign = False
-    elif organization_incoming_domain == 'campaigns.wevote.us':    # Only used to test the doc page
-        chosen_domain_type_is_campaign = True
-    else:
-        organization_manager = OrganizationManager()
-        results = organization_manager.retrieve_organization_from_incoming_hostname(
-            organization_incoming_domain, read_only=True)
-        organization_found = results['organization_found']
-        organization = results['organization']
-        status += results['status']
-
-        if organization_found:
-            master_features_provided_bitmap = 0
-            chosen_domain_type_is_campaign = organization.chosen_domain_type_is_campaign
-            if positive_value_exists(chosen_domain_type_is_campaign):
-                # Change the default
-                chosen_social_share_description = "Vote for candidates you like. Oppose candidates you don't."
-            features_provided_bitmap = organization.features_provided_bitmap
-            chosen_hide_we_vote_logo = organization.chosen_hide_we_vote_logo
-            chosen_html_verification_string = organization.chosen_html_verification_string
-            chosen_prevent_sharing_opinions = organization.chosen_prevent_sharing_opinions
-            if not positive_value_exists(features_provided_bitmap) \
-                    and positive_value_exists(organization.chosen_feature_package) \
-                    and organization.chosen_feature_package not in 'FREE':
-                try:
-                    donation_manager = DonationManager()
-                    results = donation_manager.retrieve_master_feature_package(organization.chosen_feature_package)
-                    if results['master_feature_package_found']:
-                        master_feature_package = results['master_feature_package']
-                        master_features_provided_bitmap = master_feature_package.features_provided_bitmap
-                except Exception as e:
-                    # Could not retrieve master_feature_package
-                    pass
-                if positive_value_exists(master_features_provided_bitmap):
-                    try:
-                        features_provided_bitmap = master_features_provided_bitmap
-                        organization.features_provided_bitmap = master_features_provided_bitmap
-                        organization.save()
-                    except Exception as e:
-                        # Could not save features_provided_bitmap update to organization
-                        pass
-
-            if features_provided_bitmap & CHOSEN_FAVICON_ALLOWED:
-                if positive_value_exists(organization.chosen_favicon_url_https):
-                    chosen_favicon_url_https = organization.chosen_favicon_url_https
-                    hide_favicon = False
-                elif positive_value_exists(chosen_hide_we_vote_logo):
-                    chosen_favicon_url_https = None
-                    hide_favicon = True
-                else:
-                    # Show We Vote favicon if a new favicon has not been uploaded, and We Vote logo not hidden
-                    chosen_favicon_url_https = None
-                    hide_favicon = False
-
-            if features_provided_bitmap & CHOSEN_SOCIAL_SHARE_IMAGE_ALLOWED:
-                if positive_value_exists(organization.chosen_social_share_master_image_url_https):
-                    chosen_social_share_master_image_url_https = organization.chosen_social_share_master_image_url_https
-                    hide_social_share_image = False
-                elif positive_value_exists(organization.chosen_logo_url_https):
-                    chosen_social_share_master_image_url_https = organization.chosen_logo_url_https
-                    hide_social_share_image = False
-                elif positive_value_exists(chosen_hide_we_vote_logo):
-                    chosen_social_share_master_image_url_https = None
-                    hide_social_share_image = True
-                else:
-                    # Show We Vote social share image if a new image has not been uploaded, and We Vote logo not hidden
-                    chosen_social_share_master_image_url_https = None
-                    hide_social_share_image = False
-
-            if features_provided_bitmap & CHOSEN_SOCIAL_SHARE_DESCRIPTION_ALLOWED:
-                html_title = organization.chosen_website_name if organization.chosen_website_name \
-                    else organization.organization_name
-                chosen_social_share_description = organization.chosen_social_share_description
-
-            if features_provided_bitmap & CHOSEN_GOOGLE_ANALYTICS_ALLOWED:
-                chosen_google_analytics_tracking_id = organization.chosen_google_analytics_tracking_id
-                google_analytics_valid = False
-                # Make sure this is a valid account number
-                if positive_value_exists(chosen_google_analytics_tracking_id) \
-                        and isinstance(chosen_google_analytics_tracking_id, str):
-                    chosen_google_analytics_tracking_id = chosen_google_analytics_tracking_id.strip()
-                    if chosen_google_analytics_tracking_id.startswith('UA-') \
-                            and len(chosen_google_analytics_tracking_id) < 20:
-                        # We do these primitive validity checks
-                        google_analytics_valid = True
-                if not google_analytics_valid:
-                    chosen_google_analytics_tracking_id = None
-
-    # Regardless of the number and varieties of customized sites, immediately after a WebApp or Campaigns build update,
-    # a main.name.html will be in the build directory for both the base WebApp or Campaigns sites.  For any site,
-    # customized or un-customized, we need to get the full name of the build's main.[hash].js and feed that to Fastly
-    # when it requests a customized index.html
-
-    if chosen_domain_type_is_campaign:
-        req_url = 'https://campaigns.wevote.us/main.name.html'
-    else:
-        req_url = 'https://wevote.us/main.name.html'
-
-    verify_bool = not ('localhost' in organization_incoming_domain or '127.0.0.1' in organization_incoming_domain or
-                       'wevotedeveloper.com')
-    text = requests.get(req_url, verify=verify_bool).text
-    main_js = re.search(r"<body>(.*?)<\/body>", text)[1]
-
-    template_values = {
-        'chosen_domain_type_is_campaign':             chosen_domain_type_is_campaign,
-        'chosen_favicon_url_https':                   chosen_favicon_url_https,
-        'chosen_google_analytics_tracking_id':        chosen_google_analytics_tracking_id,
-        'chosen_html_verification_string':            chosen_html_verification_string,
-        'chosen_prevent_sharing_opinions':            chosen_prevent_sharing_opinions,
-        'chosen_social_share_description':            chosen_social_share_description,
-        'chosen_social_share_master_image_url_https': chosen_social_share_master_image_url_https,
-        'hide_favicon':                               hide_favicon,
-        'hide_social_share_image':                    hide_social_share_image,
-        'html_title':                                 html_title,
-        'organization_incoming_domain':               organization_incoming_domain,
-        'some_numerical_string':                      '12345hi',
-        'main_js':                                    main_js,
-    }
-
+    # Not precomputed: the page names the current WebApp build (main.[hash].js), which changes with every deploy
+    template_values = organization_index_template_values_retrieve(
+        organization_incoming_domain=organization_incoming_domain)
     return render(request, 'organization/organization_index.html', template_values)
 
 
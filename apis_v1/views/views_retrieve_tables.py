@@ -2,13 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 import json
+from datetime import datetime
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 import wevote_functions.admin
 from config.base import get_environment_variable
-from retrieve_tables.controllers_master import fast_load_status_retrieve, get_total_row_count, get_max_id, \
-    retrieve_sql_tables_as_csv
+from retrieve_tables.controllers_master import allowable_tables, fast_load_status_retrieve, get_total_row_count, \
+    get_max_id, retrieve_sql_table_range_checksums, retrieve_sql_tables_as_csv, stream_sql_table_as_gzip_copy
 from retrieve_tables.controllers_master import fast_load_status_update
 from wevote_functions.functions import get_voter_api_device_id
 
@@ -44,6 +45,65 @@ def retrieve_sql_tables(request):  # retrieveSQLTables
     return HttpResponse(json.dumps(json_data), content_type='application/json')
 
 
+def retrieve_sql_tables_stream(request):  # retrieveSQLTablesStream
+    """
+    Stream one of the allowable tables as gzip compressed, pipe delimited COPY data with a header row.
+    The developer's local server feeds this straight into its own COPY ... FROM STDIN.
+    :param request:
+    :return:
+    """
+    table_name = request.GET.get('table_name', 'bad_table_param_error')
+    start = request.GET.get('start', '')
+    end = request.GET.get('end', '')
+    # Delta sync: rows above since_id, or with change_column later than changed_since
+    since_id = request.GET.get('since_id', 0)
+    change_column = request.GET.get('change_column', '')
+    changed_since_string = request.GET.get('changed_since', '')
+    try:
+        changed_since = datetime.fromisoformat(changed_since_string) if changed_since_string else None
+    except ValueError:
+        changed_since = None
+
+    if table_name not in allowable_tables:
+        json_data = {
+            'success': False,
+            'status': "the table_name '" + table_name + "' is not in the table list, therefore no table was returned",
+        }
+        return HttpResponse(json.dumps(json_data), content_type='application/json', status=400)
+
+    response = StreamingHttpResponse(
+        stream_sql_table_as_gzip_copy(table_name, start, end, since_id, change_column, changed_since),
+        content_type='application/gzip')
+    response['Content-Disposition'] = 'attachment; filename="' + table_name + '.csv.gz"'
+    return response
+
+
+def retrieve_sql_tables_checksums(request):  # retrieveSQLTablesChecksums
+    """
+    Checksums of each block of range_size ids in one of the allowable tables, for the delta sync full-reconcile
+    :param request:
+    :return:
+    """
+    table_name = request.GET.get('table_name', 'bad_table_param_error')
+    range_size = request.GET.get('range_size', 10000)
+    # {column name: text hashed for NULL}, from the local server, so both servers hash the same way
+    checksum_null_text_by_column = None
+    try:
+        checksum_columns = json.loads(request.GET.get('checksum_columns', 'null'))
+        if isinstance(checksum_columns, dict):
+            checksum_null_text_by_column = checksum_columns
+    except ValueError:
+        pass
+    if table_name in allowable_tables:
+        json_data = retrieve_sql_table_range_checksums(table_name, range_size, checksum_null_text_by_column)
+    else:
+        json_data = {
+            'success': False,
+            'status': "the table_name '" + table_name + "' is not in the table list, therefore no table was returned",
+        }
+    return HttpResponse(json.dumps(json_data), content_type='application/json')
+
+
 def retrieve_sql_tables_row_count(request):  # retrieveSQLTablesRowCount
     json_data = {
         'rowCount': str(get_total_row_count())
@@ -12,18 +12,22 @@ import datetime as the_other_datetime
 from election.controllers import retrieve_upcoming_election_id_list
 from election.models import ElectionManager
 from exception.models import handle_exception
+from geoip.models import geocode_with_cache
 from import_export_google_civic.controllers import \
     refresh_voter_ballot_items_from_google_civic_from_voter_ballot_saved, \
     voter_ballot_items_retrieve_from_google_civic_for_api
 from measure.models import ContestMeasureListManager, ContestMeasureManager
-from office.models import ContestOfficeManager, ContestOfficeListManager
+from office.models import ContestOfficeListManager
 from polling_location.models import PollingLocationManager
+from search.controllers_database_search import retrieve_search_field_dict, search_queryset, SEARCH_KIND_CANDIDATE, \
+    SEARCH_KIND_MEASURE, SEARCH_RESULTS_LIMIT
 import pytz
 from voter.models import BALLOT_ADDRESS, VoterAddress, VoterAddressManager, VoterDeviceLinkManager, VoterManager
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_state_code_from_address_string, positive_value_exists, \
     process_request_from_master, strip_html_tags
-from wevote_functions.functions_date import generate_localized_datetime_from_obj, DATE_FORMAT_YMD
+from wevote_functions.functions_date import generate_localized_datetime_from_obj, get_current_year_as_integer, \
+    DATE_FORMAT_YMD
 from geopy.geocoders import get_geocoder_for_service
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -420,7 +424,7 @@ def heal_geo_coordinates(text_for_map_search):
     latitude = None
     try:
         google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-        location = google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+        location = geocode_with_cache(google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         if location is None:
             status = 'Could not find location matching "{}" '.format(text_for_map_search)
             logger.debug(status)
@@ -2490,7 +2494,8 @@ def all_ballot_items_retrieve_for_one_election_for_api(google_civic_election_id,
 
 def ballot_items_search_retrieve_for_api(search_string):  # ballotItemsSearchRetrieve
     """
-    IMPLEMENTATION NOT COMPLETE
+    Candidates and measures from this year on, ranked by how closely their names match search_string, using the
+    pg_trgm indexed search in search/controllers_database_search.py.
     2020-07-12 I decided to use ballotItemOptionsRetrieve instead.
     If we choose to finish building ballotItemsSearchRetrieve, it would be so we can
     return the entire Office (with other candidates) when we find one candidate.
@@ -2682,6 +2687,53 @@ def ballot_items_search_retrieve_for_api(search_string):  # ballotItemsSearchRet
     #             }
     #             ballot_items_to_display.append(one_ballot_item.copy())
 
+    if positive_value_exists(search_string):
+        search_field_dict = retrieve_search_field_dict()
+        current_year = get_current_year_as_integer()
+        ranked_ballot_item_list = []
+        try:
+            candidate_model, search_field_list = search_field_dict[SEARCH_KIND_CANDIDATE]
+            queryset = candidate_model.objects.using('readonly').filter(candidate_year__gte=current_year)
+            for candidate in search_queryset(queryset, search_field_list, search_string, limit=SEARCH_RESULTS_LIMIT):
+                one_candidate = {
+                    'we_vote_id':                   candidate.we_vote_id,
+                    'ballot_item_display_name':     candidate.display_candidate_name(),
+                    'candidate_photo_url_medium':   candidate.we_vote_hosted_profile_image_url_medium,
+                    'candidate_photo_url_tiny':     candidate.we_vote_hosted_profile_image_url_tiny,
+                    'kind_of_ballot_item':          CANDIDATE,
+                    'party':                        candidate.political_party_display(),
+                    'state_code':                   candidate.state_code.lower()
+                    if positive_value_exists(candidate.state_code) else "",
+                    'twitter_handle':               candidate.fetch_twitter_handle(),
+                    'withdrawn_from_election':      candidate.withdrawn_from_election,
+                }
+                ranked_ballot_item_list.append((candidate.search_rank, one_candidate))
+
+            measure_model, search_field_list = search_field_dict[SEARCH_KIND_MEASURE]
+            queryset = measure_model.objects.using('readonly').filter(measure_year__gte=current_year)
+            for contest_measure in search_queryset(
+                    queryset, search_field_list, search_string, limit=SEARCH_RESULTS_LIMIT):
+                one_ballot_item = {
+                    'ballot_item_display_name':     contest_measure.measure_title,
+                    'google_civic_election_id':     convert_to_int(contest_measure.google_civic_election_id),
+                    'kind_of_ballot_item':          MEASURE,
+                    'measure_subtitle':             contest_measure.measure_subtitle,
+                    'measure_url':                  contest_measure.measure_url,
+                    'state_code':                   contest_measure.state_code.lower()
+                    if positive_value_exists(contest_measure.state_code) else "",
+                    'we_vote_id':                   contest_measure.we_vote_id,
+                }
+                ranked_ballot_item_list.append((contest_measure.search_rank, one_ballot_item))
+
+            ranked_ballot_item_list.sort(key=lambda ranked_ballot_item: -ranked_ballot_item[0])
+            ballot_items_to_display = [
+                one_ballot_item for search_rank, one_ballot_item in ranked_ballot_item_list[:SEARCH_RESULTS_LIMIT]]
+            ballot_found = len(ballot_items_to_display) > 0
+            status += "BALLOT_ITEMS_SEARCH_COMPLETE "
+        except Exception as e:
+            status += "BALLOT_ITEMS_SEARCH_FAILED: " + str(e) + " "
+            success = False
+
     results = {
         'status':                   status,
         'success':                  success,
@@ -2854,6 +2906,28 @@ def voter_ballot_items_retrieve_for_one_election_for_api(
     return results
 
 
+def retrieve_office_dict_from_we_vote_id_list(office_we_vote_id_list=[]):
+    """
+    Retrieve offices with one query, keyed by office we_vote_id. Offices we could not find are stored as None, so
+    generate_candidate_dict_from_candidate_object treats them as "not found" instead of querying for them again.
+    :param office_we_vote_id_list:
+    :return:
+    """
+    office_dict = {}
+    for office_we_vote_id in office_we_vote_id_list:
+        office_dict[office_we_vote_id] = None
+    office_list_manager = ContestOfficeListManager()
+    results = office_list_manager.retrieve_offices(
+        retrieve_from_this_office_we_vote_id_list=office_we_vote_id_list,
+        return_list_of_objects=True,
+        read_only=True)
+    if results['office_list_found']:
+        for one_office in results['office_list_objects']:
+            if positive_value_exists(one_office.we_vote_id):
+                office_dict[one_office.we_vote_id] = one_office
+    return office_dict
+
+
 def generate_ballot_item_list_from_object_list(
         ballot_item_object_list=[],
         google_civic_election_id='',
@@ -2863,7 +2937,6 @@ def generate_ballot_item_list_from_object_list(
     status = ''
     success = True
 
-    contest_office_manager = ContestOfficeManager()
     candidate_list_object = CandidateListManager()
 
     # Loop through measures to make sure we have full measure data needed
@@ -2884,6 +2957,58 @@ def generate_ballot_item_list_from_object_list(
             for one_measure in measure_list_objects:
                 measure_results_dict[one_measure.we_vote_id] = one_measure
 
+    # Retrieve all the offices on this ballot, their candidates, and everything generate_candidate_dict_from_candidate_object
+    #  needs with a fixed number of queries, instead of multiple queries per office and per candidate
+    contest_office_we_vote_id_list = []
+    for ballot_item in ballot_item_object_list:
+        if positive_value_exists(ballot_item.contest_office_we_vote_id) and \
+                ballot_item.contest_office_we_vote_id not in contest_office_we_vote_id_list:
+            contest_office_we_vote_id_list.append(ballot_item.contest_office_we_vote_id)
+
+    candidate_list_by_office_dict = {}
+    candidate_to_office_link_list = []
+    election_dict = {}
+    office_dict = {}
+    if len(contest_office_we_vote_id_list) > 0:
+        office_dict = retrieve_office_dict_from_we_vote_id_list(contest_office_we_vote_id_list)
+        try:
+            results = candidate_list_object.retrieve_all_candidates_for_office_list(
+                office_we_vote_id_list=contest_office_we_vote_id_list, read_only=True)
+            if results['success']:
+                candidate_list_by_office_dict = results['candidate_list_by_office_dict']
+        except Exception as e:
+            status += 'FAILED retrieve_all_candidates_for_office_list. ' + str(e) + " "
+
+    candidate_we_vote_id_list = []
+    for candidate_list in candidate_list_by_office_dict.values():
+        for candidate in candidate_list:
+            if candidate.we_vote_id not in candidate_we_vote_id_list:
+                candidate_we_vote_id_list.append(candidate.we_vote_id)
+    if len(candidate_we_vote_id_list) > 0:
+        results = candidate_list_object.retrieve_candidate_to_office_link_list(
+            candidate_we_vote_id_list=candidate_we_vote_id_list,
+            read_only=True)
+        candidate_to_office_link_list = results['candidate_to_office_link_list']
+        other_office_we_vote_id_list = []
+        election_id_list = []
+        for candidate_to_office_link in candidate_to_office_link_list:
+            if positive_value_exists(candidate_to_office_link.contest_office_we_vote_id) and \
+                    candidate_to_office_link.contest_office_we_vote_id not in office_dict and \
+                    candidate_to_office_link.contest_office_we_vote_id not in other_office_we_vote_id_list:
+                other_office_we_vote_id_list.append(candidate_to_office_link.contest_office_we_vote_id)
+            election_id_integer = convert_to_int(candidate_to_office_link.google_civic_election_id)
+            if positive_value_exists(election_id_integer) and election_id_integer not in election_id_list:
+                election_id_list.append(election_id_integer)
+        if len(other_office_we_vote_id_list) > 0:
+            office_dict.update(retrieve_office_dict_from_we_vote_id_list(other_office_we_vote_id_list))
+        if len(election_id_list) > 0:
+            election_manager = ElectionManager()
+            election_results = election_manager.retrieve_elections_by_google_civic_election_id_list(
+                google_civic_election_id_list=election_id_list,
+                read_only=True)
+            for one_election in election_results['election_list']:
+                election_dict[convert_to_int(one_election.google_civic_election_id)] = one_election
+
     # Now prepare the full list for json result
     status += "BALLOT_ITEM_LIST_FOUND "
     ballot_item_list_found = len(ballot_item_object_list) > 0
@@ -2897,37 +3022,31 @@ def generate_ballot_item_list_from_object_list(
             primary_party = ""
             race_office_level = ""
             if positive_value_exists(office_we_vote_id):
-                office_results = contest_office_manager.retrieve_contest_office_from_we_vote_id(
-                    office_we_vote_id, read_only=True)
-                if office_results['contest_office_found']:
-                    contest_office = office_results['contest_office']
+                contest_office = office_dict.get(office_we_vote_id)
+                if contest_office:
                     office_id = contest_office.id
                     office_name = contest_office.office_name
                     primary_party = contest_office.primary_party
                     race_office_level = contest_office.ballotpedia_race_office_level
             try:
-                results = candidate_list_object.retrieve_all_candidates_for_office(
-                    office_we_vote_id=office_we_vote_id, read_only=True)
-
                 candidates_to_display = []
-                if results['candidate_list_found']:
-                    candidate_list = results['candidate_list']
-                    for candidate in candidate_list:
-                        candidate_dict_results = generate_candidate_dict_from_candidate_object(
-                            candidate=candidate,
-                            google_civic_election_id=google_civic_election_id,
-                            office_id=office_id,
-                            office_name=office_name,
-                            office_we_vote_id=office_we_vote_id,
-                        )
-                        if candidate_dict_results['success']:
-                            candidate_dict = candidate_dict_results['candidate_dict']
-                            candidates_to_display.append(candidate_dict)
+                for candidate in candidate_list_by_office_dict.get(office_we_vote_id, []):
+                    candidate_dict_results = generate_candidate_dict_from_candidate_object(
+                        candidate=candidate,
+                        candidate_to_office_link_list_from_multiple_candidates=candidate_to_office_link_list,
+                        election_dict=election_dict,
+                        google_civic_election_id=google_civic_election_id,
+                        office_dict=office_dict,
+                        office_id=office_id,
+                        office_name=office_name,
+                        office_we_vote_id=office_we_vote_id,
+                    )
+                    if candidate_dict_results['success']:
+                        candidate_dict = candidate_dict_results['candidate_dict']
+                        candidates_to_display.append(candidate_dict)
             except Exception as e:
-                status += 'FAILED retrieve_all_candidates_for_office. ' + str(e) + " "
+                status += 'FAILED generate_candidate_dict_from_candidate_object. ' + str(e) + " "
                 candidates_to_display = []
-                if hasattr(results, 'status'):
-                    status += results['status'] + " "
 
             if len(candidates_to_display):
                 one_ballot_item = {
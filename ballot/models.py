@@ -4,6 +4,7 @@
 
 import sys
 from datetime import date, datetime
+from functools import partial
 
 from django.db import models
 from django.db.models import F, Q, Count, FloatField, ExpressionWrapper, Func
@@ -15,12 +16,15 @@ from candidate.models import CandidateCampaign
 from config.base import get_environment_variable
 from election.models import ElectionManager
 from exception.models import handle_exception, handle_record_found_more_than_one_exception
+from geoip.models import geocode_with_cache
 from measure.models import ContestMeasureManager
 from office.models import ContestOfficeManager
 from polling_location.models import PollingLocationManager
 from wevote_functions.functions import convert_to_int, extract_state_code_from_address_string, \
     positive_value_exists, STATE_CODE_MAP
 from wevote_functions.functions_date import convert_date_to_date_as_integer, DATE_FORMAT_YMD
+from wevote_functions.functions_geo import BALLOT_RETURNED_MAP_POINTS, filter_queryset_to_bounding_box, \
+    find_nearest_map_point_ids_in_spatial_index, retrieve_map_point_spatial_index
 from wevote_settings.models import fetch_next_we_vote_id_ballot_returned_integer, fetch_site_unique_id_prefix
 
 OFFICE = 'OFFICE'
@@ -1862,6 +1866,10 @@ class BallotReturned(models.Model):
             models.Index(
                 fields=['we_vote_id'],
                 name='ballot_returned_we_vote_id'),
+            # For bounding-box prefilters in find_closest_ballot_returned
+            models.Index(
+                fields=['google_civic_election_id', 'latitude', 'longitude'],
+                name='ballot_returned_election_lat'),
         ]
 
     # We override the save function, so we can auto-generate we_vote_id
@@ -2615,6 +2623,51 @@ class BallotReturnedManager(models.Manager):
         # If we got through the elections without finding any ballot_returned entries, there is no prior election
         return 0
 
+    @staticmethod
+    def retrieve_closest_map_point_ballot_returned(
+            ballot_returned_query=None,
+            google_civic_election_id=0,
+            location=None,
+            state_code=''):
+        """
+        Return the first entry in ballot_returned_query, which find_closest_ballot_returned has already limited to
+        map points within DISTANCE_LIMIT_IN_MILES of location and ordered by distance. When we know the election and
+        state, we look up the nearest map points in this worker's spatial index first, so the database only
+        calculates the distance for those few rows.
+        :param ballot_returned_query:
+        :param google_civic_election_id:
+        :param location:
+        :param state_code:
+        :return:
+        """
+        if not positive_value_exists(google_civic_election_id) or not positive_value_exists(state_code):
+            return ballot_returned_query.first()
+
+        spatial_index = retrieve_map_point_spatial_index(
+            kind_of_map_point=BALLOT_RETURNED_MAP_POINTS,
+            google_civic_election_id=google_civic_election_id,
+            state_code=state_code,
+            retrieve_map_point_location_list_function=partial(
+                BallotReturnedListManager.retrieve_map_point_location_list,
+                google_civic_election_id=google_civic_election_id,
+                state_code=state_code))
+        if spatial_index is None:
+            return ballot_returned_query.first()
+
+        nearest_id_list = find_nearest_map_point_ids_in_spatial_index(
+            spatial_index=spatial_index,
+            latitude=location.latitude,
+            longitude=location.longitude,
+            distance_in_miles=DISTANCE_LIMIT_IN_MILES)
+        if not len(nearest_id_list):
+            # Nothing nearby in the index, which may have been built before the map points nearest location were saved
+            return ballot_returned_query.first()
+        ballot = ballot_returned_query.filter(id__in=nearest_id_list).first()
+        if ballot is None:
+            # The nearest map points have changed since the index was built
+            ballot = ballot_returned_query.first()
+        return ballot
+
     def find_closest_ballot_returned(self, text_for_map_search, google_civic_election_id=0, read_only=True):
         """
         We search for the closest address for this election in the ballot_returned table. We never have to worry
@@ -2648,7 +2701,7 @@ class BallotReturnedManager(models.Manager):
         # keep using the GeoPy as a wrapper, in case some day we want to swap out google for geolocation, with a better
         # competitor.  (GeoPy doesn't have much value in our use case.)
         try:
-            location = self.google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+            location = geocode_with_cache(self.google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         except GeocoderQuotaExceeded:
             try_without_maps_key = True
             status += "GEOCODER_QUOTA_EXCEEDED "
@@ -2662,7 +2715,7 @@ class BallotReturnedManager(models.Manager):
             # If we have exceeded our account, try without a maps key
             try:
                 temp_google_client = get_geocoder_for_service('google')()
-                location = temp_google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+                location = geocode_with_cache(temp_google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
             except GeocoderQuotaExceeded:
                 status += "GEOCODER_QUOTA_EXCEEDED "
                 results = {
@@ -2754,6 +2807,9 @@ class BallotReturnedManager(models.Manager):
                 ballot_returned_query = ballot_returned_query.filter(normalized_state__iexact=state_code)
 
             try:
+                # Only calculate the distance for map points inside the bounding box, which can use an index
+                ballot_returned_query = filter_queryset_to_bounding_box(
+                    ballot_returned_query, location.latitude, location.longitude, DISTANCE_LIMIT_IN_MILES)
                 lat_rads_ploc = location.latitude * DEG_TO_RADS
                 lon_rads_ploc = location.longitude * DEG_TO_RADS
                 ballot_returned_query = ballot_returned_query.annotate(
@@ -2782,7 +2838,11 @@ class BallotReturnedManager(models.Manager):
                 status += "SEARCHING_BY_GOOGLE_CIVIC_ID "
                 ballot_returned_query = ballot_returned_query.filter(google_civic_election_id=google_civic_election_id)
                 try:
-                    ballot = ballot_returned_query.first()
+                    ballot = self.retrieve_closest_map_point_ballot_returned(
+                        ballot_returned_query=ballot_returned_query,
+                        google_civic_election_id=google_civic_election_id,
+                        location=location,
+                        state_code=state_code)
                     if ballot == None:
                         status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID__BALLOT_NONE "
                     else:
@@ -2805,7 +2865,11 @@ class BallotReturnedManager(models.Manager):
                     ballot_returned_query = ballot_returned_query.filter(
                         google_civic_election_id=upcoming_google_civic_election_id)
                     try:
-                        ballot = ballot_returned_query.first()
+                        ballot = self.retrieve_closest_map_point_ballot_returned(
+                            ballot_returned_query=ballot_returned_query,
+                            google_civic_election_id=upcoming_google_civic_election_id,
+                            location=location,
+                            state_code=state_code)
                         if ballot == None:
                             status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_HAS_LOCATION_AND_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
                         else:
@@ -2836,7 +2900,11 @@ class BallotReturnedManager(models.Manager):
                                 ballot_returned_query = ballot_returned_query.filter(
                                     google_civic_election_id=upcoming_google_civic_election_id)
                                 try:
-                                    ballot = ballot_returned_query.first()
+                                    ballot = self.retrieve_closest_map_point_ballot_returned(
+                                        ballot_returned_query=ballot_returned_query,
+                                        google_civic_election_id=upcoming_google_civic_election_id,
+                                        location=location,
+                                        state_code=state_code)
                                     if ballot == None:
                                         status += "BALLOT_RETURNED_QUERY_FIRST_FAILED_BALLOT_NONE_POSITIVE_UPCOMING_GOOGLE_CIVIC_ID__BALLOT_NONE "
                                     else:
@@ -2895,6 +2963,8 @@ class BallotReturnedManager(models.Manager):
                     Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
 
                 try:
+                    ballot_returned_query = filter_queryset_to_bounding_box(
+                        ballot_returned_query, location.latitude, location.longitude, DISTANCE_LIMIT_IN_MILES)
                     lat_rads_ploc = location.latitude * DEG_TO_RADS
                     lon_rads_ploc = location.longitude * DEG_TO_RADS
                     ballot_returned_query = ballot_returned_query.annotate(
@@ -3134,7 +3204,7 @@ class BallotReturnedManager(models.Manager):
             ballot_returned_object.normalized_state,
             ballot_returned_object.normalized_zip)
         try:
-            location = self.google_client.geocode(full_ballot_address, sensor=False, timeout=GEOCODE_TIMEOUT)
+            location = geocode_with_cache(self.google_client, full_ballot_address, timeout=GEOCODE_TIMEOUT)
         except GeocoderQuotaExceeded:
             status += "GeocoderQuotaExceeded "
             results = {
@@ -3271,6 +3341,28 @@ class BallotReturnedListManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def retrieve_map_point_location_list(google_civic_election_id=0, state_code=''):
+        """
+        The (id, latitude, longitude) of every map point ballot in this election and state, for the spatial index
+        used by find_closest_ballot_returned.
+        :param google_civic_election_id:
+        :param state_code:
+        :return:
+        """
+        if 'test' in sys.argv:
+            ballot_returned_query = BallotReturned.objects.all()
+        else:
+            ballot_returned_query = BallotReturned.objects.using('readonly').all()
+        ballot_returned_query = ballot_returned_query.exclude(
+            Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
+        ballot_returned_query = ballot_returned_query.filter(
+            google_civic_election_id=google_civic_election_id,
+            normalized_state__iexact=state_code,
+            latitude__isnull=False,
+            longitude__isnull=False)
+        return list(ballot_returned_query.values_list('id', 'latitude', 'longitude'))
+
     @staticmethod
     def retrieve_ballot_returned_duplicate_list(google_civic_election_id, polling_location_we_vote_id, voter_id):
         success = True
@@ -4609,7 +4701,7 @@ def retrieve_address_fields_from_geocoder(text_for_map_search):
     zip_long = ""
     try:
         google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-        location = google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+        location = geocode_with_cache(google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         if location is None:
             status += 'REFRESH_ADDRESS_FIELDS: Could not find location matching "{}" '.format(text_for_map_search)
             logger.debug(status)
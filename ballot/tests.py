@@ -1,9 +1,16 @@
 from unittest import mock
 from collections import namedtuple
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 
-from ballot.models import BallotReturned, BallotReturnedManager
+from ballot.controllers import generate_ballot_item_list_from_object_list
+from ballot.models import BallotItem, BallotReturned, BallotReturnedManager
+from candidate.models import CandidateCampaign, CandidateToOfficeLink
+from election.models import Election
+from geoip.models import local_geocode_cache
+from office.models import ContestOffice
+from wevote_functions.functions_geo import BALLOT_RETURNED_MAP_POINTS, generate_map_point_spatial_index_key, \
+    invalidate_map_point_spatial_index, map_point_spatial_index_cache, retrieve_map_point_spatial_index
 
 
 Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
@@ -23,6 +30,8 @@ class BallotTestCase(TestCase):
                                          'polling_location_we_vote_id': 'wv01ploc43132',
                                          })
         self.ballot_manager = BallotReturnedManager()
+        # These tests count calls to the geocoder, so don't answer from an earlier test's cached geocodes
+        local_geocode_cache.clear()
 
     def test_do_not_return_ballot_in_different_state(self):
         with mock.patch('ballot.models.get_geocoder_for_service') as mock_geopy:
@@ -100,3 +109,118 @@ class BallotTestCase(TestCase):
             self.assertFalse(result['geocoder_quota_exceeded'])
             self.assertTrue(result['ballot_returned_found'])
             self.assertEqual(result['ballot_returned'], ballot_in_jackson)
+
+    def test_return_closest_ballot_for_election(self):
+        """ With an election and state we use the map point spatial index. It must agree with the distance query. """
+        ballot_in_jackson = BallotReturned.objects.create(**{'google_civic_election_id': 4184,
+                                                             'latitude': 32.269163,
+                                                             'longitude': -90.234566,
+                                                             'normalized_city': 'jackson',
+                                                             'normalized_line1': '1020 w mcdowell rd',
+                                                             'normalized_state': 'MS',
+                                                             'normalized_zip': '39204',
+                                                             'polling_location_we_vote_id': 'wv01ploc42284',
+                                                             })
+        invalidate_map_point_spatial_index(kind_of_map_point=BALLOT_RETURNED_MAP_POINTS, google_civic_election_id=4184)
+        with mock.patch('ballot.models.get_geocoder_for_service') as mock_geopy:
+            google_client = mock_geopy('google')()
+            google_client.geocode.return_value = Location(address='Jackson, MS, USA',
+                                                          latitude=32.310251, longitude=-90.3289724)
+
+            result = self.ballot_manager.find_closest_ballot_returned('Jackson, MS', google_civic_election_id=4184)
+            self.assertTrue(result['ballot_returned_found'])
+            self.assertEqual(result['ballot_returned'], ballot_in_jackson)
+
+            # Hernando is about 16 miles from the Coldwater map point
+            google_client.geocode.return_value = Location(address='Hernando, MS, USA',
+                                                          latitude=34.8239874, longitude=-89.9937017)
+            result = self.ballot_manager.find_closest_ballot_returned('Hernando, MS', google_civic_election_id=4184)
+            self.assertTrue(result['ballot_returned_found'])
+            self.assertNotEqual(result['ballot_returned'], ballot_in_jackson)
+
+            # Starkville is more than DISTANCE_LIMIT_IN_MILES from both map points
+            google_client.geocode.return_value = Location(address='Starkville, MS, USA',
+                                                          latitude=33.4503998, longitude=-88.8183872)
+            result = self.ballot_manager.find_closest_ballot_returned('Starkville, MS', google_civic_election_id=4184)
+            self.assertFalse(result['ballot_returned_found'])
+
+            # A map point saved after the index was built is still found by the distance query
+            ballot_in_starkville = BallotReturned.objects.create(**{'google_civic_election_id': 4184,
+                                                                    'latitude': 33.4503998,
+                                                                    'longitude': -88.8183872,
+                                                                    'normalized_city': 'starkville',
+                                                                    'normalized_state': 'MS',
+                                                                    'polling_location_we_vote_id': 'wv01ploc42285',
+                                                                    })
+            self.assertEqual(BallotReturnedManager.retrieve_closest_map_point_ballot_returned(
+                ballot_returned_query=BallotReturned.objects.filter(normalized_city='starkville'),
+                google_civic_election_id=4184,
+                location=google_client.geocode.return_value,
+                state_code='MS'), ballot_in_starkville)
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' queries see the offices and candidates saved here
+class BallotItemListAssemblyTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        Election.objects.create(election_name='Test General Election', election_day_text='2026-11-03',
+                                google_civic_election_id='4184')
+        self.ballot_item_object_list = []
+        for office_number in range(1, 4):
+            office_we_vote_id = 'wv01off{office_number}'.format(office_number=office_number)
+            contest_office = ContestOffice.objects.create(
+                google_civic_election_id='4184', office_name='Office {0}'.format(office_number),
+                we_vote_id=office_we_vote_id)
+            for candidate_number in range(1, 3):
+                candidate_we_vote_id = 'wv01cand{office_number}{candidate_number}'.format(
+                    office_number=office_number, candidate_number=candidate_number)
+                CandidateCampaign.objects.create(
+                    candidate_name='Candidate {0}{1}'.format(office_number, candidate_number),
+                    google_civic_election_id='4184', twitter_followers_count=candidate_number,
+                    we_vote_id=candidate_we_vote_id)
+                CandidateToOfficeLink.objects.create(
+                    candidate_we_vote_id=candidate_we_vote_id, contest_office_we_vote_id=office_we_vote_id,
+                    google_civic_election_id=4184, state_code='ms')
+            self.ballot_item_object_list.append(BallotItem(
+                ballot_item_display_name=contest_office.office_name, contest_office_id=contest_office.id,
+                contest_office_we_vote_id=office_we_vote_id, google_civic_election_id='4184',
+                local_ballot_order=office_number))
+
+    def test_query_count_does_not_grow_with_ballot_size(self):
+        # Offices, links by office, candidates, links by candidate, elections
+        with self.assertNumQueries(5, using='readonly'):
+            results = generate_ballot_item_list_from_object_list(
+                ballot_item_object_list=self.ballot_item_object_list,
+                google_civic_election_id='4184')
+        self.assertTrue(results['ballot_item_list_found'])
+        self.assertEqual(len(results['ballot_item_list']), 3)
+
+    def test_candidates_ordered_by_twitter_followers(self):
+        results = generate_ballot_item_list_from_object_list(
+            ballot_item_object_list=self.ballot_item_object_list,
+            google_civic_election_id='4184')
+        first_ballot_item = results['ballot_item_list'][0]
+        self.assertEqual(first_ballot_item['we_vote_id'], 'wv01off1')
+        self.assertEqual(first_ballot_item['ballot_item_display_name'], 'Office 1')
+        self.assertEqual([candidate['we_vote_id'] for candidate in first_ballot_item['candidate_list']],
+                         ['wv01cand12', 'wv01cand11'])
+        self.assertEqual(first_ballot_item['candidate_list'][0]['contest_office_list'][0]['election_day_text'],
+                         '2026-11-03')
+
+
+class MapPointSpatialIndexTestCase(SimpleTestCase):
+
+    def test_invalidate_only_matches_the_whole_election_id(self):
+        map_point_spatial_index_cache.clear()
+        for google_civic_election_id in [1, 10]:
+            retrieve_map_point_spatial_index(
+                kind_of_map_point=BALLOT_RETURNED_MAP_POINTS,
+                google_civic_election_id=google_civic_election_id,
+                state_code='MS',
+                retrieve_map_point_location_list_function=lambda: [(1, 34.6604854, -90.184124)])
+        invalidate_map_point_spatial_index(kind_of_map_point=BALLOT_RETURNED_MAP_POINTS, google_civic_election_id=1)
+        self.assertNotIn(generate_map_point_spatial_index_key(BALLOT_RETURNED_MAP_POINTS, 1, 'MS'),
+                         map_point_spatial_index_cache)
+        self.assertIn(generate_map_point_spatial_index_key(BALLOT_RETURNED_MAP_POINTS, 10, 'MS'),
+                      map_point_spatial_index_cache)
@@ -17,6 +17,7 @@ from django.shortcuts import render
 from django.urls import reverse
 from election.models import Election, ElectionManager
 from exception.models import handle_record_not_deleted_exception
+from geoip.models import geocode_with_cache
 from geopy.geocoders import get_geocoder_for_service
 import json
 from measure.models import ContestMeasure, ContestMeasureManager
@@ -730,7 +731,7 @@ def ballot_item_list_edit_process_view(request):
                     if not ballot_returned.latitude or not ballot_returned.longitude:
                         # Make sure we have saved a latitude and longitude for the ballot_returned entry
                         google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-                        location = google_client.geocode(ballot_returned.text_for_map_search, sensor=False)
+                        location = geocode_with_cache(google_client, ballot_returned.text_for_map_search)
                         if location is None:
                             status += 'Could not find location matching "{}"'.format(ballot_returned.text_for_map_search)
                             logger.debug(status)
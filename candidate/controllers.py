@@ -20,7 +20,6 @@ from image.controllers import retrieve_all_images_for_one_candidate, cache_maste
 from import_export_vote_smart.controllers import retrieve_and_match_candidate_from_vote_smart, \
     retrieve_candidate_photo_from_vote_smart
 from office.models import ContestOfficeListManager, ContestOfficeManager
-from organization.models import ORGANIZATION_WEBSITES_TO_EXCLUDE_FROM_SCRAPER
 from politician.models import PoliticianManager
 from position.controllers import move_positions_to_another_candidate, update_all_position_details_from_candidate
 from twitter.models import TwitterUserManager
@@ -33,6 +32,8 @@ from wevote_functions.functions_date import convert_date_to_we_vote_date_string,
     convert_we_vote_date_string_to_date_as_integer, get_current_date_as_integer, get_current_year_as_integer, \
     DATE_FORMAT_YMD_HMS, DATE_FORMAT_YMD
 from wevote_functions.utils import staticUserAgent
+from .controllers_endorsement_scanner import ENDORSEMENT_ITEM_BALLOT_ITEM, ENDORSEMENT_ITEM_ORGANIZATION, \
+    find_endorsement_items_in_text
 from .models import CandidateListManager, CandidateCampaign, CandidateManager, \
     CANDIDATE_UNIQUE_ATTRIBUTES_TO_BE_CLEARED, CANDIDATE_UNIQUE_IDENTIFIERS, \
     PROFILE_IMAGE_TYPE_BALLOTPEDIA, PROFILE_IMAGE_TYPE_FACEBOOK, PROFILE_IMAGE_TYPE_LINKEDIN, \
@@ -2432,6 +2433,40 @@ def retrieve_candidate_list_for_entire_year(
     return results
 
 
+def candidate_list_for_upcoming_elections_retrieve_for_api(  # candidateListForUpcomingElectionsRetrieve
+        google_civic_election_id_list=[],
+        state_code=''):
+    """
+    Return all candidates running for the elections in google_civic_election_id_list
+    :param google_civic_election_id_list:
+    :param state_code:
+    :return:
+    """
+    status = ""
+    # We will need all candidates for all upcoming elections so we can search the HTML of
+    #  the possible voter guide for these names
+    candidate_list_light = []
+    super_light = True  # limit the response package
+    results = retrieve_candidate_list_for_all_upcoming_elections(google_civic_election_id_list,
+                                                                 limit_to_this_state_code=state_code,
+                                                                 super_light_candidate_list=super_light)
+    if results['candidate_list_found']:
+        candidate_list_light = results['candidate_list_light']
+
+    google_civic_election_id_list = results['google_civic_election_id_list']
+
+    status += results['status']
+    success = results['success']
+
+    json_data = {
+        'status':                           status,
+        'success':                          success,
+        'google_civic_election_id_list':    google_civic_election_id_list,
+        'candidate_list':                   candidate_list_light,
+    }
+    return json_data
+
+
 def retrieve_candidate_list_for_all_upcoming_elections(
         upcoming_google_civic_election_id_list=[],
         limit_to_these_last_names=[],
@@ -3026,38 +3061,12 @@ def find_candidate_endorsements_on_one_candidate_web_page(site_url, endorsement_
             for one_ballot_item_dict in endorsement_list_light:
                 # Add empty candidate_we_vote_id
                 one_ballot_item_dict['candidate_we_vote_id'] = ""
-                if positive_value_exists(one_ballot_item_dict['organization_we_vote_id']) \
-                        and one_ballot_item_dict['organization_we_vote_id'] \
-                        not in organization_we_vote_ids_list:
-                    if positive_value_exists(one_ballot_item_dict['organization_name']):
-                        if one_ballot_item_dict['organization_name'].lower() in all_html_lower_case:
-                            organization_we_vote_ids_list.append(one_ballot_item_dict['organization_we_vote_id'])
-                            endorsement_list_light_modified.append(one_ballot_item_dict)
-                            continue
-                        elif 'alternate_names' in one_ballot_item_dict:
-                            alternate_name_found = False
-                            alternate_names = one_ballot_item_dict['alternate_names']
-                            for organization_name_alternate in alternate_names:
-                                if organization_name_alternate.lower() in all_html_lower_case:
-                                    organization_we_vote_ids_list.append(
-                                        one_ballot_item_dict['organization_we_vote_id'])
-                                    endorsement_list_light_modified.append(one_ballot_item_dict)
-                                    alternate_name_found = True
-                                    break
-                            if alternate_name_found:
-                                continue
-                    if 'organization_website' in one_ballot_item_dict and \
-                            positive_value_exists(one_ballot_item_dict['organization_website']):
-                        organization_website = one_ballot_item_dict['organization_website'].lower()
-                        # Remove the http... from the candidate website
-                        organization_website_stripped = extract_website_from_url(organization_website)
-                        # Also search for extract_website_from_url
-                        if organization_website_stripped not in ORGANIZATION_WEBSITES_TO_EXCLUDE_FROM_SCRAPER:
-                            if organization_website_stripped in all_html_lower_case:
-                                organization_we_vote_ids_list.append(
-                                    one_ballot_item_dict['organization_we_vote_id'])
-                                endorsement_list_light_modified.append(one_ballot_item_dict)
-                                continue
+            organization_list_light_found = find_endorsement_items_in_text(
+                endorsement_list_light, all_html_lower_case, ENDORSEMENT_ITEM_ORGANIZATION)
+            for one_ballot_item_dict in organization_list_light_found:
+                if one_ballot_item_dict['organization_we_vote_id'] not in organization_we_vote_ids_list:
+                    organization_we_vote_ids_list.append(one_ballot_item_dict['organization_we_vote_id'])
+                    endorsement_list_light_modified.append(one_ballot_item_dict)
 
         except Exception as error_message:
             status += "SCRAPE_ONE_LINE_ERROR: {error_message}".format(error_message=error_message)
@@ -3122,8 +3131,9 @@ def find_organization_endorsements_of_candidates_on_one_web_page(site_url, endor
         scan_results = organization_endorsements_scanner(endorsement_list_light, all_html_lower_case)
         status += scan_results['status']
         success = scan_results['success']
+        # Already in the order they appear on the page
         endorsement_list_light_modified = scan_results['endorsement_list_light']
-        # at_least_one_endorsement_found = scan_results['at_least_one_endorsement_found']
+        at_least_one_endorsement_found = scan_results['at_least_one_endorsement_found']
 
         status += "FINISHED_SCRAPING_PAGE "
     except timeout:
@@ -3139,12 +3149,6 @@ def find_organization_endorsements_of_candidates_on_one_web_page(site_url, endor
         status += "SCRAPE_GENERAL_EXCEPTION_ERROR: {error_message}".format(error_message=error_message)
         success = False
 
-    reorder_results = reorder_endorsement_list_to_match_candidates_on_one_web_page(
-        site_url, endorsement_list_light_modified)
-    if reorder_results['success']:
-        endorsement_list_light_modified = reorder_results['endorsement_list_light']
-        at_least_one_endorsement_found = reorder_results['at_least_one_endorsement_found']
-
     results = {
         'status':                           status,
         'success':                          success,
@@ -3297,16 +3301,18 @@ def find_possible_duplicate_candidates_to_merge_with_this_candidate(candidate=No
 
 
 def organization_endorsements_scanner(endorsement_list_light, text_to_search_lower_case,
-                                      candidate_we_vote_ids_list=[], measure_we_vote_ids_list=[]):
+                                      candidate_we_vote_ids_list=None, measure_we_vote_ids_list=None):
     """
     Take the list of candidates and measures (in endorsement_list_light) and search the text_to_search_lower_case
-    provided. Return the ones found.
+    provided, in one pass for all of them. Return the ones found, in the order they first appear in the text.
     :param endorsement_list_light:
     :param text_to_search_lower_case:
-    :param candidate_we_vote_ids_list:
-    :param measure_we_vote_ids_list:
+    :param candidate_we_vote_ids_list: Candidates already found, which we don't return again
+    :param measure_we_vote_ids_list: Measures already found, which we don't return again
     :return:
     """
+    candidate_we_vote_ids_list = [] if candidate_we_vote_ids_list is None else candidate_we_vote_ids_list
+    measure_we_vote_ids_list = [] if measure_we_vote_ids_list is None else measure_we_vote_ids_list
     endorsement_list_light_modified = []
     status = ""
     success = True
@@ -3314,53 +3320,18 @@ def organization_endorsements_scanner(endorsement_list_light, text_to_search_low
         for one_ballot_item_dict in endorsement_list_light:
             # Add empty organization_we_vote_id
             one_ballot_item_dict['organization_we_vote_id'] = ""
-            # Hanging off each ballot_item_dict is a alternate_names that includes
-            #  shortened alternative names that we should check against all_html_lower_case
-            if positive_value_exists(one_ballot_item_dict['measure_we_vote_id']) \
-                    and one_ballot_item_dict['measure_we_vote_id'] not in measure_we_vote_ids_list:
-                if positive_value_exists(one_ballot_item_dict['ballot_item_display_name']):
-                    ballot_item_display_name_lower = one_ballot_item_dict['ballot_item_display_name'].lower()
-                    if ballot_item_display_name_lower in text_to_search_lower_case:
-                        measure_we_vote_ids_list.append(one_ballot_item_dict['measure_we_vote_id'])
-                        endorsement_list_light_modified.append(one_ballot_item_dict)
-                        continue
-                if 'alternate_names' in one_ballot_item_dict:
-                    alternate_names = one_ballot_item_dict['alternate_names']
-                    for ballot_item_display_name_alternate in alternate_names:
-                        if ballot_item_display_name_alternate in text_to_search_lower_case:
-                            measure_we_vote_ids_list.append(one_ballot_item_dict['measure_we_vote_id'])
-                            endorsement_list_light_modified.append(one_ballot_item_dict)
-                            continue
-            elif positive_value_exists(one_ballot_item_dict['candidate_we_vote_id']) \
-                    and one_ballot_item_dict['candidate_we_vote_id'] not in candidate_we_vote_ids_list:
-                if positive_value_exists(one_ballot_item_dict['ballot_item_display_name']):
-                    ballot_item_display_name_lower = one_ballot_item_dict['ballot_item_display_name'].lower()
-                    if ballot_item_display_name_lower in text_to_search_lower_case:
-                        candidate_we_vote_ids_list.append(one_ballot_item_dict['candidate_we_vote_id'])
-                        endorsement_list_light_modified.append(one_ballot_item_dict)
-                        continue
-                if 'ballot_item_website' in one_ballot_item_dict and \
-                        positive_value_exists(one_ballot_item_dict['ballot_item_website']):
-                    ballot_item_website = one_ballot_item_dict['ballot_item_website'].lower()
-                    # Remove the http... from the candidate website
-                    ballot_item_website_stripped = extract_website_from_url(ballot_item_website)
-                    if ballot_item_website_stripped not in ORGANIZATION_WEBSITES_TO_EXCLUDE_FROM_SCRAPER:
-                        if ballot_item_website_stripped in text_to_search_lower_case:
-                            candidate_we_vote_ids_list.append(one_ballot_item_dict['candidate_we_vote_id'])
-                            endorsement_list_light_modified.append(one_ballot_item_dict)
-                            continue
-                if 'alternate_names' in one_ballot_item_dict:
-                    alternate_name_found = False
-                    for ballot_item_display_name_alternate in one_ballot_item_dict['alternate_names']:
-                        if ballot_item_display_name_alternate.lower() in text_to_search_lower_case:
-                            candidate_we_vote_ids_list.append(one_ballot_item_dict['candidate_we_vote_id'])
-                            endorsement_list_light_modified.append(one_ballot_item_dict)
-                            alternate_name_found = True
-                            break
-                    if alternate_name_found:
-                        continue
-            else:
-                testing = 1
+        # Hanging off each ballot_item_dict is a alternate_names that includes
+        #  shortened alternative names that we also search for
+        ballot_item_list_light_found = find_endorsement_items_in_text(
+            endorsement_list_light, text_to_search_lower_case, ENDORSEMENT_ITEM_BALLOT_ITEM)
+        for one_ballot_item_dict in ballot_item_list_light_found:
+            if positive_value_exists(one_ballot_item_dict['measure_we_vote_id']):
+                if one_ballot_item_dict['measure_we_vote_id'] not in measure_we_vote_ids_list:
+                    measure_we_vote_ids_list.append(one_ballot_item_dict['measure_we_vote_id'])
+                    endorsement_list_light_modified.append(one_ballot_item_dict)
+            elif one_ballot_item_dict['candidate_we_vote_id'] not in candidate_we_vote_ids_list:
+                candidate_we_vote_ids_list.append(one_ballot_item_dict['candidate_we_vote_id'])
+                endorsement_list_light_modified.append(one_ballot_item_dict)
     except Exception as error_message:
         status += "SCRAPE_ONE_LINE_ERROR: {error_message}".format(error_message=error_message)
 
@@ -3379,62 +3350,6 @@ def organization_endorsements_scanner(endorsement_list_light, text_to_search_low
     return results
 
 
-def reorder_endorsement_list_to_match_candidates_on_one_web_page(site_url, endorsement_list_light):
-    candidate_we_vote_ids_list = []
-    endorsement_list_light_modified = []
-    measure_we_vote_ids_list = []
-    status = ""
-    success = False
-
-    try:
-        request = urllib.request.Request(site_url, None, staticUserAgent())
-        page = urllib.request.urlopen(request, timeout=5)
-        all_lines = page.readlines()
-        page.close()
-        for one_line in all_lines:
-            one_line_decoded = one_line.decode()
-            try:
-                one_line_decoded_lower_case = one_line_decoded.lower()
-                scan_results = organization_endorsements_scanner(
-                    endorsement_list_light, one_line_decoded_lower_case,
-                    candidate_we_vote_ids_list=candidate_we_vote_ids_list,
-                    measure_we_vote_ids_list=measure_we_vote_ids_list)
-                status += scan_results['status']
-                endorsement_list_light_new_segment = scan_results['endorsement_list_light']
-                endorsement_list_light_modified += endorsement_list_light_new_segment
-                candidate_we_vote_ids_list = scan_results['candidate_we_vote_ids_list']
-                measure_we_vote_ids_list = scan_results['measure_we_vote_ids_list']
-
-            except Exception as error_message:
-                status += "SCRAPE_ONE_LINE_ERROR: {error_message}".format(error_message=error_message)
-
-        success = True
-        status += "FINISHED_SCRAPING_PAGE "
-    except timeout:
-        status += "ENDORSEMENTS-WEB_PAGE_SCRAPE_TIMEOUT_ERROR "
-        success = False
-    except IOError as error_instance:
-        # Catch the error message coming back from urllib.request.urlopen and pass it in the status
-        error_message = error_instance
-        status += "SCRAPE_SOCIAL_IO_ERROR: {error_message}".format(error_message=error_message)
-        success = False
-    except Exception as error_instance:
-        error_message = error_instance
-        status += "SCRAPE_GENERAL_EXCEPTION_ERROR: {error_message}".format(error_message=error_message)
-        success = False
-
-    at_least_one_endorsement_found = positive_value_exists(len(candidate_we_vote_ids_list)) \
-        or positive_value_exists(len(measure_we_vote_ids_list))
-    results = {
-        'status':                           status,
-        'success':                          success,
-        'at_least_one_endorsement_found':   at_least_one_endorsement_found,
-        'page_redirected':                  False,
-        'endorsement_list_light':           endorsement_list_light_modified,
-    }
-    return results
-
-
 def update_candidate_details_from_campaignx(candidate, campaignx):
     status = ''
     success = True
@@ -0,0 +1,169 @@
+# candidate/controllers_endorsement_scanner.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+from organization.models import ORGANIZATION_WEBSITES_TO_EXCLUDE_FROM_SCRAPER
+from wevote_functions.functions import extract_website_from_url, positive_value_exists
+
+ENDORSEMENT_ITEM_BALLOT_ITEM = 'BALLOT_ITEM'
+ENDORSEMENT_ITEM_ORGANIZATION = 'ORGANIZATION'
+# One index per endorsement_list_light snapshot, e.g. all candidates and measures in upcoming elections
+ENDORSEMENT_PATTERN_INDEX_CACHE_SIZE = 8
+
+endorsement_pattern_index_cache = OrderedDict()
+endorsement_pattern_index_cache_lock = threading.Lock()
+
+
+def is_word_character(character):
+    return character.isalnum() or character == '_'
+
+
+def generate_endorsement_pattern_list(one_item_dict, item_kind):
+    """
+    The lower case names, alternate names and websites we look for on a page for one entry in endorsement_list_light.
+    :param one_item_dict:
+    :param item_kind: ENDORSEMENT_ITEM_BALLOT_ITEM (candidates and measures) or ENDORSEMENT_ITEM_ORGANIZATION
+    :return: tuple of patterns
+    """
+    pattern_list = []
+    website = ''
+    if item_kind == ENDORSEMENT_ITEM_ORGANIZATION:
+        if not positive_value_exists(one_item_dict.get('organization_we_vote_id')):
+            return ()
+        if positive_value_exists(one_item_dict.get('organization_name')):
+            pattern_list.append(one_item_dict['organization_name'])
+            pattern_list += one_item_dict.get('alternate_names') or []
+        website = one_item_dict.get('organization_website')
+    elif positive_value_exists(one_item_dict.get('measure_we_vote_id')):
+        pattern_list.append(one_item_dict.get('ballot_item_display_name'))
+        pattern_list += one_item_dict.get('alternate_names') or []
+    elif positive_value_exists(one_item_dict.get('candidate_we_vote_id')):
+        pattern_list.append(one_item_dict.get('ballot_item_display_name'))
+        pattern_list += one_item_dict.get('alternate_names') or []
+        website = one_item_dict.get('ballot_item_website')
+    if positive_value_exists(website):
+        # Remove the http... from the website
+        website_stripped = extract_website_from_url(website.lower())
+        if website_stripped not in ORGANIZATION_WEBSITES_TO_EXCLUDE_FROM_SCRAPER:
+            pattern_list.append(website_stripped)
+    pattern_list = [pattern.lower().strip() for pattern in pattern_list if positive_value_exists(pattern)]
+    return tuple(pattern for pattern in dict.fromkeys(pattern_list) if pattern)
+
+
+class EndorsementPatternIndex:
+    """
+    An Aho-Corasick automaton over every pattern in one endorsement_list_light, so a page is scanned once for all
+    candidates, measures or organizations instead of once per name. A pattern that starts or ends with a letter or
+    digit only matches on a word boundary, so "prop 1" doesn't match "prop 12".
+    """
+
+    def __init__(self, item_pattern_list):
+        self.pattern_list = []
+        self.item_index_list_by_pattern_id = []
+        self.transition_list = [{}]
+        self.failure_list = [0]
+        self.output_list = [()]
+
+        pattern_id_by_pattern = {}
+        for item_index, pattern_tuple in enumerate(item_pattern_list):
+            for pattern in pattern_tuple:
+                if pattern not in pattern_id_by_pattern:
+                    pattern_id_by_pattern[pattern] = len(self.pattern_list)
+                    self.pattern_list.append(pattern)
+                    self.item_index_list_by_pattern_id.append([])
+                self.item_index_list_by_pattern_id[pattern_id_by_pattern[pattern]].append(item_index)
+
+        for pattern_id, pattern in enumerate(self.pattern_list):
+            state = 0
+            for character in pattern:
+                next_state = self.transition_list[state].get(character)
+                if next_state is None:
+                    next_state = len(self.transition_list)
+                    self.transition_list.append({})
+                    self.failure_list.append(0)
+                    self.output_list.append(())
+                    self.transition_list[state][character] = next_state
+                state = next_state
+            self.output_list[state] += (pattern_id,)
+
+        # Breadth first, so the failure state of every shorter suffix is known before we need it
+        state_queue = list(self.transition_list[0].values())
+        for state in state_queue:
+            for character, next_state in self.transition_list[state].items():
+                failure_state = self.failure_list[state]
+                while failure_state and character not in self.transition_list[failure_state]:
+                    failure_state = self.failure_list[failure_state]
+                failure_state = self.transition_list[failure_state].get(character, 0)
+                self.failure_list[next_state] = failure_state
+                self.output_list[next_state] += self.output_list[failure_state]
+                state_queue.append(next_state)
+
+    def find_items(self, text_to_search_lower_case):
+        """
+        :param text_to_search_lower_case:
+        :return: dict from item index (position in endorsement_list_light) to the first position it was found at
+        """
+        first_position_by_item_index = {}
+        transition_list = self.transition_list
+        failure_list = self.failure_list
+        output_list = self.output_list
+        text_length = len(text_to_search_lower_case)
+        state = 0
+        for end_position, character in enumerate(text_to_search_lower_case):
+            while state and character not in transition_list[state]:
+                state = failure_list[state]
+            state = transition_list[state].get(character, 0)
+            if not output_list[state]:
+                continue
+            for pattern_id in output_list[state]:
+                pattern = self.pattern_list[pattern_id]
+                start_position = end_position - len(pattern) + 1
+                if is_word_character(pattern[0]) and start_position > 0 \
+                        and is_word_character(text_to_search_lower_case[start_position - 1]):
+                    continue
+                if is_word_character(pattern[-1]) and end_position + 1 < text_length \
+                        and is_word_character(text_to_search_lower_case[end_position + 1]):
+                    continue
+                for item_index in self.item_index_list_by_pattern_id[pattern_id]:
+                    if item_index not in first_position_by_item_index:
+                        first_position_by_item_index[item_index] = start_position
+        return first_position_by_item_index
+
+
+def retrieve_endorsement_pattern_index(endorsement_list_light, item_kind):
+    """
+    The index is cached under a hash of every pattern in endorsement_list_light, so it is built once per snapshot and
+    rebuilt as soon as a candidate, measure or organization name, alternate name or website changes.
+    :param endorsement_list_light:
+    :param item_kind: ENDORSEMENT_ITEM_BALLOT_ITEM or ENDORSEMENT_ITEM_ORGANIZATION
+    :return: EndorsementPatternIndex
+    """
+    item_pattern_list = [
+        generate_endorsement_pattern_list(one_item_dict, item_kind) for one_item_dict in endorsement_list_light]
+    index_key = hashlib.md5(repr((item_kind, item_pattern_list)).encode('utf-8')).hexdigest()
+    with endorsement_pattern_index_cache_lock:
+        pattern_index = endorsement_pattern_index_cache.get(index_key)
+        if pattern_index is not None:
+            endorsement_pattern_index_cache.move_to_end(index_key)
+            return pattern_index
+
+    pattern_index = EndorsementPatternIndex(item_pattern_list)
+    with endorsement_pattern_index_cache_lock:
+        endorsement_pattern_index_cache[index_key] = pattern_index
+        while len(endorsement_pattern_index_cache) > ENDORSEMENT_PATTERN_INDEX_CACHE_SIZE:
+            endorsement_pattern_index_cache.popitem(last=False)
+    return pattern_index
+
+
+def find_endorsement_items_in_text(endorsement_list_light, text_to_search_lower_case, item_kind):
+    """
+    :return: the entries of endorsement_list_light found in the text, in the order they first appear
+    """
+    pattern_index = retrieve_endorsement_pattern_index(endorsement_list_light, item_kind)
+    first_position_by_item_index = pattern_index.find_items(text_to_search_lower_case)
+    return [endorsement_list_light[item_index] for item_index in sorted(
+        first_position_by_item_index, key=lambda item_index: (first_position_by_item_index[item_index], item_index))]
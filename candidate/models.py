@@ -322,6 +322,91 @@ class CandidateListManager(models.Manager):
         }
         return results
 
+    @staticmethod
+    def retrieve_all_candidates_for_office_list(office_we_vote_id_list=[], read_only=False):
+        """
+        Bulk version of retrieve_all_candidates_for_office. Retrieves the candidates for every office in
+        office_we_vote_id_list with two queries (one for the links, one for the candidates), instead of
+        two queries per office. Each office's list is ordered the same way retrieve_all_candidates_for_office orders it.
+        :param office_we_vote_id_list:
+        :param read_only:
+        :return:
+        """
+        candidate_list_by_office_dict = {}
+        candidate_to_office_link_list = []
+        status = ""
+        success = True
+
+        office_we_vote_id_list = [one_id for one_id in office_we_vote_id_list if positive_value_exists(one_id)]
+        if len(office_we_vote_id_list) == 0:
+            status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-MISSING_OFFICE_WE_VOTE_ID_LIST '
+            results = {
+                'success':                          False,
+                'status':                           status,
+                'candidate_list_by_office_dict':    candidate_list_by_office_dict,
+                'candidate_to_office_link_list':    candidate_to_office_link_list,
+            }
+            return results
+
+        candidate_list_manager = CandidateListManager()
+        link_results = candidate_list_manager.retrieve_candidate_to_office_link_list(
+            contest_office_we_vote_id_list=office_we_vote_id_list,
+            read_only=read_only)
+        if not positive_value_exists(link_results['success']):
+            status += link_results['status']
+            results = {
+                'success':                          False,
+                'status':                           status,
+                'candidate_list_by_office_dict':    candidate_list_by_office_dict,
+                'candidate_to_office_link_list':    candidate_to_office_link_list,
+            }
+            return results
+        candidate_to_office_link_list = link_results['candidate_to_office_link_list']
+
+        office_we_vote_id_list_by_candidate_dict = {}
+        for one_link in candidate_to_office_link_list:
+            if not positive_value_exists(one_link.candidate_we_vote_id):
+                continue
+            if one_link.candidate_we_vote_id not in office_we_vote_id_list_by_candidate_dict:
+                office_we_vote_id_list_by_candidate_dict[one_link.candidate_we_vote_id] = []
+            if one_link.contest_office_we_vote_id not in \
+                    office_we_vote_id_list_by_candidate_dict[one_link.candidate_we_vote_id]:
+                office_we_vote_id_list_by_candidate_dict[one_link.candidate_we_vote_id].append(
+                    one_link.contest_office_we_vote_id)
+
+        if len(office_we_vote_id_list_by_candidate_dict) > 0:
+            try:
+                if read_only:
+                    candidate_query = CandidateCampaign.objects.using('readonly').all()
+                else:
+                    candidate_query = CandidateCampaign.objects.all()
+                candidate_query = candidate_query.filter(
+                    we_vote_id__in=list(office_we_vote_id_list_by_candidate_dict.keys()))
+                candidate_query = candidate_query.exclude(do_not_display_on_ballot=True)
+                candidate_query = candidate_query.order_by('-twitter_followers_count')
+                # Because the candidates come back in one ordered list, appending them in order keeps each
+                #  office's list in the same order a per-office query would return
+                for candidate in candidate_query:
+                    for office_we_vote_id in office_we_vote_id_list_by_candidate_dict.get(candidate.we_vote_id, []):
+                        if office_we_vote_id not in candidate_list_by_office_dict:
+                            candidate_list_by_office_dict[office_we_vote_id] = []
+                        candidate_list_by_office_dict[office_we_vote_id].append(candidate)
+                status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-CANDIDATES_RETRIEVED '
+            except Exception as e:
+                handle_exception(e, logger=logger)
+                status += 'FAILED retrieve_all_candidates_for_office_list ' + str(e) + ' '
+                success = False
+        else:
+            status += 'RETRIEVE_ALL_CANDIDATES_FOR_OFFICE_LIST-NO_CANDIDATES_RETRIEVED '
+
+        results = {
+            'success':                          success,
+            'status':                           status,
+            'candidate_list_by_office_dict':    candidate_list_by_office_dict,
+            'candidate_to_office_link_list':    candidate_to_office_link_list,
+        }
+        return results
+
     @staticmethod
     def retrieve_candidate_list(
             candidate_id_list=None,
@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+
+from candidate.controllers_endorsement_scanner import ENDORSEMENT_ITEM_BALLOT_ITEM, ENDORSEMENT_ITEM_ORGANIZATION, \
+    find_endorsement_items_in_text
+
+
+class EndorsementScannerTestCase(SimpleTestCase):
+
+    @staticmethod
+    def find_candidate_names(candidate_name_list, text_to_search, alternate_names_by_name=None):
+        endorsement_list_light = [
+            {
+                'candidate_we_vote_id':     'wvtestcand' + str(number),
+                'ballot_item_display_name': candidate_name,
+                'alternate_names':          (alternate_names_by_name or {}).get(candidate_name, []),
+            }
+            for number, candidate_name in enumerate(candidate_name_list)]
+        return [one_item_dict['ballot_item_display_name'] for one_item_dict in find_endorsement_items_in_text(
+            endorsement_list_light, text_to_search.lower(), ENDORSEMENT_ITEM_BALLOT_ITEM)]
+
+    def test_overlapping_names(self):
+        # One name inside another, and two names sharing words, are all found
+        self.assertEqual(
+            self.find_candidate_names(['Smith', 'John Smith', 'Mary Ann', 'Ann Lee'],
+                                      "We endorse John Smith and Mary Ann Lee."),
+            ['John Smith', 'Smith', 'Mary Ann', 'Ann Lee'])
+        # A shorter name is found even where a longer one starts to match and then doesn't
+        self.assertEqual(self.find_candidate_names(['Ann Leeds', 'Lee'], "Ann Lee for council"), ['Lee'])
+
+    def test_prefix_names(self):
+        self.assertEqual(
+            self.find_candidate_names(['Prop 1', 'Prop 12', 'Ann', 'Anna'], "Yes on Prop 12, and vote for Anna"),
+            ['Prop 12', 'Anna'])
+        self.assertEqual(
+            self.find_candidate_names(['Prop 1', 'Prop 12'], "Yes on Prop 1."), ['Prop 1'])
+
+    def test_word_boundaries(self):
+        self.assertEqual(self.find_candidate_names(['Al', 'Tim'], "The total for Timothy"), [])
+        self.assertEqual(self.find_candidate_names(['Al', 'Tim'], "(Al) and tim_ are here"), ['Al'])
+        self.assertEqual(self.find_candidate_names(['Al'], "Al"), ['Al'])
+        # Names that start or end with punctuation can be found inside a word at that end
+        self.assertEqual(self.find_candidate_names(['Smith Jr.'], "smith jr.com"), ['Smith Jr.'])
+
+    def test_found_in_order_of_first_appearance(self):
+        self.assertEqual(
+            self.find_candidate_names(['Jane Doe', 'Bob Roe'], "Bob Roe, then Jane, then Bob Roe again",
+                                      alternate_names_by_name={'Jane Doe': ['Jane']}),
+            ['Bob Roe', 'Jane Doe'])
+
+    def test_organization_name_and_website(self):
+        endorsement_list_light = [
+            {'organization_we_vote_id': 'wvtestorg1', 'organization_name': 'Sierra Club',
+             'organization_website': 'https://www.sierraclub.org/'},
+            {'organization_we_vote_id': 'wvtestorg2', 'organization_name': 'Club'},
+            {'organization_we_vote_id': '', 'organization_name': 'Skipped Without Id'},
+        ]
+        found_list = find_endorsement_items_in_text(
+            endorsement_list_light, "see sierraclub.org and skipped without id", ENDORSEMENT_ITEM_ORGANIZATION)
+        self.assertEqual([one_item_dict['organization_we_vote_id'] for one_item_dict in found_list], ['wvtestorg1'])
+
+    def test_changed_name_rebuilds_index(self):
+        self.assertEqual(self.find_candidate_names(['Jane Doe'], "vote jane roe"), [])
+        self.assertEqual(self.find_candidate_names(['Jane Roe'], "vote jane roe"), ['Jane Roe'])
@@ -43,7 +43,8 @@ from measure.models import ContestMeasure
 from office.controllers import office_create_from_office_held
 from office.models import ContestOffice, ContestOfficeManager
 from office_held.models import OfficeHeld
-from politician.controllers_generate_color import generate_background, validate_hex
+from politician.controllers_generate_color import generate_background, \
+    update_profile_image_background_color_list, validate_hex
 from politician.models import Politician, PoliticianManager
 from position.models import PositionEntered, PositionListManager
 from representative.models import Representative
@@ -5783,18 +5784,10 @@ def update_profile_image_background_color_view_for_candidates(request):
     else:
         message += "{count:,} candidates need a background color for profile photo. ".format(count=candidate_list_count)
 
-    bulk_update_list = []
-    candidates_updated = 0
-    candidates_not_updated = 0
-    for candidate in candidate_list:
-        candidate.profile_image_background_color_needed = False
-        if positive_value_exists(candidate.we_vote_hosted_profile_image_url_large):
-            hex = generate_background(candidate)
-            candidate.profile_image_background_color = hex
-            candidates_updated += 1
-        else:
-            candidates_not_updated += 1
-        bulk_update_list.append(candidate)
+    background_color_results = update_profile_image_background_color_list(candidate_list)
+    candidates_updated = background_color_results['updated_count']
+    candidates_not_updated = background_color_results['not_updated_count']
+    bulk_update_list = candidate_list
     try:
         CandidateCampaign.objects.bulk_update(
             bulk_update_list,
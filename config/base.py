@@ -206,6 +206,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'wevote_social.middleware.SocialMiddleware',
+    'voter.middleware.VoterIdentityCacheMiddleware',
 ]
 
 AUTHENTICATION_BACKENDS = (
@@ -274,6 +275,22 @@ MEDIA_URL = '/media/'  # Django Cookbook
 MEDIA_ROOT = os.path.join(PROJECT_PATH, "static", "media")  # Django Cookbook
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'        # Added for Django 3.2, June 2021
 
+# The shared tier of the api_internal_cache response cache. Set SHARED_CACHE_LOCATION (i.e., "redis://host:6379/1")
+#  to share cached API responses between gunicorn workers and servers; otherwise each process keeps its own copy.
+SHARED_CACHE_LOCATION = get_environment_variable_default("SHARED_CACHE_LOCATION", "")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE_LOCATION,
+    } if SHARED_CACHE_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
 # We want to default to cookie storage of messages so we don't overload our app servers with session data
 MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
 
@@ -18,3 +18,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()  # Without Heroku
 # application = Cling(get_wsgi_application())  # For Heroku
+
+# Open the GeoLite2 database once per worker, instead of on the first voterLocationRetrieveFromIP request
+from geoip.controllers import open_geoip_reader_at_startup  # noqa: E402
+open_geoip_reader_at_startup()
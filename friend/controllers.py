@@ -9,6 +9,8 @@ from .models import ACCEPTED, CurrentFriend, FriendInvitationVoterLink, FriendMa
     FRIEND_INVITATIONS_PROCESSED, \
     FRIEND_INVITATIONS_SENT_BY_ME, FRIEND_INVITATIONS_SENT_TO_ME, FRIEND_INVITATIONS_WAITING_FOR_VERIFICATION, \
     IGNORE_SUGGESTION, MutualFriend, SuggestedFriend, SUGGESTED_FRIEND_LIST, UNFRIEND_CURRENT_FRIEND
+from .controllers_mutual_friend_graph import generate_mutual_friends_from_friend_graph, \
+    retrieve_mutual_friend_voter_values
 from config.base import get_environment_variable
 from email_outbound.controllers import schedule_email_with_email_outbound_description, schedule_verification_email
 from email_outbound.models import EmailAddress, EmailManager, EMAIL_SECRET_KEY_LENGTH, \
@@ -2682,78 +2684,14 @@ def friend_lists_all_for_api(voter_device_id,  # friendListsAll
     return results
 
 
-def generate_mutual_friends_for_all_voters():
-    total_mutual_friends_created_count = 0
-    total_mutual_friends_updated_count = 0
-    total_mutual_friends_update_suppressed_count = 0
-    status = ""
-    success = False
-
-    current_friend_queryset = CurrentFriend.objects.all()
-    current_friend_queryset = current_friend_queryset.order_by('-date_last_changed')
-    current_friend_list = list(current_friend_queryset)
-    # Loop through them CurrentFriend list
-    for one_current_friend in current_friend_list:
-        generate_results = generate_mutual_friends_for_current_friend(current_friend=one_current_friend)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    suggested_friend_queryset = SuggestedFriend.objects.all()
-    suggested_friend_queryset = suggested_friend_queryset.order_by('-date_last_changed')
-    suggested_friend_list = list(suggested_friend_queryset)
-    # Loop through them SuggestedFriend list
-    for one_suggested_friend in suggested_friend_list:
-        generate_results = generate_mutual_friends_for_suggested_friend(suggested_friend=one_suggested_friend)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    queryset = FriendInvitationVoterLink.objects.all()
-    queryset = queryset.filter(deleted=False)
-    queryset = queryset.order_by('-date_last_changed')
-    friend_invitation_voter_link_list = list(queryset)
-    # Loop through them SuggestedFriend list
-    for one_friend_invitation_voter_link in friend_invitation_voter_link_list:
-        generate_results = generate_mutual_friends_for_friend_invitation_voter_link(
-            friend_invitation_voter_link=one_friend_invitation_voter_link)
-        status += generate_results['status']
-        mutual_friends_created_count = generate_results['mutual_friends_created_count']
-        mutual_friends_updated_count = generate_results['mutual_friends_updated_count']
-        mutual_friends_update_suppressed_count = generate_results['mutual_friends_update_suppressed_count']
-        if positive_value_exists(mutual_friends_created_count):
-            total_mutual_friends_created_count += mutual_friends_created_count
-        if positive_value_exists(mutual_friends_updated_count):
-            total_mutual_friends_updated_count += mutual_friends_updated_count
-        if positive_value_exists(mutual_friends_update_suppressed_count):
-            total_mutual_friends_update_suppressed_count += mutual_friends_update_suppressed_count
-
-    if positive_value_exists(total_mutual_friends_created_count):
-        status += "created: " + str(total_mutual_friends_created_count) + " "
-    if positive_value_exists(total_mutual_friends_updated_count):
-        status += "updated: " + str(total_mutual_friends_updated_count) + " "
-    if positive_value_exists(total_mutual_friends_update_suppressed_count):
-        status += "update_suppressed: " + str(total_mutual_friends_update_suppressed_count) + " "
-
-    results = {
-        'success':                          success,
-        'status':                           status,
-    }
-    return results
+def generate_mutual_friends_for_all_voters(changed_since_last_run=False):
+    """
+    Regenerate MutualFriend for every CurrentFriend, SuggestedFriend and FriendInvitationVoterLink, from one
+    in-memory copy of the friend graph instead of two CurrentFriend queries per voter pair.
+    :param changed_since_last_run: only the voter pairs touched since the last run
+    :return:
+    """
+    return generate_mutual_friends_from_friend_graph(changed_since_last_run=changed_since_last_run)
 
 
 def generate_mutual_friends_for_one_voter(voter_we_vote_id='', update_existing_data=False):
@@ -3068,7 +3006,6 @@ def generate_mutual_friends_for_two_voters(
     mutual_friends_updated_count = 0
     status = ""
     success = True
-    voter_manager = VoterManager()
 
     # Retrieve list of MutualFriend entries already existing for this CurrentFriend entry,
     #  so we can avoid recreating one that already exists.
@@ -3098,6 +3035,18 @@ def generate_mutual_friends_for_two_voters(
             existing_mutual_friend_voter_we_vote_id_list.append(one_mutual_friend.mutual_friend_voter_we_vote_id)
             existing_mutual_friend_dict[one_mutual_friend.mutual_friend_voter_we_vote_id] = one_mutual_friend
 
+    # Retrieve the voters who are mutual friends in one query, so we can get the names and profile images
+    mutual_friend_voter_we_vote_id_list_to_save = [
+        one_mutual_friend_voter_we_vote_id
+        for one_mutual_friend_voter_we_vote_id in mutual_friends_voter_we_vote_id_list_from_current_friends
+        if positive_value_exists(update_existing_data) or
+        one_mutual_friend_voter_we_vote_id not in existing_mutual_friend_voter_we_vote_id_list]
+    try:
+        voter_values_by_we_vote_id = retrieve_mutual_friend_voter_values(mutual_friend_voter_we_vote_id_list_to_save)
+    except Exception as e:
+        status += "FAILED_RETRIEVING_MUTUAL_FRIEND_VOTERS: " + str(e) + " "
+        voter_values_by_we_vote_id = {}
+
     # Loop through all the friends that first_friend_voter_we_vote_id and second_friend_voter_we_vote_id share in common
     for one_mutual_friend_voter_we_vote_id in mutual_friends_voter_we_vote_id_list_from_current_friends:
         if one_mutual_friend_voter_we_vote_id in existing_mutual_friend_voter_we_vote_id_list:
@@ -3108,25 +3057,16 @@ def generate_mutual_friends_for_two_voters(
                 # If not updating existing data, move onto the next mutual friend
                 mutual_friends_update_suppressed_count += 1
                 continue
-        # Retrieve the voter who is the mutual friend, so we can get the name and profile image
-        voter_results = voter_manager.retrieve_voter_by_we_vote_id(one_mutual_friend_voter_we_vote_id)
-        if not voter_results['success'] or not voter_results['voter_found']:
+        if one_mutual_friend_voter_we_vote_id not in voter_values_by_we_vote_id:
             # If we can't retrieve the voter data for this mutual friend for any reason,
             #  go on to the next mutual friend
-            status += "FAILED_RETRIEVING_MUTUAL_FRIEND_VOTER: " + voter_results['status'] + " "
+            status += "FAILED_RETRIEVING_MUTUAL_FRIEND_VOTER: " + str(one_mutual_friend_voter_we_vote_id) + " "
             continue
-        mutual_friend_display_name = None
-        mutual_friend_display_name_exists = False
-        we_vote_hosted_profile_image_url_medium = None
-        mutual_friend_profile_image_exists = False
-
-        voter = voter_results['voter']
-        if positive_value_exists(voter.get_full_name(real_name_only=True)):
-            mutual_friend_display_name = voter.get_full_name(real_name_only=True)
-            mutual_friend_display_name_exists = True
-        if positive_value_exists(voter.we_vote_hosted_profile_image_url_medium):
-            we_vote_hosted_profile_image_url_medium = voter.we_vote_hosted_profile_image_url_medium
-            mutual_friend_profile_image_exists = True
+        voter_values = voter_values_by_we_vote_id[one_mutual_friend_voter_we_vote_id]
+        mutual_friend_display_name = voter_values['mutual_friend_display_name']
+        mutual_friend_display_name_exists = voter_values['mutual_friend_display_name_exists']
+        we_vote_hosted_profile_image_url_medium = voter_values['mutual_friend_we_vote_hosted_profile_image_url_medium']
+        mutual_friend_profile_image_exists = voter_values['mutual_friend_profile_image_exists']
 
         viewer_to_mutual_friend_friend_count = friend_manager.fetch_mutual_friends_count_from_current_friends(
             voter_we_vote_id=first_friend_voter_we_vote_id,
@@ -0,0 +1,365 @@
+# friend/controllers_mutual_friend_graph.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import datetime
+import json
+
+from django.db.models import Q
+from django.utils.timezone import localtime, now
+
+from .models import CurrentFriend, FriendInvitationVoterLink, MutualFriend, SuggestedFriend
+from voter.models import Voter
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+from wevote_settings.models import WeVoteSettingsManager
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+MUTUAL_FRIEND_GRAPH_CHUNK_SIZE = 1000
+MUTUAL_FRIEND_PREVIEW_LIST_MAXIMUM = 8
+# When the last generate_mutual_friends_from_friend_graph run started, so the next run can only look at what changed
+MUTUAL_FRIENDS_LAST_GENERATED_SETTING = 'mutual_friends_last_generated'
+MUTUAL_FRIEND_VOTER_FIELD_LIST = [
+    'mutual_friend_display_name', 'mutual_friend_display_name_exists',
+    'mutual_friend_we_vote_hosted_profile_image_url_medium', 'mutual_friend_profile_image_exists',
+    'viewer_to_mutual_friend_friend_count', 'viewee_to_mutual_friend_friend_count',
+]
+
+EMPTY_FRIEND_SET = frozenset()
+
+
+def generate_voter_pair_key(first_voter_we_vote_id, second_voter_we_vote_id):
+    # MutualFriend entries can be stored in either direction
+    if first_voter_we_vote_id < second_voter_we_vote_id:
+        return first_voter_we_vote_id, second_voter_we_vote_id
+    return second_voter_we_vote_id, first_voter_we_vote_id
+
+
+def retrieve_friend_we_vote_ids_by_voter():
+    """
+    The whole CurrentFriend graph in memory, as the set of friends of each voter.
+    """
+    friend_we_vote_ids_by_voter = {}
+    queryset = CurrentFriend.objects.using('readonly') \
+        .values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id')
+    for viewer_voter_we_vote_id, viewee_voter_we_vote_id in \
+            queryset.iterator(chunk_size=MUTUAL_FRIEND_GRAPH_CHUNK_SIZE):
+        if not positive_value_exists(viewer_voter_we_vote_id) or not positive_value_exists(viewee_voter_we_vote_id) \
+                or viewer_voter_we_vote_id == viewee_voter_we_vote_id:
+            continue
+        friend_we_vote_ids_by_voter.setdefault(viewer_voter_we_vote_id, set()).add(viewee_voter_we_vote_id)
+        friend_we_vote_ids_by_voter.setdefault(viewee_voter_we_vote_id, set()).add(viewer_voter_we_vote_id)
+    return friend_we_vote_ids_by_voter
+
+
+def generate_mutual_friend_values_for_voter_pairs(friend_we_vote_ids_by_voter, voter_pair_list):
+    """
+    Intersect the friend sets for every voter pair at once.
+    :param friend_we_vote_ids_by_voter: from retrieve_friend_we_vote_ids_by_voter
+    :param voter_pair_list: (viewer_voter_we_vote_id, viewee_voter_we_vote_id) tuples
+    :return: dict from voter pair key to the list of MutualFriend values for that pair
+    """
+    shared_friend_count_by_voter_pair = {}
+
+    def fetch_shared_friend_count(first_voter_we_vote_id, second_voter_we_vote_id):
+        voter_pair_key = generate_voter_pair_key(first_voter_we_vote_id, second_voter_we_vote_id)
+        if voter_pair_key not in shared_friend_count_by_voter_pair:
+            shared_friend_count_by_voter_pair[voter_pair_key] = len(
+                friend_we_vote_ids_by_voter.get(first_voter_we_vote_id, EMPTY_FRIEND_SET) &
+                friend_we_vote_ids_by_voter.get(second_voter_we_vote_id, EMPTY_FRIEND_SET))
+        return shared_friend_count_by_voter_pair[voter_pair_key]
+
+    mutual_friend_values_by_voter_pair = {}
+    for viewer_voter_we_vote_id, viewee_voter_we_vote_id in voter_pair_list:
+        voter_pair_key = generate_voter_pair_key(viewer_voter_we_vote_id, viewee_voter_we_vote_id)
+        if voter_pair_key in mutual_friend_values_by_voter_pair:
+            continue
+        mutual_friend_we_vote_id_set = \
+            friend_we_vote_ids_by_voter.get(viewer_voter_we_vote_id, EMPTY_FRIEND_SET) & \
+            friend_we_vote_ids_by_voter.get(viewee_voter_we_vote_id, EMPTY_FRIEND_SET)
+        mutual_friend_values_by_voter_pair[voter_pair_key] = [
+            {
+                'viewer_voter_we_vote_id':              viewer_voter_we_vote_id,
+                'viewee_voter_we_vote_id':              viewee_voter_we_vote_id,
+                'mutual_friend_voter_we_vote_id':       mutual_friend_voter_we_vote_id,
+                'viewer_to_mutual_friend_friend_count':
+                    fetch_shared_friend_count(viewer_voter_we_vote_id, mutual_friend_voter_we_vote_id),
+                'viewee_to_mutual_friend_friend_count':
+                    fetch_shared_friend_count(viewee_voter_we_vote_id, mutual_friend_voter_we_vote_id),
+            }
+            for mutual_friend_voter_we_vote_id in sorted(mutual_friend_we_vote_id_set)]
+    return mutual_friend_values_by_voter_pair
+
+
+def generate_mutual_friend_preview_list_serialized_from_values(mutual_friend_values_list):
+    """
+    The same preview list generate_mutual_friend_preview_list_serialized_for_two_voters builds from MutualFriend.
+    """
+    preview_values_list = [
+        mutual_friend_values for mutual_friend_values in mutual_friend_values_list
+        if mutual_friend_values['mutual_friend_display_name_exists'] or
+        mutual_friend_values['mutual_friend_profile_image_exists']]
+    preview_values_list.sort(
+        key=lambda mutual_friend_values: -(mutual_friend_values['viewer_to_mutual_friend_friend_count'] +
+                                           mutual_friend_values['viewee_to_mutual_friend_friend_count']))
+    mutual_friend_preview_list = [
+        {
+            "friend_display_name":      mutual_friend_values['mutual_friend_display_name'],
+            "friend_photo_url_medium":  mutual_friend_values['mutual_friend_we_vote_hosted_profile_image_url_medium'],
+        }
+        for mutual_friend_values in preview_values_list[:MUTUAL_FRIEND_PREVIEW_LIST_MAXIMUM]]
+    if len(mutual_friend_preview_list) > 0:
+        return json.dumps(mutual_friend_preview_list)
+    return None
+
+
+def retrieve_mutual_friend_voter_values(voter_we_vote_id_list):
+    voter_values_by_we_vote_id = {}
+    voter_we_vote_id_list = list(voter_we_vote_id_list)
+    for start in range(0, len(voter_we_vote_id_list), MUTUAL_FRIEND_GRAPH_CHUNK_SIZE):
+        queryset = Voter.objects.using('readonly').filter(
+            we_vote_id__in=voter_we_vote_id_list[start:start + MUTUAL_FRIEND_GRAPH_CHUNK_SIZE])
+        for voter in queryset:
+            mutual_friend_display_name = voter.get_full_name(real_name_only=True)
+            we_vote_hosted_profile_image_url_medium = voter.we_vote_hosted_profile_image_url_medium
+            voter_values_by_we_vote_id[voter.we_vote_id] = {
+                'mutual_friend_display_name':
+                    mutual_friend_display_name if positive_value_exists(mutual_friend_display_name) else None,
+                'mutual_friend_display_name_exists':    positive_value_exists(mutual_friend_display_name),
+                'mutual_friend_we_vote_hosted_profile_image_url_medium':
+                    we_vote_hosted_profile_image_url_medium
+                    if positive_value_exists(we_vote_hosted_profile_image_url_medium) else None,
+                'mutual_friend_profile_image_exists':
+                    positive_value_exists(we_vote_hosted_profile_image_url_medium),
+            }
+    return voter_values_by_we_vote_id
+
+
+def retrieve_rows_for_voters(queryset, first_field_name, second_field_name, voter_we_vote_id_set=None):
+    """
+    :param voter_we_vote_id_set: None for every row, otherwise only the rows with either voter in the set
+    """
+    if voter_we_vote_id_set is None:
+        return list(queryset)
+    row_by_id = {}
+    voter_we_vote_id_list = sorted(voter_we_vote_id_set)
+    for start in range(0, len(voter_we_vote_id_list), MUTUAL_FRIEND_GRAPH_CHUNK_SIZE):
+        voter_we_vote_id_chunk = voter_we_vote_id_list[start:start + MUTUAL_FRIEND_GRAPH_CHUNK_SIZE]
+        for row in queryset.filter(
+                Q(**{first_field_name + '__in': voter_we_vote_id_chunk}) |
+                Q(**{second_field_name + '__in': voter_we_vote_id_chunk})):
+            row_by_id[row.id] = row
+    return list(row_by_id.values())
+
+
+def retrieve_voters_with_deleted_friends_from_mutual_friends(friend_we_vote_ids_by_voter):
+    """
+    A deleted CurrentFriend leaves no row behind with a date_last_changed, however it was deleted. Each saved
+    MutualFriend says its mutual friend was a friend of both voters, so one of those friendships that is no longer in
+    the graph shows which voters lost a friend.
+    """
+    voter_we_vote_id_set = set()
+    queryset = MutualFriend.objects.using('readonly') \
+        .values_list('viewer_voter_we_vote_id', 'viewee_voter_we_vote_id', 'mutual_friend_voter_we_vote_id')
+    for viewer_voter_we_vote_id, viewee_voter_we_vote_id, mutual_friend_voter_we_vote_id in \
+            queryset.iterator(chunk_size=MUTUAL_FRIEND_GRAPH_CHUNK_SIZE):
+        for voter_we_vote_id in (viewer_voter_we_vote_id, viewee_voter_we_vote_id):
+            friend_we_vote_id_set = friend_we_vote_ids_by_voter.get(voter_we_vote_id, EMPTY_FRIEND_SET)
+            if mutual_friend_voter_we_vote_id not in friend_we_vote_id_set:
+                voter_we_vote_id_set.update((voter_we_vote_id, mutual_friend_voter_we_vote_id))
+    return voter_we_vote_id_set
+
+
+def generate_mutual_friends_from_friend_graph(changed_since_last_run=False):
+    """
+    Regenerate MutualFriend, and the mutual_friend_count and mutual_friend_preview_list_serialized on
+    CurrentFriend, SuggestedFriend and FriendInvitationVoterLink, from the friend graph held in memory.
+    Only the entries that differ from what is saved are written, in bulk.
+    :param changed_since_last_run: only recalculate the voter pairs with a voter whose friends (or whose
+        friends' friends) changed since the last run. Name and photo changes are picked up by a full run.
+        Deleted friendships are found from the MutualFriend entries that relied on them.
+    :return:
+    """
+    status = ""
+    success = True
+    run_started = now()
+    today = localtime(run_started).date()  # We Vote uses Pacific Time
+    we_vote_settings_manager = WeVoteSettingsManager()
+
+    friend_we_vote_ids_by_voter = retrieve_friend_we_vote_ids_by_voter()
+
+    # (model, queryset, viewer field, viewee field) for the entries that show mutual friends
+    friend_source_list = [
+        (CurrentFriend, CurrentFriend.objects.all(), 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'),
+        (SuggestedFriend, SuggestedFriend.objects.all(), 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id'),
+        (FriendInvitationVoterLink, FriendInvitationVoterLink.objects.filter(deleted=False),
+         'sender_voter_we_vote_id', 'recipient_voter_we_vote_id'),
+    ]
+
+    affected_voter_we_vote_id_set = None
+    if changed_since_last_run:
+        last_generated = we_vote_settings_manager.fetch_setting(MUTUAL_FRIENDS_LAST_GENERATED_SETTING)
+        if positive_value_exists(last_generated):
+            changed_voter_we_vote_id_set = set()
+            for friend_model, queryset, first_field_name, second_field_name in friend_source_list:
+                # Unfriending deletes the CurrentFriend, but also updates the SuggestedFriend for the pair
+                changed_queryset = friend_model.objects.filter(
+                    date_last_changed__gte=datetime.fromisoformat(last_generated))
+                for voter_we_vote_id_pair in changed_queryset.values_list(first_field_name, second_field_name):
+                    changed_voter_we_vote_id_set.update(voter_we_vote_id_pair)
+            changed_voter_we_vote_id_set.update(
+                retrieve_voters_with_deleted_friends_from_mutual_friends(friend_we_vote_ids_by_voter))
+            affected_voter_we_vote_id_set = set(changed_voter_we_vote_id_set)
+            for voter_we_vote_id in changed_voter_we_vote_id_set:
+                affected_voter_we_vote_id_set.update(friend_we_vote_ids_by_voter.get(voter_we_vote_id, ()))
+            affected_voter_we_vote_id_set.discard(None)
+            affected_voter_we_vote_id_set.discard('')
+            status += "MUTUAL_FRIEND_GRAPH_VOTERS_AFFECTED: " + str(len(affected_voter_we_vote_id_set)) + " "
+        else:
+            status += "MUTUAL_FRIEND_GRAPH_NO_PREVIOUS_RUN "
+
+    friend_row_list_by_model = {}
+    voter_pair_list = []
+    for friend_model, queryset, first_field_name, second_field_name in friend_source_list:
+        queryset = queryset.only(
+            'id', first_field_name, second_field_name, 'mutual_friend_count', 'mutual_friend_count_last_updated',
+            'mutual_friend_preview_list_serialized', 'mutual_friend_preview_list_update_needed')
+        friend_row_list = []
+        for row in retrieve_rows_for_voters(
+                queryset, first_field_name, second_field_name, affected_voter_we_vote_id_set):
+            first_voter_we_vote_id = getattr(row, first_field_name)
+            second_voter_we_vote_id = getattr(row, second_field_name)
+            if positive_value_exists(first_voter_we_vote_id) and positive_value_exists(second_voter_we_vote_id):
+                friend_row_list.append((row, first_voter_we_vote_id, second_voter_we_vote_id))
+                voter_pair_list.append((first_voter_we_vote_id, second_voter_we_vote_id))
+        friend_row_list_by_model[friend_model] = (friend_row_list, first_field_name, second_field_name)
+
+    mutual_friend_values_by_voter_pair = \
+        generate_mutual_friend_values_for_voter_pairs(friend_we_vote_ids_by_voter, voter_pair_list)
+    mutual_friend_count_by_voter_pair = {
+        voter_pair_key: len(mutual_friend_values_list)
+        for voter_pair_key, mutual_friend_values_list in mutual_friend_values_by_voter_pair.items()}
+
+    # Add the name and photo of each mutual friend. Like before, we skip mutual friends we can't retrieve.
+    voter_values_by_we_vote_id = retrieve_mutual_friend_voter_values(set(
+        mutual_friend_values['mutual_friend_voter_we_vote_id']
+        for mutual_friend_values_list in mutual_friend_values_by_voter_pair.values()
+        for mutual_friend_values in mutual_friend_values_list))
+    for voter_pair_key, mutual_friend_values_list in mutual_friend_values_by_voter_pair.items():
+        mutual_friend_values_by_voter_pair[voter_pair_key] = [
+            dict(mutual_friend_values, **voter_values_by_we_vote_id[mutual_friend_voter_we_vote_id])
+            for mutual_friend_values in mutual_friend_values_list
+            for mutual_friend_voter_we_vote_id in [mutual_friend_values['mutual_friend_voter_we_vote_id']]
+            if mutual_friend_voter_we_vote_id in voter_values_by_we_vote_id]
+
+    # Compare with the MutualFriend entries we have now
+    existing_mutual_friend_by_key = {}
+    mutual_friend_id_list_to_delete = []
+    for mutual_friend in retrieve_rows_for_voters(
+            MutualFriend.objects.all(), 'viewer_voter_we_vote_id', 'viewee_voter_we_vote_id',
+            affected_voter_we_vote_id_set):
+        mutual_friend_key = (
+            generate_voter_pair_key(mutual_friend.viewer_voter_we_vote_id or '',
+                                    mutual_friend.viewee_voter_we_vote_id or ''),
+            mutual_friend.mutual_friend_voter_we_vote_id)
+        if mutual_friend_key in existing_mutual_friend_by_key:
+            mutual_friend_id_list_to_delete.append(mutual_friend.id)
+        else:
+            existing_mutual_friend_by_key[mutual_friend_key] = mutual_friend
+
+    mutual_friend_list_to_create = []
+    mutual_friend_list_to_update = []
+    for voter_pair_key, mutual_friend_values_list in mutual_friend_values_by_voter_pair.items():
+        for mutual_friend_values in mutual_friend_values_list:
+            mutual_friend = existing_mutual_friend_by_key.pop(
+                (voter_pair_key, mutual_friend_values['mutual_friend_voter_we_vote_id']), None)
+            if mutual_friend is None:
+                mutual_friend_list_to_create.append(MutualFriend(**mutual_friend_values))
+                continue
+            if mutual_friend.viewer_voter_we_vote_id != mutual_friend_values['viewer_voter_we_vote_id']:
+                # Saved the other way around, so the viewer and viewee counts trade places
+                mutual_friend_values = dict(
+                    mutual_friend_values,
+                    viewer_to_mutual_friend_friend_count=mutual_friend_values['viewee_to_mutual_friend_friend_count'],
+                    viewee_to_mutual_friend_friend_count=mutual_friend_values['viewer_to_mutual_friend_friend_count'])
+            change_to_save = False
+            for field_name in MUTUAL_FRIEND_VOTER_FIELD_LIST:
+                if getattr(mutual_friend, field_name) != mutual_friend_values[field_name]:
+                    setattr(mutual_friend, field_name, mutual_friend_values[field_name])
+                    change_to_save = True
+            if change_to_save:
+                mutual_friend.date_last_changed = run_started
+                mutual_friend_list_to_update.append(mutual_friend)
+    # Whatever is left is no longer a mutual friend, or is for a pair that isn't connected any more
+    mutual_friend_id_list_to_delete += [mutual_friend.id for mutual_friend in existing_mutual_friend_by_key.values()]
+
+    try:
+        MutualFriend.objects.bulk_create(mutual_friend_list_to_create, batch_size=MUTUAL_FRIEND_GRAPH_CHUNK_SIZE)
+        MutualFriend.objects.bulk_update(
+            mutual_friend_list_to_update, MUTUAL_FRIEND_VOTER_FIELD_LIST + ['date_last_changed'],
+            batch_size=MUTUAL_FRIEND_GRAPH_CHUNK_SIZE)
+        for start in range(0, len(mutual_friend_id_list_to_delete), MUTUAL_FRIEND_GRAPH_CHUNK_SIZE):
+            MutualFriend.objects.filter(
+                id__in=mutual_friend_id_list_to_delete[start:start + MUTUAL_FRIEND_GRAPH_CHUNK_SIZE]).delete()
+    except Exception as e:
+        success = False
+        status += "MUTUAL_FRIEND_GRAPH_SAVE_FAILED: " + str(e) + " "
+
+    friend_rows_updated_count = 0
+    if success:
+        for friend_model, (friend_row_list, first_field_name, second_field_name) in friend_row_list_by_model.items():
+            friend_row_list_to_update = []
+            for row, first_voter_we_vote_id, second_voter_we_vote_id in friend_row_list:
+                voter_pair_key = generate_voter_pair_key(first_voter_we_vote_id, second_voter_we_vote_id)
+                change_to_save = False
+                mutual_friend_count = mutual_friend_count_by_voter_pair[voter_pair_key]
+                if not positive_value_exists(mutual_friend_count) and row.mutual_friend_count is None:
+                    pass
+                elif row.mutual_friend_count != mutual_friend_count:
+                    row.mutual_friend_count = mutual_friend_count
+                    row.mutual_friend_count_last_updated = today
+                    change_to_save = True
+                mutual_friend_preview_list_serialized = generate_mutual_friend_preview_list_serialized_from_values(
+                    mutual_friend_values_by_voter_pair[voter_pair_key])
+                if not positive_value_exists(mutual_friend_preview_list_serialized) and \
+                        row.mutual_friend_preview_list_serialized is None:
+                    pass
+                elif row.mutual_friend_preview_list_serialized != mutual_friend_preview_list_serialized:
+                    row.mutual_friend_preview_list_serialized = mutual_friend_preview_list_serialized
+                    row.mutual_friend_preview_list_update_needed = False
+                    change_to_save = True
+                if change_to_save:
+                    friend_row_list_to_update.append(row)
+            try:
+                friend_model.objects.bulk_update(
+                    friend_row_list_to_update,
+                    ['mutual_friend_count', 'mutual_friend_count_last_updated',
+                     'mutual_friend_preview_list_serialized', 'mutual_friend_preview_list_update_needed'],
+                    batch_size=MUTUAL_FRIEND_GRAPH_CHUNK_SIZE)
+                friend_rows_updated_count += len(friend_row_list_to_update)
+            except Exception as e:
+                success = False
+                status += "MUTUAL_FRIEND_GRAPH_" + friend_model.__name__ + "_SAVE_FAILED: " + str(e) + " "
+
+    if success:
+        we_vote_settings_manager.save_setting(MUTUAL_FRIENDS_LAST_GENERATED_SETTING, run_started.isoformat())
+
+    status += "voter_pairs: " + str(len(mutual_friend_values_by_voter_pair)) + " "
+    if positive_value_exists(len(mutual_friend_list_to_create)):
+        status += "created: " + str(len(mutual_friend_list_to_create)) + " "
+    if positive_value_exists(len(mutual_friend_list_to_update)):
+        status += "updated: " + str(len(mutual_friend_list_to_update)) + " "
+    if positive_value_exists(len(mutual_friend_id_list_to_delete)):
+        status += "deleted: " + str(len(mutual_friend_id_list_to_delete)) + " "
+
+    results = {
+        'success':                          success,
+        'status':                           status,
+        'voter_pair_count':                 len(mutual_friend_values_by_voter_pair),
+        'mutual_friends_created_count':     len(mutual_friend_list_to_create),
+        'mutual_friends_updated_count':     len(mutual_friend_list_to_update),
+        'mutual_friends_deleted_count':     len(mutual_friend_id_list_to_delete),
+        'friend_rows_updated_count':        friend_rows_updated_count,
+    }
+    return results
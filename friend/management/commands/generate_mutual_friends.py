@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from friend.controllers_mutual_friend_graph import generate_mutual_friends_from_friend_graph
+
+
+class Command(BaseCommand):
+    help = 'Regenerates MutualFriend and the mutual friend counts and preview lists from the friend graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changed-since-last-run', action='store_true',
+                            help='Only recalculate the voter pairs touched since the last run')
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        results = generate_mutual_friends_from_friend_graph(
+            changed_since_last_run=options['changed_since_last_run'])
+        self.stdout.write("{status}in {seconds:.1f} seconds".format(
+            status=results['status'], seconds=time.perf_counter() - start_time))
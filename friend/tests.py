@@ -0,0 +1,95 @@
+import json
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from friend.controllers_mutual_friend_graph import generate_mutual_friend_preview_list_serialized_from_values, \
+    generate_mutual_friend_values_for_voter_pairs, generate_mutual_friends_from_friend_graph, generate_voter_pair_key
+from friend.models import CurrentFriend, MutualFriend
+from voter.models import Voter
+
+
+class MutualFriendGraphTestCase(SimpleTestCase):
+
+    def setUp(self):
+        # a-b, a-c, a-d, b-c, b-d, c-d form a clique, and e is only friends with a
+        self.friend_we_vote_ids_by_voter = {}
+        for first, second in [('a', 'b'), ('a', 'c'), ('a', 'd'), ('b', 'c'), ('b', 'd'), ('c', 'd'), ('a', 'e')]:
+            self.friend_we_vote_ids_by_voter.setdefault(first, set()).add(second)
+            self.friend_we_vote_ids_by_voter.setdefault(second, set()).add(first)
+
+    def test_mutual_friends_and_counts(self):
+        mutual_friend_values_by_voter_pair = generate_mutual_friend_values_for_voter_pairs(
+            self.friend_we_vote_ids_by_voter, [('a', 'b'), ('b', 'a'), ('e', 'b'), ('a', 'zz')])
+        # Both directions of a pair are calculated once
+        self.assertEqual(len(mutual_friend_values_by_voter_pair), 3)
+        mutual_friend_values_list = mutual_friend_values_by_voter_pair[generate_voter_pair_key('b', 'a')]
+        self.assertEqual([values['mutual_friend_voter_we_vote_id'] for values in mutual_friend_values_list],
+                         ['c', 'd'])
+        # a and c share b and d; b and c share a and d
+        self.assertEqual(mutual_friend_values_list[0]['viewer_to_mutual_friend_friend_count'], 2)
+        self.assertEqual(mutual_friend_values_list[0]['viewee_to_mutual_friend_friend_count'], 2)
+        self.assertEqual([values['mutual_friend_voter_we_vote_id']
+                          for values in mutual_friend_values_by_voter_pair[generate_voter_pair_key('e', 'b')]], ['a'])
+        self.assertEqual(mutual_friend_values_by_voter_pair[generate_voter_pair_key('a', 'zz')], [])
+
+    def test_preview_list_skips_friends_without_name_or_photo(self):
+        mutual_friend_values_list = [
+            {'mutual_friend_display_name': 'Low Count', 'mutual_friend_display_name_exists': True,
+             'mutual_friend_we_vote_hosted_profile_image_url_medium': None, 'mutual_friend_profile_image_exists': False,
+             'viewer_to_mutual_friend_friend_count': 1, 'viewee_to_mutual_friend_friend_count': 1},
+            {'mutual_friend_display_name': None, 'mutual_friend_display_name_exists': False,
+             'mutual_friend_we_vote_hosted_profile_image_url_medium': None, 'mutual_friend_profile_image_exists': False,
+             'viewer_to_mutual_friend_friend_count': 9, 'viewee_to_mutual_friend_friend_count': 9},
+            {'mutual_friend_display_name': 'High Count', 'mutual_friend_display_name_exists': True,
+             'mutual_friend_we_vote_hosted_profile_image_url_medium': 'https://example.com/high.jpg',
+             'mutual_friend_profile_image_exists': True,
+             'viewer_to_mutual_friend_friend_count': 3, 'viewee_to_mutual_friend_friend_count': 4},
+        ]
+        preview_list = json.loads(generate_mutual_friend_preview_list_serialized_from_values(mutual_friend_values_list))
+        self.assertEqual([one_friend['friend_display_name'] for one_friend in preview_list],
+                         ['High Count', 'Low Count'])
+        self.assertIsNone(generate_mutual_friend_preview_list_serialized_from_values(mutual_friend_values_list[1:2]))
+
+
+# Inheriting from TransactionTestCase lets the friend graph, read from 'readonly', see the friends saved here
+class GenerateMutualFriendsTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        for letter in 'abcde':
+            Voter.objects.create(we_vote_id='wvtest' + letter, first_name='Voter', last_name=letter.upper())
+        # c and d are mutual friends of a and b. a and c also share e, which b doesn't know.
+        for first, second in [('a', 'b'), ('a', 'c'), ('b', 'c'), ('a', 'd'), ('b', 'd'), ('a', 'e'), ('c', 'e')]:
+            CurrentFriend.objects.create(viewer_voter_we_vote_id='wvtest' + first,
+                                         viewee_voter_we_vote_id='wvtest' + second)
+        self.assertTrue(generate_mutual_friends_from_friend_graph()['success'])
+
+    def test_entry_saved_in_other_direction_keeps_its_counts(self):
+        mutual_friend = MutualFriend.objects.get(viewer_voter_we_vote_id='wvtesta', viewee_voter_we_vote_id='wvtestb',
+                                                 mutual_friend_voter_we_vote_id='wvtestc')
+        # a and c share b and e, b and c share a
+        self.assertEqual(mutual_friend.viewer_to_mutual_friend_friend_count, 2)
+        self.assertEqual(mutual_friend.viewee_to_mutual_friend_friend_count, 1)
+        mutual_friend.viewer_voter_we_vote_id = 'wvtestb'
+        mutual_friend.viewee_voter_we_vote_id = 'wvtesta'
+        mutual_friend.viewer_to_mutual_friend_friend_count = 1
+        mutual_friend.viewee_to_mutual_friend_friend_count = 2
+        mutual_friend.save()
+
+        results = generate_mutual_friends_from_friend_graph()
+        self.assertEqual(results['mutual_friends_updated_count'], 0)
+        mutual_friend.refresh_from_db()
+        self.assertEqual(mutual_friend.viewer_to_mutual_friend_friend_count, 1)
+        self.assertEqual(mutual_friend.viewee_to_mutual_friend_friend_count, 2)
+
+    def test_changed_since_last_run_finds_deleted_friend(self):
+        self.assertEqual(CurrentFriend.objects.get(
+            viewer_voter_we_vote_id='wvtesta', viewee_voter_we_vote_id='wvtestb').mutual_friend_count, 2)
+        # Not through unfriending, so no other entry for the pair is changed
+        CurrentFriend.objects.filter(viewer_voter_we_vote_id='wvtesta', viewee_voter_we_vote_id='wvtestd').delete()
+
+        results = generate_mutual_friends_from_friend_graph(changed_since_last_run=True)
+        self.assertTrue(results['success'])
+        self.assertFalse(MutualFriend.objects.filter(mutual_friend_voter_we_vote_id='wvtestd').exists())
+        self.assertEqual(CurrentFriend.objects.get(
+            viewer_voter_we_vote_id='wvtesta', viewee_voter_we_vote_id='wvtestb').mutual_friend_count, 1)
@@ -83,7 +83,9 @@ def generate_mutual_friends_for_all_voters_view(request):
     if not voter_has_authority(request, authority_required):
         return redirect_to_sign_in_page(request, authority_required)
 
-    results = generate_mutual_friends_for_all_voters()
+    changed_since_last_run = positive_value_exists(request.GET.get('changed_since_last_run', False))
+
+    results = generate_mutual_friends_for_all_voters(changed_since_last_run=changed_since_last_run)
     status += results['status']
     messages.add_message(request, messages.INFO, 'status: ' + str(status))
 
@@ -2,15 +2,130 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from collections import Counter, OrderedDict
+import ipaddress
 import sys
-from ipaddress import IPv4Address
+from threading import Lock
+
 import geoip2.database
+import geoip2.errors
 import wevote_functions.admin
 from config.base import get_environment_variable_default
 from wevote_functions.functions import get_ip_from_headers, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+GEOLITE2_DATABASE_LOCATION = get_environment_variable_default(
+    'GEOLITE2_DATABASE_LOCATION', 'geoip2/city-db/GeoLite2-City.mmdb')
+GEOIP_CACHE_MAX_ENTRIES = 8192
+
+# One reader per process. MODE_MMAP lets the operating system share the database pages between workers.
+geoip_reader = None
+geoip_reader_lock = Lock()
+# Process-local LRU: the GeoLite2 network an address was found in -> location fields dict, or None when the
+# database has no location. GeoLite2 networks can be any size, so the cache remembers which (IP version, prefix
+# length) pairs it holds, and checks only those.
+geoip_location_cache = OrderedDict()
+geoip_location_cache_prefix_length_counts = Counter()
+geoip_location_cache_lock = Lock()
+
+
+def get_geoip_reader():
+    global geoip_reader
+    if geoip_reader is None:
+        with geoip_reader_lock:
+            if geoip_reader is None:
+                geoip_reader = geoip2.database.Reader(GEOLITE2_DATABASE_LOCATION, mode=geoip2.database.MODE_MMAP)
+    return geoip_reader
+
+
+def open_geoip_reader_at_startup():
+    # Called from config/wsgi.py, so the first request doesn't pay for opening the database
+    try:
+        get_geoip_reader()
+    except Exception as e:
+        logger.error("GEOIP_READER_COULD_NOT_BE_OPENED: " + str(e))
+
+
+def generate_geoip_location_cache_key(valid_ip_address, prefix_length):
+    network = ipaddress.ip_network(
+        "{ip}/{prefix_length}".format(ip=valid_ip_address, prefix_length=prefix_length), strict=False)
+    return str(network)
+
+
+def retrieve_location_fields_from_geoip_reader(valid_ip_address):
+    """
+    :return: tuple of (dict of location fields or None if this IP address isn't in the GeoLite2 database,
+        the GeoLite2 network the answer applies to, or None if the database didn't say)
+    """
+    try:
+        response = get_geoip_reader().city(str(valid_ip_address))
+    except geoip2.errors.AddressNotFoundError as e:
+        return None, e.network
+
+    location_fields = {
+        'voter_location':   '',
+        'city':             '',
+        'region':           '',  # could be state_code
+        'postal_code':      '',
+        'country_code':     '',
+    }
+    if response.city.name:
+        location_fields['city'] = response.city.name
+        location_fields['voter_location'] += response.city.name
+        if response.subdivisions.most_specific.iso_code or response.postal.code:
+            location_fields['voter_location'] += ', '
+    if response.subdivisions.most_specific.iso_code:
+        location_fields['region'] = response.subdivisions.most_specific.iso_code
+        location_fields['voter_location'] += response.subdivisions.most_specific.iso_code
+        if response.postal.code:
+            location_fields['voter_location'] += ' '
+    if response.postal.code:
+        location_fields['postal_code'] = response.postal.code
+        location_fields['voter_location'] += response.postal.code
+    if response.country.iso_code:
+        location_fields['country_code'] = response.country.iso_code
+    return location_fields, response.traits.network
+
+
+def retrieve_location_fields_from_ip(valid_ip_address):
+    """
+    Look up this address in the LRU of recently seen GeoLite2 networks, and only then walk the GeoLite2 tree.
+    :param valid_ip_address: IPv4Address or IPv6Address
+    :return: dict of location fields, or None if this IP address isn't in the GeoLite2 database
+    """
+    with geoip_location_cache_lock:
+        # Most specific network first, although GeoLite2 networks never overlap
+        for ip_version, prefix_length in sorted(geoip_location_cache_prefix_length_counts, reverse=True):
+            if ip_version != valid_ip_address.version:
+                continue
+            cache_key = generate_geoip_location_cache_key(valid_ip_address, prefix_length)
+            if cache_key in geoip_location_cache:
+                geoip_location_cache.move_to_end(cache_key)
+                return geoip_location_cache[cache_key]
+
+    location_fields, network = retrieve_location_fields_from_geoip_reader(valid_ip_address)
+    if network is None:
+        return location_fields
+    cache_key = str(network)
+    with geoip_location_cache_lock:
+        if cache_key not in geoip_location_cache:
+            geoip_location_cache_prefix_length_counts[(network.version, network.prefixlen)] += 1
+        geoip_location_cache[cache_key] = location_fields
+        while len(geoip_location_cache) > GEOIP_CACHE_MAX_ENTRIES:
+            evicted_network = ipaddress.ip_network(geoip_location_cache.popitem(last=False)[0])
+            evicted_prefix_length = (evicted_network.version, evicted_network.prefixlen)
+            geoip_location_cache_prefix_length_counts[evicted_prefix_length] -= 1
+            if geoip_location_cache_prefix_length_counts[evicted_prefix_length] <= 0:
+                del geoip_location_cache_prefix_length_counts[evicted_prefix_length]
+    return location_fields
+
+
+def clear_geoip_location_cache():
+    with geoip_location_cache_lock:
+        geoip_location_cache.clear()
+        geoip_location_cache_prefix_length_counts.clear()
+
 
 def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
     """
@@ -19,7 +134,7 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
     https://geoip2.readthedocs.io/en/latest/#city-database
     https://www.maxmind.com/en/geoip-demo
     :param request:
-    :param ip_address:
+    :param ip_address: IPv4 or IPv6
     :return:
     """
     x_forwarded_for = request.META.get('X-Forwarded-For')
@@ -29,12 +144,12 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
     value = ip_address
 
     try:
-        valid_ip_address = IPv4Address(value)
-    except:
+        valid_ip_address = ipaddress.ip_address(value)
+    except ValueError:
         value = get_ip_from_headers(request)
         try:
-            valid_ip_address = IPv4Address(value)
-        except:
+            valid_ip_address = ipaddress.ip_address(value)
+        except ValueError:
             # None of the IP addresses are valid
             response_content = {
                 'success':              False,
@@ -54,6 +169,7 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
 
     if valid_ip_address.is_private and 'test' not in sys.argv:
         value = '73.158.32.221'
+        valid_ip_address = ipaddress.ip_address(value)
         try:
             if 'only_log_ip_substitution_once' not in sys.argv:
                 sys.argv.append('only_log_ip_substitution_once')
@@ -61,75 +177,35 @@ def voter_location_retrieve_from_ip_for_api(request, ip_address=''):
         except Exception as e:
             pass
 
-    try:
-        database_location = get_environment_variable_default('GEOLITE2_DATABASE_LOCATION', 'geoip2/city-db/GeoLite2-City.mmdb')
-        reader = geoip2.database.Reader(database_location)
-        response = reader.city(value)
-
-    except geoip2.errors.AddressNotFoundError as e:
-        if 'test' not in sys.argv:
-            logger.error("voter_location_retrieve_from_ip_for_api ip " + value + " not found: " + str(e))
-
-        response_content = {
-            'success':              True,
-            'status':               'LOCATION_NOT_FOUND',
-            'voter_location_found': False,
-            'voter_location':       '',
-            'city':                 '',
-            'region':               '',
-            'postal_code':          '',
-            'country_code':         '',
-            'ip_address':           value,
-            'x_forwarded_for':      x_forwarded_for,
-            'http_x_forwarded_for': http_x_forwarded_for,
-        }
-
-        return response_content
-
-    voter_location = ''
-    city = ''
-    region = ''  # could be state_code
-    postal_code = ''
-    country_code = ''
     success = True
-    voter_location_found = False
     try:
-        if response.city.name:
-            city = response.city.name
-            voter_location += city
-            if response.subdivisions.most_specific.iso_code or response.postal.code:
-                voter_location += ', '
-        if response.subdivisions.most_specific.iso_code:
-            region = response.subdivisions.most_specific.iso_code
-            voter_location += region
-            if response.postal.code:
-                voter_location += ' '
-        if response.postal.code:
-            postal_code = response.postal.code
-            voter_location += postal_code
-        if response.country.iso_code:
-            country_code = response.country.iso_code
-        if positive_value_exists(voter_location):
-            status = 'LOCATION_FOUND'
-            voter_location_found = True
-        else:
-            status = 'IP_FOUND_BUT_LOCATION_NOT_RETURNED'
-            voter_location_found = False
-
+        location_fields = retrieve_location_fields_from_ip(valid_ip_address)
     except Exception as e:
         logger.error("voter_location_retrieve_from_ip_for_api ip " + value + " parse error: " + str(e))
         status = str(e)
         success = False
+        location_fields = None
+    else:
+        if location_fields is None:
+            if 'test' not in sys.argv:
+                logger.error("voter_location_retrieve_from_ip_for_api ip " + value + " not found")
+            status = 'LOCATION_NOT_FOUND'
+        elif positive_value_exists(location_fields['voter_location']):
+            status = 'LOCATION_FOUND'
+        else:
+            status = 'IP_FOUND_BUT_LOCATION_NOT_RETURNED'
 
+    if location_fields is None:
+        location_fields = {}
     response_content = {
         'success':              success,
         'status':               status,
-        'voter_location_found': voter_location_found,
-        'voter_location':       voter_location,
-        'city':                 city,
-        'region':               region,
-        'postal_code':          postal_code,
-        'country_code':         country_code,
+        'voter_location_found': positive_value_exists(location_fields.get('voter_location')),
+        'voter_location':       location_fields.get('voter_location', ''),
+        'city':                 location_fields.get('city', ''),
+        'region':               location_fields.get('region', ''),
+        'postal_code':          location_fields.get('postal_code', ''),
+        'country_code':         location_fields.get('country_code', ''),
         'ip_address':           value,
         'x_forwarded_for':      x_forwarded_for,
         'http_x_forwarded_for': http_x_forwarded_for,
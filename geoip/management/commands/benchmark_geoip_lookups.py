@@ -0,0 +1,51 @@
+import ipaddress
+import random
+import time
+
+import geoip2.database
+import geoip2.errors
+from django.core.management.base import BaseCommand
+
+from geoip.controllers import GEOLITE2_DATABASE_LOCATION, clear_geoip_location_cache, get_geoip_reader, \
+    retrieve_location_fields_from_geoip_reader, retrieve_location_fields_from_ip
+
+
+class Command(BaseCommand):
+    help = 'Measures GeoIP lookups per second: a new Reader per lookup (how we used to do it), ' \
+           'the shared memory-mapped Reader, and the shared Reader with the GeoLite2 network LRU.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=2000, help='Number of lookups for each approach')
+        parser.add_argument('--networks', type=int, default=200,
+                            help='Number of distinct /24 networks the addresses come from')
+
+    def handle(self, *args, **options):
+        number_of_lookups = options['lookups']
+        random.seed(42)
+        network_list = [
+            "{a}.{b}.{c}".format(a=random.randint(1, 223), b=random.randint(0, 255), c=random.randint(0, 255))
+            for _ in range(options['networks'])]
+        ip_address_list = [
+            ipaddress.ip_address("{network}.{d}".format(network=random.choice(network_list), d=random.randint(1, 254)))
+            for _ in range(number_of_lookups)]
+
+        def lookup_with_new_reader(valid_ip_address):
+            reader = geoip2.database.Reader(GEOLITE2_DATABASE_LOCATION)
+            try:
+                reader.city(str(valid_ip_address))
+            except geoip2.errors.AddressNotFoundError:
+                pass
+            reader.close()
+
+        get_geoip_reader()
+        clear_geoip_location_cache()
+        for label, lookup_function in [
+                ('New Reader per lookup', lookup_with_new_reader),
+                ('Shared MODE_MMAP Reader', retrieve_location_fields_from_geoip_reader),
+                ('Shared Reader + network LRU', retrieve_location_fields_from_ip)]:
+            start_time = time.perf_counter()
+            for valid_ip_address in ip_address_list:
+                lookup_function(valid_ip_address)
+            elapsed_seconds = time.perf_counter() - start_time
+            self.stdout.write("{label:30} {lookups_per_second:12,.0f} lookups/second".format(
+                label=label, lookups_per_second=number_of_lookups / elapsed_seconds))
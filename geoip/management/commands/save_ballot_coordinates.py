@@ -3,6 +3,7 @@ from django.core.management.base import BaseCommand
 from geopy.geocoders import get_geocoder_for_service
 from geopy.exc import GeocoderQuotaExceeded
 from ballot.models import BallotReturned
+from geoip.models import geocode_with_cache
 
 # GOOGLE_MAPS_API_KEY = get_environment_variable("GOOGLE_MAPS_API_KEY")
 
@@ -14,7 +15,7 @@ class Command(BaseCommand):
         for b in BallotReturned.objects.filter(latitude=None).order_by('id'):
             full_ballot_address = '{}, {}, {} {}'.format(
                 b.normalized_line1, b.normalized_city, b.normalized_state, b.normalized_zip)
-            location = self.google_client.geocode(full_ballot_address, sensor=False)
+            location = geocode_with_cache(self.google_client, full_ballot_address)
             if location is None:
                 raise Exception('Could not find a location for ballot {}'.format(b.id))
             b.latitude, b.longitude = location.latitude, location.longitude
@@ -1,3 +1,299 @@
+# geoip/models.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+from datetime import timedelta
+import json
+import sys
+from threading import Lock
+import time
+
+from django.core.cache import caches
 from django.db import models
+from django.utils.timezone import localtime, now
+from geopy.location import Location
+import usaddress
+
+from config.base import SHARED_CACHE_LOCATION
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists, STATE_CODE_MAP
+from wevote_functions.functions_date import DATE_FORMAT_YMD
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# Street addresses don't move, so we keep found locations for a long time
+GEOCODE_CACHE_FOUND_DAYS = 180
+# Addresses the geocoder couldn't find are retried sooner, in case the voter's typo is a new street
+GEOCODE_CACHE_NOT_FOUND_DAYS = 7
+# How long a worker trusts its in-memory copy before looking at the GeocodeCache table again
+GEOCODE_LOCAL_CACHE_TTL_SECONDS = 24 * 60 * 60
+GEOCODE_LOCAL_CACHE_MAX_ENTRIES = 4096
+GEOCODE_CACHE_COUNTER_TTL_SECONDS = 32 * 24 * 60 * 60
+
+GEOCODE_CACHE_LOCAL_HIT = 'local_hit'
+GEOCODE_CACHE_DATABASE_HIT = 'database_hit'
+GEOCODE_CACHE_MISS = 'miss'
+
+# Words are only abbreviated where usaddress labels them as one of these, so "East St" and "E St" stay different streets
+ADDRESS_DIRECTIONAL_ABBREVIATIONS = {
+    'east':         'e',
+    'north':        'n',
+    'northeast':    'ne',
+    'northwest':    'nw',
+    'south':        's',
+    'southeast':    'se',
+    'southwest':    'sw',
+    'west':         'w',
+}
+ADDRESS_STREET_TYPE_ABBREVIATIONS = {
+    'avenue':       'ave',
+    'boulevard':    'blvd',
+    'circle':       'cir',
+    'court':        'ct',
+    'drive':        'dr',
+    'highway':      'hwy',
+    'lane':         'ln',
+    'parkway':      'pkwy',
+    'place':        'pl',
+    'road':         'rd',
+    'street':       'st',
+    'terrace':      'ter',
+}
+ADDRESS_OCCUPANCY_TYPE_ABBREVIATIONS = {
+    'apartment':    'apt',
+    'suite':        'ste',
+}
+ADDRESS_ABBREVIATIONS_BY_LABEL = {
+    'OccupancyType':                ADDRESS_OCCUPANCY_TYPE_ABBREVIATIONS,
+    'StreetNamePostDirectional':    ADDRESS_DIRECTIONAL_ABBREVIATIONS,
+    'StreetNamePostType':           ADDRESS_STREET_TYPE_ABBREVIATIONS,
+    'StreetNamePreDirectional':     ADDRESS_DIRECTIONAL_ABBREVIATIONS,
+    'StreetNamePreType':            ADDRESS_STREET_TYPE_ABBREVIATIONS,
+}
+STATE_NAME_TO_STATE_CODE = {state_name.lower(): state_code.lower() for state_code, state_name in STATE_CODE_MAP.items()}
+
+# Process-local LRU: normalized_address -> (location or None, time stored)
+local_geocode_cache = OrderedDict()
+local_geocode_cache_lock = Lock()
+
+
+class GeocodeCache(models.Model):
+    """
+    One geocoder answer per normalized address, so we only ask Google about each address once.
+    """
+    normalized_address = models.CharField(max_length=255, unique=True)
+    # The first text we were asked to geocode for this normalized_address
+    text_for_map_search = models.TextField(null=True, blank=True)
+    location_found = models.BooleanField(default=False)
+    address = models.TextField(null=True, blank=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    # The geocoder's full response, which includes address_components
+    raw_serialized = models.TextField(null=True, blank=True)
+    date_cached = models.DateTimeField(null=True, auto_now=True, db_index=True)
+
+
+def normalize_address_for_geocode_cache(text_for_map_search=''):
+    """
+    Reduce an address to the form we cache it under, so that "1200 Broadway Avenue, Oakland, California 94612, USA"
+    and "1200 broadway ave oakland CA 94612" share one geocoder call.
+    :param text_for_map_search:
+    :return:
+    """
+    text_for_map_search = text_for_map_search.strip() if positive_value_exists(text_for_map_search) else ''
+    if not positive_value_exists(text_for_map_search):
+        return ''
+    try:
+        parsed_address = usaddress.parse(text_for_map_search)
+    except Exception as e:
+        parsed_address = [(one_word, '') for one_word in text_for_map_search.split()]
+
+    # Join multi-word state names like "New York" before looking up the state code
+    labeled_word_list = []
+    for one_word, label in parsed_address:
+        one_word = one_word.lower().strip(' ,.;#')
+        if not positive_value_exists(one_word) or label == 'CountryName' or one_word == 'usa':
+            continue
+        if label == 'StateName' and len(labeled_word_list) and labeled_word_list[-1][1] == 'StateName':
+            labeled_word_list[-1] = (labeled_word_list[-1][0] + ' ' + one_word, label)
+        else:
+            labeled_word_list.append((one_word, label))
+
+    normalized_word_list = []
+    for one_word, label in labeled_word_list:
+        if label == 'StateName':
+            one_word = STATE_NAME_TO_STATE_CODE.get(one_word, one_word)
+        elif label == 'ZipCode':
+            one_word = one_word[:5]
+        elif label in ADDRESS_ABBREVIATIONS_BY_LABEL:
+            one_word = ADDRESS_ABBREVIATIONS_BY_LABEL[label].get(one_word, one_word)
+        normalized_word_list.append(one_word)
+    return ' '.join(normalized_word_list)
+
+
+def is_geocode_cache_counter_on():
+    # Without SHARED_CACHE_LOCATION the shared cache is each worker's own memory, so the counts would only be one
+    #  worker's, and gone when it restarts
+    return positive_value_exists(SHARED_CACHE_LOCATION)
+
+
+def increment_geocode_cache_counter(counter_name=''):
+    if not is_geocode_cache_counter_on():
+        return
+    counter_key = "geocode_cache:{date}:{counter_name}".format(
+        date=localtime(now()).date().strftime(DATE_FORMAT_YMD),
+        counter_name=counter_name)
+    try:
+        caches['shared'].add(counter_key, 0, GEOCODE_CACHE_COUNTER_TTL_SECONDS)
+        caches['shared'].incr(counter_key)
+    except Exception as e:
+        logger.error("GEOCODE_CACHE_COUNTER_ERROR: " + str(e))
+
+
+def retrieve_geocode_cache_daily_summaries(days_to_display=15):
+    """
+    Hit rate of the geocode cache for each of the last days_to_display days, for the statistics summary page.
+    Only counted when the shared cache is Redis.
+    """
+    daily_summaries = []
+    if not is_geocode_cache_counter_on():
+        return daily_summaries
+    today = localtime(now()).date()
+    for days_ago in range(days_to_display):
+        date_string = (today - timedelta(days=days_ago)).strftime(DATE_FORMAT_YMD)
+        counter_key_list = [
+            "geocode_cache:{date}:{counter_name}".format(date=date_string, counter_name=counter_name)
+            for counter_name in [GEOCODE_CACHE_LOCAL_HIT, GEOCODE_CACHE_DATABASE_HIT, GEOCODE_CACHE_MISS]]
+        try:
+            counter_values = caches['shared'].get_many(counter_key_list)
+        except Exception as e:
+            logger.error("GEOCODE_CACHE_SUMMARY_ERROR: " + str(e))
+            counter_values = {}
+        local_hit_count = counter_values.get(counter_key_list[0], 0)
+        database_hit_count = counter_values.get(counter_key_list[1], 0)
+        miss_count = counter_values.get(counter_key_list[2], 0)
+        total_count = local_hit_count + database_hit_count + miss_count
+        if not positive_value_exists(total_count):
+            continue
+        daily_summaries.append({
+            'date_string':          date_string,
+            'local_hit_count':      local_hit_count,
+            'database_hit_count':   database_hit_count,
+            'miss_count':           miss_count,
+            'total_count':          total_count,
+            'hit_rate_percent':     round(100.0 * (local_hit_count + database_hit_count) / total_count, 1),
+        })
+    return daily_summaries
+
+
+def store_location_in_local_geocode_cache(normalized_address, location):
+    with local_geocode_cache_lock:
+        local_geocode_cache[normalized_address] = (location, time.monotonic())
+        local_geocode_cache.move_to_end(normalized_address)
+        while len(local_geocode_cache) > GEOCODE_LOCAL_CACHE_MAX_ENTRIES:
+            local_geocode_cache.popitem(last=False)
+
+
+def retrieve_location_from_local_geocode_cache(normalized_address):
+    """
+    :return: (location_cached, location). location is None for cached "not found" answers.
+    """
+    with local_geocode_cache_lock:
+        if normalized_address not in local_geocode_cache:
+            return False, None
+        location, time_stored = local_geocode_cache[normalized_address]
+        if time.monotonic() - time_stored > GEOCODE_LOCAL_CACHE_TTL_SECONDS:
+            del local_geocode_cache[normalized_address]
+            return False, None
+        local_geocode_cache.move_to_end(normalized_address)
+        return True, location
+
+
+def retrieve_location_from_geocode_cache_table(normalized_address):
+    """
+    :return: (location_cached, location). location is None for cached "not found" answers.
+    """
+    try:
+        if 'test' in sys.argv:
+            queryset = GeocodeCache.objects.all()
+        else:
+            queryset = GeocodeCache.objects.using('readonly').all()
+        geocode_cache = queryset.filter(normalized_address=normalized_address).first()
+    except Exception as e:
+        logger.error("GEOCODE_CACHE_RETRIEVE_ERROR: " + str(e))
+        return False, None
+    if geocode_cache is None:
+        return False, None
+
+    if geocode_cache.location_found:
+        if geocode_cache.date_cached < now() - timedelta(days=GEOCODE_CACHE_FOUND_DAYS):
+            return False, None
+        try:
+            raw = json.loads(geocode_cache.raw_serialized) if positive_value_exists(geocode_cache.raw_serialized) \
+                else {}
+        except Exception as e:
+            raw = {}
+        location = Location(geocode_cache.address, (geocode_cache.latitude, geocode_cache.longitude), raw)
+        return True, location
+    else:
+        if geocode_cache.date_cached < now() - timedelta(days=GEOCODE_CACHE_NOT_FOUND_DAYS):
+            return False, None
+        return True, None
+
+
+def store_location_in_geocode_cache_table(normalized_address, text_for_map_search, location):
+    try:
+        raw_serialized = json.dumps(location.raw) if location is not None and hasattr(location, 'raw') else ''
+    except Exception as e:
+        raw_serialized = ''
+    try:
+        GeocodeCache.objects.update_or_create(
+            normalized_address=normalized_address,
+            defaults={
+                'text_for_map_search':  text_for_map_search,
+                'location_found':       location is not None,
+                'address':              location.address if location is not None else None,
+                'latitude':             location.latitude if location is not None else None,
+                'longitude':            location.longitude if location is not None else None,
+                'raw_serialized':       raw_serialized,
+            })
+    except Exception as e:
+        logger.error("GEOCODE_CACHE_SAVE_ERROR: " + str(e))
+
+
+def geocode_with_cache(google_client, text_for_map_search='', timeout=None):
+    """
+    Drop-in replacement for google_client.geocode(text_for_map_search, sensor=False, timeout=timeout).
+    Answers come from this worker's memory, then the GeocodeCache table, and only then the geocoder.
+    Geocoder exceptions like GeocoderQuotaExceeded are raised to the caller as before, and are not cached.
+    :param google_client: from get_geocoder_for_service('google')
+    :param text_for_map_search:
+    :param timeout:
+    :return: geopy Location, or None if the geocoder could not find the address
+    """
+    geocode_kwargs = {'sensor': False}
+    if timeout is not None:
+        geocode_kwargs['timeout'] = timeout
+
+    normalized_address = normalize_address_for_geocode_cache(text_for_map_search)
+    if not positive_value_exists(normalized_address) or len(normalized_address) > 255:
+        increment_geocode_cache_counter(GEOCODE_CACHE_MISS)
+        return google_client.geocode(text_for_map_search, **geocode_kwargs)
+
+    location_cached, location = retrieve_location_from_local_geocode_cache(normalized_address)
+    if location_cached:
+        increment_geocode_cache_counter(GEOCODE_CACHE_LOCAL_HIT)
+        return location
+
+    location_cached, location = retrieve_location_from_geocode_cache_table(normalized_address)
+    if location_cached:
+        increment_geocode_cache_counter(GEOCODE_CACHE_DATABASE_HIT)
+        store_location_in_local_geocode_cache(normalized_address, location)
+        return location
 
-# Create your models here.
+    increment_geocode_cache_counter(GEOCODE_CACHE_MISS)
+    location = google_client.geocode(text_for_map_search, **geocode_kwargs)
+    store_location_in_geocode_cache_table(normalized_address, text_for_map_search, location)
+    store_location_in_local_geocode_cache(normalized_address, location)
+    return location
@@ -1,3 +1,156 @@
-from django.test import TestCase
+from collections import namedtuple
+import ipaddress
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import geoip2.errors
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from geoip.controllers import clear_geoip_location_cache, generate_geoip_location_cache_key, \
+    retrieve_location_fields_from_ip
+from geoip.models import GEOCODE_CACHE_LOCAL_HIT, GEOCODE_CACHE_MISS, GeocodeCache, geocode_with_cache, \
+    increment_geocode_cache_counter, local_geocode_cache, normalize_address_for_geocode_cache, \
+    retrieve_geocode_cache_daily_summaries
+
+Location = namedtuple('Location', ['address', 'latitude', 'longitude'])
+
+
+class GeocodeCacheTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        local_geocode_cache.clear()
+        self.google_client = mock.Mock()
+
+    def test_normalize_address(self):
+        self.assertEqual(
+            normalize_address_for_geocode_cache("1200 Broadway Avenue, Oakland, California 94612, USA"),
+            normalize_address_for_geocode_cache("1200 broadway ave oakland CA 94612-1234"))
+        self.assertNotEqual(
+            normalize_address_for_geocode_cache("1200 Broadway Avenue, Oakland, CA"),
+            normalize_address_for_geocode_cache("1201 Broadway Avenue, Oakland, CA"))
+        self.assertEqual(normalize_address_for_geocode_cache(''), '')
+
+    def test_normalize_address_only_abbreviates_directions_and_street_types(self):
+        self.assertNotEqual(normalize_address_for_geocode_cache("100 East St, Oakland, CA"),
+                            normalize_address_for_geocode_cache("100 E St, Oakland, CA"))
+        self.assertEqual(normalize_address_for_geocode_cache("100 North Main Street Apartment 4, Oakland, CA"),
+                         normalize_address_for_geocode_cache("100 N Main St Apt 4, Oakland, CA"))
+        self.assertEqual(normalize_address_for_geocode_cache("55 Main Street Northwest, Washington, DC"),
+                         normalize_address_for_geocode_cache("55 Main St NW, Washington, DC"))
+
+    def test_geocoder_called_once_for_equivalent_addresses(self):
+        self.google_client.geocode.return_value = Location(address='1200 Broadway, Oakland, CA 94612, USA',
+                                                           latitude=37.8030442, longitude=-122.2739699)
+        location = geocode_with_cache(self.google_client, "1200 Broadway Avenue, Oakland, CA 94612")
+        self.assertEqual(location.latitude, 37.8030442)
+        self.assertEqual(GeocodeCache.objects.count(), 1)
+
+        # From another worker: only the database copy is available
+        local_geocode_cache.clear()
+        location = geocode_with_cache(self.google_client, "1200 broadway ave, oakland, california 94612, USA")
+        self.assertEqual(location.longitude, -122.2739699)
+        self.assertEqual(location.address, '1200 Broadway, Oakland, CA 94612, USA')
+        self.assertEqual(self.google_client.geocode.call_count, 1)
+
+    def test_location_not_found_is_cached(self):
+        self.google_client.geocode.return_value = None
+        self.assertIsNone(geocode_with_cache(self.google_client, "qwzx plok, ZZ"))
+        self.assertIsNone(geocode_with_cache(self.google_client, "qwzx plok, ZZ"))
+        self.assertEqual(self.google_client.geocode.call_count, 1)
+        self.assertFalse(GeocodeCache.objects.get().location_found)
+
+    def test_geocoder_errors_are_not_cached(self):
+        self.google_client.geocode.side_effect = Exception("quota")
+        with self.assertRaises(Exception):
+            geocode_with_cache(self.google_client, "1200 Broadway Avenue, Oakland, CA 94612")
+        self.assertEqual(GeocodeCache.objects.count(), 0)
+
+
+class GeocodeCacheCounterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.addCleanup(caches['shared'].clear)
+
+    @staticmethod
+    def count_lookups():
+        for counter_name in [GEOCODE_CACHE_MISS, GEOCODE_CACHE_LOCAL_HIT, GEOCODE_CACHE_LOCAL_HIT, GEOCODE_CACHE_LOCAL_HIT]:
+            increment_geocode_cache_counter(counter_name)
+        return retrieve_geocode_cache_daily_summaries(days_to_display=1)
+
+    @mock.patch('geoip.models.SHARED_CACHE_LOCATION', 'redis://shared-cache:6379/1')
+    def test_counted_when_shared_cache_is_redis(self):
+        daily_summaries = self.count_lookups()
+        self.assertEqual(len(daily_summaries), 1)
+        self.assertEqual(daily_summaries[0]['total_count'], 4)
+        self.assertEqual(daily_summaries[0]['local_hit_count'], 3)
+        self.assertEqual(daily_summaries[0]['hit_rate_percent'], 75.0)
+
+    @mock.patch('geoip.models.SHARED_CACHE_LOCATION', '')
+    def test_not_counted_in_worker_memory(self):
+        self.assertEqual(self.count_lookups(), [])
+        with mock.patch('geoip.models.SHARED_CACHE_LOCATION', 'redis://shared-cache:6379/1'):
+            self.assertEqual(retrieve_geocode_cache_daily_summaries(days_to_display=1), [])
+
+
+class GeoipLocationCacheTestCase(SimpleTestCase):
+
+    @staticmethod
+    def generate_city_response(city_name, network):
+        return SimpleNamespace(
+            city=SimpleNamespace(name=city_name),
+            subdivisions=SimpleNamespace(most_specific=SimpleNamespace(iso_code='CA')),
+            postal=SimpleNamespace(code=None),
+            country=SimpleNamespace(iso_code='US'),
+            traits=SimpleNamespace(network=ipaddress.ip_network(network)))
+
+    def test_cache_key_is_network(self):
+        self.assertEqual(generate_geoip_location_cache_key(ipaddress.ip_address('69.181.21.132'), 25),
+                         '69.181.21.128/25')
+        self.assertEqual(generate_geoip_location_cache_key(ipaddress.ip_address('2001:4860:4860::8888'), 64),
+                         '2001:4860:4860::/64')
+
+    def test_ipv4_lookup_is_cached_only_within_the_geolite2_network(self):
+        clear_geoip_location_cache()
+        with mock.patch('geoip.controllers.get_geoip_reader') as mock_get_geoip_reader:
+            mock_city = mock_get_geoip_reader.return_value.city
+            mock_city.return_value = self.generate_city_response('San Francisco', '69.181.21.128/25')
+            location_fields = retrieve_location_fields_from_ip(ipaddress.ip_address('69.181.21.132'))
+            self.assertEqual(location_fields['voter_location'], 'San Francisco, CA')
+            self.assertEqual(retrieve_location_fields_from_ip(ipaddress.ip_address('69.181.21.200')), location_fields)
+            self.assertEqual(mock_city.call_count, 1)
+
+            # Same /24, but a different GeoLite2 network
+            mock_city.return_value = self.generate_city_response('Oakland', '69.181.21.0/25')
+            location_fields = retrieve_location_fields_from_ip(ipaddress.ip_address('69.181.21.7'))
+            self.assertEqual(location_fields['city'], 'Oakland')
+            self.assertEqual(mock_city.call_count, 2)
+
+    def test_ipv6_lookup_is_cached_only_within_the_geolite2_network(self):
+        clear_geoip_location_cache()
+        with mock.patch('geoip.controllers.get_geoip_reader') as mock_get_geoip_reader:
+            mock_city = mock_get_geoip_reader.return_value.city
+            mock_city.return_value = self.generate_city_response('Mountain View', '2001:4860:4860::/64')
+            location_fields = retrieve_location_fields_from_ip(ipaddress.ip_address('2001:4860:4860::8888'))
+            self.assertEqual(location_fields['city'], 'Mountain View')
+            self.assertEqual(retrieve_location_fields_from_ip(ipaddress.ip_address('2001:4860:4860::8844')),
+                             location_fields)
+            self.assertEqual(mock_city.call_count, 1)
+
+            # Same /48, but outside the /64
+            mock_city.return_value = self.generate_city_response('Reston', '2001:4860:4860:1::/64')
+            location_fields = retrieve_location_fields_from_ip(ipaddress.ip_address('2001:4860:4860:1::8888'))
+            self.assertEqual(location_fields['city'], 'Reston')
+            self.assertEqual(mock_city.call_count, 2)
+
+    def test_address_not_found_is_cached_for_its_network(self):
+        clear_geoip_location_cache()
+        with mock.patch('geoip.controllers.get_geoip_reader') as mock_get_geoip_reader:
+            mock_city = mock_get_geoip_reader.return_value.city
+            mock_city.side_effect = geoip2.errors.AddressNotFoundError(
+                "not in database", ip_address='0.2.1.1', prefix_len=8)
+            self.assertIsNone(retrieve_location_fields_from_ip(ipaddress.ip_address('0.2.1.1')))
+            self.assertIsNone(retrieve_location_fields_from_ip(ipaddress.ip_address('0.9.9.9')))
+            self.assertEqual(mock_city.call_count, 1)
@@ -0,0 +1,191 @@
+# googlebot_site_map/controllers.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import datetime, timezone
+import gzip
+from itertools import islice
+import math
+import os
+from xml.sax.saxutils import escape
+
+from config.base import get_environment_variable_default
+from googlebot_site_map import supplemental_urls
+from politician.models import Politician
+import wevote_functions.admin
+from wevote_functions.functions import is_private_directory, positive_value_exists
+from wevote_functions.functions_date import DATE_FORMAT_YMD
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+GOOGLEBOT_SITE_MAP_URLS_PER_MAP = 40000
+GOOGLEBOT_SITE_MAP_CHUNKS_PER_YIELD = 1000
+# The site map views serve whatever is here, so it has to be a directory only this user can write to
+#  (see is_private_directory). Without it, the views build each map from the database.
+GOOGLEBOT_SITE_MAP_DIRECTORY = get_environment_variable_default('GOOGLEBOT_SITE_MAP_DIRECTORY', '')
+GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME = 'sitemap_index.xml.gz'
+HTTPS_ROOT = "https://wevote.us/"
+SITE_MAP_XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def site_map_file_name(map_number):
+    return 'map{map_number}.xml.gz'.format(map_number=map_number)
+
+
+def retrieve_politician_site_map_queryset():
+    """
+    Only politicians with a seo_friendly_path, as (seo_friendly_path, date_last_updated) tuples. Each map holds the
+    next GOOGLEBOT_SITE_MAP_URLS_PER_MAP of these rows in id order.
+    """
+    return Politician.objects.using('readonly') \
+        .filter(seo_friendly_path__isnull=False).exclude(seo_friendly_path='') \
+        .order_by('id').values_list('seo_friendly_path', 'date_last_updated')
+
+
+def retrieve_site_map_count():
+    politician_count = retrieve_politician_site_map_queryset().count()
+    return max(1, math.ceil(politician_count / GOOGLEBOT_SITE_MAP_URLS_PER_MAP))
+
+
+def generate_url_xml(loc, lastmod=None):
+    chunk = '  <url>\n'
+    chunk += '    <loc>' + escape(loc) + '</loc>\n'
+    if lastmod:
+        chunk += '    <lastmod>' + lastmod.strftime(DATE_FORMAT_YMD) + '</lastmod>\n'
+    chunk += '  </url>\n'
+    return chunk
+
+
+def generate_site_map_xml(map_number, politician_row_iterator):
+    """
+    Yields the <urlset> for one map a block of urls at a time, so the whole map is never held in memory.
+    :param map_number: Map 0 also lists the supplemental_urls
+    :param politician_row_iterator: (seo_friendly_path, date_last_updated) tuples
+    """
+    yield SITE_MAP_XML_HEADER + '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    if map_number == 0:
+        yield ''.join(generate_url_xml(loc) for loc in supplemental_urls.crawlable_urls)
+    chunk_list = []
+    for seo_friendly_path, date_last_updated in politician_row_iterator:
+        chunk_list.append(generate_url_xml(HTTPS_ROOT + seo_friendly_path + "/-/", date_last_updated))
+        if len(chunk_list) >= GOOGLEBOT_SITE_MAP_CHUNKS_PER_YIELD:
+            yield ''.join(chunk_list)
+            chunk_list = []
+    yield ''.join(chunk_list) + '</urlset>\n'
+
+
+def generate_site_map_index_xml(map_count, lastmod_list=None):
+    xml = SITE_MAP_XML_HEADER + '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for map_number in range(map_count):
+        xml += '  <sitemap>\n'
+        xml += '    <loc>' + HTTPS_ROOT + 'map{map_number}.xml</loc>\n'.format(map_number=map_number)
+        if lastmod_list and lastmod_list[map_number]:
+            xml += '    <lastmod>' + lastmod_list[map_number].strftime(DATE_FORMAT_YMD) + '</lastmod>\n'
+        xml += '  </sitemap>\n'
+    xml += '</sitemapindex>\n'
+    return xml
+
+
+def stream_site_map_xml_from_database(map_number):
+    start = map_number * GOOGLEBOT_SITE_MAP_URLS_PER_MAP
+    queryset = retrieve_politician_site_map_queryset()[start:start + GOOGLEBOT_SITE_MAP_URLS_PER_MAP]
+    return generate_site_map_xml(map_number, queryset.iterator(chunk_size=GOOGLEBOT_SITE_MAP_CHUNKS_PER_YIELD))
+
+
+def write_gzip_file(file_name, text_iterator, site_map_directory=GOOGLEBOT_SITE_MAP_DIRECTORY):
+    # Write next to the live file and swap it in, so a crawler never gets half a file
+    file_path = os.path.join(site_map_directory, file_name)
+    temporary_file_path = file_path + '.' + str(os.getpid())
+    with gzip.open(temporary_file_path, 'wt', encoding='utf-8') as site_map_file:
+        for text in text_iterator:
+            site_map_file.write(text)
+    os.replace(temporary_file_path, file_path)
+
+
+def precompute_googlebot_site_map_files(site_map_directory=GOOGLEBOT_SITE_MAP_DIRECTORY):
+    """
+    One streaming pass over the politicians, writing each map and then the index as gzip files the site map views
+    serve without touching the database.
+    :param site_map_directory: Created if it doesn't exist. Nothing is written unless only this user can write to it.
+    :return:
+    """
+    status = ""
+    success = True
+    lastmod_list = []
+    if positive_value_exists(site_map_directory):
+        try:
+            os.makedirs(site_map_directory, mode=0o700, exist_ok=True)
+        except OSError as e:
+            status += "GOOGLEBOT_SITE_MAP_DIRECTORY_NOT_CREATED: " + str(e) + " "
+    if not positive_value_exists(site_map_directory) or not is_private_directory(site_map_directory):
+        status += "GOOGLEBOT_SITE_MAP_DIRECTORY_MISSING_OR_NOT_PRIVATE "
+        results = {
+            'success':      False,
+            'status':       status,
+            'map_count':    0,
+        }
+        return results
+    politician_row_iterator = retrieve_politician_site_map_queryset().iterator(
+        chunk_size=GOOGLEBOT_SITE_MAP_CHUNKS_PER_YIELD)
+    try:
+        while True:
+            map_row_list = list(islice(politician_row_iterator, GOOGLEBOT_SITE_MAP_URLS_PER_MAP))
+            if not map_row_list and lastmod_list:
+                break
+            write_gzip_file(site_map_file_name(len(lastmod_list)),
+                            generate_site_map_xml(len(lastmod_list), map_row_list), site_map_directory)
+            lastmod_list.append(max((politician_row[1] for politician_row in map_row_list if politician_row[1]),
+                                    default=None))
+            if len(map_row_list) < GOOGLEBOT_SITE_MAP_URLS_PER_MAP:
+                break
+        write_gzip_file(GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME,
+                        [generate_site_map_index_xml(len(lastmod_list), lastmod_list)], site_map_directory)
+        # Maps past the end of the new index are left from when there were more politicians
+        map_number = len(lastmod_list)
+        while os.path.isfile(os.path.join(site_map_directory, site_map_file_name(map_number))):
+            os.remove(os.path.join(site_map_directory, site_map_file_name(map_number)))
+            map_number += 1
+        status += "GOOGLEBOT_SITE_MAP_FILES_WRITTEN "
+    except Exception as e:
+        status += "GOOGLEBOT_SITE_MAP_FILES_NOT_WRITTEN: " + str(e) + " "
+        logger.error('precompute_googlebot_site_map_files threw ', e)
+        success = False
+
+    results = {
+        'success':      success,
+        'status':       status,
+        'map_count':    len(lastmod_list),
+    }
+    return results
+
+
+def retrieve_precomputed_site_map_file_path(file_name, site_map_directory=None):
+    if site_map_directory is None:
+        site_map_directory = GOOGLEBOT_SITE_MAP_DIRECTORY
+    if not positive_value_exists(site_map_directory) or not is_private_directory(site_map_directory):
+        return None
+    file_path = os.path.join(site_map_directory, file_name)
+    return file_path if os.path.isfile(file_path) else None
+
+
+def generate_precomputed_site_map_etag(file_name, gzip_encoded=False, site_map_directory=None):
+    """
+    :param file_name:
+    :param gzip_encoded: The gzip file is sent as is, rather than decompressed. The two are different bodies, so they
+      get different strong ETags.
+    :param site_map_directory: Defaults to GOOGLEBOT_SITE_MAP_DIRECTORY
+    :return:
+    """
+    file_path = retrieve_precomputed_site_map_file_path(file_name, site_map_directory)
+    if not positive_value_exists(file_path):
+        return None
+    file_stat = os.stat(file_path)
+    return '"{modified:x}-{size:x}{encoding}"'.format(
+        modified=file_stat.st_mtime_ns, size=file_stat.st_size, encoding='-gzip' if gzip_encoded else '')
+
+
+def retrieve_precomputed_site_map_last_modified(file_name, site_map_directory=None):
+    file_path = retrieve_precomputed_site_map_file_path(file_name, site_map_directory)
+    if not positive_value_exists(file_path):
+        return None
+    return datetime.fromtimestamp(os.stat(file_path).st_mtime, tz=timezone.utc)
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from googlebot_site_map.controllers import precompute_googlebot_site_map_files
+
+
+class Command(BaseCommand):
+    help = 'Writes the Googlebot site map index and maps as gzip files, which the googlebotSiteMap views serve ' \
+           'with ETag and Last-Modified instead of querying politicians on every crawler hit. Run it from cron.'
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        results = precompute_googlebot_site_map_files()
+        self.stdout.write("{status}Wrote {map_count} maps in {seconds:.1f} seconds".format(
+            status=results['status'], map_count=results['map_count'], seconds=time.perf_counter() - start_time))
@@ -0,0 +1,108 @@
+# googlebot_site_map/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from datetime import datetime, timezone
+import gzip
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from googlebot_site_map import supplemental_urls
+from googlebot_site_map.controllers import generate_precomputed_site_map_etag, generate_site_map_xml, \
+    GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, precompute_googlebot_site_map_files, retrieve_precomputed_site_map_file_path
+from politician.models import Politician
+
+
+def read_gzip_file(file_path):
+    with gzip.open(file_path, 'rt', encoding='utf-8') as site_map_file:
+        return site_map_file.read()
+
+
+class GenerateSiteMapXmlTestCase(SimpleTestCase):
+
+    def test_urls_are_escaped_and_dated(self):
+        xml = ''.join(generate_site_map_xml(1, [
+            ('smith-&-jones', datetime(2024, 3, 5, 12, 0, tzinfo=timezone.utc)),
+            ('pat-<lee>', None),
+        ]))
+        self.assertTrue(xml.startswith('<?xml version="1.0" encoding="UTF-8"?>\n<urlset '))
+        self.assertTrue(xml.endswith('</urlset>\n'))
+        self.assertIn('<loc>https://wevote.us/smith-&amp;-jones/-/</loc>\n    <lastmod>2024-03-05</lastmod>', xml)
+        self.assertIn('<loc>https://wevote.us/pat-&lt;lee&gt;/-/</loc>\n  </url>', xml)
+        self.assertEqual(xml.count('<url>'), 2)
+
+    def test_only_first_map_lists_supplemental_urls(self):
+        self.assertEqual(''.join(generate_site_map_xml(0, [])).count('<url>'), len(supplemental_urls.crawlable_urls))
+        self.assertEqual(''.join(generate_site_map_xml(1, [])).count('<url>'), 0)
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' politician queries see the politicians saved here
+class PrecomputeSiteMapFilesTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.site_map_directory = os.path.join(temporary_directory.name, 'googlebot_site_map')
+
+    def create_politicians(self, seo_friendly_path_list):
+        for seo_friendly_path in seo_friendly_path_list:
+            politician = Politician.objects.create(politician_name=seo_friendly_path or 'No Path',
+                                                   seo_friendly_path=seo_friendly_path)
+            Politician.objects.filter(id=politician.id).update(
+                date_last_updated=datetime(2024, 1, 1 + politician.id % 28, tzinfo=timezone.utc))
+
+    @mock.patch('googlebot_site_map.controllers.GOOGLEBOT_SITE_MAP_URLS_PER_MAP', 2)
+    def test_politicians_are_split_into_maps(self):
+        self.create_politicians(['pol-a', '', 'pol-b', None, 'pol-c'])
+        # A map left from when there were more politicians
+        os.makedirs(self.site_map_directory, mode=0o700)
+        with gzip.open(os.path.join(self.site_map_directory, 'map2.xml.gz'), 'wt') as old_map_file:
+            old_map_file.write('old')
+
+        results = precompute_googlebot_site_map_files(self.site_map_directory)
+        self.assertTrue(results['success'], results['status'])
+        self.assertEqual(results['map_count'], 2)
+        self.assertEqual(sorted(os.listdir(self.site_map_directory)),
+                         ['map0.xml.gz', 'map1.xml.gz', GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME])
+        first_map = read_gzip_file(os.path.join(self.site_map_directory, 'map0.xml.gz'))
+        second_map = read_gzip_file(os.path.join(self.site_map_directory, 'map1.xml.gz'))
+        # Politicians without a seo_friendly_path are skipped
+        self.assertIn('/pol-a/-/', first_map)
+        self.assertIn('/pol-b/-/', first_map)
+        self.assertEqual(first_map.count('<url>'), 2 + len(supplemental_urls.crawlable_urls))
+        self.assertIn('/pol-c/-/', second_map)
+        self.assertEqual(second_map.count('<url>'), 1)
+        site_map_index = read_gzip_file(os.path.join(self.site_map_directory, GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME))
+        self.assertIn('<loc>https://wevote.us/map0.xml</loc>', site_map_index)
+        self.assertIn('<loc>https://wevote.us/map1.xml</loc>', site_map_index)
+        self.assertEqual(site_map_index.count('<sitemap>'), 2)
+        self.assertEqual(site_map_index.count('<lastmod>2024-01-'), 2)
+
+    def test_directory_others_can_write_to_is_not_used(self):
+        os.makedirs(self.site_map_directory)
+        os.chmod(self.site_map_directory, 0o777)
+        results = precompute_googlebot_site_map_files(self.site_map_directory)
+        self.assertFalse(results['success'])
+        self.assertEqual(os.listdir(self.site_map_directory), [])
+        self.assertFalse(precompute_googlebot_site_map_files('')['success'])
+
+        with open(os.path.join(self.site_map_directory, GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME), 'wb'):
+            pass
+        self.assertIsNone(retrieve_precomputed_site_map_file_path(
+            GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, self.site_map_directory))
+        os.chmod(self.site_map_directory, 0o700)
+        self.assertIsNotNone(retrieve_precomputed_site_map_file_path(
+            GOOGLEBOT_SITE_MAP_INDEX_FILE_NAME, self.site_map_directory))
+
+    def test_gzip_and_plain_bodies_have_different_etags(self):
+        self.create_politicians(['pol-a'])
+        precompute_googlebot_site_map_files(self.site_map_directory)
+        plain_etag = generate_precomputed_site_map_etag('map0.xml.gz', site_map_directory=self.site_map_directory)
+        gzip_etag = generate_precomputed_site_map_etag(
+            'map0.xml.gz', gzip_encoded=True, site_map_directory=self.site_map_directory)
+        self.assertTrue(plain_etag.startswith('"'))
+        self.assertNotEqual(plain_etag, gzip_etag)
@@ -16,6 +16,7 @@ from config.base import get_environment_variable
 from import_export_facebook.models import FacebookManager
 from issue.models import IssueManager
 from organization.models import OrganizationManager
+from politician.controllers_generate_color import generate_background_color_from_python_image
 from politician.models import PoliticianManager
 from position.controllers import reset_all_position_image_details_from_candidate, \
     reset_position_for_friends_image_details_from_voter, reset_position_entered_image_details_from_organization, \
@@ -25,8 +26,10 @@ from twitter.models import TwitterUserManager
 from voter.models import VoterManager, VoterDeviceLink, VoterDeviceLinkManager, VoterAddressManager, Voter
 from voter_guide.models import VoterGuideManager
 from wevote_functions.functions import positive_value_exists, convert_to_int
-from .functions import analyze_remote_url, analyze_image_file, analyze_image_in_memory, \
-    change_default_profile_image_if_needed
+from .controllers_image_pipeline import analyze_source_image_url, encode_resized_python_image, \
+    generate_resized_python_image, retrieve_source_image
+from .controllers_image_storage import generate_content_addressed_image_key, retrieve_image_storage_service
+from .functions import analyze_image_file, analyze_image_in_memory, change_default_profile_image_if_needed
 from .models import WeVoteImageManager, WeVoteImage, \
     CHOSEN_FAVICON_NAME, CHOSEN_LOGO_NAME, CHOSEN_SOCIAL_SHARE_IMAGE_NAME, \
     FACEBOOK_PROFILE_IMAGE_NAME, FACEBOOK_BACKGROUND_IMAGE_NAME, \
@@ -96,7 +99,6 @@ ISSUES_IMAGE_MEDIUM_WIDTH = convert_to_int(get_environment_variable("ISSUES_IMAG
 ISSUES_IMAGE_MEDIUM_HEIGHT = convert_to_int(get_environment_variable("ISSUES_IMAGE_MEDIUM_HEIGHT"))
 ISSUES_IMAGE_TINY_WIDTH = convert_to_int(get_environment_variable("ISSUES_IMAGE_TINY_WIDTH"))
 ISSUES_IMAGE_TINY_HEIGHT = convert_to_int(get_environment_variable("ISSUES_IMAGE_TINY_HEIGHT"))
-AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
 
 try:
     SOCIAL_BACKGROUND_IMAGE_WIDTH = convert_to_int(get_environment_variable("SOCIAL_BACKGROUND_IMAGE_WIDTH"))
@@ -797,7 +799,6 @@ def cache_image_locally(
     image_stored_from_source = False
     image_stored_locally = False
     image_stored_to_aws = False
-    image_versions = []
 
     we_vote_image_manager = WeVoteImageManager()
 
@@ -902,42 +903,8 @@ def cache_image_locally(
     image_url_valid = True
     status += " IMAGE_URL_VALID "
 
-    # Get today's cached images and their versions so that image version can be calculated
-    cached_todays_we_vote_image_list_results = we_vote_image_manager.retrieve_todays_cached_we_vote_image_list(
-        campaignx_we_vote_id=campaignx_we_vote_id,
-        candidate_we_vote_id=candidate_we_vote_id,
-        issue_we_vote_id=issue_we_vote_id,
-        kind_of_image_ballotpedia_profile=kind_of_image_ballotpedia_profile,
-        kind_of_image_campaignx_photo=kind_of_image_campaignx_photo,
-        kind_of_image_ctcl_profile=kind_of_image_ctcl_profile,
-        kind_of_image_facebook_background=kind_of_image_facebook_background,
-        kind_of_image_facebook_profile=kind_of_image_facebook_profile,
-        kind_of_image_issue=kind_of_image_issue,
-        kind_of_image_linkedin_profile=kind_of_image_linkedin_profile,
-        kind_of_image_maplight=kind_of_image_maplight,
-        kind_of_image_organization_uploaded_profile=kind_of_image_organization_uploaded_profile,
-        kind_of_image_original=kind_of_image_original,
-        kind_of_image_other_source=kind_of_image_other_source,
-        kind_of_image_politician_uploaded_profile=kind_of_image_politician_uploaded_profile,
-        kind_of_image_twitter_background=kind_of_image_twitter_background,
-        kind_of_image_twitter_banner=kind_of_image_twitter_banner,
-        kind_of_image_twitter_profile=kind_of_image_twitter_profile,
-        kind_of_image_vote_smart=kind_of_image_vote_smart,
-        kind_of_image_vote_usa_profile=kind_of_image_vote_usa_profile,
-        kind_of_image_voter_uploaded_profile=kind_of_image_voter_uploaded_profile,
-        kind_of_image_wikipedia_profile=kind_of_image_wikipedia_profile,
-        organization_we_vote_id=organization_we_vote_id,
-        politician_we_vote_id=politician_we_vote_id,
-        representative_we_vote_id=representative_we_vote_id,
-        voter_we_vote_id=voter_we_vote_id,
-    )
-    for cached_we_vote_image in cached_todays_we_vote_image_list_results['we_vote_image_list']:
-        if cached_we_vote_image.same_day_image_version:
-            image_versions.append(cached_we_vote_image.same_day_image_version)
-    if image_versions:
-        same_day_image_version = max(image_versions) + 1
-    else:
-        same_day_image_version = 1
+    # Image keys are content-addressed, so there is no longer a same-day version to count
+    same_day_image_version = None
 
     if kind_of_image_ballotpedia_profile:
         save_source_info_results = we_vote_image_manager.save_we_vote_image_ballotpedia_info(
@@ -1037,25 +1004,19 @@ def cache_image_locally(
     status += " " + save_source_info_results['status']
     if save_source_info_results['success']:
         image_stored_from_source = True
-        date_image_saved = "{year}{:02d}{:02d}".format(we_vote_image.date_image_saved.month,
-                                                       we_vote_image.date_image_saved.day,
-                                                       year=we_vote_image.date_image_saved.year)
-        # ex twitter_profile_image_master-2017210_1_48x48.png
+        # ex twitter_profile_image_master_48x48, which generate_content_addressed_image_key finishes as
+        # twitter_profile_image_master_48x48-<hash of the image>.png
         analyze_image_url_results = analyze_source_images_results['analyze_image_url_results']
         image_width = analyze_image_url_results['image_width'] if 'image_width' in analyze_image_url_results else 0
         image_height = analyze_image_url_results['image_height'] if 'image_height' in analyze_image_url_results else 0
         image_format = analyze_image_url_results['image_format'] if 'image_format' in analyze_image_url_results else ''
         we_vote_image_file_name = \
-            "{image_type}_{master_image}-{date_image_saved}_{counter}_" \
-            "{image_width}x{image_height}.{image_format}" \
+            "{image_type}_{master_image}_{image_width}x{image_height}" \
             "".format(
                 image_type=analyze_source_images_results['image_type'],
                 master_image=MASTER_IMAGE,
-                date_image_saved=date_image_saved,
-                counter=str(same_day_image_version),
                 image_width=str(image_width),
-                image_height=str(image_height),
-                image_format=str(image_format))
+                image_height=str(image_height))
 
         if voter_we_vote_id:
             we_vote_image_file_location = voter_we_vote_id + "/" + we_vote_image_file_name
@@ -1072,8 +1033,9 @@ def cache_image_locally(
         else:
             we_vote_image_file_location = we_vote_image_file_name
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-            analyze_source_images_results['image_url_https'], we_vote_image_file_name)
+        # The source was fetched and decoded once, when we analyzed it
+        source_image = analyze_source_images_results['analyze_image_url_results'].get('source_image')
+        image_stored_locally = source_image is not None
 
         if not image_stored_locally:
             error_results = {
@@ -1091,10 +1053,13 @@ def cache_image_locally(
             return error_results
 
         status += " IMAGE_STORED_LOCALLY "
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-            we_vote_image_file_name=we_vote_image_file_name,
+        we_vote_image_file_location = generate_content_addressed_image_key(
+            source_image.image_bytes, we_vote_image_file_location, image_format)
+        image_stored_to_aws = we_vote_image_manager.store_image_bytes_to_aws(
+            source_image.image_bytes,
             we_vote_image_file_location=we_vote_image_file_location,
-            image_format=analyze_source_images_results['analyze_image_url_results']['image_format'])
+            image_format=analyze_source_images_results['analyze_image_url_results']['image_format'],
+            content_addressed=True)
         if not image_stored_to_aws:
             error_results = {
                 'success':                      success,
@@ -1109,9 +1074,7 @@ def cache_image_locally(
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             log_and_time_cache_action(False, time0, 'cache_image_locally -- IMAGE_NOT_STORED_TO_AWS problem')
             return error_results
-        we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                            "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                      we_vote_image_file_location=we_vote_image_file_location)
+        we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
         # logger.error('(Ok) New image created in cache_image_locally we_vote_image_url: %s' % we_vote_image_url)
         save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
             we_vote_image,
@@ -1414,7 +1377,7 @@ def analyze_source_images(
     elif kind_of_image_wikipedia_profile:
         image_type = WIKIPEDIA_IMAGE_NAME
 
-    analyze_image_url_results = analyze_remote_url(image_url_https)
+    analyze_image_url_results = analyze_source_image_url(image_url_https)
     results = {
         'twitter_id':                   twitter_id,
         'twitter_screen_name':          twitter_screen_name,
@@ -2170,9 +2133,7 @@ def cache_image_object_to_aws(
         log_and_time_cache_action(True, time0, 'cache_image_object_to_aws -- not image_stored_to_aws')
         return error_results
 
-    we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                        "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                  we_vote_image_file_location=we_vote_image_file_location)
+    we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
     save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
         we_vote_image,
         we_vote_image_url=we_vote_image_url,
@@ -2424,9 +2385,7 @@ def cache_voter_master_uploaded_image(
         log_and_time_cache_action(True, time0, 'cache_voter_master_uploaded_image -- not image_stored_to_aws')
         return error_results
 
-    we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                        "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                  we_vote_image_file_location=we_vote_image_file_location)
+    we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
     save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
         we_vote_image,
         we_vote_image_url=we_vote_image_url,
@@ -2624,6 +2583,34 @@ def create_resized_image_if_not_created(we_vote_image):
         representative_we_vote_id=we_vote_image.representative_we_vote_id,
         voter_we_vote_id=we_vote_image.voter_we_vote_id,
     )
+
+    # Only some of our kinds of images have medium or tiny sizes
+    has_medium_and_tiny_sizes = \
+        we_vote_image.kind_of_image_ballotpedia_profile or \
+        we_vote_image.kind_of_image_campaignx_photo or \
+        we_vote_image.kind_of_image_ctcl_profile or \
+        we_vote_image.kind_of_image_facebook_profile or \
+        we_vote_image.kind_of_image_linkedin_profile or \
+        we_vote_image.kind_of_image_organization_uploaded_profile or \
+        we_vote_image.kind_of_image_politician_uploaded_profile or \
+        we_vote_image.kind_of_image_maplight or \
+        we_vote_image.kind_of_image_twitter_profile or \
+        we_vote_image.kind_of_image_vote_smart or \
+        we_vote_image.kind_of_image_vote_usa_profile or \
+        we_vote_image.kind_of_image_voter_uploaded_profile or \
+        we_vote_image.kind_of_image_wikipedia_profile or \
+        we_vote_image.kind_of_image_other_source
+
+    # Fetch and decode the source once for all the sizes we still need
+    source_image = None
+    # The sizes upload in parallel, and we wait for them all at the end
+    upload_list = []
+    if not resized_version_exists_results['large_image_version_exists'] or (has_medium_and_tiny_sizes and (
+            not resized_version_exists_results['medium_image_version_exists'] or
+            not resized_version_exists_results['tiny_image_version_exists'])):
+        source_image_results = retrieve_source_image(image_url_https)
+        source_image = source_image_results['source_image']
+
     if not resized_version_exists_results['large_image_version_exists']:
         # Large version does not exist so create resize image and cache it
         cache_resized_image_locally_results = cache_resized_image_locally(
@@ -2658,30 +2645,19 @@ def create_resized_image_if_not_created(we_vote_image):
             other_source=we_vote_image.other_source,
             politician_we_vote_id=we_vote_image.politician_we_vote_id,
             representative_we_vote_id=we_vote_image.representative_we_vote_id,
+            source_image=source_image,
             twitter_id=we_vote_image.twitter_id,
+            upload_in_background=True,
             vote_smart_id=we_vote_image.vote_smart_id,
             voter_we_vote_id=we_vote_image.voter_we_vote_id,
             we_vote_parent_image_id=we_vote_image.id,
         )
         create_resized_image_results['cached_large_image'] = cache_resized_image_locally_results['success']
+        upload_list.append(('cached_large_image', cache_resized_image_locally_results))
     else:
         create_resized_image_results['cached_large_image'] = IMAGE_ALREADY_CACHED
 
-    # Only some of our kinds of images have medium or tiny sizes
-    if we_vote_image.kind_of_image_ballotpedia_profile or \
-            we_vote_image.kind_of_image_campaignx_photo or \
-            we_vote_image.kind_of_image_ctcl_profile or \
-            we_vote_image.kind_of_image_facebook_profile or \
-            we_vote_image.kind_of_image_linkedin_profile or \
-            we_vote_image.kind_of_image_organization_uploaded_profile or \
-            we_vote_image.kind_of_image_politician_uploaded_profile or \
-            we_vote_image.kind_of_image_maplight or \
-            we_vote_image.kind_of_image_twitter_profile or \
-            we_vote_image.kind_of_image_vote_smart or \
-            we_vote_image.kind_of_image_vote_usa_profile or \
-            we_vote_image.kind_of_image_voter_uploaded_profile or \
-            we_vote_image.kind_of_image_wikipedia_profile or \
-            we_vote_image.kind_of_image_other_source:
+    if has_medium_and_tiny_sizes:
         if not resized_version_exists_results['medium_image_version_exists']:
             # Medium version does not exist so create resize image and cache it
             cache_resized_image_locally_results = cache_resized_image_locally(
@@ -2716,12 +2692,15 @@ def create_resized_image_if_not_created(we_vote_image):
                 other_source=we_vote_image.other_source,
                 politician_we_vote_id=we_vote_image.politician_we_vote_id,
                 representative_we_vote_id=we_vote_image.representative_we_vote_id,
+                source_image=source_image,
                 twitter_id=we_vote_image.twitter_id,
+                upload_in_background=True,
                 vote_smart_id=we_vote_image.vote_smart_id,
                 voter_we_vote_id=we_vote_image.voter_we_vote_id,
                 we_vote_parent_image_id=we_vote_image.id,
             )
             create_resized_image_results['cached_medium_image'] = cache_resized_image_locally_results['success']
+            upload_list.append(('cached_medium_image', cache_resized_image_locally_results))
         else:
             create_resized_image_results['cached_medium_image'] = IMAGE_ALREADY_CACHED
 
@@ -2759,14 +2738,23 @@ def create_resized_image_if_not_created(we_vote_image):
                 other_source=we_vote_image.other_source,
                 politician_we_vote_id=we_vote_image.politician_we_vote_id,
                 representative_we_vote_id=we_vote_image.representative_we_vote_id,
+                source_image=source_image,
                 twitter_id=we_vote_image.twitter_id,
+                upload_in_background=True,
                 vote_smart_id=we_vote_image.vote_smart_id,
                 voter_we_vote_id=we_vote_image.voter_we_vote_id,
                 we_vote_parent_image_id=we_vote_image.id,
             )
             create_resized_image_results['cached_tiny_image'] = cache_resized_image_locally_results['success']
+            upload_list.append(('cached_tiny_image', cache_resized_image_locally_results))
         else:
             create_resized_image_results['cached_tiny_image'] = IMAGE_ALREADY_CACHED
+
+    for cached_image_key, cache_resized_image_locally_results in upload_list:
+        upload_future = cache_resized_image_locally_results.get('upload_future')
+        if upload_future is not None and not upload_future.result():
+            create_resized_image_results[cached_image_key] = False
+            WeVoteImageManager().delete_we_vote_image(cache_resized_image_locally_results['we_vote_image'])
     log_and_time_cache_action(False, time0, 'create_resized_image_if_not_created')
     return create_resized_image_results
 
@@ -3025,7 +3013,9 @@ def cache_resized_image_locally(
         other_source=None,
         politician_we_vote_id=None,
         representative_we_vote_id=None,
+        source_image=None,
         twitter_id=None,
+        upload_in_background=False,
         vote_smart_id=None,
         voter_we_vote_id=None,
         we_vote_parent_image_id=0,
@@ -3069,7 +3059,9 @@ def cache_resized_image_locally(
     :param other_source:
     :param politician_we_vote_id:
     :param representative_we_vote_id:
+    :param source_image: SourceImage of image_url_https, already fetched and decoded
     :param twitter_id:
+    :param upload_in_background: Return upload_future instead of waiting for the upload
     :param vote_smart_id:
     :param voter_we_vote_id:
     :param we_vote_parent_image_id:
@@ -3083,8 +3075,8 @@ def cache_resized_image_locally(
     image_stored_from_source = False
     image_stored_locally = False
     image_stored_to_aws = False
-    image_versions = []
     we_vote_image_file_location = None
+    upload_future = None
 
     we_vote_image_manager = WeVoteImageManager()
 
@@ -3211,45 +3203,8 @@ def cache_resized_image_locally(
     else:
         image_type = ''
 
-    # Get today's cached images and their versions so that image version can be calculated
-    cached_todays_we_vote_image_list_results = we_vote_image_manager.retrieve_todays_cached_we_vote_image_list(
-        campaignx_we_vote_id=campaignx_we_vote_id,
-        candidate_we_vote_id=candidate_we_vote_id,
-        issue_we_vote_id=issue_we_vote_id,
-        kind_of_image_ballotpedia_profile=kind_of_image_ballotpedia_profile,
-        kind_of_image_campaignx_photo=kind_of_image_campaignx_photo,
-        kind_of_image_ctcl_profile=kind_of_image_ctcl_profile,
-        kind_of_image_facebook_background=kind_of_image_facebook_background,
-        kind_of_image_facebook_profile=kind_of_image_facebook_profile,
-        kind_of_image_issue=kind_of_image_issue,
-        kind_of_image_large=kind_of_image_large,
-        kind_of_image_linkedin_profile=kind_of_image_linkedin_profile,
-        kind_of_image_maplight=kind_of_image_maplight,
-        kind_of_image_medium=kind_of_image_medium,
-        kind_of_image_organization_uploaded_profile=kind_of_image_organization_uploaded_profile,
-        kind_of_image_original=kind_of_image_original,
-        kind_of_image_other_source=kind_of_image_other_source,
-        kind_of_image_politician_uploaded_profile=kind_of_image_politician_uploaded_profile,
-        kind_of_image_tiny=kind_of_image_tiny,
-        kind_of_image_twitter_background=kind_of_image_twitter_background,
-        kind_of_image_twitter_banner=kind_of_image_twitter_banner,
-        kind_of_image_twitter_profile=kind_of_image_twitter_profile,
-        kind_of_image_vote_smart=kind_of_image_vote_smart,
-        kind_of_image_vote_usa_profile=kind_of_image_vote_usa_profile,
-        kind_of_image_voter_uploaded_profile=kind_of_image_voter_uploaded_profile,
-        kind_of_image_wikipedia_profile=kind_of_image_wikipedia_profile,
-        organization_we_vote_id=organization_we_vote_id,
-        politician_we_vote_id=politician_we_vote_id,
-        representative_we_vote_id=representative_we_vote_id,
-        voter_we_vote_id=voter_we_vote_id,
-    )
-    for cached_we_vote_image in cached_todays_we_vote_image_list_results['we_vote_image_list']:
-        if cached_we_vote_image.same_day_image_version:
-            image_versions.append(cached_we_vote_image.same_day_image_version)
-    if image_versions:
-        same_day_image_version = max(image_versions) + 1
-    else:
-        same_day_image_version = 1
+    # Image keys are content-addressed, so there is no longer a same-day version to count
+    same_day_image_version = None
 
     # 2021-05-09 We default to storing all resized images as jpg
     convert_image_to_jpg = True
@@ -3362,22 +3317,16 @@ def cache_resized_image_locally(
     status += " " + save_source_info_results['status']
     if save_source_info_results['success']:
         image_stored_from_source = True
-        date_image_saved = "{year}{:02d}{:02d}".format(we_vote_image.date_image_saved.month,
-                                                       we_vote_image.date_image_saved.day,
-                                                       year=we_vote_image.date_image_saved.year)
-        # ex twitter_profile_image_master-2017210_1_48x48.png
+        # ex twitter_profile_image_48x48, which generate_content_addressed_image_key finishes as
+        # twitter_profile_image_48x48-<hash of the image>.jpg
         if convert_image_to_jpg:
             image_format_filtered = 'jpg'
         else:
             image_format_filtered = image_format
-        we_vote_image_file_name = "{image_type}-{date_image_saved}_{counter}_" \
-                                  "{image_width}x{image_height}.{image_format}" \
+        we_vote_image_file_name = "{image_type}_{image_width}x{image_height}" \
                                   "".format(image_type=image_type,
-                                            date_image_saved=date_image_saved,
-                                            counter=str(same_day_image_version),
                                             image_width=str(image_width),
-                                            image_height=str(image_height),
-                                            image_format=str(image_format_filtered))
+                                            image_height=str(image_height))
         if campaignx_we_vote_id:
             we_vote_image_file_location = campaignx_we_vote_id + "/" + we_vote_image_file_name
         elif candidate_we_vote_id:
@@ -3396,8 +3345,10 @@ def cache_resized_image_locally(
             we_vote_image_file_location = "missing_id/" + we_vote_image_file_name
 
 
-        image_stored_locally = we_vote_image_manager.store_image_locally(
-                image_url_https, we_vote_image_file_name)
+        if source_image is None:
+            source_image_results = retrieve_source_image(image_url_https)
+            source_image = source_image_results['source_image']
+        image_stored_locally = source_image is not None
         if not image_stored_locally:
             status += " IMAGE_NOT_STORED_LOCALLY1 "
             error_results = {
@@ -3413,14 +3364,24 @@ def cache_resized_image_locally(
             return error_results
 
         status += " IMAGE_STORED_LOCALLY "
-        resized_image_created = we_vote_image_manager.resize_we_vote_master_image(
-            image_local_path=we_vote_image_file_name,
-            image_width=image_width,
-            image_height=image_height,
-            image_type=image_type,
-            image_offset_x=image_offset_x,
-            image_offset_y=image_offset_y,
-            convert_image_to_jpg=convert_image_to_jpg)
+        try:
+            resized_python_image = generate_resized_python_image(
+                source_image,
+                image_width=image_width,
+                image_height=image_height,
+                image_type=image_type,
+                image_offset_y=image_offset_y)
+            if kind_of_image_large:
+                # We have the large size decoded right here, so this is when we find its background color
+                we_vote_image.profile_image_background_color = \
+                    generate_background_color_from_python_image(resized_python_image) or None
+            resized_image_bytes = encode_resized_python_image(
+                source_image, resized_python_image, convert_image_to_jpg=convert_image_to_jpg)
+            resized_image_created = True
+        except Exception as e:
+            resized_image_bytes = None
+            resized_image_created = False
+            status += " RESIZE_FAILED: " + str(e) + " "
         if not resized_image_created:
             status += " IMAGE_NOT_STORED_LOCALLY2 "
             error_results = {
@@ -3436,10 +3397,19 @@ def cache_resized_image_locally(
             return error_results
 
         status += " RESIZED_IMAGE_CREATED "
-        image_stored_to_aws = we_vote_image_manager.store_image_to_aws(
-            we_vote_image_file_name=we_vote_image_file_name,
-            we_vote_image_file_location=we_vote_image_file_location,
-            image_format=image_format_filtered)
+        we_vote_image_file_location = generate_content_addressed_image_key(
+            resized_image_bytes, we_vote_image_file_location, image_format_filtered)
+        if upload_in_background:
+            # The caller waits for upload_future, and deletes we_vote_image if the upload fails
+            upload_future = retrieve_image_storage_service().store_image_bytes_async(
+                resized_image_bytes, we_vote_image_file_location, image_format_filtered, content_addressed=True)
+            image_stored_to_aws = True
+        else:
+            image_stored_to_aws = we_vote_image_manager.store_image_bytes_to_aws(
+                resized_image_bytes,
+                we_vote_image_file_location=we_vote_image_file_location,
+                image_format=image_format_filtered,
+                content_addressed=True)
         if not image_stored_to_aws:
             status += " IMAGE_NOT_STORED_TO_AWS "
             error_results = {
@@ -3454,9 +3424,7 @@ def cache_resized_image_locally(
             delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
             return error_results
 
-        we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                            "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                      we_vote_image_file_location=we_vote_image_file_location)
+        we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
         # if we_vote_image_url is not empty then save we_vote_image_wes_info else delete we_vote_image entry
         if we_vote_image_url is not None and we_vote_image_url != "":
             # logger.error('(Ok) New image created in cache_resized_image_locally we_vote_image_url: %s' %
@@ -3517,6 +3485,8 @@ def cache_resized_image_locally(
         'image_stored_locally':         image_stored_locally,
         'resized_image_created':        resized_image_created,
         'image_stored_to_aws':          image_stored_to_aws,
+        'upload_future':                upload_future,
+        'we_vote_image':                we_vote_image,
     }
     log_and_time_cache_action(False, time0, 'cache_resized_image_locally')
     return results
@@ -4550,9 +4520,7 @@ def cache_issue_image_master(google_civic_election_id, issue_image_file, issue_w
         delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
         return error_results
 
-    we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                        "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                  we_vote_image_file_location=we_vote_image_file_location)
+    we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
     save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
         we_vote_image,
         we_vote_image_url=we_vote_image_url,
@@ -4768,9 +4736,7 @@ def cache_organization_sharing_image(
         delete_we_vote_image_results = we_vote_image_manager.delete_we_vote_image(we_vote_image)
         return error_results
 
-    we_vote_image_url = "https://{bucket_name}.s3.amazonaws.com/{we_vote_image_file_location}" \
-                        "".format(bucket_name=AWS_STORAGE_BUCKET_NAME,
-                                  we_vote_image_file_location=we_vote_image_file_location)
+    we_vote_image_url = retrieve_image_storage_service().generate_image_url(we_vote_image_file_location)
     save_aws_info = we_vote_image_manager.save_we_vote_image_aws_info(
         we_vote_image,
         we_vote_image_url=we_vote_image_url,
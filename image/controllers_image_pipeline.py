@@ -0,0 +1,170 @@
+# image/controllers_image_pipeline.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+from io import BytesIO
+from threading import Lock
+import time
+
+from PIL import Image, ImageOps
+import requests
+
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+from .models import WeVoteImageManager
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# We cache the master and then make the large, medium and tiny sizes from the same source a moment later, so we keep
+# the last few decoded sources instead of fetching and decoding them again for every size
+SOURCE_IMAGE_CACHE_SECONDS = 120
+SOURCE_IMAGE_CACHE_SIZE = 4
+SOURCE_IMAGE_FETCH_TIMEOUT_SECONDS = 20
+SOURCE_IMAGE_REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/36.0.1941.0 Safari/537.36',
+    'Accept': 'image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.8',
+}
+
+source_image_cache = OrderedDict()
+source_image_cache_lock = Lock()
+
+
+class SourceImage:
+    """
+    One source image, fetched once and decoded once. Every size we store is made from python_image.
+    """
+
+    def __init__(self, image_url_https, image_bytes):
+        self.image_url_https = image_url_https
+        self.image_bytes = image_bytes
+        original_image = Image.open(BytesIO(image_bytes))
+        self.image_format = original_image.format.lower() if original_image.format else ''
+        self.python_image = ImageOps.exif_transpose(original_image)
+        self.python_image.load()
+        self.image_width, self.image_height = self.python_image.size
+        self.date_decoded = time.monotonic()
+
+
+def fetch_image_bytes(image_url_https):
+    response = requests.get(image_url_https, headers=SOURCE_IMAGE_REQUEST_HEADERS,
+                            timeout=SOURCE_IMAGE_FETCH_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.content
+
+
+def retrieve_source_image(image_url_https, fetch_function=fetch_image_bytes):
+    """
+    :param image_url_https:
+    :param fetch_function: Returns the bytes at a url, e.g. fetch_image_bytes
+    :return: results with source_image, a SourceImage
+    """
+    status = ""
+    source_image = None
+    if not positive_value_exists(image_url_https):
+        results = {
+            'success':      False,
+            'status':       "SOURCE_IMAGE_URL_MISSING ",
+            'source_image': None,
+        }
+        return results
+
+    with source_image_cache_lock:
+        source_image = source_image_cache.get(image_url_https)
+        if source_image is not None:
+            if time.monotonic() - source_image.date_decoded < SOURCE_IMAGE_CACHE_SECONDS:
+                source_image_cache.move_to_end(image_url_https)
+            else:
+                del source_image_cache[image_url_https]
+                source_image = None
+    if source_image is not None:
+        results = {
+            'success':      True,
+            'status':       "SOURCE_IMAGE_ALREADY_DECODED ",
+            'source_image': source_image,
+        }
+        return results
+
+    try:
+        source_image = SourceImage(image_url_https, fetch_function(image_url_https))
+        status += "SOURCE_IMAGE_DECODED "
+        success = True
+    except Exception as e:
+        status += "SOURCE_IMAGE_NOT_DECODED: " + str(e) + " "
+        logger.error("retrieve_source_image: image url {image_url_https} is not valid: {error}".format(
+            image_url_https=image_url_https, error=e))
+        success = False
+
+    if success:
+        with source_image_cache_lock:
+            source_image_cache[image_url_https] = source_image
+            while len(source_image_cache) > SOURCE_IMAGE_CACHE_SIZE:
+                source_image_cache.popitem(last=False)
+
+    results = {
+        'success':      success,
+        'status':       status,
+        'source_image': source_image,
+    }
+    return results
+
+
+def analyze_source_image_url(image_url_https):
+    """
+    The same results as analyze_remote_url, from one fetch which the sizes we make next reuse
+    :param image_url_https:
+    :return:
+    """
+    source_image_results = retrieve_source_image(image_url_https)
+    source_image = source_image_results['source_image']
+    results = {
+        'image_url_valid':  source_image_results['success'],
+        'image_width':      source_image.image_width if source_image else None,
+        'image_height':     source_image.image_height if source_image else None,
+        'image_format':     source_image.image_format if source_image else None,
+        'source_image':     source_image,
+    }
+    return results
+
+
+def generate_resized_python_image(source_image, image_width=0, image_height=0, image_type='', image_offset_y=0):
+    """
+    One of our sizes of source_image, before it is encoded
+    :return: PIL image
+    """
+    return WeVoteImageManager.resize_python_image(
+        source_image.python_image,
+        image_width=image_width,
+        image_height=image_height,
+        image_type=image_type,
+        image_offset_y=image_offset_y)
+
+
+def encode_resized_python_image(source_image, resized_python_image, convert_image_to_jpg=True):
+    """
+    :return: bytes, encoded the way we store resized_python_image
+    """
+    return WeVoteImageManager.encode_python_image(
+        resized_python_image, convert_image_to_jpg=convert_image_to_jpg, image_format=source_image.image_format)
+
+
+def generate_resized_image_bytes(
+        source_image,
+        image_width=0,
+        image_height=0,
+        image_type='',
+        image_offset_y=0,
+        convert_image_to_jpg=True):
+    """
+    One of our sizes of source_image, encoded the way we store it
+    :return: bytes
+    """
+    resized_image = generate_resized_python_image(
+        source_image,
+        image_width=image_width,
+        image_height=image_height,
+        image_type=image_type,
+        image_offset_y=image_offset_y)
+    return encode_resized_python_image(source_image, resized_image, convert_image_to_jpg=convert_image_to_jpg)
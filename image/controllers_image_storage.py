@@ -0,0 +1,270 @@
+# image/controllers_image_storage.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import os
+from threading import BoundedSemaphore, Lock
+import time
+
+import boto3
+
+from config.base import get_environment_variable, get_environment_variable_default
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+AWS_ACCESS_KEY_ID = get_environment_variable("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = get_environment_variable("AWS_SECRET_ACCESS_KEY")
+AWS_REGION_NAME = get_environment_variable("AWS_REGION_NAME")
+AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
+AWS_STORAGE_SERVICE = "s3"
+# Store images in this directory instead of on AWS, e.g. for development or to benchmark the image pipeline offline
+IMAGE_STORAGE_DIRECTORY = get_environment_variable_default('IMAGE_STORAGE_DIRECTORY', '')
+IMAGE_UPLOAD_WORKERS = convert_to_int(get_environment_variable_default('IMAGE_UPLOAD_WORKERS', 8))
+# Uploads waiting for a worker, beyond which store_image_bytes_async waits instead of holding more images in memory
+IMAGE_UPLOAD_QUEUE_SIZE = 64
+
+
+def generate_content_addressed_image_key(image_bytes, key_prefix, image_format):
+    """
+    The same bytes always get the same key, so they are only ever uploaded once.
+    :param image_bytes:
+    :param key_prefix: e.g. "wv02cand1234/twitter_profile_image_200x200"
+    :param image_format:
+    :return: e.g. "wv02cand1234/twitter_profile_image_200x200-5b1d...e0.jpg"
+    """
+    return "{key_prefix}-{content_hash}.{image_format}".format(
+        key_prefix=key_prefix, content_hash=hashlib.sha256(image_bytes).hexdigest()[:32], image_format=image_format)
+
+
+class AwsImageStorageBackend:
+    """
+    One S3 client for the process. boto3 clients are safe to share between threads, so every upload reuses its
+    connection pool and credentials instead of paying for a new client, session and TLS handshake each time.
+    """
+
+    def __init__(self, bucket_name=AWS_STORAGE_BUCKET_NAME):
+        self.bucket_name = bucket_name
+        self.client = None
+        self.client_lock = Lock()
+
+    def retrieve_client(self):
+        if self.client is None:
+            with self.client_lock:
+                if self.client is None:
+                    self.client = boto3.client(
+                        AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME, aws_access_key_id=AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                        config=boto3.session.Config(max_pool_connections=IMAGE_UPLOAD_WORKERS + 2))
+        return self.client
+
+    def put(self, key, image_bytes, content_type):
+        self.retrieve_client().put_object(Bucket=self.bucket_name, Key=key, Body=image_bytes, ContentType=content_type)
+
+    def exists(self, key):
+        try:
+            self.retrieve_client().head_object(Bucket=self.bucket_name, Key=key)
+            return True
+        except self.retrieve_client().exceptions.ClientError as e:
+            # Without s3:GetObject on the bucket (e.g. a put-only IAM policy) S3 answers 403 instead of 404, and we
+            #  upload, which is idempotent, as if the key were missing
+            if e.response.get('Error', {}).get('Code') in ('403', '404', 'AccessDenied', 'Forbidden', 'NoSuchKey',
+                                                           'NotFound'):
+                return False
+            raise
+
+    def get(self, key):
+        return self.retrieve_client().get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+
+    def delete(self, key):
+        self.retrieve_client().delete_object(Bucket=self.bucket_name, Key=key)
+
+    def generate_url(self, key):
+        return "https://{bucket_name}.s3.amazonaws.com/{key}".format(bucket_name=self.bucket_name, key=key)
+
+
+class LocalImageStorageBackend:
+    """
+    Images as files under one directory, with the same interface as AwsImageStorageBackend.
+    """
+
+    def __init__(self, image_storage_directory, base_url='', latency_seconds=0.0):
+        """
+        :param image_storage_directory:
+        :param base_url: Where the directory is served from, if it is
+        :param latency_seconds: Simulated time each request takes, for benchmarks
+        """
+        self.image_storage_directory = image_storage_directory
+        self.base_url = base_url or 'file://' + os.path.abspath(image_storage_directory) + '/'
+        self.latency_seconds = latency_seconds
+
+    def file_path(self, key):
+        file_path = os.path.abspath(os.path.join(self.image_storage_directory, key))
+        if not file_path.startswith(os.path.abspath(self.image_storage_directory) + os.sep):
+            raise ValueError("Image key outside the storage directory: " + str(key))
+        return file_path
+
+    def put(self, key, image_bytes, content_type):
+        time.sleep(self.latency_seconds)
+        file_path = self.file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temporary_file_path = file_path + '.' + str(os.getpid()) + '.part'
+        with open(temporary_file_path, 'wb') as image_file:
+            image_file.write(image_bytes)
+        os.replace(temporary_file_path, file_path)
+
+    def exists(self, key):
+        time.sleep(self.latency_seconds)
+        return os.path.isfile(self.file_path(key))
+
+    def get(self, key):
+        time.sleep(self.latency_seconds)
+        with open(self.file_path(key), 'rb') as image_file:
+            return image_file.read()
+
+    def delete(self, key):
+        time.sleep(self.latency_seconds)
+        if os.path.isfile(self.file_path(key)):
+            os.remove(self.file_path(key))
+
+    def generate_url(self, key):
+        return self.base_url + key
+
+
+class ImageStorageService:
+    """
+    Stores, retrieves and deletes our cached images through one backend, with a bounded pool of threads for uploads
+    that can run in parallel.
+    """
+
+    def __init__(self, backend, number_of_workers=IMAGE_UPLOAD_WORKERS, upload_queue_size=IMAGE_UPLOAD_QUEUE_SIZE):
+        self.backend = backend
+        self.number_of_workers = number_of_workers
+        self.executor = None
+        self.executor_lock = Lock()
+        self.upload_slot_semaphore = BoundedSemaphore(number_of_workers + upload_queue_size)
+        self.upload_lock = Lock()
+        self.upload_future_by_key = {}
+        self.upload_count = 0
+        self.upload_skipped_count = 0
+
+    def retrieve_executor(self):
+        if self.executor is None:
+            with self.executor_lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(
+                        max_workers=self.number_of_workers, thread_name_prefix='image_storage')
+        return self.executor
+
+    def store_image_bytes(self, image_bytes, key, image_format='', content_addressed=False):
+        """
+        :param image_bytes:
+        :param key:
+        :param image_format:
+        :param content_addressed: key came from generate_content_addressed_image_key, so if anything is stored there
+          it is already these bytes. We ask the backend every time, instead of remembering which keys we stored,
+          since another process may have deleted the file since.
+        :return: True if the image is in storage
+        """
+        try:
+            if content_addressed and self.backend.exists(key):
+                with self.upload_lock:
+                    self.upload_skipped_count += 1
+                return True
+            content_type = "image/{image_format}".format(image_format=image_format)
+            self.backend.put(key, image_bytes, content_type)
+            with self.upload_lock:
+                self.upload_count += 1
+            return True
+        except Exception as e:
+            logger.error("store_image_bytes failed for {key}: {error}".format(key=key, error=e))
+            return False
+
+    def store_image_bytes_async(self, image_bytes, key, image_format='', content_addressed=False):
+        """
+        store_image_bytes on one of the upload threads. Waits first if IMAGE_UPLOAD_QUEUE_SIZE uploads are already
+        waiting for a thread. A content addressed key already on its way up shares that upload.
+        :return: Future with the result of store_image_bytes
+        """
+        future = Future()
+        if content_addressed:
+            # Looked up and registered under one hold of the lock, so two threads can't both start this upload
+            with self.upload_lock:
+                upload_future = self.upload_future_by_key.get(key)
+                if upload_future is not None:
+                    self.upload_skipped_count += 1
+                    return upload_future
+                self.upload_future_by_key[key] = future
+
+        self.upload_slot_semaphore.acquire()
+        try:
+            self.retrieve_executor().submit(
+                self.run_upload, future, image_bytes, key, image_format, content_addressed)
+        except Exception as e:
+            self.finish_upload(key, future)
+            future.set_exception(e)
+            raise
+        return future
+
+    def run_upload(self, future, image_bytes, key, image_format, content_addressed):
+        try:
+            stored = self.store_image_bytes(image_bytes, key, image_format, content_addressed)
+        finally:
+            self.finish_upload(key, future)
+        future.set_result(stored)
+
+    def finish_upload(self, key, future):
+        with self.upload_lock:
+            if self.upload_future_by_key.get(key) is future:
+                del self.upload_future_by_key[key]
+        self.upload_slot_semaphore.release()
+
+    def retrieve_image_bytes(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.error("retrieve_image_bytes failed for {key}: {error}".format(key=key, error=e))
+            return None
+
+    def delete_image(self, key):
+        try:
+            self.backend.delete(key)
+            return True
+        except Exception as e:
+            logger.error("delete_image failed for {key}: {error}".format(key=key, error=e))
+            return False
+
+    def generate_image_url(self, key):
+        return self.backend.generate_url(key)
+
+
+image_storage_service = None
+image_storage_service_lock = Lock()
+
+
+def retrieve_image_storage_service():
+    """
+    The image storage service for this process: local files if IMAGE_STORAGE_DIRECTORY is set, otherwise AWS.
+    """
+    global image_storage_service
+    if image_storage_service is None:
+        with image_storage_service_lock:
+            if image_storage_service is None:
+                if positive_value_exists(IMAGE_STORAGE_DIRECTORY):
+                    backend = LocalImageStorageBackend(IMAGE_STORAGE_DIRECTORY)
+                else:
+                    backend = AwsImageStorageBackend()
+                image_storage_service = ImageStorageService(backend)
+    return image_storage_service
+
+
+def set_image_storage_service(new_image_storage_service):
+    """
+    Replace the image storage service for this process, e.g. with a LocalImageStorageBackend in a benchmark
+    """
+    global image_storage_service
+    with image_storage_service_lock:
+        image_storage_service = new_image_storage_service
@@ -0,0 +1,149 @@
+from io import BytesIO
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageOps
+
+from image.controllers import PROFILE_IMAGE_LARGE_HEIGHT, PROFILE_IMAGE_LARGE_WIDTH, PROFILE_IMAGE_MEDIUM_HEIGHT, \
+    PROFILE_IMAGE_MEDIUM_WIDTH, PROFILE_IMAGE_TINY_HEIGHT, PROFILE_IMAGE_TINY_WIDTH
+from image.controllers_image_pipeline import generate_resized_image_bytes, retrieve_source_image
+from image.controllers_image_storage import generate_content_addressed_image_key, IMAGE_UPLOAD_WORKERS, \
+    ImageStorageService, LocalImageStorageBackend
+from image.models import TWITTER_PROFILE_IMAGE_NAME, WeVoteImageManager
+
+
+class Command(BaseCommand):
+    help = 'Measures profile images per second cached as a master plus large, medium and tiny sizes, with temporary ' \
+           'files and a download per size (how we used to do it), with the in-memory pipeline, and with the ' \
+           'in-memory pipeline uploading in parallel to content addressed keys, storing to a local directory with ' \
+           'simulated upload latency instead of AWS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=50)
+        parser.add_argument('--source-size', type=int, default=1024, help='Width and height of each source image')
+        parser.add_argument('--latency-ms', type=int, default=100, help='Simulated source download time')
+        parser.add_argument('--upload-latency-ms', type=int, default=50, help='Simulated time of each storage request')
+        parser.add_argument('--workers', type=int, default=IMAGE_UPLOAD_WORKERS)
+        parser.add_argument('--storage-directory',
+                            default=os.path.join(tempfile.gettempdir(), 'we_vote_image_pipeline_benchmark'))
+
+    def handle(self, *args, **options):
+        latency_seconds = options['latency_ms'] / 1000.0
+        source_image_bytes = self.generate_source_image_bytes(options['source_size'])
+        size_list = [
+            (PROFILE_IMAGE_LARGE_WIDTH or 200, PROFILE_IMAGE_LARGE_HEIGHT or 200),
+            (PROFILE_IMAGE_MEDIUM_WIDTH or 48, PROFILE_IMAGE_MEDIUM_HEIGHT or 48),
+            (PROFILE_IMAGE_TINY_WIDTH or 32, PROFILE_IMAGE_TINY_HEIGHT or 32),
+        ]
+
+        def fetch_function(image_url_https):
+            time.sleep(latency_seconds)
+            return source_image_bytes
+
+        image_storage_service = ImageStorageService(
+            LocalImageStorageBackend(options['storage_directory'],
+                                     latency_seconds=options['upload_latency_ms'] / 1000.0),
+            number_of_workers=options['workers'])
+
+        def store_image_bytes(image_bytes, we_vote_image_file_location, image_format):
+            return image_storage_service.store_image_bytes(image_bytes, we_vote_image_file_location, image_format)
+
+        image_url_list = ["https://images.example.org/temporary_files/{number}.jpg".format(number=number)
+                          for number in range(options['images'])]
+        start_time = time.perf_counter()
+        for image_url_https in image_url_list:
+            self.cache_image_with_temporary_files(image_url_https, fetch_function, store_image_bytes, size_list)
+        self.write_images_per_second('Temporary files', len(image_url_list), start_time)
+
+        image_url_list = ["https://images.example.org/pipeline/{number}.jpg".format(number=number)
+                          for number in range(options['images'])]
+        start_time = time.perf_counter()
+        for number, image_url_https in enumerate(image_url_list):
+            source_image = retrieve_source_image(image_url_https, fetch_function)['source_image']
+            location = "pipeline/{number}".format(number=number)
+            store_image_bytes(source_image.image_bytes, location + "/master.jpg", source_image.image_format)
+            for image_width, image_height in size_list:
+                resized_image_bytes = generate_resized_image_bytes(
+                    source_image, image_width=image_width, image_height=image_height,
+                    image_type=TWITTER_PROFILE_IMAGE_NAME)
+                store_image_bytes(resized_image_bytes, location + "/{image_width}x{image_height}.jpg".format(
+                    image_width=image_width, image_height=image_height), 'jpg')
+        self.write_images_per_second('In-memory pipeline', len(image_url_list), start_time)
+
+        # Every source image here is the same, so after the first one the content addressed uploads are all skipped
+        for label in ['Parallel uploads', 'Parallel uploads, all stored']:
+            image_url_list = ["https://images.example.org/{label}/{number}.jpg".format(label=label, number=number)
+                              for number in range(options['images'])]
+            start_time = time.perf_counter()
+            upload_future_list = []
+            for image_url_https in image_url_list:
+                source_image = retrieve_source_image(image_url_https, fetch_function)['source_image']
+                upload_future_list.append(image_storage_service.store_image_bytes_async(
+                    source_image.image_bytes,
+                    generate_content_addressed_image_key(source_image.image_bytes, "parallel/master",
+                                                         source_image.image_format),
+                    source_image.image_format, content_addressed=True))
+                for image_width, image_height in size_list:
+                    resized_image_bytes = generate_resized_image_bytes(
+                        source_image, image_width=image_width, image_height=image_height,
+                        image_type=TWITTER_PROFILE_IMAGE_NAME)
+                    upload_future_list.append(image_storage_service.store_image_bytes_async(
+                        resized_image_bytes,
+                        generate_content_addressed_image_key(resized_image_bytes, "parallel/{image_width}x{image_height}"
+                                                             "".format(image_width=image_width,
+                                                                       image_height=image_height), 'jpg'),
+                        'jpg', content_addressed=True))
+            for upload_future in upload_future_list:
+                upload_future.result()
+            self.write_images_per_second(
+                "{label} ({workers} workers)".format(label=label, workers=options['workers']), len(image_url_list),
+                start_time)
+        self.stdout.write("{uploaded:,} images uploaded, {skipped:,} already stored".format(
+            uploaded=image_storage_service.upload_count, skipped=image_storage_service.upload_skipped_count))
+
+    @staticmethod
+    def generate_source_image_bytes(source_size):
+        gradient = Image.radial_gradient('L').resize((source_size, source_size))
+        source_image = Image.merge('RGB', [gradient, gradient.rotate(90), gradient.rotate(180)])
+        image_buffer = BytesIO()
+        source_image.save(image_buffer, format='JPEG', quality=90)
+        return image_buffer.getvalue()
+
+    @staticmethod
+    def cache_image_with_temporary_files(image_url_https, fetch_function, store_image_bytes, size_list):
+        """
+        The steps we used to take: analyze the url (two downloads and a decode), download the master to a temporary
+        file and upload it, then for each size download again, open, resize, save and upload the temporary file.
+        """
+        temporary_directory = tempfile.mkdtemp()
+        location = "temporary_files/" + os.path.basename(image_url_https).split('.')[0]
+        fetch_function(image_url_https)
+        ImageOps.exif_transpose(Image.open(BytesIO(fetch_function(image_url_https)))).load()
+
+        master_file_path = os.path.join(temporary_directory, 'master.jpg')
+        with open(master_file_path, 'wb') as master_file:
+            master_file.write(fetch_function(image_url_https))
+        with open(master_file_path, 'rb') as master_file:
+            store_image_bytes(master_file.read(), location + "/master.jpg", 'jpeg')
+        os.remove(master_file_path)
+
+        for image_width, image_height in size_list:
+            resized_file_path = os.path.join(temporary_directory, "{image_width}x{image_height}.jpg".format(
+                image_width=image_width, image_height=image_height))
+            with open(resized_file_path, 'wb') as resized_file:
+                resized_file.write(fetch_function(image_url_https))
+            image = WeVoteImageManager.resize_python_image(
+                ImageOps.exif_transpose(Image.open(resized_file_path)), image_width=image_width,
+                image_height=image_height, image_type=TWITTER_PROFILE_IMAGE_NAME)
+            image.convert('RGB').save(resized_file_path, quality=95, subsampling=0)
+            with open(resized_file_path, 'rb') as resized_file:
+                store_image_bytes(resized_file.read(), location + "/" + os.path.basename(resized_file_path), 'jpg')
+            os.remove(resized_file_path)
+        os.rmdir(temporary_directory)
+
+    def write_images_per_second(self, label, number_of_images, start_time):
+        elapsed_seconds = time.perf_counter() - start_time
+        self.stdout.write("{label:40} {images_per_second:10,.1f} images/second".format(
+            label=label, images_per_second=number_of_images / elapsed_seconds))
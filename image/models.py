@@ -2,17 +2,17 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
-from config.base import get_environment_variable
 from datetime import date
+from io import BytesIO
 from django.db import models
+from django.db.models import Q
 from exception.models import handle_record_found_more_than_one_exception, handle_exception, \
     handle_record_not_saved_exception, handle_record_not_deleted_exception
 from PIL import Image, ImageOps
-from urllib.request import urlretrieve
 from urllib.error import HTTPError
 from wevote_functions.functions import convert_to_int, positive_value_exists
-import boto3
 import wevote_functions.admin
+from .controllers_image_storage import retrieve_image_storage_service
 from .functions import analyze_remote_url
 
 # naming convention stored at aws
@@ -39,12 +39,6 @@ VOTE_USA_PROFILE_IMAGE_NAME = "vote_usa_profile_image"
 VOTER_UPLOADED_IMAGE_NAME = "voter_uploaded_profile_image"
 WIKIPEDIA_IMAGE_NAME = "wikipedia_image"
 
-AWS_ACCESS_KEY_ID = get_environment_variable("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = get_environment_variable("AWS_SECRET_ACCESS_KEY")
-AWS_REGION_NAME = get_environment_variable("AWS_REGION_NAME")
-AWS_STORAGE_BUCKET_NAME = get_environment_variable("AWS_STORAGE_BUCKET_NAME")
-AWS_STORAGE_SERVICE = "s3"
-
 logger = wevote_functions.admin.get_logger(__name__)
 
 
@@ -115,6 +109,8 @@ class WeVoteImage(models.Model):
     date_image_saved = models.DateTimeField(verbose_name="date when image saved on wevote", auto_now_add=True)
     same_day_image_version = models.BigIntegerField(verbose_name="image version on same day", null=True, blank=True)
     is_active_version = models.BooleanField(verbose_name="True if image is newest", default=False)
+    # Dominant color at the top corners of a large profile image, for the background behind it. Hex like "#1a2b3c"
+    profile_image_background_color = models.CharField(blank=True, null=True, max_length=7)
 
     kind_of_image_ballotpedia_profile = models.BooleanField(verbose_name="image is ballotpedia", default=False)
     kind_of_image_ctcl_profile = models.BooleanField(default=False)
@@ -157,6 +153,11 @@ class WeVoteImage(models.Model):
             models.Index(
                 fields=['is_active_version'],
                 name='is_active_version'),
+            # For finding the background color of a we_vote_hosted_profile_image_url_large
+            models.Index(
+                fields=['we_vote_image_url'],
+                condition=Q(kind_of_image_large=True),
+                name='large_image_url_index'),
         ]
 
     def display_kind_of_image(self):
@@ -367,17 +368,17 @@ class WeVoteImageManager(models.Manager):
     @staticmethod
     def delete_image_from_aws(we_vote_image_file_location):
         """
-        Delete image from aws
+        Delete image from aws, unless another WeVoteImage still uses it. Identical images share one content addressed
+        file, so call this before deleting the WeVoteImage itself. We count on the primary database, since a
+        WeVoteImage saved a moment ago for the same file might not be on the read replica yet.
         :param we_vote_image_file_location:
         :return:
         """
         try:
-
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            client.delete_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=we_vote_image_file_location)
-            image_deleted_from_aws = True
+            if WeVoteImage.objects.filter(
+                    we_vote_image_file_location=we_vote_image_file_location).count() > 1:
+                return True
+            image_deleted_from_aws = retrieve_image_storage_service().delete_image(we_vote_image_file_location)
         except Exception as e:
             image_deleted_from_aws = False
             exception_message = "delete_image_from_aws failed"
@@ -2070,76 +2071,49 @@ class WeVoteImageManager(models.Manager):
         return results
 
     @staticmethod
-    def resize_we_vote_master_image(
-            image_local_path='',
+    def resize_python_image(
+            python_image,
             image_width=0,
             image_height=0,
             image_type='',
-            image_offset_x=0,
-            image_offset_y=0,
-            convert_image_to_jpg=True):
+            image_offset_y=0):
         """
-        Resize image and save it to the same location
+        Resize a decoded image to one of our sizes. The source image is not changed, so every size can be made from
+        the same decoded image.
         Note re the facebook background:  We are scaling and sizing here to match the size of the html pane on the
         client, which is driven by the aspect ratio of the twitter banner.
-        :param image_local_path:
+        :param python_image: Already exif transposed
         :param image_width:
         :param image_height:
         :param image_type:
-        :param image_offset_x:
         :param image_offset_y:
-        :param convert_image_to_jpg:
         :return:
         """
-        try:
-            image_local_path = "/tmp/" + image_local_path
-            original_image = Image.open(image_local_path)
-            image = ImageOps.exif_transpose(original_image)
-            if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
-                image = image.resize((image_width, image_height), Image.Resampling.LANCZOS)
-            elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
-                centering_x = 0.5
-                centering_y = ((image.height - image_offset_y) * 0.5) / image.height
-                image = ImageOps.fit(image, (image_width, image_height), Image.Resampling.LANCZOS,
-                                     centering=(centering_x, centering_y))
-            else:
-                image = ImageOps.fit(image, (image_width, image_height), Image.Resampling.LANCZOS, centering=(0.5, 0.5))
-            if convert_image_to_jpg:
-                image = image.convert('RGB')
-                image.save(image_local_path, quality=95, subsampling=0)
-            else:
-                image.save(image_local_path)
-            resized_image_created = True
-        except Exception as e:
-            resized_image_created = False
-            exception_message = "resize_we_vote_master_image failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
-
-        return resized_image_created
+        if image_type == TWITTER_BACKGROUND_IMAGE_NAME or image_type == TWITTER_BANNER_IMAGE_NAME:
+            return python_image.resize((image_width, image_height), Image.Resampling.LANCZOS)
+        elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
+            centering_x = 0.5
+            centering_y = ((python_image.height - (image_offset_y or 0)) * 0.5) / python_image.height
+            return ImageOps.fit(python_image, (image_width, image_height), Image.Resampling.LANCZOS,
+                                centering=(centering_x, centering_y))
+        return ImageOps.fit(python_image, (image_width, image_height), Image.Resampling.LANCZOS, centering=(0.5, 0.5))
 
     @staticmethod
-    def store_image_locally(image_url_https, image_local_path):
+    def encode_python_image(python_image, convert_image_to_jpg=True, image_format=''):
         """
-        Save image locally at /tmp/ folder
-        :param image_url_https:
-        :param image_local_path:
-        :return:
+        Encode an image in memory, the way we store it
+        :param python_image:
+        :param convert_image_to_jpg:
+        :param image_format: When not converting to jpg, e.g. png
+        :return: bytes
         """
-        try:
-            image_local_path = "/tmp/" + image_local_path
-            urlretrieve(image_url_https, image_local_path)
-            image_stored = True
-        except HTTPError as error:  # something wrong with url
-            image_stored = False
-            exception_message = "store_image_locally failed because of http error"
-            handle_exception(error, logger=logger, exception_message=exception_message)
-        except Exception as e:
-            image_stored = False
-            exception_message = "store_image_locally failed"
-            handle_exception(e, logger=logger, exception_message=exception_message)
-
-        return image_stored
-
+        image_buffer = BytesIO()
+        if convert_image_to_jpg:
+            python_image.convert('RGB').save(image_buffer, format='JPEG', quality=95, subsampling=0)
+        else:
+            image_format = 'jpeg' if image_format in ('jpg', '') else image_format
+            python_image.save(image_buffer, format=image_format.upper())
+        return image_buffer.getvalue()
 
     @staticmethod
     def store_python_image_locally(python_image_library_image, image_local_path):
@@ -2174,15 +2148,12 @@ class WeVoteImageManager(models.Manager):
         :return:
         """
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
             upload_image_from_location = "/tmp/" + we_vote_image_file_name
             # print('-------------- temp file upload to aws ' +  upload_image_from_location)
-            content_type = "image/{image_format}".format(image_format=image_format)
-            client.upload_file(upload_image_from_location, AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location,
-                               ExtraArgs={'ContentType': content_type})
-            image_stored_to_aws = True
+            with open(upload_image_from_location, 'rb') as image_file:
+                image_bytes = image_file.read()
+            image_stored_to_aws = retrieve_image_storage_service().store_image_bytes(
+                image_bytes, we_vote_image_file_location, image_format)
         except Exception as e:
             image_stored_to_aws = False
             exception_message = "store_image_to_aws failed: " + str(e) + " "
@@ -2190,6 +2161,21 @@ class WeVoteImageManager(models.Manager):
 
         return image_stored_to_aws
 
+    @staticmethod
+    def store_image_bytes_to_aws(image_bytes, we_vote_image_file_location='', image_format='',
+                                 content_addressed=False):
+        """
+        Upload an encoded image straight from memory
+        :param image_bytes:
+        :param we_vote_image_file_location:
+        :param image_format:
+        :param content_addressed: we_vote_image_file_location came from generate_content_addressed_image_key, so we
+          skip the upload if those bytes are already stored
+        :return:
+        """
+        return retrieve_image_storage_service().store_image_bytes(
+            image_bytes, we_vote_image_file_location, image_format, content_addressed=content_addressed)
+
     @staticmethod
     def store_image_file_to_aws(image_file, we_vote_image_file_location):
         """
@@ -2199,13 +2185,9 @@ class WeVoteImageManager(models.Manager):
         :return:
         """
         try:
-            session = boto3.session.Session(region_name=AWS_REGION_NAME,
-                                            aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                            aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            s3 = session.resource(AWS_STORAGE_SERVICE)
-            s3.Bucket(AWS_STORAGE_BUCKET_NAME).put_object(Key=we_vote_image_file_location,
-                                                          Body=image_file)
-            image_stored_to_aws = True
+            image_format = we_vote_image_file_location.split(".")[-1] if "." in we_vote_image_file_location else ''
+            image_stored_to_aws = retrieve_image_storage_service().store_image_bytes(
+                image_file.read(), we_vote_image_file_location, image_format)
         except Exception as e:
             image_stored_to_aws = False
             exception_message = "store_image_file_to_aws failed"
@@ -2221,12 +2203,14 @@ class WeVoteImageManager(models.Manager):
         :return:
         """
         try:
-            client = boto3.client(AWS_STORAGE_SERVICE, region_name=AWS_REGION_NAME,
-                                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-            download_image_at_location = "/tmp/" + we_vote_image_file_location
-            client.download_file(AWS_STORAGE_BUCKET_NAME, we_vote_image_file_location, download_image_at_location)
-            image_retrieved_from_aws = True
+            image_bytes = retrieve_image_storage_service().retrieve_image_bytes(we_vote_image_file_location)
+            if image_bytes is None:
+                image_retrieved_from_aws = False
+            else:
+                download_image_at_location = "/tmp/" + we_vote_image_file_location
+                with open(download_image_at_location, 'wb') as image_file:
+                    image_file.write(image_bytes)
+                image_retrieved_from_aws = True
         except Exception as e:
             image_retrieved_from_aws = False
             exception_message = "retrieve_image_from_aws failed"
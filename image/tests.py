@@ -0,0 +1,278 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import os
+import tempfile
+from threading import Barrier, Event
+from unittest import mock
+
+import boto3
+from botocore.stub import Stubber
+from django.test import SimpleTestCase, TestCase
+from PIL import Image, ImageOps
+
+from image.controllers_image_pipeline import generate_resized_image_bytes, retrieve_source_image, \
+    SOURCE_IMAGE_CACHE_SECONDS, source_image_cache, SourceImage
+from image.controllers_image_storage import AwsImageStorageBackend, generate_content_addressed_image_key, \
+    ImageStorageService, LocalImageStorageBackend, retrieve_image_storage_service, set_image_storage_service
+from image.models import FACEBOOK_BACKGROUND_IMAGE_NAME, TWITTER_BANNER_IMAGE_NAME, WeVoteImage, WeVoteImageManager
+
+
+def generate_test_image_bytes(image_format, image_mode='RGB', image_size=(60, 40), exif_orientation=0):
+    # Four differently colored quarters, so a rotation or a shifted crop changes the pixels
+    python_image = Image.new(image_mode, image_size)
+    width, height = image_size
+    for quarter_index, color in enumerate(['red', 'green', 'blue', 'yellow']):
+        box = ((quarter_index % 2) * width // 2, (quarter_index // 2) * height // 2,
+               (quarter_index % 2 + 1) * width // 2, (quarter_index // 2 + 1) * height // 2)
+        python_image.paste(Image.new(image_mode, (box[2] - box[0], box[3] - box[1]), color), box)
+    save_options = {}
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        save_options['exif'] = exif
+    image_buffer = BytesIO()
+    python_image.save(image_buffer, format=image_format, **save_options)
+    return image_buffer.getvalue()
+
+
+def resize_image_file_the_old_way(image_local_path, image_width, image_height, image_type='', image_offset_y=0,
+                                  convert_image_to_jpg=True):
+    # How resize_we_vote_master_image made our sizes from a file in /tmp, before the in-memory pipeline
+    image = ImageOps.exif_transpose(Image.open(image_local_path))
+    if image_type == TWITTER_BANNER_IMAGE_NAME:
+        image = image.resize((image_width, image_height), Image.Resampling.LANCZOS)
+    elif image_type == FACEBOOK_BACKGROUND_IMAGE_NAME:
+        centering_y = ((image.height - image_offset_y) * 0.5) / image.height
+        image = ImageOps.fit(image, (image_width, image_height), Image.Resampling.LANCZOS,
+                             centering=(0.5, centering_y))
+    else:
+        image = ImageOps.fit(image, (image_width, image_height), Image.Resampling.LANCZOS, centering=(0.5, 0.5))
+    if convert_image_to_jpg:
+        image = image.convert('RGB')
+        image.save(image_local_path, quality=95, subsampling=0)
+    else:
+        image.save(image_local_path)
+    with open(image_local_path, 'rb') as image_file:
+        return image_file.read()
+
+
+class ImagePipelineTestCase(SimpleTestCase):
+
+    def setUp(self):
+        source_image_cache.clear()
+        self.addCleanup(source_image_cache.clear)
+        self.fetched_url_list = []
+
+    def fetch_test_image_bytes(self, image_url_https):
+        self.fetched_url_list.append(image_url_https)
+        return generate_test_image_bytes('PNG')
+
+    def test_source_image_is_fetched_once_until_it_expires(self):
+        first_results = retrieve_source_image('https://example.com/a.png', fetch_function=self.fetch_test_image_bytes)
+        self.assertIn('SOURCE_IMAGE_DECODED', first_results['status'])
+        second_results = retrieve_source_image('https://example.com/a.png', fetch_function=self.fetch_test_image_bytes)
+        self.assertIn('SOURCE_IMAGE_ALREADY_DECODED', second_results['status'])
+        self.assertIs(second_results['source_image'], first_results['source_image'])
+        self.assertEqual(self.fetched_url_list, ['https://example.com/a.png'])
+
+        decoded_at = first_results['source_image'].date_decoded
+        with mock.patch('image.controllers_image_pipeline.time.monotonic',
+                        return_value=decoded_at + SOURCE_IMAGE_CACHE_SECONDS + 1):
+            expired_results = retrieve_source_image(
+                'https://example.com/a.png', fetch_function=self.fetch_test_image_bytes)
+        self.assertIn('SOURCE_IMAGE_DECODED', expired_results['status'])
+        self.assertIsNot(expired_results['source_image'], first_results['source_image'])
+        self.assertEqual(len(self.fetched_url_list), 2)
+
+    def test_source_image_not_cached_when_not_decoded(self):
+        results = retrieve_source_image('https://example.com/bad.png', fetch_function=lambda image_url_https: b'bad')
+        self.assertFalse(results['success'])
+        self.assertNotIn('https://example.com/bad.png', source_image_cache)
+        self.assertFalse(retrieve_source_image('')['success'])
+
+    def test_encode_keeps_format_when_not_converting_to_jpg(self):
+        for image_format, image_mode, expected_format in [
+                ('png', 'RGBA', 'PNG'), ('gif', 'P', 'GIF'), ('jpg', 'RGB', 'JPEG'), ('', 'RGB', 'JPEG')]:
+            python_image = Image.new(image_mode, (10, 10))
+            encoded_image = Image.open(BytesIO(WeVoteImageManager.encode_python_image(
+                python_image, convert_image_to_jpg=False, image_format=image_format)))
+            self.assertEqual(encoded_image.format, expected_format)
+            self.assertEqual(encoded_image.mode, image_mode)
+        encoded_image = Image.open(BytesIO(WeVoteImageManager.encode_python_image(
+            Image.new('RGBA', (10, 10)), convert_image_to_jpg=True, image_format='png')))
+        self.assertEqual((encoded_image.format, encoded_image.mode), ('JPEG', 'RGB'))
+
+    def test_sizes_match_the_old_resize(self):
+        for image_bytes, image_format in [
+                (generate_test_image_bytes('PNG', image_mode='RGBA'), 'png'),
+                # Orientation 6: the camera was turned, and the image is shown rotated 90 degrees clockwise
+                (generate_test_image_bytes('JPEG', exif_orientation=6), 'jpeg')]:
+            source_image = SourceImage('https://example.com/test.' + image_format, image_bytes)
+            self.assertEqual(source_image.image_format, image_format)
+            if image_format == 'jpeg':
+                self.assertEqual((source_image.image_width, source_image.image_height), (40, 60))
+            for image_width, image_height, image_type, image_offset_y, convert_image_to_jpg in [
+                    (24, 24, '', 0, True), (24, 24, '', 0, False), (30, 10, TWITTER_BANNER_IMAGE_NAME, 0, True),
+                    (30, 10, FACEBOOK_BACKGROUND_IMAGE_NAME, 12, True)]:
+                with tempfile.TemporaryDirectory() as temporary_directory:
+                    # Like the old file names, .jpg when converting, which is what told PIL how to save it
+                    image_local_path = os.path.join(
+                        temporary_directory, 'test.' + ('jpg' if convert_image_to_jpg else image_format))
+                    with open(image_local_path, 'wb') as image_file:
+                        image_file.write(image_bytes)
+                    old_image_bytes = resize_image_file_the_old_way(
+                        image_local_path, image_width, image_height, image_type, image_offset_y, convert_image_to_jpg)
+                new_image_bytes = generate_resized_image_bytes(
+                    source_image, image_width=image_width, image_height=image_height, image_type=image_type,
+                    image_offset_y=image_offset_y, convert_image_to_jpg=convert_image_to_jpg)
+                old_image = Image.open(BytesIO(old_image_bytes))
+                new_image = Image.open(BytesIO(new_image_bytes))
+                self.assertEqual((new_image.format, new_image.mode, new_image.size),
+                                 (old_image.format, old_image.mode, old_image.size))
+                self.assertEqual(list(new_image.getdata()), list(old_image.getdata()))
+                # The source is unchanged, so the next size starts from the same image
+                self.assertEqual((source_image.image_width, source_image.image_height),
+                                 source_image.python_image.size)
+
+
+class ImageStorageTestCase(SimpleTestCase):
+
+    def setUp(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.image_storage_directory = temporary_directory.name
+        self.image_storage_service = ImageStorageService(
+            LocalImageStorageBackend(self.image_storage_directory), number_of_workers=2, upload_queue_size=2)
+
+    def test_store_retrieve_and_delete(self):
+        key = 'wvtestcand1/twitter_profile_image_48x48.jpg'
+        self.assertTrue(self.image_storage_service.store_image_bytes(b'first', key, 'jpeg'))
+        self.assertEqual(self.image_storage_service.retrieve_image_bytes(key), b'first')
+        # Not content addressed, so a new image for the key replaces the old one
+        self.assertTrue(self.image_storage_service.store_image_bytes(b'second', key, 'jpeg'))
+        self.assertEqual(self.image_storage_service.retrieve_image_bytes(key), b'second')
+        self.assertEqual(self.image_storage_service.generate_image_url(key),
+                         'file://' + os.path.abspath(self.image_storage_directory) + '/' + key)
+        self.assertTrue(self.image_storage_service.delete_image(key))
+        self.assertIsNone(self.image_storage_service.retrieve_image_bytes(key))
+        self.assertEqual(os.listdir(os.path.join(self.image_storage_directory, 'wvtestcand1')), [])
+
+    def test_content_addressed_image_is_uploaded_once(self):
+        key = generate_content_addressed_image_key(b'same bytes', 'wvtestcand1/twitter_profile_image_48x48', 'jpg')
+        self.assertEqual(key, generate_content_addressed_image_key(
+            b'same bytes', 'wvtestcand1/twitter_profile_image_48x48', 'jpg'))
+        self.assertNotEqual(key, generate_content_addressed_image_key(
+            b'other bytes', 'wvtestcand1/twitter_profile_image_48x48', 'jpg'))
+        for _ in range(3):
+            self.assertTrue(self.image_storage_service.store_image_bytes(
+                b'same bytes', key, 'jpeg', content_addressed=True))
+        self.assertEqual((self.image_storage_service.upload_count, self.image_storage_service.upload_skipped_count),
+                         (1, 2))
+
+        # Deleted by another process: stored again, instead of trusting that it was stored before
+        os.remove(os.path.join(self.image_storage_directory, key))
+        self.assertTrue(self.image_storage_service.store_image_bytes(
+            b'same bytes', key, 'jpeg', content_addressed=True))
+        self.assertEqual(self.image_storage_service.retrieve_image_bytes(key), b'same bytes')
+        self.assertEqual(self.image_storage_service.upload_count, 2)
+
+    def test_async_uploads_share_one_upload_per_content_addressed_key(self):
+        upload_may_finish = Event()
+        backend = self.image_storage_service.backend
+        backend_put = backend.put
+
+        def wait_then_put(key, image_bytes, content_type):
+            upload_may_finish.wait(5)
+            backend_put(key, image_bytes, content_type)
+
+        key_list = ['wvtestcand1/image-{number}.png'.format(number=number) for number in range(3)]
+        with mock.patch.object(backend, 'put', side_effect=wait_then_put):
+            future_list = [
+                self.image_storage_service.store_image_bytes_async(b'image', key, 'png', content_addressed=True)
+                for key in key_list]
+            # The same key while its upload is still on the way shares that upload
+            self.assertIs(self.image_storage_service.store_image_bytes_async(
+                b'image', key_list[0], 'png', content_addressed=True), future_list[0])
+            upload_may_finish.set()
+            self.assertEqual([future.result(timeout=5) for future in future_list], [True, True, True])
+        self.assertEqual((self.image_storage_service.upload_count, self.image_storage_service.upload_skipped_count),
+                         (3, 1))
+        for key in key_list:
+            self.assertEqual(self.image_storage_service.retrieve_image_bytes(key), b'image')
+        self.assertEqual(self.image_storage_service.upload_future_by_key, {})
+
+    def test_same_key_from_many_threads_is_uploaded_once(self):
+        key = generate_content_addressed_image_key(b'image', 'wvtestcand1/twitter_profile_image_48x48', 'png')
+        all_threads_ready = Barrier(8)
+
+        def store_image_bytes_async():
+            all_threads_ready.wait(5)
+            return self.image_storage_service.store_image_bytes_async(b'image', key, 'png', content_addressed=True)
+
+        upload_may_finish = Event()
+        backend_put = self.image_storage_service.backend.put
+
+        def wait_then_put(key, image_bytes, content_type):
+            upload_may_finish.wait(5)
+            backend_put(key, image_bytes, content_type)
+
+        with mock.patch.object(self.image_storage_service.backend, 'put', side_effect=wait_then_put):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                future_list = list(executor.map(lambda _: store_image_bytes_async(), range(8)))
+            upload_may_finish.set()
+            self.assertEqual([future.result(timeout=5) for future in future_list], [True] * 8)
+        self.assertEqual(len(set(future_list)), 1)
+        self.assertEqual((self.image_storage_service.upload_count, self.image_storage_service.upload_skipped_count),
+                         (1, 7))
+
+    def test_key_outside_storage_directory_is_refused(self):
+        for key in ['../outside.jpg', 'wvtestcand1/../../outside.jpg', '/tmp/outside.jpg']:
+            with self.assertRaises(ValueError):
+                self.image_storage_service.backend.file_path(key)
+            self.assertFalse(self.image_storage_service.store_image_bytes(b'image', key, 'jpeg'))
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.image_storage_directory), 'outside.jpg')))
+        self.assertEqual(os.listdir(self.image_storage_directory), [])
+
+
+class AwsImageStorageBackendTestCase(SimpleTestCase):
+
+    def test_forbidden_head_is_treated_as_missing(self):
+        backend = AwsImageStorageBackend(bucket_name='wevote-test-images')
+        backend.client = boto3.client(
+            's3', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+        image_storage_service = ImageStorageService(backend, number_of_workers=1, upload_queue_size=1)
+        with Stubber(backend.client) as stubber:
+            # A put-only IAM policy can't HEAD, so S3 answers 403
+            stubber.add_client_error('head_object', service_error_code='403', http_status_code=403)
+            stubber.add_response('put_object', {}, {
+                'Bucket': 'wevote-test-images', 'Key': 'wvtestcand1/image.png', 'Body': b'image',
+                'ContentType': 'image/png'})
+            self.assertTrue(image_storage_service.store_image_bytes(
+                b'image', 'wvtestcand1/image.png', 'png', content_addressed=True))
+            stubber.assert_no_pending_responses()
+        self.assertEqual(image_storage_service.upload_count, 1)
+
+
+class DeleteImageFromAwsTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.image_storage_directory = temporary_directory.name
+        previous_image_storage_service = retrieve_image_storage_service()
+        set_image_storage_service(ImageStorageService(LocalImageStorageBackend(self.image_storage_directory)))
+        self.addCleanup(set_image_storage_service, previous_image_storage_service)
+
+    def test_shared_file_is_kept_until_last_image_is_deleted(self):
+        key = 'wvtestcand1/twitter_profile_image-0123.jpg'
+        retrieve_image_storage_service().store_image_bytes(b'image', key, 'jpeg')
+        first_we_vote_image = WeVoteImage.objects.create(we_vote_image_file_location=key)
+        second_we_vote_image = WeVoteImage.objects.create(we_vote_image_file_location=key)
+
+        self.assertTrue(WeVoteImageManager.delete_image_from_aws(key))
+        second_we_vote_image.delete()
+        self.assertTrue(os.path.isfile(os.path.join(self.image_storage_directory, key)))
+        self.assertTrue(WeVoteImageManager.delete_image_from_aws(key))
+        first_we_vote_image.delete()
+        self.assertFalse(os.path.isfile(os.path.join(self.image_storage_directory, key)))
@@ -18,6 +18,7 @@ from config.base import get_environment_variable
 from electoral_district.models import ElectoralDistrict, ElectoralDistrictManager
 from election.models import BallotpediaElection, ElectionManager, Election
 from exception.models import handle_exception
+from geoip.models import geocode_with_cache
 from geopy.geocoders import get_geocoder_for_service
 from image.controllers import IMAGE_SOURCE_BALLOTPEDIA, \
     organize_object_photo_fields_based_on_image_type_currently_active
@@ -3374,7 +3375,7 @@ def voter_ballot_items_retrieve_from_ballotpedia_for_api_v4(
     try:
         # Make sure we have a latitude and longitude
         google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-        location = google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+        location = geocode_with_cache(google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         if location is None:
             status += 'RETRIEVE_FROM_BALLOTPEDIA-Could not find location matching "{}"'.format(text_for_map_search)
             success = False
@@ -38,6 +38,7 @@ from volunteer_task.models import VOLUNTEER_ACTION_CANDIDATE_CREATED, VOLUNTEER_
 from voter.models import fetch_voter_from_voter_device_link, VoterManager
 from voter_guide.controllers import refresh_existing_voter_guides
 from voter_guide.models import ORGANIZATION_WORD
+from wevote_settings.models import fetch_next_we_vote_id_polling_location_integer_list, fetch_site_unique_id_prefix
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_twitter_handle_from_text_string, positive_value_exists
 from wevote_functions.functions_date import get_current_year_as_integer
@@ -5005,8 +5006,21 @@ def import_polling_location_data_from_batch_row_actions(
         status += "POLLING_LOCATION_UPDATE_NOT_WORKING YET "
 
     polling_location_manager = PollingLocationManager()
+    new_we_vote_id_list = []
+    if create_entry_flag:
+        # Reserve the we_vote_ids of all the new map points at once, instead of one at a time as each one is saved
+        number_needed = len([one_batch_row_action for one_batch_row_action in batch_row_action_list
+                             if not positive_value_exists(one_batch_row_action.polling_location_we_vote_id)])
+        site_unique_id_prefix = fetch_site_unique_id_prefix()
+        new_we_vote_id_list = [
+            "wv{site_unique_id_prefix}ploc{next_integer}".format(
+                site_unique_id_prefix=site_unique_id_prefix, next_integer=next_integer)
+            for next_integer in fetch_next_we_vote_id_polling_location_integer_list(number_needed)]
+    new_we_vote_id_iterator = iter(new_we_vote_id_list)
     for one_batch_row_action in batch_row_action_list:
         if create_entry_flag:
+            we_vote_id_for_new_entry = '' if positive_value_exists(one_batch_row_action.polling_location_we_vote_id) \
+                else next(new_we_vote_id_iterator, '')
             results = polling_location_manager.update_or_create_polling_location(
                 one_batch_row_action.polling_location_we_vote_id, '',
                 one_batch_row_action.location_name, '', '',
@@ -5018,7 +5032,8 @@ def import_polling_location_data_from_batch_row_actions(
                 latitude=one_batch_row_action.latitude,
                 longitude=one_batch_row_action.longitude,
                 use_for_bulk_retrieve=one_batch_row_action.use_for_bulk_retrieve,
-                polling_location_deleted=one_batch_row_action.polling_location_deleted)
+                polling_location_deleted=one_batch_row_action.polling_location_deleted,
+                we_vote_id_for_new_entry=we_vote_id_for_new_entry)
 
             if not results['polling_location_created']:
                 continue
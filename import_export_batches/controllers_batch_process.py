@@ -6,7 +6,7 @@ from .controllers import create_batch_row_actions, import_data_from_batch_row_ac
 from .controllers_representatives import process_one_representatives_batch_process
 from .models import ACTIVITY_NOTICE_PROCESS, API_REFRESH_REQUEST, \
     AUGMENT_ANALYTICS_ACTION_WITH_ELECTION_ID, AUGMENT_ANALYTICS_ACTION_WITH_FIRST_VISIT, \
-    BatchDescription, BatchManager, BatchProcessManager, \
+    BatchDescription, BatchManager, BatchProcessBallotItemChunk, BatchProcessManager, \
     CALCULATE_ORGANIZATION_DAILY_METRICS, \
     CALCULATE_ORGANIZATION_ELECTION_METRICS, \
     CALCULATE_SITEWIDE_DAILY_METRICS, \
@@ -23,6 +23,8 @@ from analytics.controllers import calculate_sitewide_daily_metrics, \
     process_one_analytics_batch_process_augment_with_first_visit, process_sitewide_voter_metrics, \
     retrieve_analytics_processing_next_step
 from analytics.models import AnalyticsManager
+from api_internal_cache.controllers_precomputed_api import refresh_precomputed_api_response, \
+    schedule_prewarm_of_precomputed_apis
 from api_internal_cache.models import ApiInternalCacheManager
 from ballot.models import BallotReturnedListManager
 from campaign.controllers import update_campaignx_entries_from_politician_list
@@ -30,7 +32,7 @@ from candidate.controllers import fetch_ballotpedia_urls_to_retrieve_for_links_c
     fetch_ballotpedia_urls_to_retrieve_for_photos_count
 from candidate.models import CandidateListManager
 from datetime import timedelta
-from django.db.models import Q
+from django.db.models import Q, Sum
 from django.utils.timezone import localtime, now
 from election.models import ElectionManager
 from exception.models import handle_exception
@@ -40,13 +42,13 @@ from import_export_twitter.controllers import fetch_number_of_candidates_needing
     retrieve_and_update_candidates_needing_twitter_update, retrieve_and_update_organizations_needing_twitter_update, \
     retrieve_and_update_representatives_needing_twitter_update, retrieve_possible_twitter_handles_in_bulk
 from issue.controllers import update_issue_statistics
-import json
 from politician.controllers import fetch_number_of_politicians_to_match_to_organizations
 from position.models import PositionEntered
-from voter_guide.controllers import voter_guides_upcoming_retrieve_for_api
 from voter_guide.models import VoterGuideManager, VoterGuidesGenerated
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.functions_geo import BALLOT_RETURNED_MAP_POINTS, invalidate_map_point_spatial_index, \
+    OFFICES_HELD_FOR_LOCATION_MAP_POINTS
 from wevote_settings.models import fetch_batch_process_system_on, fetch_batch_process_system_activity_notices_on, \
     fetch_batch_process_system_api_refresh_on, fetch_batch_process_system_ballot_items_on, \
     fetch_batch_process_system_general_maintenance_on, \
@@ -1482,33 +1484,13 @@ def process_one_api_refresh_request_batch_process(batch_process):
         }
         return results
 
-    api_internal_cache_id = 0
-    api_internal_cache_saved = False
-    api_results_retrieved = False
-    if batch_process.api_name == 'voterGuidesUpcoming':
-        status += "STARTING_PROCESS_ONE_API_REFRESH_REQUESTED-voterGuidesUpcoming-" \
-                  "(" + str(batch_process.election_id_list_serialized) + ") "
-        google_civic_election_id_list = json.loads(batch_process.election_id_list_serialized)
-        results = voter_guides_upcoming_retrieve_for_api(google_civic_election_id_list=google_civic_election_id_list)
-        status += results['status']
-        api_results_retrieved = results['success']
-        json_data = results['json_data']
-        if json_data['success'] and api_results_retrieved:
-            # Save the json in the cache
-            status += "NEW_API_RESULTS_RETRIEVED-CREATING_API_INTERNAL_CACHE "
-            cached_api_response_serialized = json.dumps(json_data)
-            results = api_internal_cache_manager.create_api_internal_cache(
-                api_name=batch_process.api_name,
-                cached_api_response_serialized=cached_api_response_serialized,
-                election_id_list_serialized=batch_process.election_id_list_serialized,
-            )
-            status += results['status']
-            api_internal_cache_saved = results['success']
-            api_internal_cache_id = results['api_internal_cache_id']
-        else:
-            status += "NEW_API_RESULTS_RETRIEVE_FAILED "
-    else:
-        status += "API_NAME_NOT_RECOGNIZED: " + str(batch_process.api_name) + " "
+    # Regenerate and store the response for any endpoint declared in PRECOMPUTED_API_REGISTRY
+    results = refresh_precomputed_api_response(
+        api_name=batch_process.api_name,
+        election_id_list_serialized=batch_process.election_id_list_serialized)
+    status += results['status']
+    api_internal_cache_saved = results['api_internal_cache_saved']
+    api_results_retrieved = results['api_results_retrieved']
 
     if api_results_retrieved and api_internal_cache_saved:
         try:
@@ -1536,14 +1518,6 @@ def process_one_api_refresh_request_batch_process(batch_process):
             }
             return results
 
-        # Mark all refresh requests prior to now as satisfied
-        if positive_value_exists(api_internal_cache_id):
-            results = api_internal_cache_manager.mark_prior_api_internal_cache_entries_as_replaced(
-                api_name=batch_process.api_name,
-                election_id_list_serialized=batch_process.election_id_list_serialized,
-                excluded_api_internal_cache_id=api_internal_cache_id)
-            status += results['status']
-
         # Mark all refresh requests prior to now as satisfied
         results = api_internal_cache_manager.mark_refresh_completed_for_prior_api_refresh_requested(
             api_name=batch_process.api_name,
@@ -1660,6 +1634,8 @@ def process_one_ballot_item_batch_process(batch_process):
         # Kick off retrieve
         retrieve_success = False
         retrieve_row_count = 0
+        ballot_fingerprint_count = 0
+        ballot_fingerprint_hit_count = 0
         batch_set_id = 0
         try:
             # If here, we are about to retrieve ballot items
@@ -1708,6 +1684,8 @@ def process_one_ballot_item_batch_process(batch_process):
             retrieve_success = positive_value_exists(results['success'])
             batch_set_id = results['batch_set_id']
             retrieve_row_count = results['retrieve_row_count']
+            ballot_fingerprint_count = results.get('ballot_fingerprint_count', 0)
+            ballot_fingerprint_hit_count = results.get('ballot_fingerprint_hit_count', 0)
             status += results['status']
             if 'batch_process_ballot_item_chunk' in results:
                 if results['batch_process_ballot_item_chunk'] and \
@@ -1750,6 +1728,8 @@ def process_one_ballot_item_batch_process(batch_process):
             retrieve_success = positive_value_exists(results['success'])
             batch_set_id = results['batch_set_id']
             retrieve_row_count = results['retrieve_row_count']
+            ballot_fingerprint_count = results.get('ballot_fingerprint_count', 0)
+            ballot_fingerprint_hit_count = results.get('ballot_fingerprint_hit_count', 0)
             status += results['status']
             if 'batch_process_ballot_item_chunk' in results:
                 if results['batch_process_ballot_item_chunk'] and \
@@ -1766,6 +1746,8 @@ def process_one_ballot_item_batch_process(batch_process):
                     # If here, then ballots were retrieved, so we can set retrieve_date_completed
                     batch_process_ballot_item_chunk.batch_set_id = batch_set_id
                     batch_process_ballot_item_chunk.retrieve_row_count = retrieve_row_count
+                    batch_process_ballot_item_chunk.retrieve_fingerprint_count = ballot_fingerprint_count
+                    batch_process_ballot_item_chunk.retrieve_fingerprint_hit_count = ballot_fingerprint_hit_count
                     batch_process_ballot_item_chunk.retrieve_date_completed = now()
                     batch_process_ballot_item_chunk.save()
                     status += "RETRIEVE_DATE_STARTED-RETRIEVE_DATE_COMPLETED_SAVED "
@@ -1833,6 +1815,11 @@ def process_one_ballot_item_batch_process(batch_process):
                     state_code=state_code,
                     status=status)
                 status += results['status']
+                if positive_value_exists(google_civic_election_id):
+                    # This election's data import is done, so refresh the precomputed API responses now
+                    results = schedule_prewarm_of_precomputed_apis(
+                        google_civic_election_id_list=[google_civic_election_id])
+                    status += results['status']
                 results = {
                     'success': success,
                     'status': status,
@@ -3490,6 +3477,32 @@ def process_batch_set(batch_set_id=0, analyze_all=False, create_all=False, delet
     return results
 
 
+def generate_ballot_fingerprint_completion_summary(batch_process_id=0):
+    """
+    How many map points were linked to ballot items already groomed for a neighboring map point
+    """
+    try:
+        totals = BatchProcessBallotItemChunk.objects.using('readonly') \
+            .filter(batch_process_id=batch_process_id) \
+            .aggregate(fingerprint_count=Sum('retrieve_fingerprint_count'),
+                       fingerprint_hit_count=Sum('retrieve_fingerprint_hit_count'),
+                       retrieve_row_count=Sum('retrieve_row_count'))
+    except Exception as e:
+        return "BALLOT_FINGERPRINT_SUMMARY_FAILED: " + str(e)
+    fingerprint_count = totals['fingerprint_count'] or 0
+    fingerprint_hit_count = totals['fingerprint_hit_count'] or 0
+    hit_ratio_percent = round(100.0 * fingerprint_hit_count / fingerprint_count, 1) \
+        if positive_value_exists(fingerprint_count) else 0.0
+    return \
+        "Ballots Retrieved: {retrieve_row_count:,}, " \
+        "Ballot Fingerprint Hits: {fingerprint_hit_count:,} out of {fingerprint_count:,} " \
+        "({hit_ratio_percent}%)" \
+        "".format(retrieve_row_count=totals['retrieve_row_count'] or 0,
+                  fingerprint_hit_count=fingerprint_hit_count,
+                  fingerprint_count=fingerprint_count,
+                  hit_ratio_percent=hit_ratio_percent)
+
+
 def mark_batch_process_as_complete(
         batch_process=None,
         batch_process_ballot_item_chunk=None,
@@ -3523,9 +3536,22 @@ def mark_batch_process_as_complete(
             if batch_process.date_completed is None:
                 batch_process.date_checked_out = None
                 batch_process.date_completed = now()
+            if batch_process.kind_of_process in [
+                    REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS] \
+                    and not positive_value_exists(batch_process.completion_summary):
+                batch_process.completion_summary = \
+                    generate_ballot_fingerprint_completion_summary(batch_process_id=batch_process.id)
             batch_process.save()
             batch_process_updated = True
             status += "BATCH_PROCESS_MARKED_COMPLETE "
+            # The map point data for this election has changed, so each worker rebuilds its spatial index
+            if batch_process.kind_of_process in [
+                    REFRESH_BALLOT_ITEMS_FROM_POLLING_LOCATIONS, RETRIEVE_BALLOT_ITEMS_FROM_POLLING_LOCATIONS]:
+                invalidate_map_point_spatial_index(
+                    kind_of_map_point=BALLOT_RETURNED_MAP_POINTS,
+                    google_civic_election_id=batch_process.google_civic_election_id)
+            elif batch_process.kind_of_process == RETRIEVE_REPRESENTATIVES_FROM_POLLING_LOCATIONS:
+                invalidate_map_point_spatial_index(kind_of_map_point=OFFICES_HELD_FOR_LOCATION_MAP_POINTS)
         except Exception as e:
             success = False
             status += "ERROR-CANNOT_MARK_BATCH_PROCESS_AS_COMPLETE: " + str(e) + " "
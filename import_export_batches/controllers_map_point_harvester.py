@@ -0,0 +1,235 @@
+# import_export_batches/controllers_map_point_harvester.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import os
+import random
+from threading import Lock
+import time
+
+from config.base import get_environment_variable_default
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+MAP_POINT_PROVIDER_CTCL = 'CTCL'
+MAP_POINT_PROVIDER_VOTE_USA = 'VOTE_USA'
+
+# Requests per second we allow ourselves to send to each provider, from this process
+MAP_POINT_PROVIDER_REQUESTS_PER_SECOND = {
+    MAP_POINT_PROVIDER_CTCL:        convert_to_int(
+        get_environment_variable_default('CTCL_REQUESTS_PER_SECOND', 5)),
+    MAP_POINT_PROVIDER_VOTE_USA:    convert_to_int(
+        get_environment_variable_default('VOTE_USA_REQUESTS_PER_SECOND', 5)),
+}
+MAP_POINT_HARVESTER_WORKERS = convert_to_int(get_environment_variable_default('MAP_POINT_HARVESTER_WORKERS', 8))
+# Responses we let pile up ahead of the (sequential) ballot processing, per worker
+MAP_POINT_HARVESTER_PREFETCH_PER_WORKER = 2
+MAP_POINT_HARVESTER_MAX_ATTEMPTS = 4
+MAP_POINT_HARVESTER_BACKOFF_SECONDS = 1.0
+MAP_POINT_HARVESTER_MAX_BACKOFF_SECONDS = 30.0
+MAP_POINT_HARVESTER_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+MAP_POINT_HARVESTER_REQUEST_TIMEOUT_SECONDS = 60
+# When set, every provider response is also written to <directory>/<provider>/<map point we_vote_id>.json,
+#  so benchmark_map_point_harvester can replay them offline
+MAP_POINT_RESPONSE_RECORDING_DIRECTORY = get_environment_variable_default('MAP_POINT_RESPONSE_RECORDING_DIRECTORY', '')
+
+
+class TokenBucket:
+    """
+    Allows requests_per_second on average, with bursts of up to `capacity` requests. Safe to share between threads.
+    """
+
+    def __init__(self, requests_per_second, capacity=None):
+        self.requests_per_second = max(float(requests_per_second), 0.001)
+        self.capacity = float(capacity) if capacity else max(self.requests_per_second, 1.0)
+        self.tokens = self.capacity
+        self.time_last_refilled = time.monotonic()
+        self.lock = Lock()
+
+    def refill(self):
+        current_time = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (current_time - self.time_last_refilled) * self.requests_per_second)
+        self.time_last_refilled = current_time
+
+    def acquire(self):
+        """
+        Wait until a token is available, and take it.
+        :return: seconds spent waiting
+        """
+        seconds_waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return seconds_waited
+                seconds_to_wait = (1.0 - self.tokens) / self.requests_per_second
+            time.sleep(seconds_to_wait)
+            seconds_waited += seconds_to_wait
+
+
+# One bucket per provider, shared by every harvest running in this process
+provider_token_buckets = {}
+provider_token_buckets_lock = Lock()
+
+
+def get_provider_token_bucket(provider):
+    with provider_token_buckets_lock:
+        if provider not in provider_token_buckets:
+            provider_token_buckets[provider] = TokenBucket(MAP_POINT_PROVIDER_REQUESTS_PER_SECOND.get(provider, 1))
+        return provider_token_buckets[provider]
+
+
+def calculate_retry_backoff_seconds(attempt_number):
+    """
+    Exponential backoff with full jitter: 0 to 1, 0 to 2, 0 to 4... seconds
+    """
+    backoff_ceiling = min(MAP_POINT_HARVESTER_MAX_BACKOFF_SECONDS,
+                          MAP_POINT_HARVESTER_BACKOFF_SECONDS * (2 ** attempt_number))
+    return random.uniform(0, backoff_ceiling)
+
+
+def record_map_point_response(provider, polling_location_we_vote_id, response):
+    if not positive_value_exists(MAP_POINT_RESPONSE_RECORDING_DIRECTORY) or response is None:
+        return
+    try:
+        recording_directory = os.path.join(MAP_POINT_RESPONSE_RECORDING_DIRECTORY, provider)
+        os.makedirs(recording_directory, exist_ok=True)
+        with open(os.path.join(recording_directory, polling_location_we_vote_id + '.json'), 'w') as recording_file:
+            recording_file.write(response.text)
+    except Exception as e:
+        logger.error("MAP_POINT_RESPONSE_RECORDING_FAILED: " + str(e))
+
+
+def fetch_map_point_response_with_retries(provider, fetch_function, polling_location, token_bucket=None):
+    """
+    Runs in a harvester thread: no database access here, only the provider request.
+    :param provider:
+    :param fetch_function: takes polling_location and returns a requests Response, or None to skip this map point
+    :param polling_location:
+    :param token_bucket:
+    :return: results dict. Unless 'success', 'response' is None and 'status' says why: the map point was skipped, or
+        every attempt raised an exception or got a MAP_POINT_HARVESTER_RETRY_STATUS_CODES answer. Callers skip the map
+        point then, instead of asking the provider again.
+    """
+    success = False
+    status = ''
+    response = None
+    attempts = 0
+    if token_bucket is None:
+        token_bucket = get_provider_token_bucket(provider)
+    while attempts < MAP_POINT_HARVESTER_MAX_ATTEMPTS:
+        if attempts > 0:
+            time.sleep(calculate_retry_backoff_seconds(attempts - 1))
+        attempts += 1
+        token_bucket.acquire()
+        try:
+            response = fetch_function(polling_location)
+        except Exception as e:
+            status += 'MAP_POINT_FETCH_EXCEPTION: ' + str(e) + ' '
+            continue
+        if response is None:
+            # Nothing to ask the provider about this map point, like a missing address
+            status += 'MAP_POINT_FETCH_SKIPPED '
+            break
+        if response.status_code in MAP_POINT_HARVESTER_RETRY_STATUS_CODES:
+            status += 'MAP_POINT_FETCH_RETRY_STATUS_CODE: ' + str(response.status_code) + ' '
+            continue
+        record_map_point_response(provider, polling_location.we_vote_id, response)
+        success = True
+        break
+    if not success:
+        if response is not None:
+            status += 'MAP_POINT_FETCH_RETRIES_EXHAUSTED '
+        response = None
+    return {
+        'success':          success,
+        'status':           status,
+        'polling_location': polling_location,
+        'response':         response,
+        'attempts':         attempts,
+    }
+
+
+def harvest_map_point_responses(provider, polling_location_list, fetch_function,
+                                number_of_workers=MAP_POINT_HARVESTER_WORKERS, token_bucket=None):
+    """
+    Send the provider requests for many map points at once, and hand back the responses as they arrive.
+    This is a generator: the caller processes each response (and updates its existing_*_dict caches) in its own
+    thread, while the next requests are already in flight. At most
+    number_of_workers * MAP_POINT_HARVESTER_PREFETCH_PER_WORKER responses wait in memory for the caller.
+    :param provider: MAP_POINT_PROVIDER_CTCL or MAP_POINT_PROVIDER_VOTE_USA, selects the rate limit
+    :param polling_location_list:
+    :param fetch_function: takes polling_location and returns a requests Response
+    :param number_of_workers:
+    :param token_bucket: defaults to the shared bucket for this provider
+    :return: yields the results dict from fetch_map_point_response_with_retries, in completion order
+    """
+    if token_bucket is None:
+        token_bucket = get_provider_token_bucket(provider)
+    number_of_workers = max(convert_to_int(number_of_workers), 1)
+    maximum_in_flight = number_of_workers * MAP_POINT_HARVESTER_PREFETCH_PER_WORKER
+    polling_location_iterator = iter(polling_location_list)
+    in_flight = set()
+    executor = ThreadPoolExecutor(max_workers=number_of_workers, thread_name_prefix='map_point_harvester')
+    try:
+        while True:
+            for polling_location in polling_location_iterator:
+                in_flight.add(executor.submit(
+                    fetch_map_point_response_with_retries,
+                    provider, fetch_function, polling_location, token_bucket))
+                if len(in_flight) >= maximum_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # If the caller stops early, don't send the requests it will never look at
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class RecordedMapPointResponse:
+    """
+    Stands in for a requests Response, with the body from a recorded provider response.
+    """
+
+    def __init__(self, text, status_code=200, url=''):
+        self.text = text
+        self.status_code = status_code
+        self.url = url
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def generate_recorded_response_fetch_function(recording_directory, provider, latency_seconds=0.0):
+    """
+    A fetch_function for harvest_map_point_responses that answers from files written with
+    MAP_POINT_RESPONSE_RECORDING_DIRECTORY, after sleeping latency_seconds like a provider would.
+    Map points without a recording get the first recorded response, so a small recording can drive a long benchmark.
+    """
+    provider_directory = os.path.join(recording_directory, provider)
+    recorded_text_by_we_vote_id = {}
+    if os.path.isdir(provider_directory):
+        for file_name in sorted(os.listdir(provider_directory)):
+            if file_name.endswith('.json'):
+                with open(os.path.join(provider_directory, file_name)) as recording_file:
+                    recorded_text_by_we_vote_id[file_name[:-len('.json')]] = recording_file.read()
+    default_text = next(iter(recorded_text_by_we_vote_id.values()), '{}')
+
+    def fetch_recorded_response(polling_location):
+        if latency_seconds:
+            time.sleep(latency_seconds)
+        return RecordedMapPointResponse(recorded_text_by_we_vote_id.get(polling_location.we_vote_id, default_text))
+
+    return fetch_recorded_response
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+import time
+
+from django.core.management.base import BaseCommand
+
+from import_export_batches.controllers_map_point_harvester import generate_recorded_response_fetch_function, \
+    harvest_map_point_responses, MAP_POINT_HARVESTER_WORKERS, MAP_POINT_PROVIDER_REQUESTS_PER_SECOND, \
+    MAP_POINT_PROVIDER_VOTE_USA, MAP_POINT_RESPONSE_RECORDING_DIRECTORY, TokenBucket
+
+
+class Command(BaseCommand):
+    help = 'Measures map points per minute for the ballot retrieve, one map point at a time (how we used to do it) ' \
+           'and with the concurrent harvester, replaying responses recorded with ' \
+           'MAP_POINT_RESPONSE_RECORDING_DIRECTORY instead of calling the provider.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', default=MAP_POINT_PROVIDER_VOTE_USA, help='CTCL or VOTE_USA')
+        parser.add_argument('--recording-directory', default=MAP_POINT_RESPONSE_RECORDING_DIRECTORY)
+        parser.add_argument('--map-points', type=int, default=200)
+        parser.add_argument('--latency-ms', type=int, default=800, help='Simulated provider response time')
+        parser.add_argument('--processing-ms', type=int, default=50,
+                            help='Simulated time we spend storing one ballot')
+        parser.add_argument('--workers', type=int, default=MAP_POINT_HARVESTER_WORKERS)
+        parser.add_argument('--requests-per-second', type=float, default=0,
+                            help='Defaults to the rate limit for this provider')
+
+    def handle(self, *args, **options):
+        provider = options['provider']
+        processing_seconds = options['processing_ms'] / 1000.0
+        requests_per_second = options['requests_per_second'] or \
+            MAP_POINT_PROVIDER_REQUESTS_PER_SECOND.get(provider, 1)
+        fetch_function = generate_recorded_response_fetch_function(
+            options['recording_directory'], provider, latency_seconds=options['latency_ms'] / 1000.0)
+        polling_location_list = [SimpleNamespace(we_vote_id="wvbenchploc{number}".format(number=number))
+                                 for number in range(options['map_points'])]
+
+        start_time = time.perf_counter()
+        for polling_location in polling_location_list:
+            fetch_function(polling_location).json()
+            time.sleep(processing_seconds)
+        self.write_map_points_per_minute('One map point at a time', len(polling_location_list), start_time)
+
+        start_time = time.perf_counter()
+        for harvested_results in harvest_map_point_responses(
+                provider, polling_location_list, fetch_function, number_of_workers=options['workers'],
+                token_bucket=TokenBucket(requests_per_second)):
+            harvested_results['response'].json()
+            time.sleep(processing_seconds)
+        self.write_map_points_per_minute(
+            "Harvester ({workers} workers, {rate:g}/s)".format(workers=options['workers'], rate=requests_per_second),
+            len(polling_location_list), start_time)
+
+    def write_map_points_per_minute(self, label, number_of_map_points, start_time):
+        elapsed_seconds = time.perf_counter() - start_time
+        self.stdout.write("{label:36} {map_points_per_minute:10,.0f} map points/minute".format(
+            label=label, map_points_per_minute=number_of_map_points * 60 / elapsed_seconds))
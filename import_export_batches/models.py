@@ -4,7 +4,9 @@
 
 import codecs
 import csv
+import itertools
 import json
+import time
 import urllib
 import xml.etree.ElementTree as ElementTree
 from datetime import date, timedelta
@@ -12,7 +14,7 @@ from urllib.parse import quote
 from urllib.request import Request, urlopen
 
 import magic
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.utils.timezone import now
 
@@ -86,6 +88,9 @@ KIND_OF_ACTION_CHOICES = (
     (IMPORT_ADD_TO_EXISTING,   'Add to Existing'),
 )
 
+# BatchRows are saved with one bulk_create per this many rows
+BATCH_ROW_BULK_CREATE_SIZE = 500
+
 BATCH_SET_SOURCE_CTCL = 'CTCL'
 BATCH_SET_SOURCE_IMPORT_EXPORT_ENDORSEMENTS = 'IMPORT_EXPORT_ENDORSEMENTS'
 BATCH_SET_SOURCE_IMPORT_BALLOTPEDIA_BALLOT_ITEMS = 'IMPORT_BALLOTPEDIA_BALLOT_ITEMS'
@@ -871,13 +876,82 @@ class BatchManager(models.Manager):
 
         return results
 
+    @staticmethod
+    def bulk_create_batch_rows(batch_row_iterator, batch_row_bulk_create_size=BATCH_ROW_BULK_CREATE_SIZE):
+        """
+        Save unsaved BatchRow objects with one bulk_create per batch_row_bulk_create_size rows, all in one
+        transaction. Only one group of rows is in memory at a time, so pass a generator for large files.
+        If any group fails, none of the rows are saved.
+        :param batch_row_iterator: iterable of unsaved BatchRow objects
+        :param batch_row_bulk_create_size:
+        :return: results dict
+        """
+        status = ""
+        success = True
+        number_of_batch_rows = 0
+        batch_row_bulk_create_size = max(convert_to_int(batch_row_bulk_create_size), 1)
+        t0 = time.time()
+        try:
+            with transaction.atomic():
+                batch_row_list = []
+                for batch_row in batch_row_iterator:
+                    batch_row_list.append(batch_row)
+                    if len(batch_row_list) >= batch_row_bulk_create_size:
+                        BatchRow.objects.bulk_create(batch_row_list)
+                        number_of_batch_rows += len(batch_row_list)
+                        batch_row_list = []
+                if len(batch_row_list):
+                    BatchRow.objects.bulk_create(batch_row_list)
+                    number_of_batch_rows += len(batch_row_list)
+        except Exception as e:
+            success = False
+            number_of_batch_rows = 0
+            status += "EXCEPTION_BATCH_ROW_BULK_CREATE: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+
+        seconds = time.time() - t0
+        rows_per_second = number_of_batch_rows / seconds if seconds > 0 else 0
+        if success:
+            status += "BATCH_ROWS_SAVED: " + str(number_of_batch_rows) + \
+                " ({:.0f} rows/second) ".format(rows_per_second)
+        results = {
+            'success':              success,
+            'status':               status,
+            'number_of_batch_rows': number_of_batch_rows,
+            'rows_per_second':      rows_per_second,
+        }
+        return results
+
+    @staticmethod
+    def delete_batch_without_rows(batch_header_id):
+        """
+        Remove the BatchHeader, BatchHeaderMap and BatchDescription saved for a batch whose BatchRows could not be
+        saved, so an empty batch isn't left behind looking like a finished import.
+        :param batch_header_id:
+        :return: status string
+        """
+        status = ""
+        try:
+            BatchDescription.objects.filter(batch_header_id=batch_header_id).delete()
+            BatchHeaderMap.objects.filter(batch_header_id=batch_header_id).delete()
+            BatchHeader.objects.filter(id=batch_header_id).delete()
+            status += "BATCH_WITHOUT_ROWS_DELETED "
+        except Exception as e:
+            status += "EXCEPTION_DELETING_BATCH_WITHOUT_ROWS: " + str(e) + " "
+            handle_exception(e, logger=logger, exception_message=status)
+        return status
+
     def create_batch_from_csv_data(self, file_name, csv_data, kind_of_batch, google_civic_election_id=0,
-                                   organization_we_vote_id="", polling_location_we_vote_id=""):
-        first_line = True
+                                   organization_we_vote_id="", polling_location_we_vote_id="",
+                                   batch_row_bulk_create_size=BATCH_ROW_BULK_CREATE_SIZE):
+        """
+        csv_data is read one line at a time while the BatchRows are saved, so pass a csv.reader over the file or
+        response (not a list) to keep memory flat for large files.
+        """
         success = False
         status = ""
         number_of_batch_rows = 0
-        # limit_for_testing = 5
+        rows_per_second = 0
 
         # Retrieve from JSON
         # request = Request(batch_uri, headers={'User-Agent': 'Mozilla/5.0'})
@@ -889,218 +963,221 @@ class BatchManager(models.Manager):
 
         batch_header_id = 0
         batch_header_map_id = 0
-        for line in csv_data:
-            if first_line:
-                first_line = False
-                try:
-                    batch_header = BatchHeader.objects.create(
-                        batch_header_column_000=get_value_if_index_in_list(line, 0),
-                        batch_header_column_001=get_value_if_index_in_list(line, 1),
-                        batch_header_column_002=get_value_if_index_in_list(line, 2),
-                        batch_header_column_003=get_value_if_index_in_list(line, 3),
-                        batch_header_column_004=get_value_if_index_in_list(line, 4),
-                        batch_header_column_005=get_value_if_index_in_list(line, 5),
-                        batch_header_column_006=get_value_if_index_in_list(line, 6),
-                        batch_header_column_007=get_value_if_index_in_list(line, 7),
-                        batch_header_column_008=get_value_if_index_in_list(line, 8),
-                        batch_header_column_009=get_value_if_index_in_list(line, 9),
-                        batch_header_column_010=get_value_if_index_in_list(line, 10),
-                        batch_header_column_011=get_value_if_index_in_list(line, 11),
-                        batch_header_column_012=get_value_if_index_in_list(line, 12),
-                        batch_header_column_013=get_value_if_index_in_list(line, 13),
-                        batch_header_column_014=get_value_if_index_in_list(line, 14),
-                        batch_header_column_015=get_value_if_index_in_list(line, 15),
-                        batch_header_column_016=get_value_if_index_in_list(line, 16),
-                        batch_header_column_017=get_value_if_index_in_list(line, 17),
-                        batch_header_column_018=get_value_if_index_in_list(line, 18),
-                        batch_header_column_019=get_value_if_index_in_list(line, 19),
-                        batch_header_column_020=get_value_if_index_in_list(line, 20),
-                        batch_header_column_021=get_value_if_index_in_list(line, 21),
-                        batch_header_column_022=get_value_if_index_in_list(line, 22),
-                        batch_header_column_023=get_value_if_index_in_list(line, 23),
-                        batch_header_column_024=get_value_if_index_in_list(line, 24),
-                        batch_header_column_025=get_value_if_index_in_list(line, 25),
-                        batch_header_column_026=get_value_if_index_in_list(line, 26),
-                        batch_header_column_027=get_value_if_index_in_list(line, 27),
-                        batch_header_column_028=get_value_if_index_in_list(line, 28),
-                        batch_header_column_029=get_value_if_index_in_list(line, 29),
-                        batch_header_column_030=get_value_if_index_in_list(line, 30),
-                        batch_header_column_031=get_value_if_index_in_list(line, 31),
-                        batch_header_column_032=get_value_if_index_in_list(line, 32),
-                        batch_header_column_033=get_value_if_index_in_list(line, 33),
-                        batch_header_column_034=get_value_if_index_in_list(line, 34),
-                        batch_header_column_035=get_value_if_index_in_list(line, 35),
-                        batch_header_column_036=get_value_if_index_in_list(line, 36),
-                        batch_header_column_037=get_value_if_index_in_list(line, 37),
-                        batch_header_column_038=get_value_if_index_in_list(line, 38),
-                        batch_header_column_039=get_value_if_index_in_list(line, 39),
-                        batch_header_column_040=get_value_if_index_in_list(line, 40),
-                        batch_header_column_041=get_value_if_index_in_list(line, 41),
-                        batch_header_column_042=get_value_if_index_in_list(line, 42),
-                        batch_header_column_043=get_value_if_index_in_list(line, 43),
-                        batch_header_column_044=get_value_if_index_in_list(line, 44),
-                        batch_header_column_045=get_value_if_index_in_list(line, 45),
-                        batch_header_column_046=get_value_if_index_in_list(line, 46),
-                        batch_header_column_047=get_value_if_index_in_list(line, 47),
-                        batch_header_column_048=get_value_if_index_in_list(line, 48),
-                        batch_header_column_049=get_value_if_index_in_list(line, 49),
-                        batch_header_column_050=get_value_if_index_in_list(line, 50),
-                        )
-                    batch_header_id = batch_header.id
+        csv_data_iterator = iter(csv_data)
+        for line in csv_data_iterator:
+            # Only the first line is read here. The rest are BatchRows, saved in bulk below.
+            try:
+                batch_header = BatchHeader.objects.create(
+                    batch_header_column_000=get_value_if_index_in_list(line, 0),
+                    batch_header_column_001=get_value_if_index_in_list(line, 1),
+                    batch_header_column_002=get_value_if_index_in_list(line, 2),
+                    batch_header_column_003=get_value_if_index_in_list(line, 3),
+                    batch_header_column_004=get_value_if_index_in_list(line, 4),
+                    batch_header_column_005=get_value_if_index_in_list(line, 5),
+                    batch_header_column_006=get_value_if_index_in_list(line, 6),
+                    batch_header_column_007=get_value_if_index_in_list(line, 7),
+                    batch_header_column_008=get_value_if_index_in_list(line, 8),
+                    batch_header_column_009=get_value_if_index_in_list(line, 9),
+                    batch_header_column_010=get_value_if_index_in_list(line, 10),
+                    batch_header_column_011=get_value_if_index_in_list(line, 11),
+                    batch_header_column_012=get_value_if_index_in_list(line, 12),
+                    batch_header_column_013=get_value_if_index_in_list(line, 13),
+                    batch_header_column_014=get_value_if_index_in_list(line, 14),
+                    batch_header_column_015=get_value_if_index_in_list(line, 15),
+                    batch_header_column_016=get_value_if_index_in_list(line, 16),
+                    batch_header_column_017=get_value_if_index_in_list(line, 17),
+                    batch_header_column_018=get_value_if_index_in_list(line, 18),
+                    batch_header_column_019=get_value_if_index_in_list(line, 19),
+                    batch_header_column_020=get_value_if_index_in_list(line, 20),
+                    batch_header_column_021=get_value_if_index_in_list(line, 21),
+                    batch_header_column_022=get_value_if_index_in_list(line, 22),
+                    batch_header_column_023=get_value_if_index_in_list(line, 23),
+                    batch_header_column_024=get_value_if_index_in_list(line, 24),
+                    batch_header_column_025=get_value_if_index_in_list(line, 25),
+                    batch_header_column_026=get_value_if_index_in_list(line, 26),
+                    batch_header_column_027=get_value_if_index_in_list(line, 27),
+                    batch_header_column_028=get_value_if_index_in_list(line, 28),
+                    batch_header_column_029=get_value_if_index_in_list(line, 29),
+                    batch_header_column_030=get_value_if_index_in_list(line, 30),
+                    batch_header_column_031=get_value_if_index_in_list(line, 31),
+                    batch_header_column_032=get_value_if_index_in_list(line, 32),
+                    batch_header_column_033=get_value_if_index_in_list(line, 33),
+                    batch_header_column_034=get_value_if_index_in_list(line, 34),
+                    batch_header_column_035=get_value_if_index_in_list(line, 35),
+                    batch_header_column_036=get_value_if_index_in_list(line, 36),
+                    batch_header_column_037=get_value_if_index_in_list(line, 37),
+                    batch_header_column_038=get_value_if_index_in_list(line, 38),
+                    batch_header_column_039=get_value_if_index_in_list(line, 39),
+                    batch_header_column_040=get_value_if_index_in_list(line, 40),
+                    batch_header_column_041=get_value_if_index_in_list(line, 41),
+                    batch_header_column_042=get_value_if_index_in_list(line, 42),
+                    batch_header_column_043=get_value_if_index_in_list(line, 43),
+                    batch_header_column_044=get_value_if_index_in_list(line, 44),
+                    batch_header_column_045=get_value_if_index_in_list(line, 45),
+                    batch_header_column_046=get_value_if_index_in_list(line, 46),
+                    batch_header_column_047=get_value_if_index_in_list(line, 47),
+                    batch_header_column_048=get_value_if_index_in_list(line, 48),
+                    batch_header_column_049=get_value_if_index_in_list(line, 49),
+                    batch_header_column_050=get_value_if_index_in_list(line, 50),
+                    )
+                batch_header_id = batch_header.id
 
-                    if positive_value_exists(batch_header_id):
-                        # Save an initial BatchHeaderMap
+                if positive_value_exists(batch_header_id):
+                    # Save an initial BatchHeaderMap
 
-                        # For each line, check for translation suggestions
-                        batch_header_map = BatchHeaderMap.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_000=get_header_map_value_if_index_in_list(line, 0, kind_of_batch),
-                            batch_header_map_001=get_header_map_value_if_index_in_list(line, 1, kind_of_batch),
-                            batch_header_map_002=get_header_map_value_if_index_in_list(line, 2, kind_of_batch),
-                            batch_header_map_003=get_header_map_value_if_index_in_list(line, 3, kind_of_batch),
-                            batch_header_map_004=get_header_map_value_if_index_in_list(line, 4, kind_of_batch),
-                            batch_header_map_005=get_header_map_value_if_index_in_list(line, 5, kind_of_batch),
-                            batch_header_map_006=get_header_map_value_if_index_in_list(line, 6, kind_of_batch),
-                            batch_header_map_007=get_header_map_value_if_index_in_list(line, 7, kind_of_batch),
-                            batch_header_map_008=get_header_map_value_if_index_in_list(line, 8, kind_of_batch),
-                            batch_header_map_009=get_header_map_value_if_index_in_list(line, 9, kind_of_batch),
-                            batch_header_map_010=get_header_map_value_if_index_in_list(line, 10, kind_of_batch),
-                            batch_header_map_011=get_header_map_value_if_index_in_list(line, 11, kind_of_batch),
-                            batch_header_map_012=get_header_map_value_if_index_in_list(line, 12, kind_of_batch),
-                            batch_header_map_013=get_header_map_value_if_index_in_list(line, 13, kind_of_batch),
-                            batch_header_map_014=get_header_map_value_if_index_in_list(line, 14, kind_of_batch),
-                            batch_header_map_015=get_header_map_value_if_index_in_list(line, 15, kind_of_batch),
-                            batch_header_map_016=get_header_map_value_if_index_in_list(line, 16, kind_of_batch),
-                            batch_header_map_017=get_header_map_value_if_index_in_list(line, 17, kind_of_batch),
-                            batch_header_map_018=get_header_map_value_if_index_in_list(line, 18, kind_of_batch),
-                            batch_header_map_019=get_header_map_value_if_index_in_list(line, 19, kind_of_batch),
-                            batch_header_map_020=get_header_map_value_if_index_in_list(line, 20, kind_of_batch),
-                            batch_header_map_021=get_header_map_value_if_index_in_list(line, 21, kind_of_batch),
-                            batch_header_map_022=get_header_map_value_if_index_in_list(line, 22, kind_of_batch),
-                            batch_header_map_023=get_header_map_value_if_index_in_list(line, 23, kind_of_batch),
-                            batch_header_map_024=get_header_map_value_if_index_in_list(line, 24, kind_of_batch),
-                            batch_header_map_025=get_header_map_value_if_index_in_list(line, 25, kind_of_batch),
-                            batch_header_map_026=get_header_map_value_if_index_in_list(line, 26, kind_of_batch),
-                            batch_header_map_027=get_header_map_value_if_index_in_list(line, 27, kind_of_batch),
-                            batch_header_map_028=get_header_map_value_if_index_in_list(line, 28, kind_of_batch),
-                            batch_header_map_029=get_header_map_value_if_index_in_list(line, 29, kind_of_batch),
-                            batch_header_map_030=get_header_map_value_if_index_in_list(line, 30, kind_of_batch),
-                            batch_header_map_031=get_header_map_value_if_index_in_list(line, 31, kind_of_batch),
-                            batch_header_map_032=get_header_map_value_if_index_in_list(line, 32, kind_of_batch),
-                            batch_header_map_033=get_header_map_value_if_index_in_list(line, 33, kind_of_batch),
-                            batch_header_map_034=get_header_map_value_if_index_in_list(line, 34, kind_of_batch),
-                            batch_header_map_035=get_header_map_value_if_index_in_list(line, 35, kind_of_batch),
-                            batch_header_map_036=get_header_map_value_if_index_in_list(line, 36, kind_of_batch),
-                            batch_header_map_037=get_header_map_value_if_index_in_list(line, 37, kind_of_batch),
-                            batch_header_map_038=get_header_map_value_if_index_in_list(line, 38, kind_of_batch),
-                            batch_header_map_039=get_header_map_value_if_index_in_list(line, 39, kind_of_batch),
-                            batch_header_map_040=get_header_map_value_if_index_in_list(line, 40, kind_of_batch),
-                            batch_header_map_041=get_header_map_value_if_index_in_list(line, 41, kind_of_batch),
-                            batch_header_map_042=get_header_map_value_if_index_in_list(line, 42, kind_of_batch),
-                            batch_header_map_043=get_header_map_value_if_index_in_list(line, 43, kind_of_batch),
-                            batch_header_map_044=get_header_map_value_if_index_in_list(line, 44, kind_of_batch),
-                            batch_header_map_045=get_header_map_value_if_index_in_list(line, 45, kind_of_batch),
-                            batch_header_map_046=get_header_map_value_if_index_in_list(line, 46, kind_of_batch),
-                            batch_header_map_047=get_header_map_value_if_index_in_list(line, 47, kind_of_batch),
-                            batch_header_map_048=get_header_map_value_if_index_in_list(line, 48, kind_of_batch),
-                            batch_header_map_049=get_header_map_value_if_index_in_list(line, 49, kind_of_batch),
-                            batch_header_map_050=get_header_map_value_if_index_in_list(line, 50, kind_of_batch),
+                    # For each line, check for translation suggestions
+                    batch_header_map = BatchHeaderMap.objects.create(
+                        batch_header_id=batch_header_id,
+                        batch_header_map_000=get_header_map_value_if_index_in_list(line, 0, kind_of_batch),
+                        batch_header_map_001=get_header_map_value_if_index_in_list(line, 1, kind_of_batch),
+                        batch_header_map_002=get_header_map_value_if_index_in_list(line, 2, kind_of_batch),
+                        batch_header_map_003=get_header_map_value_if_index_in_list(line, 3, kind_of_batch),
+                        batch_header_map_004=get_header_map_value_if_index_in_list(line, 4, kind_of_batch),
+                        batch_header_map_005=get_header_map_value_if_index_in_list(line, 5, kind_of_batch),
+                        batch_header_map_006=get_header_map_value_if_index_in_list(line, 6, kind_of_batch),
+                        batch_header_map_007=get_header_map_value_if_index_in_list(line, 7, kind_of_batch),
+                        batch_header_map_008=get_header_map_value_if_index_in_list(line, 8, kind_of_batch),
+                        batch_header_map_009=get_header_map_value_if_index_in_list(line, 9, kind_of_batch),
+                        batch_header_map_010=get_header_map_value_if_index_in_list(line, 10, kind_of_batch),
+                        batch_header_map_011=get_header_map_value_if_index_in_list(line, 11, kind_of_batch),
+                        batch_header_map_012=get_header_map_value_if_index_in_list(line, 12, kind_of_batch),
+                        batch_header_map_013=get_header_map_value_if_index_in_list(line, 13, kind_of_batch),
+                        batch_header_map_014=get_header_map_value_if_index_in_list(line, 14, kind_of_batch),
+                        batch_header_map_015=get_header_map_value_if_index_in_list(line, 15, kind_of_batch),
+                        batch_header_map_016=get_header_map_value_if_index_in_list(line, 16, kind_of_batch),
+                        batch_header_map_017=get_header_map_value_if_index_in_list(line, 17, kind_of_batch),
+                        batch_header_map_018=get_header_map_value_if_index_in_list(line, 18, kind_of_batch),
+                        batch_header_map_019=get_header_map_value_if_index_in_list(line, 19, kind_of_batch),
+                        batch_header_map_020=get_header_map_value_if_index_in_list(line, 20, kind_of_batch),
+                        batch_header_map_021=get_header_map_value_if_index_in_list(line, 21, kind_of_batch),
+                        batch_header_map_022=get_header_map_value_if_index_in_list(line, 22, kind_of_batch),
+                        batch_header_map_023=get_header_map_value_if_index_in_list(line, 23, kind_of_batch),
+                        batch_header_map_024=get_header_map_value_if_index_in_list(line, 24, kind_of_batch),
+                        batch_header_map_025=get_header_map_value_if_index_in_list(line, 25, kind_of_batch),
+                        batch_header_map_026=get_header_map_value_if_index_in_list(line, 26, kind_of_batch),
+                        batch_header_map_027=get_header_map_value_if_index_in_list(line, 27, kind_of_batch),
+                        batch_header_map_028=get_header_map_value_if_index_in_list(line, 28, kind_of_batch),
+                        batch_header_map_029=get_header_map_value_if_index_in_list(line, 29, kind_of_batch),
+                        batch_header_map_030=get_header_map_value_if_index_in_list(line, 30, kind_of_batch),
+                        batch_header_map_031=get_header_map_value_if_index_in_list(line, 31, kind_of_batch),
+                        batch_header_map_032=get_header_map_value_if_index_in_list(line, 32, kind_of_batch),
+                        batch_header_map_033=get_header_map_value_if_index_in_list(line, 33, kind_of_batch),
+                        batch_header_map_034=get_header_map_value_if_index_in_list(line, 34, kind_of_batch),
+                        batch_header_map_035=get_header_map_value_if_index_in_list(line, 35, kind_of_batch),
+                        batch_header_map_036=get_header_map_value_if_index_in_list(line, 36, kind_of_batch),
+                        batch_header_map_037=get_header_map_value_if_index_in_list(line, 37, kind_of_batch),
+                        batch_header_map_038=get_header_map_value_if_index_in_list(line, 38, kind_of_batch),
+                        batch_header_map_039=get_header_map_value_if_index_in_list(line, 39, kind_of_batch),
+                        batch_header_map_040=get_header_map_value_if_index_in_list(line, 40, kind_of_batch),
+                        batch_header_map_041=get_header_map_value_if_index_in_list(line, 41, kind_of_batch),
+                        batch_header_map_042=get_header_map_value_if_index_in_list(line, 42, kind_of_batch),
+                        batch_header_map_043=get_header_map_value_if_index_in_list(line, 43, kind_of_batch),
+                        batch_header_map_044=get_header_map_value_if_index_in_list(line, 44, kind_of_batch),
+                        batch_header_map_045=get_header_map_value_if_index_in_list(line, 45, kind_of_batch),
+                        batch_header_map_046=get_header_map_value_if_index_in_list(line, 46, kind_of_batch),
+                        batch_header_map_047=get_header_map_value_if_index_in_list(line, 47, kind_of_batch),
+                        batch_header_map_048=get_header_map_value_if_index_in_list(line, 48, kind_of_batch),
+                        batch_header_map_049=get_header_map_value_if_index_in_list(line, 49, kind_of_batch),
+                        batch_header_map_050=get_header_map_value_if_index_in_list(line, 50, kind_of_batch),
+                    )
+                    batch_header_map_id = batch_header_map.id
+                    status += "BATCH_HEADER_MAP_SAVED "
+
+                if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
+                    # Now save the BatchDescription
+                    if positive_value_exists(file_name):
+                        batch_name = str(batch_header_id) + ": " + file_name
+                    if not positive_value_exists(batch_name):
+                        batch_name = str(batch_header_id) + ": " + kind_of_batch
+                    batch_description_text = ""
+                    batch_description = BatchDescription.objects.create(
+                        batch_header_id=batch_header_id,
+                        batch_header_map_id=batch_header_map_id,
+                        batch_name=batch_name,
+                        batch_description_text=batch_description_text,
+                        google_civic_election_id=google_civic_election_id,
+                        kind_of_batch=kind_of_batch,
+                        organization_we_vote_id=organization_we_vote_id,
+                        polling_location_we_vote_id=polling_location_we_vote_id,
+                        # source_uri=batch_uri,
                         )
-                        batch_header_map_id = batch_header_map.id
-                        status += "BATCH_HEADER_MAP_SAVED "
+                    status += "BATCH_DESCRIPTION_SAVED "
+                    success = True
+            except Exception as e:
+                # Stop trying to save rows -- break out of the for loop
+                batch_header_id = 0
+                status += "EXCEPTION_BATCH_HEADER: " + str(e) + " "
+                handle_exception(e, logger=logger, exception_message=status)
+            break
 
-                    if positive_value_exists(batch_header_id) and positive_value_exists(batch_header_map_id):
-                        # Now save the BatchDescription
-                        if positive_value_exists(file_name):
-                            batch_name = str(batch_header_id) + ": " + file_name
-                        if not positive_value_exists(batch_name):
-                            batch_name = str(batch_header_id) + ": " + kind_of_batch
-                        batch_description_text = ""
-                        batch_description = BatchDescription.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_header_map_id=batch_header_map_id,
-                            batch_name=batch_name,
-                            batch_description_text=batch_description_text,
-                            google_civic_election_id=google_civic_election_id,
-                            kind_of_batch=kind_of_batch,
-                            organization_we_vote_id=organization_we_vote_id,
-                            polling_location_we_vote_id=polling_location_we_vote_id,
-                            # source_uri=batch_uri,
-                            )
-                        status += "BATCH_DESCRIPTION_SAVED "
-                        success = True
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    batch_header_id = 0
-                    status += "EXCEPTION_BATCH_HEADER: " + str(e) + " "
-                    handle_exception(e, logger=logger, exception_message=status)
-                    break
-            else:
-                # if number_of_batch_rows >= limit_for_testing:
-                #     break
-                if positive_value_exists(batch_header_id):
-                    try:
-                        batch_row = BatchRow.objects.create(
-                            batch_header_id=batch_header_id,
-                            batch_row_000=get_value_if_index_in_list(line, 0),
-                            batch_row_001=get_value_if_index_in_list(line, 1),
-                            batch_row_002=get_value_if_index_in_list(line, 2),
-                            batch_row_003=get_value_if_index_in_list(line, 3),
-                            batch_row_004=get_value_if_index_in_list(line, 4),
-                            batch_row_005=get_value_if_index_in_list(line, 5),
-                            batch_row_006=get_value_if_index_in_list(line, 6),
-                            batch_row_007=get_value_if_index_in_list(line, 7),
-                            batch_row_008=get_value_if_index_in_list(line, 8),
-                            batch_row_009=get_value_if_index_in_list(line, 9),
-                            batch_row_010=get_value_if_index_in_list(line, 10),
-                            batch_row_011=get_value_if_index_in_list(line, 11),
-                            batch_row_012=get_value_if_index_in_list(line, 12),
-                            batch_row_013=get_value_if_index_in_list(line, 13),
-                            batch_row_014=get_value_if_index_in_list(line, 14),
-                            batch_row_015=get_value_if_index_in_list(line, 15),
-                            batch_row_016=get_value_if_index_in_list(line, 16),
-                            batch_row_017=get_value_if_index_in_list(line, 17),
-                            batch_row_018=get_value_if_index_in_list(line, 18),
-                            batch_row_019=get_value_if_index_in_list(line, 19),
-                            batch_row_020=get_value_if_index_in_list(line, 20),
-                            batch_row_021=get_value_if_index_in_list(line, 21),
-                            batch_row_022=get_value_if_index_in_list(line, 22),
-                            batch_row_023=get_value_if_index_in_list(line, 23),
-                            batch_row_024=get_value_if_index_in_list(line, 24),
-                            batch_row_025=get_value_if_index_in_list(line, 25),
-                            batch_row_026=get_value_if_index_in_list(line, 26),
-                            batch_row_027=get_value_if_index_in_list(line, 27),
-                            batch_row_028=get_value_if_index_in_list(line, 28),
-                            batch_row_029=get_value_if_index_in_list(line, 29),
-                            batch_row_030=get_value_if_index_in_list(line, 30),
-                            batch_row_031=get_value_if_index_in_list(line, 31),
-                            batch_row_032=get_value_if_index_in_list(line, 32),
-                            batch_row_033=get_value_if_index_in_list(line, 33),
-                            batch_row_034=get_value_if_index_in_list(line, 34),
-                            batch_row_035=get_value_if_index_in_list(line, 35),
-                            batch_row_036=get_value_if_index_in_list(line, 36),
-                            batch_row_037=get_value_if_index_in_list(line, 37),
-                            batch_row_038=get_value_if_index_in_list(line, 38),
-                            batch_row_039=get_value_if_index_in_list(line, 39),
-                            batch_row_040=get_value_if_index_in_list(line, 40),
-                            batch_row_041=get_value_if_index_in_list(line, 41),
-                            batch_row_042=get_value_if_index_in_list(line, 42),
-                            batch_row_043=get_value_if_index_in_list(line, 43),
-                            batch_row_044=get_value_if_index_in_list(line, 44),
-                            batch_row_045=get_value_if_index_in_list(line, 45),
-                            batch_row_046=get_value_if_index_in_list(line, 46),
-                            batch_row_047=get_value_if_index_in_list(line, 47),
-                            batch_row_048=get_value_if_index_in_list(line, 48),
-                            batch_row_049=get_value_if_index_in_list(line, 49),
-                            batch_row_050=get_value_if_index_in_list(line, 50),
-                            google_civic_election_id=google_civic_election_id,
-                            polling_location_we_vote_id=polling_location_we_vote_id,
-                        )
-                        number_of_batch_rows += 1
-                    except Exception as e:
-                        # Stop trying to save rows -- break out of the for loop
-                        status += "EXCEPTION_BATCH_ROW: " + str(e) + " "
-                        break
+        if positive_value_exists(batch_header_id):
+            def generate_batch_rows():
+                for one_line in csv_data_iterator:
+                    yield BatchRow(
+                        batch_header_id=batch_header_id,
+                        batch_row_000=get_value_if_index_in_list(one_line, 0),
+                        batch_row_001=get_value_if_index_in_list(one_line, 1),
+                        batch_row_002=get_value_if_index_in_list(one_line, 2),
+                        batch_row_003=get_value_if_index_in_list(one_line, 3),
+                        batch_row_004=get_value_if_index_in_list(one_line, 4),
+                        batch_row_005=get_value_if_index_in_list(one_line, 5),
+                        batch_row_006=get_value_if_index_in_list(one_line, 6),
+                        batch_row_007=get_value_if_index_in_list(one_line, 7),
+                        batch_row_008=get_value_if_index_in_list(one_line, 8),
+                        batch_row_009=get_value_if_index_in_list(one_line, 9),
+                        batch_row_010=get_value_if_index_in_list(one_line, 10),
+                        batch_row_011=get_value_if_index_in_list(one_line, 11),
+                        batch_row_012=get_value_if_index_in_list(one_line, 12),
+                        batch_row_013=get_value_if_index_in_list(one_line, 13),
+                        batch_row_014=get_value_if_index_in_list(one_line, 14),
+                        batch_row_015=get_value_if_index_in_list(one_line, 15),
+                        batch_row_016=get_value_if_index_in_list(one_line, 16),
+                        batch_row_017=get_value_if_index_in_list(one_line, 17),
+                        batch_row_018=get_value_if_index_in_list(one_line, 18),
+                        batch_row_019=get_value_if_index_in_list(one_line, 19),
+                        batch_row_020=get_value_if_index_in_list(one_line, 20),
+                        batch_row_021=get_value_if_index_in_list(one_line, 21),
+                        batch_row_022=get_value_if_index_in_list(one_line, 22),
+                        batch_row_023=get_value_if_index_in_list(one_line, 23),
+                        batch_row_024=get_value_if_index_in_list(one_line, 24),
+                        batch_row_025=get_value_if_index_in_list(one_line, 25),
+                        batch_row_026=get_value_if_index_in_list(one_line, 26),
+                        batch_row_027=get_value_if_index_in_list(one_line, 27),
+                        batch_row_028=get_value_if_index_in_list(one_line, 28),
+                        batch_row_029=get_value_if_index_in_list(one_line, 29),
+                        batch_row_030=get_value_if_index_in_list(one_line, 30),
+                        batch_row_031=get_value_if_index_in_list(one_line, 31),
+                        batch_row_032=get_value_if_index_in_list(one_line, 32),
+                        batch_row_033=get_value_if_index_in_list(one_line, 33),
+                        batch_row_034=get_value_if_index_in_list(one_line, 34),
+                        batch_row_035=get_value_if_index_in_list(one_line, 35),
+                        batch_row_036=get_value_if_index_in_list(one_line, 36),
+                        batch_row_037=get_value_if_index_in_list(one_line, 37),
+                        batch_row_038=get_value_if_index_in_list(one_line, 38),
+                        batch_row_039=get_value_if_index_in_list(one_line, 39),
+                        batch_row_040=get_value_if_index_in_list(one_line, 40),
+                        batch_row_041=get_value_if_index_in_list(one_line, 41),
+                        batch_row_042=get_value_if_index_in_list(one_line, 42),
+                        batch_row_043=get_value_if_index_in_list(one_line, 43),
+                        batch_row_044=get_value_if_index_in_list(one_line, 44),
+                        batch_row_045=get_value_if_index_in_list(one_line, 45),
+                        batch_row_046=get_value_if_index_in_list(one_line, 46),
+                        batch_row_047=get_value_if_index_in_list(one_line, 47),
+                        batch_row_048=get_value_if_index_in_list(one_line, 48),
+                        batch_row_049=get_value_if_index_in_list(one_line, 49),
+                        batch_row_050=get_value_if_index_in_list(one_line, 50),
+                        google_civic_election_id=google_civic_election_id,
+                        polling_location_we_vote_id=polling_location_we_vote_id,
+                    )
+
+            bulk_create_results = self.bulk_create_batch_rows(generate_batch_rows(), batch_row_bulk_create_size)
+            status += bulk_create_results['status']
+            number_of_batch_rows = bulk_create_results['number_of_batch_rows']
+            rows_per_second = bulk_create_results['rows_per_second']
+            if not bulk_create_results['success']:
+                status += self.delete_batch_without_rows(batch_header_id)
+                batch_header_id = 0
+                success = False
 
         results = {
             'success':              success,
@@ -1108,22 +1185,29 @@ class BatchManager(models.Manager):
             'batch_header_id':      batch_header_id,
             'batch_saved':          success,
             'number_of_batch_rows': number_of_batch_rows,
+            'rows_per_second':      rows_per_second,
         }
         return results
 
     def create_batch_from_json(self, file_name, structured_json_list, mapping_dict, kind_of_batch,
                                google_civic_election_id=0, organization_we_vote_id="", polling_location_we_vote_id="",
-                               batch_set_id=0, state_code=""):
+                               batch_set_id=0, state_code="", batch_row_bulk_create_size=BATCH_ROW_BULK_CREATE_SIZE):
+        """
+        structured_json_list can be a list or any iterable of dicts, like a generator reading a large file
+        incrementally. The BatchRows are saved in bulk as the dicts are read.
+        """
         success = False
         status = ""
         number_of_batch_rows = 0
-        # limit_for_testing = 5
+        rows_per_second = 0
 
         batch_header_id = 0
         batch_header_map_id = 0
         batch_name = ""
 
-        if not len(structured_json_list):
+        structured_json_iterator = iter(structured_json_list)
+        first_dict = next(structured_json_iterator, None)
+        if first_dict is None:
             # If there aren't any values, don't create a batch
             results = {
                 'success': success,
@@ -1131,8 +1215,10 @@ class BatchManager(models.Manager):
                 'batch_header_id': batch_header_id,
                 'batch_saved': success,
                 'number_of_batch_rows': number_of_batch_rows,
+                'rows_per_second': rows_per_second,
             }
             return results
+        structured_json_iterator = itertools.chain([first_dict], structured_json_iterator)
 
         # We want an array with integers 0 - n as the keys, and the field names as the values
         we_vote_keys = list(mapping_dict.keys())
@@ -1283,20 +1369,20 @@ class BatchManager(models.Manager):
             handle_exception(e, logger=logger, exception_message=status)
 
         if positive_value_exists(batch_header_id):
-            for one_dict in structured_json_list:
-                # if number_of_batch_rows >= limit_for_testing:
-                #     break
-                local_google_civic_election_id = google_civic_election_id  # Use it if it came in to this function
-                if not positive_value_exists(google_civic_election_id):
-                    local_google_civic_election_id = get_value_from_dict(one_dict, 'google_civic_election_id')
-                local_polling_location_we_vote_id = polling_location_we_vote_id  # Use it if it came in to this function
-                if not positive_value_exists(polling_location_we_vote_id):
-                    local_polling_location_we_vote_id = get_value_from_dict(one_dict, 'polling_location_we_vote_id')
-                local_state_code = state_code  # Use it if it came in to this function
-                if not positive_value_exists(state_code):
-                    local_state_code = get_value_from_dict(one_dict, 'state_code')
-                try:
-                    batch_row = BatchRow.objects.create(
+            def generate_batch_rows():
+                for one_dict in structured_json_iterator:
+                    local_google_civic_election_id = google_civic_election_id  # Use it if it came in to this function
+                    if not positive_value_exists(google_civic_election_id):
+                        local_google_civic_election_id = convert_to_int(
+                            get_value_from_dict(one_dict, 'google_civic_election_id'))
+                    # Use it if it came in to this function
+                    local_polling_location_we_vote_id = polling_location_we_vote_id
+                    if not positive_value_exists(polling_location_we_vote_id):
+                        local_polling_location_we_vote_id = get_value_from_dict(one_dict, 'polling_location_we_vote_id')
+                    local_state_code = state_code  # Use it if it came in to this function
+                    if not positive_value_exists(state_code):
+                        local_state_code = get_value_from_dict(one_dict, 'state_code')
+                    yield BatchRow(
                         batch_header_id=batch_header_id,
                         batch_row_000=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 0)),
                         batch_row_001=get_value_from_dict(one_dict, get_value_if_index_in_list(remote_source_keys, 1)),
@@ -1353,11 +1439,15 @@ class BatchManager(models.Manager):
                         polling_location_we_vote_id=local_polling_location_we_vote_id,
                         state_code=local_state_code,
                     )
-                    number_of_batch_rows += 1
-                except Exception as e:
-                    # Stop trying to save rows -- break out of the for loop
-                    status += "EXCEPTION_BATCH_ROW_FOR_JSON: " + str(e) + " "
-                    break
+
+            bulk_create_results = self.bulk_create_batch_rows(generate_batch_rows(), batch_row_bulk_create_size)
+            status += bulk_create_results['status']
+            number_of_batch_rows = bulk_create_results['number_of_batch_rows']
+            rows_per_second = bulk_create_results['rows_per_second']
+            if not bulk_create_results['success']:
+                status += self.delete_batch_without_rows(batch_header_id)
+                batch_header_id = 0
+                success = False
         else:
             status += "NO_BATCH_HEADER_ID "
 
@@ -1367,6 +1457,7 @@ class BatchManager(models.Manager):
             'batch_header_id':      batch_header_id,
             'batch_saved':          success,
             'number_of_batch_rows': number_of_batch_rows,
+            'rows_per_second':      rows_per_second,
         }
         return results
 
@@ -5647,6 +5738,9 @@ class BatchProcessBallotItemChunk(models.Model):
     retrieve_date_completed = models.DateTimeField(null=True)
     retrieve_timed_out = models.BooleanField(default=None, null=True)
     retrieve_row_count = models.PositiveIntegerField(default=0, null=False)
+    # Map points whose contests we fingerprinted, and how many of those reused an earlier map point's ballot items
+    retrieve_fingerprint_count = models.PositiveIntegerField(default=0, null=False)
+    retrieve_fingerprint_hit_count = models.PositiveIntegerField(default=0, null=False)
 
     analyze_date_started = models.DateTimeField(null=True)
     analyze_date_completed = models.DateTimeField(null=True)
@@ -0,0 +1,160 @@
+import csv
+import io
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from import_export_batches.controllers import import_polling_location_data_from_batch_row_actions
+from import_export_batches.controllers_map_point_harvester import harvest_map_point_responses, \
+    RecordedMapPointResponse, TokenBucket
+from import_export_batches.models import BatchDescription, BatchHeader, BatchManager, BatchRow, \
+    BatchRowActionPollingLocation, IMPORT_CREATE
+from import_export_google_civic.controllers import generate_ballot_contest_fingerprint, \
+    groom_or_reuse_google_civic_ballot_json_2021
+from polling_location.models import PollingLocation
+from wevote_settings.models import fetch_site_unique_id_prefix, reserve_we_vote_id_integer_block, \
+    WeVoteSettingsManager
+
+
+class BatchRowBulkCreateTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def test_create_batch_from_csv_data_in_bulk(self):
+        csv_text = "candidate_name,state_code\n" + "".join(
+            "Candidate {number},CA\n".format(number=number) for number in range(1201))
+        results = BatchManager().create_batch_from_csv_data(
+            'candidates.csv', csv.reader(io.StringIO(csv_text)), 'CANDIDATE', batch_row_bulk_create_size=500)
+        self.assertTrue(results['batch_saved'])
+        self.assertEqual(results['number_of_batch_rows'], 1201)
+        batch_row_list = BatchRow.objects.filter(batch_header_id=results['batch_header_id']).order_by('id')
+        self.assertEqual(batch_row_list.count(), 1201)
+        self.assertEqual(batch_row_list.last().batch_row_000, 'Candidate 1200')
+
+    def test_create_batch_from_json_generator(self):
+        structured_json_generator = ({'name': 'Measure ' + str(number), 'state_code': 'WA'} for number in range(3))
+        results = BatchManager().create_batch_from_json(
+            'measures.json', structured_json_generator, {'measure_title': 'name'}, 'MEASURE',
+            batch_row_bulk_create_size=2)
+        self.assertEqual(results['number_of_batch_rows'], 3)
+        self.assertEqual(BatchRow.objects.filter(batch_header_id=results['batch_header_id'], state_code='WA').count(),
+                         3)
+
+    def test_batch_not_saved_when_rows_fail(self):
+        # state_code only holds two characters, so the second group of rows can't be saved
+        structured_json_list = [{'name': 'Measure 1', 'state_code': 'WA'}, {'name': 'Measure 2', 'state_code': 'WA'},
+                                {'name': 'Measure 3', 'state_code': 'Washington'}]
+        results = BatchManager().create_batch_from_json(
+            'measures.json', structured_json_list, {'measure_title': 'name'}, 'MEASURE', batch_row_bulk_create_size=2)
+        self.assertFalse(results['success'])
+        self.assertFalse(results['batch_saved'])
+        self.assertEqual(results['batch_header_id'], 0)
+        self.assertIn('BATCH_WITHOUT_ROWS_DELETED', results['status'])
+        self.assertEqual(BatchHeader.objects.count(), 0)
+        self.assertEqual(BatchDescription.objects.count(), 0)
+        self.assertEqual(BatchRow.objects.count(), 0)
+
+
+class ImportPollingLocationTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def test_we_vote_ids_reserved_at_once(self):
+        WeVoteSettingsManager.save_setting('we_vote_id_last_polling_location_integer', 500)
+        for number in range(30):
+            BatchRowActionPollingLocation.objects.create(
+                batch_header_id=1, batch_row_id=number + 1, kind_of_action=IMPORT_CREATE,
+                line1=str(number) + ' Main St', city='Oakland', state='CA', latitude=37.8, longitude=-122.27)
+        with mock.patch('wevote_settings.models.reserve_we_vote_id_integer_block',
+                        wraps=reserve_we_vote_id_integer_block) as mock_reserve:
+            results = import_polling_location_data_from_batch_row_actions(1, 0, create_entry_flag=True)
+        self.assertEqual(results['number_created'], 30)
+        mock_reserve.assert_called_once()
+        self.assertEqual(
+            sorted(PollingLocation.objects.values_list('we_vote_id', flat=True)),
+            sorted("wv{prefix}ploc{number}".format(prefix=fetch_site_unique_id_prefix(), number=number).lower()
+                   for number in range(501, 531)))
+
+
+class MapPointHarvesterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.polling_location_list = [SimpleNamespace(we_vote_id="wvtestploc" + str(number)) for number in range(20)]
+        self.token_bucket = TokenBucket(1000)
+
+    def test_every_map_point_is_returned_once(self):
+        results_list = list(harvest_map_point_responses(
+            'VOTE_USA', self.polling_location_list, lambda polling_location: RecordedMapPointResponse('{}'),
+            number_of_workers=4, token_bucket=self.token_bucket))
+        self.assertEqual(sorted(results['polling_location'].we_vote_id for results in results_list),
+                         sorted(polling_location.we_vote_id for polling_location in self.polling_location_list))
+        self.assertTrue(all(results['success'] for results in results_list))
+
+    @mock.patch('import_export_batches.controllers_map_point_harvester.calculate_retry_backoff_seconds',
+                return_value=0)
+    def test_rate_limited_responses_are_retried(self, mock_backoff):
+        response_list = [RecordedMapPointResponse('', status_code=429), RecordedMapPointResponse('{"ok": 1}')]
+        results_list = list(harvest_map_point_responses(
+            'CTCL', self.polling_location_list[:1], lambda polling_location: response_list.pop(0),
+            token_bucket=self.token_bucket))
+        self.assertEqual(results_list[0]['attempts'], 2)
+        self.assertEqual(results_list[0]['response'].json(), {'ok': 1})
+
+    @mock.patch('import_export_batches.controllers_map_point_harvester.calculate_retry_backoff_seconds',
+                return_value=0)
+    def test_failed_map_point_has_no_response(self, mock_backoff):
+        def fetch_function(polling_location):
+            raise ConnectionError("connection reset")
+        results_list = list(harvest_map_point_responses(
+            'CTCL', self.polling_location_list[:1], fetch_function, token_bucket=self.token_bucket))
+        self.assertFalse(results_list[0]['success'])
+        self.assertIsNone(results_list[0]['response'])
+
+    @mock.patch('import_export_batches.controllers_map_point_harvester.calculate_retry_backoff_seconds',
+                return_value=0)
+    def test_rate_limited_response_is_not_handed_through(self, mock_backoff):
+        results_list = list(harvest_map_point_responses(
+            'CTCL', self.polling_location_list[:1],
+            lambda polling_location: RecordedMapPointResponse('', status_code=503), token_bucket=self.token_bucket))
+        self.assertFalse(results_list[0]['success'])
+        self.assertIsNone(results_list[0]['response'])
+        self.assertIn('MAP_POINT_FETCH_RETRIES_EXHAUSTED', results_list[0]['status'])
+
+
+class BallotFingerprintTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.one_ballot_json = {
+            'election': {'id': '9000'},
+            'normalizedInput': {'line1': '1200 Broadway'},
+            'contests': [
+                {'office': 'Mayor', 'candidates': [{'name': 'Pat Smith'}]},
+                {'type': 'Referendum', 'referendumTitle': 'Measure A'},
+            ],
+        }
+
+    def test_neighbor_with_same_contests_has_same_fingerprint(self):
+        neighbor_ballot_json = {
+            'election': {'id': '9000'},
+            'normalizedInput': {'line1': '1210 Broadway'},
+            'contests': list(reversed(self.one_ballot_json['contests'])),
+        }
+        self.assertEqual(generate_ballot_contest_fingerprint(self.one_ballot_json, 'CA'),
+                         generate_ballot_contest_fingerprint(neighbor_ballot_json, 'CA'))
+        neighbor_ballot_json['contests'] = self.one_ballot_json['contests'][:1]
+        self.assertNotEqual(generate_ballot_contest_fingerprint(self.one_ballot_json, 'CA'),
+                            generate_ballot_contest_fingerprint(neighbor_ballot_json, 'CA'))
+        self.assertEqual(generate_ballot_contest_fingerprint({'contests': []}, 'CA'), '')
+
+    def test_matching_fingerprint_reuses_ballot_items(self):
+        ballot_fingerprint = generate_ballot_contest_fingerprint(self.one_ballot_json, 'CA')
+        ballot_fingerprint_dict = {ballot_fingerprint: [
+            {'contest_office_we_vote_id': 'wvtestoff1', 'polling_location_we_vote_id': 'wvtestploc1'}]}
+        results = groom_or_reuse_google_civic_ballot_json_2021(
+            self.one_ballot_json,
+            ballot_fingerprint_dict=ballot_fingerprint_dict,
+            polling_location_we_vote_id='wvtestploc2',
+            state_code='CA')
+        self.assertTrue(results['ballot_fingerprint_hit'])
+        self.assertEqual(results['ballot_item_dict_list'],
+                         [{'contest_office_we_vote_id': 'wvtestoff1', 'polling_location_we_vote_id': 'wvtestploc2'}])
+        self.assertEqual(ballot_fingerprint_dict[ballot_fingerprint][0]['polling_location_we_vote_id'], 'wvtestploc1')
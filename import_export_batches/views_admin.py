@@ -23,6 +23,8 @@ from .controllers import create_batch_header_translation_suggestions, create_bat
 from .controllers_batch_process import pass_through_batch_list_incoming_variables, process_next_activity_notices, \
     process_next_ballot_items, process_next_general_maintenance
 from .controllers_ballotpedia import store_ballotpedia_json_response_to_import_batch_system
+from .controllers_map_point_harvester import harvest_map_point_responses, MAP_POINT_HARVESTER_REQUEST_TIMEOUT_SECONDS, \
+    MAP_POINT_PROVIDER_CTCL, MAP_POINT_PROVIDER_VOTE_USA
 from admin_tools.views import redirect_to_sign_in_page
 from ballot.models import BallotReturnedListManager, BallotReturnedManager, MEASURE, CANDIDATE, POLITICIAN
 import csv
@@ -3669,6 +3671,11 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
     new_office_we_vote_ids_list = []
     new_candidate_we_vote_ids_list = []
     new_measure_we_vote_ids_list = []
+    # Ballots already groomed in this BatchSet, by contest fingerprint, so a neighboring map point with the same
+    #  contests is linked to the same ballot items without being analyzed again
+    ballot_fingerprint_dict = {}
+    ballot_fingerprint_count = 0
+    ballot_fingerprint_hit_count = 0
 
     batch_set_source = ''
     source_uri = ''
@@ -3748,12 +3755,53 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             from import_export_ballotpedia.controllers import \
                 retrieve_ballotpedia_ballot_items_from_polling_location_api_v4
         elif positive_value_exists(use_ctcl):
-            from import_export_ctcl.controllers import retrieve_ctcl_ballot_items_from_polling_location_api
+            from import_export_ctcl.controllers import fetch_ctcl_voter_info_response, \
+                retrieve_ctcl_ballot_items_from_polling_location_api
         elif positive_value_exists(use_vote_usa):
-            from import_export_vote_usa.controllers import retrieve_vote_usa_ballot_items_from_polling_location_api
+            from import_export_vote_usa.controllers import fetch_vote_usa_voter_info_response, \
+                retrieve_vote_usa_ballot_items_from_polling_location_api
+
+        # CTCL and Vote USA answer with one request per map point, so we send those requests concurrently
+        #  (rate limited per provider) and process the responses one at a time here, as they arrive. Only this
+        #  thread reads and updates the existing_*_dict caches and new_*_list lists.
+        if positive_value_exists(use_ballotpedia):
+            # Ballotpedia needs two dependent requests per map point, so it still asks one map point at a time
+            harvested_results_iterator = ({'polling_location': polling_location, 'response': None}
+                                          for polling_location in polling_location_list)
+        elif positive_value_exists(use_ctcl):
+            def fetch_ctcl_response(one_polling_location):
+                text_for_map_search = one_polling_location.get_text_for_map_search()
+                if not positive_value_exists(text_for_map_search):
+                    return None
+                return fetch_ctcl_voter_info_response(
+                    ctcl_election_uuid=ctcl_election_uuid,
+                    text_for_map_search=text_for_map_search,
+                    timeout=MAP_POINT_HARVESTER_REQUEST_TIMEOUT_SECONDS)
+            harvested_results_iterator = harvest_map_point_responses(
+                MAP_POINT_PROVIDER_CTCL, polling_location_list, fetch_ctcl_response)
+        elif positive_value_exists(use_vote_usa):
+            def fetch_vote_usa_response(one_polling_location):
+                if not one_polling_location.latitude or not one_polling_location.longitude or \
+                        not positive_value_exists(one_polling_location.get_text_for_map_search()):
+                    return None
+                return fetch_vote_usa_voter_info_response(
+                    election_day_text=election_day_text,
+                    latitude=one_polling_location.latitude,
+                    longitude=one_polling_location.longitude,
+                    state_code=state_code if positive_value_exists(state_code)
+                    else (one_polling_location.state if positive_value_exists(one_polling_location.state) else "na"),
+                    timeout=MAP_POINT_HARVESTER_REQUEST_TIMEOUT_SECONDS)
+            harvested_results_iterator = harvest_map_point_responses(
+                MAP_POINT_PROVIDER_VOTE_USA, polling_location_list, fetch_vote_usa_response)
+        else:
+            harvested_results_iterator = ({'polling_location': polling_location, 'response': None}
+                                          for polling_location in polling_location_list)
+
         contest_not_returned_from_data_source_polling_location_we_vote_id_list = []
         contest_returned_from_data_source_polling_location_we_vote_id_list = []
-        for polling_location in polling_location_list:
+        for harvested_results in harvested_results_iterator:
+            polling_location = harvested_results['polling_location']
+            prefetch_failed_status = '' if harvested_results.get('success', True) else harvested_results['status']
             one_ballot_results = {}
             if positive_value_exists(use_ballotpedia):
                 one_ballot_results = retrieve_ballotpedia_ballot_items_from_polling_location_api_v4(
@@ -3789,6 +3837,9 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
                     new_candidate_we_vote_ids_list=new_candidate_we_vote_ids_list,
                     new_measure_we_vote_ids_list=new_measure_we_vote_ids_list,
                     update_or_create_rules=update_or_create_rules,
+                    prefetched_response=harvested_results['response'],
+                    prefetch_failed_status=prefetch_failed_status,
+                    ballot_fingerprint_dict=ballot_fingerprint_dict,
                 )
             elif positive_value_exists(use_vote_usa):
                 one_ballot_results = retrieve_vote_usa_ballot_items_from_polling_location_api(
@@ -3807,6 +3858,9 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
                     new_candidate_we_vote_ids_list=new_candidate_we_vote_ids_list,
                     new_measure_we_vote_ids_list=new_measure_we_vote_ids_list,
                     update_or_create_rules=update_or_create_rules,
+                    prefetched_response=harvested_results['response'],
+                    prefetch_failed_status=prefetch_failed_status,
+                    ballot_fingerprint_dict=ballot_fingerprint_dict,
                 )
             else:
                 # Should not be possible to get here
@@ -3822,6 +3876,10 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             new_office_we_vote_ids_list = one_ballot_results['new_office_we_vote_ids_list']
             new_candidate_we_vote_ids_list = one_ballot_results['new_candidate_we_vote_ids_list']
             new_measure_we_vote_ids_list = one_ballot_results['new_measure_we_vote_ids_list']
+            if positive_value_exists(one_ballot_results.get('ballot_fingerprint')):
+                ballot_fingerprint_count += 1
+                if one_ballot_results['ballot_fingerprint_hit']:
+                    ballot_fingerprint_hit_count += 1
 
             if one_ballot_results['batch_header_id']:
                 ballots_retrieved += 1
@@ -3890,7 +3948,10 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             'new offices: {new_offices_found} (existing: {existing_offices_found}) ' \
             'new candidates: {new_candidates_found} (existing: {existing_candidates_found}) ' \
             'new measures: {new_measures_found} (existing: {existing_measures_found}) ' \
+            'ballot fingerprint hits: {ballot_fingerprint_hit_count} of {ballot_fingerprint_count} ' \
             ''.format(
+                ballot_fingerprint_count=ballot_fingerprint_count,
+                ballot_fingerprint_hit_count=ballot_fingerprint_hit_count,
                 ballots_retrieved=ballots_retrieved,
                 ballots_not_retrieved=ballots_not_retrieved,
                 election_name=election_name,
@@ -3906,6 +3967,8 @@ def retrieve_ballots_for_polling_locations_api_v4_internal_view(
             'success':              success,
             'batch_set_id':         batch_set_id,
             'retrieve_row_count':   retrieve_row_count,
+            'ballot_fingerprint_count':     ballot_fingerprint_count,
+            'ballot_fingerprint_hit_count': ballot_fingerprint_hit_count,
             'batch_process_ballot_item_chunk':  batch_process_ballot_item_chunk,
         }
         return results
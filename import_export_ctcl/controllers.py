@@ -11,7 +11,8 @@ from datetime import datetime
 from electoral_district.controllers import electoral_district_import_from_xml_data
 from exception.models import handle_exception, handle_record_found_more_than_one_exception
 from import_export_batches.controllers_ctcl import store_ctcl_json_response_to_import_batch_system
-from import_export_google_civic.controllers import groom_and_store_google_civic_ballot_json_2021
+from import_export_google_civic.controllers import groom_and_store_google_civic_ballot_json_2021, \
+    groom_or_reuse_google_civic_ballot_json_2021
 import json
 from party.controllers import party_import_from_xml_data
 from polling_location.models import KIND_OF_LOG_ENTRY_ADDRESS_PARSE_ERROR, \
@@ -637,6 +638,18 @@ def retrieve_ctcl_ballot_items_for_one_voter_api(
     return results
 
 
+def fetch_ctcl_voter_info_response(ctcl_election_uuid="", text_for_map_search="", timeout=None):
+    return requests.get(
+        CTCL_VOTER_INFO_URL,
+        headers=HEADERS_FOR_CTCL_API_CALL,
+        params={
+            "key": CTCL_API_KEY,
+            "electionId": ctcl_election_uuid,
+            "address": text_for_map_search,
+        },
+        timeout=timeout)
+
+
 def retrieve_ctcl_ballot_items_from_polling_location_api(
         google_civic_election_id=0,
         ctcl_election_uuid="",
@@ -653,12 +666,17 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
         new_office_we_vote_ids_list=[],
         new_candidate_we_vote_ids_list=[],
         new_measure_we_vote_ids_list=[],
-        update_or_create_rules={}):
+        update_or_create_rules={},
+        prefetched_response=None,
+        prefetch_failed_status='',
+        ballot_fingerprint_dict=None):
     success = True
     status = ""
     polling_location_found = False
     ballot_items_count = 0
     batch_header_id = 0
+    ballot_fingerprint = ''
+    ballot_fingerprint_hit = False
 
     if not positive_value_exists(google_civic_election_id) or not positive_value_exists(ctcl_election_uuid):
         status += "Error: Missing election id or ctcl_election_uuid"
@@ -751,16 +769,17 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
         one_ballot_json_found = False
         ballot_returned_manager = BallotReturnedManager()
         try:
-            api_key = CTCL_API_KEY
-            # Get the ballot info at this address
-            response = requests.get(
-                CTCL_VOTER_INFO_URL,
-                headers=HEADERS_FOR_CTCL_API_CALL,
-                params={
-                    "key": api_key,
-                    "electionId": ctcl_election_uuid,
-                    "address": text_for_map_search,
-                })
+            if prefetched_response is not None:
+                # The map point harvester already asked CTCL for this map point
+                response = prefetched_response
+            elif positive_value_exists(prefetch_failed_status):
+                # The map point harvester already retried this map point, so we don't ask CTCL again
+                raise ValueError('MAP_POINT_HARVESTER_FAILED: ' + prefetch_failed_status)
+            else:
+                # Get the ballot info at this address
+                response = fetch_ctcl_voter_info_response(
+                    ctcl_election_uuid=ctcl_election_uuid,
+                    text_for_map_search=text_for_map_search)
             if positive_value_exists(response.url):
                 status += str(response.url) + ' '
             if len(response.text) >= 2:
@@ -817,8 +836,9 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
 
         if one_ballot_json_found:
             try:
-                groom_results = groom_and_store_google_civic_ballot_json_2021(
+                groom_results = groom_or_reuse_google_civic_ballot_json_2021(
                     one_ballot_json,
+                    ballot_fingerprint_dict=ballot_fingerprint_dict,
                     google_civic_election_id=google_civic_election_id,
                     state_code=state_code,
                     polling_location_we_vote_id=polling_location_we_vote_id,
@@ -834,6 +854,8 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
                     use_ctcl=True,
                     )
                 status += groom_results['status']
+                ballot_fingerprint = groom_results['ballot_fingerprint']
+                ballot_fingerprint_hit = groom_results['ballot_fingerprint_hit']
                 ballot_item_dict_list = groom_results['ballot_item_dict_list']
                 existing_offices_by_election_dict = groom_results['existing_offices_by_election_dict']
                 existing_candidate_objects_dict = groom_results['existing_candidate_objects_dict']
@@ -1004,6 +1026,8 @@ def retrieve_ctcl_ballot_items_from_polling_location_api(
         'new_office_we_vote_ids_list':              new_office_we_vote_ids_list,
         'new_candidate_we_vote_ids_list':           new_candidate_we_vote_ids_list,
         'new_measure_we_vote_ids_list':             new_measure_we_vote_ids_list,
+        'ballot_fingerprint':                       ballot_fingerprint,
+        'ballot_fingerprint_hit':                   ballot_fingerprint_hit,
     }
     return results
 
@@ -2,6 +2,27 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from import_export_ctcl.controllers import retrieve_ctcl_ballot_items_from_polling_location_api
+from polling_location.models import PollingLocation
+
+
+class RetrieveCtclBallotItemsTestCase(TestCase):
+    databases = ["default", "readonly", "analytics"]
+
+    @mock.patch('import_export_ctcl.controllers.fetch_ctcl_voter_info_response')
+    def test_map_point_the_harvester_gave_up_on_is_skipped(self, mock_fetch_ctcl_voter_info_response):
+        polling_location = PollingLocation.objects.create(
+            we_vote_id='wvtestploc1', line1='1200 Broadway', city='Oakland', state='CA', zip_long='94612')
+        results = retrieve_ctcl_ballot_items_from_polling_location_api(
+            google_civic_election_id=4000,
+            ctcl_election_uuid='test-uuid',
+            polling_location=polling_location,
+            prefetch_failed_status='MAP_POINT_FETCH_RETRY_STATUS_CODE: 503 MAP_POINT_FETCH_RETRIES_EXHAUSTED ')
+        mock_fetch_ctcl_voter_info_response.assert_not_called()
+        self.assertFalse(results['success'])
+        self.assertIn('MAP_POINT_HARVESTER_FAILED', results['status'])
+        self.assertFalse(results['batch_header_id'])
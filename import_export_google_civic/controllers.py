@@ -15,7 +15,9 @@ from candidate.models import CandidateCTCLAlternateMap, CandidateManager, Candid
 from config.base import get_environment_variable
 from django.utils.timezone import localtime, now
 from election.models import ElectionManager
+from geoip.models import geocode_with_cache
 from geopy.geocoders import get_geocoder_for_service
+import hashlib
 import json
 from measure.models import ContestMeasureManager, ContestMeasureListManager
 from office.models import ContestOfficeManager, ContestOfficeListManager
@@ -454,6 +456,79 @@ def groom_and_store_google_civic_ballot_json_2021(
     return results
 
 
+def generate_ballot_contest_fingerprint(one_ballot_json, state_code=''):
+    """
+    Neighboring map points very often get exactly the same contests back. Two ballots with the same fingerprint
+    groom into the same offices, candidates and measures.
+    :param one_ballot_json: voterInfoQuery-style response from CTCL or Vote USA
+    :param state_code:
+    :return: hex digest, or '' if there are no contests to fingerprint
+    """
+    if not one_ballot_json or 'contests' not in one_ballot_json or not one_ballot_json['contests']:
+        return ''
+    try:
+        election_id = str(one_ballot_json.get('election', {}).get('id', ''))
+        # The same contests in a different order are the same contest set
+        contest_list = sorted(json.dumps(one_contest, sort_keys=True, separators=(',', ':'))
+                              for one_contest in one_ballot_json['contests'])
+    except Exception as e:
+        logger.error("BALLOT_CONTEST_FINGERPRINT_FAILED: " + str(e))
+        return ''
+    fingerprint_text = json.dumps([election_id, str(state_code).lower(), contest_list], separators=(',', ':'))
+    return hashlib.sha256(fingerprint_text.encode('utf-8')).hexdigest()
+
+
+def groom_or_reuse_google_civic_ballot_json_2021(
+        one_ballot_json,
+        ballot_fingerprint_dict=None,
+        polling_location_we_vote_id='',
+        **groom_kwargs):
+    """
+    Same as groom_and_store_google_civic_ballot_json_2021, except that when a ballot with the same contests has
+    already been groomed in this BatchSet, this map point reuses that ballot's ballot items instead of looking up
+    (and possibly creating) every office, candidate and measure again.
+    :param one_ballot_json:
+    :param ballot_fingerprint_dict: fingerprint -> ballot_item_dict_list, for one BatchSet. Updated in place.
+    :param polling_location_we_vote_id:
+    :param groom_kwargs: passed through to groom_and_store_google_civic_ballot_json_2021
+    :return: the groom results, plus 'ballot_fingerprint' and 'ballot_fingerprint_hit'
+    """
+    ballot_fingerprint = ''
+    if ballot_fingerprint_dict is not None:
+        ballot_fingerprint = generate_ballot_contest_fingerprint(
+            one_ballot_json, state_code=groom_kwargs.get('state_code', ''))
+
+    if positive_value_exists(ballot_fingerprint) and ballot_fingerprint in ballot_fingerprint_dict:
+        ballot_item_dict_list = []
+        for one_ballot_item_dict in ballot_fingerprint_dict[ballot_fingerprint]:
+            one_ballot_item_dict = dict(one_ballot_item_dict)
+            one_ballot_item_dict['polling_location_we_vote_id'] = polling_location_we_vote_id
+            ballot_item_dict_list.append(one_ballot_item_dict)
+        results = {
+            'success':                                  True,
+            'status':                                   "BALLOT_FINGERPRINT_MATCH-BALLOT_ITEMS_REUSED ",
+            'google_civic_election_id':                 groom_kwargs.get('google_civic_election_id', ''),
+            'ballot_item_dict_list':                    ballot_item_dict_list,
+            'ballot_fingerprint':                       ballot_fingerprint,
+            'ballot_fingerprint_hit':                   True,
+        }
+        for key in ['existing_offices_by_election_dict', 'existing_candidate_objects_dict',
+                    'existing_candidate_to_office_links_dict', 'existing_measure_objects_dict',
+                    'new_office_we_vote_ids_list', 'new_candidate_we_vote_ids_list', 'new_measure_we_vote_ids_list']:
+            results[key] = groom_kwargs.get(key, {} if key.endswith('_dict') else [])
+        return results
+
+    results = groom_and_store_google_civic_ballot_json_2021(
+        one_ballot_json,
+        polling_location_we_vote_id=polling_location_we_vote_id,
+        **groom_kwargs)
+    if positive_value_exists(ballot_fingerprint) and results['ballot_item_dict_list']:
+        ballot_fingerprint_dict[ballot_fingerprint] = results['ballot_item_dict_list']
+    results['ballot_fingerprint'] = ballot_fingerprint
+    results['ballot_fingerprint_hit'] = False
+    return results
+
+
 def groom_and_store_google_civic_candidates_json_2021(
         candidates_structured_json={},
         google_civic_election_id='',
@@ -2908,7 +2983,7 @@ def voter_ballot_items_retrieve_from_google_civic_2021(
     try:
         # Make sure we have a latitude and longitude
         google_client = get_geocoder_for_service('google')(GOOGLE_MAPS_API_KEY)
-        location = google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+        location = geocode_with_cache(google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         if location is None:
             status += 'RETRIEVE_FROM_VOTE_USA-Could not find location matching "{}"'.format(text_for_map_search)
             success = False
@@ -4,17 +4,16 @@
 
 # See also WeVoteServer/twitter/controllers.py for routines that manage internal twitter data
 import os
-import re
 import ssl
 import urllib.request
 from datetime import timedelta
 from math import floor, log2
 from re import sub
-from socket import timeout
 from time import time
 
 import tweepy
 from django.db.models import Q
+from django.db.models.signals import post_save
 from django.utils.timezone import now
 
 import wevote_functions.admin
@@ -25,6 +24,7 @@ from election.models import ElectionManager
 from image.controllers import TWITTER, cache_master_and_resized_image
 from image.models import WeVoteImageManager
 from import_export_batches.models import BatchProcessManager, UPDATE_TWITTER_DATA_FROM_TWITTER
+from import_export_twitter.controllers_social_media_crawler import crawl_social_media_from_sites
 from import_export_twitter.models import TwitterAuthManager
 from office.models import ContestOfficeManager
 from organization.controllers import move_organization_to_another_complete, \
@@ -44,7 +44,6 @@ from wevote_functions.functions import convert_to_int, extract_twitter_handle_fr
     is_voter_device_id_valid, positive_value_exists, convert_state_code_to_state_text, \
     POSITIVE_SEARCH_KEYWORDS, NEGATIVE_SEARCH_KEYWORDS, \
     POSITIVE_TWITTER_HANDLE_SEARCH_KEYWORDS, NEGATIVE_TWITTER_HANDLE_SEARCH_KEYWORDS
-from wevote_functions.utils import staticUserAgent
 from wevote_settings.models import RemoteRequestHistory, RemoteRequestHistoryManager, \
     RETRIEVE_POSSIBLE_TWITTER_HANDLES, RETRIEVE_UPDATE_DATA_FROM_TWITTER
 
@@ -63,16 +62,6 @@ if not os.environ.get('PYTHONHTTPSVERIFY', '') and getattr(ssl, '_create_unverif
 
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
 
-# RE_FACEBOOK = r'//www\.twitter\.com/(?:#!/)?(\w+)'
-RE_FACEBOOK = r'/(?:https?:\/\/)?(?:www\.)?facebook\.com\/(?:(?:\w)*#!\/)?(?:pages\/)?(?:[\w\-]*\/)*?(\/)?([^/?]*)/'
-FACEBOOK_BLACKLIST = ['group', 'group.php', 'None']
-# NOTE: Scraping a website for the Facebook handle is more complicated than Twitter. There must be an existing
-#  solution available? My attempt turned off for now.
-
-# Only pays attention to https://twitter.com or http://twitter.com and ignores www.twitter.com
-RE_TWITTER = r'//twitter\.com/(?:#!/)?(\w+)'
-RE_TWITTER_WWW = r'//www\.twitter\.com/(?:#!/)?(\w+)'
-TWITTER_BLACKLIST = ['home', 'https', 'intent', 'none', 'search', 'share', 'twitterapi', 'wix']
 TWITTER_BEARER_TOKEN = get_environment_variable("TWITTER_BEARER_TOKEN")
 TWITTER_CONSUMER_KEY = get_environment_variable("TWITTER_CONSUMER_KEY")
 TWITTER_CONSUMER_SECRET = get_environment_variable("TWITTER_CONSUMER_SECRET")
@@ -81,14 +70,6 @@ TWITTER_ACCESS_TOKEN_SECRET = get_environment_variable("TWITTER_ACCESS_TOKEN_SEC
 TWITTER_NATIVE_INDICATOR = 'native'
 
 
-class GetOutOfLoop(Exception):
-    pass
-
-
-class GetOutOfLoopLocal(Exception):
-    pass
-
-
 def analyze_twitter_search_results(
         search_results=[],
         candidate_name={},
@@ -2047,191 +2028,80 @@ def retrieve_possible_twitter_handles_in_bulk(
     return results
 
 
-def scrape_social_media_from_one_site(site_url, retrieve_list=False):
-    twitter_handle = ''
-    twitter_handle_found = False
-    twitter_handle_list = []
-    facebook_page = ''
-    facebook_page_found = False
-    facebook_page_list = []
-    success = False
-    status = ""
-    if len(site_url) < 10:
-        status = 'PROPER_URL_NOT_PROVIDED: ' + site_url
-        results = {
-            'status':               status,
-            'success':              success,
-            'twitter_handle':       twitter_handle,
-            'twitter_handle_found': twitter_handle_found,
-            'facebook_page':        facebook_page,
-            'facebook_page_found':  facebook_page_found,
-        }
-        return results
-
-
-    # ##########
-    # Twitter
-    try:
-        request = urllib.request.Request(site_url, None, staticUserAgent())
-        page = urllib.request.urlopen(request, timeout=5)
-        for line in page.readlines():
-            try:
-                decoded_line = line.decode()
-                proceed = positive_value_exists(retrieve_list) or not twitter_handle_found
-                if proceed:
-                    for m in re.finditer(RE_TWITTER, decoded_line):
-                        if m:
-                            name = m.group(1)
-                            if name not in TWITTER_BLACKLIST:
-                                twitter_handle = name
-                                twitter_handle_found = True
-                                if twitter_handle not in twitter_handle_list:
-                                    twitter_handle_list.append(twitter_handle)
-                                if not positive_value_exists(retrieve_list):
-                                    raise GetOutOfLoopLocal
-                proceed = positive_value_exists(retrieve_list) or not twitter_handle_found
-                if proceed:
-                    for m in re.finditer(RE_TWITTER_WWW, decoded_line):
-                        if m:
-                            name = m.group(1)
-                            if name not in TWITTER_BLACKLIST:
-                                twitter_handle = name
-                                twitter_handle_found = True
-                                if twitter_handle not in twitter_handle_list:
-                                    twitter_handle_list.append(twitter_handle)
-                                if not positive_value_exists(retrieve_list):
-                                    raise GetOutOfLoopLocal
-            except GetOutOfLoopLocal:
-                pass
-            if twitter_handle_found and not positive_value_exists(retrieve_list):  # and facebook_page_found:
-                raise GetOutOfLoop
-        success = True
-        status += 'FINISHED_SCRAPING_PAGE-TWITTER '
-    except timeout:
-        status += "SCRAPE_TIMEOUT_ERROR-TWITTER "
-        success = False
-    except GetOutOfLoop:
-        success = True
-        status += 'TWITTER_HANDLE_FOUND-BREAK_OUT-TWITTER '
-    except IOError as error_instance:
-        # Catch the error message coming back from urllib.request.urlopen and pass it in the status
-        error_message = error_instance
-        status += "SCRAPE_SOCIAL_IO_ERROR-TWITTER: {error_message}".format(error_message=error_message)
-        success = False
-    except Exception as error_instance:
-        error_message = error_instance
-        status += "SCRAPE_GENERAL_EXCEPTION_ERROR-TWITTER: {error_message}".format(error_message=error_message)
-        success = False
-
-    # #########
-    # Facebook
-    try:
-        request = urllib.request.Request(site_url, None, staticUserAgent())
-        page = urllib.request.urlopen(request, timeout=5)
-        for line in page.readlines():
-            try:
-                decoded_line = line.decode()
-                # decoded_line = '<div class="fb-page" data-href="https://www.facebook.com/ImmigrantAction/" data-small-header="true" data-adapt-container-width="true" data-hide-cover="false" data-show-facepile="true" data-show-posts="false"><div class="fb-xfbml-parse-ignore"><blockquote cite="https://www.facebook.com/ImmigrantAction/"><a href="https://www.facebook.com/ImmigrantAction/">ImmigrantAction</a></blockquote></div></div>'
-                proceed = positive_value_exists(retrieve_list) or not facebook_page_found
-                if proceed:
-                    for m2 in re.finditer(RE_FACEBOOK, decoded_line):
-                        if m2:
-                            possible_page1 = m2.group(0)
-                            if possible_page1 not in FACEBOOK_BLACKLIST:
-                                facebook_page = possible_page1
-                                if facebook_page not in facebook_page_list:
-                                    facebook_page_list.append(facebook_page)
-                                facebook_page_found = True
-                                if not positive_value_exists(retrieve_list):
-                                    raise GetOutOfLoopLocal
-                            try:
-                                possible_page2 = m2.group(2)
-                                if possible_page2 not in FACEBOOK_BLACKLIST:
-                                    facebook_page = possible_page2
-                                    if facebook_page not in facebook_page_list:
-                                        facebook_page_list.append(facebook_page)
-                                    facebook_page_found = True
-                                    if not positive_value_exists(retrieve_list):
-                                        raise GetOutOfLoopLocal
-                            except Exception as error_instance:
-                                pass
-                            # possible_page3 = m2.group(3)
-                            # possible_page4 = m2.group(4)
-            except GetOutOfLoopLocal:
-                pass
-            if facebook_page_found and not positive_value_exists(retrieve_list):
-                raise GetOutOfLoop
-        success = True
-        status += 'FINISHED_SCRAPING_PAGE-FACEBOOK '
-    except timeout:
-        success = False
-        status += "SCRAPE_TIMEOUT_ERROR-TWITTER "
-    except GetOutOfLoop:
-        success = True
-        status += 'FACEBOOK_PAGE_FOUND-BREAK_OUT '
-    except IOError as error_instance:
-        # Catch the error message coming back from urllib.request.urlopen and pass it in the status
-        success = False
-        error_message = error_instance
-        status += "SCRAPE_SOCIAL_IO_ERROR-FACEBOOK: {error_message}".format(error_message=error_message)
-    except Exception as error_instance:
-        success = False
-        error_message = error_instance
-        status += "SCRAPE_GENERAL_EXCEPTION_ERROR-FACEBOOK: {error_message}".format(error_message=error_message)
-
-    results = {
-        'status':               status,
-        'success':              success,
-        'page_redirected':      twitter_handle,
-        'twitter_handle':       twitter_handle,
-        'twitter_handle_list':  twitter_handle_list,
-        'twitter_handle_found': twitter_handle_found,
-        'facebook_page':        facebook_page,
-        'facebook_page_found':  facebook_page_found,
-        'facebook_page_list':   facebook_page_list,
-    }
-    return results
+def send_post_save_for_bulk_updated_objects(model, updated_object_list, update_fields):
+    """
+    bulk_update doesn't send post_save, so without this the search/models.py receivers wouldn't reindex the updated
+    rows in Elasticsearch. The rows are retrieved again in full, since they were updated from partial objects.
+    """
+    if not post_save.has_listeners(model):
+        return
+    id_list = [one_object.id for one_object in updated_object_list]
+    for start in range(0, len(id_list), 500):
+        for one_object in model.objects.filter(id__in=id_list[start:start + 500]):
+            post_save.send(sender=model, instance=one_object, created=False, update_fields=frozenset(update_fields),
+                           raw=False, using='default')
 
 
 def scrape_and_save_social_media_from_all_organizations(state_code='', force_retrieve=False):
     facebook_pages_found = 0
     twitter_handles_found = 0
+    status = ""
 
-    organization_manager = OrganizationManager()
-    organization_list_query = Organization.objects.order_by('organization_name')  # Cannot be readonly
+    organization_list_query = Organization.objects.using('readonly').order_by('organization_name')
     if positive_value_exists(state_code):
         organization_list_query = organization_list_query.filter(state_served_code=state_code)
-
-    organization_list = organization_list_query
+    organization_list_query = organization_list_query.exclude(organization_website__isnull=True) \
+        .exclude(organization_website='')
+    if not positive_value_exists(force_retrieve):
+        organization_list_query = organization_list_query.filter(
+            Q(organization_twitter_handle__isnull=True) | Q(organization_twitter_handle=''))
+    organization_list = list(organization_list_query.only(
+        'id', 'organization_website', 'organization_twitter_handle', 'organization_facebook'))
+
+    scrape_results_by_site_url = crawl_social_media_from_sites(
+        [organization.organization_website for organization in organization_list])
+    organizations_to_update = []
     for organization in organization_list:
-        twitter_handle = False
-        facebook_page = False
-        if not organization.organization_website:
+        scrape_results = scrape_results_by_site_url.get(organization.organization_website)
+        if not scrape_results:
             continue
-        if (not positive_value_exists(organization.organization_twitter_handle)) or force_retrieve:
-            scrape_results = scrape_social_media_from_one_site(organization.organization_website)
-
-            # Only include a change if we have a new value (do not try to save blank value)
-            if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
-                twitter_handle = scrape_results['twitter_handle']
-                twitter_handles_found += 1
-
-            if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
-                facebook_page = scrape_results['facebook_page']
-                facebook_pages_found += 1
-
-            save_results = organization_manager.update_organization_social_media(organization, twitter_handle,
-                                                                                 facebook_page)
+        values_changed = False
+        # Only include a change if we have a new value (do not try to save blank value)
+        if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
+            twitter_handles_found += 1
+            twitter_handle = scrape_results['twitter_handle'].strip()
+            if twitter_handle.lower() != str(organization.organization_twitter_handle).lower():
+                organization.organization_twitter_handle = twitter_handle
+                values_changed = True
+        if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
+            facebook_pages_found += 1
+            facebook_page = scrape_results['facebook_page'].strip()
+            if facebook_page != organization.organization_facebook:
+                organization.organization_facebook = facebook_page
+                values_changed = True
+        if values_changed:
+            organizations_to_update.append(organization)
 
         # ######################################
         # We refresh the Twitter information in another function
 
-    status = "ORGANIZATION_SOCIAL_MEDIA_SCRAPED"
+    try:
+        Organization.objects.bulk_update(
+            organizations_to_update, ['organization_twitter_handle', 'organization_facebook'], batch_size=500)
+        send_post_save_for_bulk_updated_objects(
+            Organization, organizations_to_update, ['organization_twitter_handle', 'organization_facebook'])
+        status += "ORGANIZATION_SOCIAL_MEDIA_SCRAPED "
+        success = True
+    except Exception as e:
+        status += "ORGANIZATION_SOCIAL_MEDIA_NOT_SAVED: " + str(e) + " "
+        success = False
+
     results = {
-        'success':                  True,
+        'success':                  success,
         'status':                   status,
         'twitter_handles_found':    twitter_handles_found,
         'facebook_pages_found':     facebook_pages_found,
+        'organizations_updated':    len(organizations_to_update) if success else 0,
     }
     return results
 
@@ -2322,7 +2192,6 @@ def scrape_and_save_social_media_for_candidates_in_one_election(google_civic_ele
     status = ""
     google_civic_election_id = convert_to_int(google_civic_election_id)
 
-    candidate_manager = CandidateManager()
     candidate_list_manager = CandidateListManager()
     return_list_of_objects = True
     google_civic_election_id_list = [google_civic_election_id]
@@ -2337,34 +2206,52 @@ def scrape_and_save_social_media_for_candidates_in_one_election(google_civic_ele
     else:
         candidate_list = []
 
+    candidate_list = [candidate for candidate in candidate_list if positive_value_exists(candidate.candidate_url)
+                      and (not positive_value_exists(candidate.candidate_twitter_handle) or force_retrieve)]
+    scrape_results_by_site_url = crawl_social_media_from_sites(
+        [candidate.candidate_url for candidate in candidate_list])
+    candidates_to_update = []
     for candidate in candidate_list:
-        twitter_handle = False
-        facebook_page = False
-        if not candidate.candidate_url:
+        scrape_results = scrape_results_by_site_url.get(candidate.candidate_url)
+        if not scrape_results:
             continue
-        if (not positive_value_exists(candidate.candidate_twitter_handle)) or force_retrieve:
-            scrape_results = scrape_social_media_from_one_site(candidate.candidate_url)
-
-            # Only include a change if we have a new value (do not try to save blank value)
-            if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
-                twitter_handle = scrape_results['twitter_handle']
-                twitter_handles_found += 1
-
-            if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
-                facebook_page = scrape_results['facebook_page']
-                facebook_pages_found += 1
-
-            save_results = candidate_manager.update_candidate_social_media(candidate, twitter_handle, facebook_page)
+        values_changed = False
+        # Only include a change if we have a new value (do not try to save blank value)
+        if scrape_results['twitter_handle_found'] and positive_value_exists(scrape_results['twitter_handle']):
+            twitter_handles_found += 1
+            twitter_handle = scrape_results['twitter_handle'].strip()[:255]
+            if twitter_handle != candidate.candidate_twitter_handle:
+                candidate.candidate_twitter_handle = twitter_handle
+                values_changed = True
+        if scrape_results['facebook_page_found'] and positive_value_exists(scrape_results['facebook_page']):
+            facebook_pages_found += 1
+            facebook_page = scrape_results['facebook_page'].strip()[:200]
+            if facebook_page != candidate.facebook_url:
+                candidate.facebook_url = facebook_page
+                values_changed = True
+        if values_changed:
+            candidates_to_update.append(candidate)
 
         # ######################################
         # We refresh the Twitter information in another function
 
-    status = "ORGANIZATION_SOCIAL_MEDIA_RETRIEVED"
+    try:
+        CandidateCampaign.objects.bulk_update(
+            candidates_to_update, ['candidate_twitter_handle', 'facebook_url'], batch_size=500)
+        send_post_save_for_bulk_updated_objects(
+            CandidateCampaign, candidates_to_update, ['candidate_twitter_handle', 'facebook_url'])
+        status += "CANDIDATE_SOCIAL_MEDIA_RETRIEVED "
+        success = True
+    except Exception as e:
+        status += "CANDIDATE_SOCIAL_MEDIA_NOT_SAVED: " + str(e) + " "
+        success = False
+
     results = {
-        'success':                  True,
+        'success':                  success,
         'status':                   status,
         'twitter_handles_found':    twitter_handles_found,
         'facebook_pages_found':     facebook_pages_found,
+        'candidates_updated':       len(candidates_to_update) if success else 0,
     }
     return results
 
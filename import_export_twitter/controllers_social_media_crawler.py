@@ -0,0 +1,262 @@
+# import_export_twitter/controllers_social_media_crawler.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+import re
+from socket import timeout
+from threading import BoundedSemaphore, Lock
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from config.base import get_environment_variable_default
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+from wevote_functions.utils import staticUserAgent
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+# RE_FACEBOOK = r'//www\.twitter\.com/(?:#!/)?(\w+)'
+RE_FACEBOOK = r'/(?:https?:\/\/)?(?:www\.)?facebook\.com\/(?:(?:\w)*#!\/)?(?:pages\/)?(?:[\w\-]*\/)*?(\/)?([^/?]*)/'
+FACEBOOK_BLACKLIST = ['group', 'group.php', 'None']
+# NOTE: Scraping a website for the Facebook handle is more complicated than Twitter. There must be an existing
+#  solution available? My attempt turned off for now.
+
+# Only pays attention to https://twitter.com or http://twitter.com and ignores www.twitter.com
+RE_TWITTER = r'//twitter\.com/(?:#!/)?(\w+)'
+RE_TWITTER_WWW = r'//www\.twitter\.com/(?:#!/)?(\w+)'
+TWITTER_BLACKLIST = ['home', 'https', 'intent', 'none', 'search', 'share', 'twitterapi', 'wix']
+
+SOCIAL_MEDIA_CRAWLER_WORKERS = convert_to_int(get_environment_variable_default('SOCIAL_MEDIA_CRAWLER_WORKERS', 16))
+# Politeness: requests in flight to one host, and the time between starting them
+SOCIAL_MEDIA_CRAWLER_REQUESTS_PER_HOST = 2
+SOCIAL_MEDIA_CRAWLER_SECONDS_BETWEEN_REQUESTS_PER_HOST = 0.5
+SOCIAL_MEDIA_CRAWLER_TIMEOUT_SECONDS = 5
+# We stop reading a page after this many bytes, even if we haven't found a handle
+SOCIAL_MEDIA_CRAWLER_MAX_BYTES = 4 * 1024 * 1024
+SOCIAL_MEDIA_CONDITIONAL_GET_CACHE_SIZE = 20000
+
+twitter_pattern_list = [re.compile(RE_TWITTER), re.compile(RE_TWITTER_WWW)]
+facebook_pattern = re.compile(RE_FACEBOOK)
+
+
+class HostPolitenessLimiter:
+    """
+    At most requests_per_host requests in flight to any one host, started at least seconds_between_requests apart.
+    Safe to share between threads.
+    """
+
+    def __init__(self, requests_per_host=SOCIAL_MEDIA_CRAWLER_REQUESTS_PER_HOST,
+                 seconds_between_requests=SOCIAL_MEDIA_CRAWLER_SECONDS_BETWEEN_REQUESTS_PER_HOST):
+        self.requests_per_host = requests_per_host
+        self.seconds_between_requests = seconds_between_requests
+        self.semaphore_by_host = {}
+        self.next_request_time_by_host = {}
+        self.lock = Lock()
+
+    @contextmanager
+    def request_slot(self, host):
+        with self.lock:
+            if host not in self.semaphore_by_host:
+                self.semaphore_by_host[host] = BoundedSemaphore(self.requests_per_host)
+            semaphore = self.semaphore_by_host[host]
+        with semaphore:
+            with self.lock:
+                current_time = time.monotonic()
+                request_time = max(current_time, self.next_request_time_by_host.get(host, 0.0))
+                self.next_request_time_by_host[host] = request_time + self.seconds_between_requests
+            if request_time > current_time:
+                time.sleep(request_time - current_time)
+            yield
+
+
+class ConditionalGetCache:
+    """
+    The ETag, Last-Modified and scrape results of the pages we have read, so the next crawl can send
+    If-None-Match / If-Modified-Since and reuse the results when the site answers 304 Not Modified.
+    """
+
+    def __init__(self, max_entries=SOCIAL_MEDIA_CONDITIONAL_GET_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entry_by_key = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entry_by_key.get(key)
+            if entry is not None:
+                self.entry_by_key.move_to_end(key)
+            return entry
+
+    def set(self, key, etag, last_modified, results):
+        if not positive_value_exists(etag) and not positive_value_exists(last_modified):
+            return
+        with self.lock:
+            self.entry_by_key[key] = {
+                'etag':             etag,
+                'last_modified':    last_modified,
+                'results':          results,
+            }
+            self.entry_by_key.move_to_end(key)
+            while len(self.entry_by_key) > self.max_entries:
+                self.entry_by_key.popitem(last=False)
+
+
+social_media_conditional_get_cache = ConditionalGetCache()
+
+
+def extract_social_media_from_line(decoded_line, scrape_values, retrieve_list=False):
+    """
+    Add the Twitter handles and Facebook pages in one line of a page to scrape_values. Unless retrieve_list, only the
+    first of each is kept.
+    """
+    if retrieve_list or not scrape_values['twitter_handle_found']:
+        for twitter_pattern in twitter_pattern_list:
+            for match in twitter_pattern.finditer(decoded_line):
+                name = match.group(1)
+                if name not in TWITTER_BLACKLIST:
+                    scrape_values['twitter_handle'] = name
+                    scrape_values['twitter_handle_found'] = True
+                    if name not in scrape_values['twitter_handle_list']:
+                        scrape_values['twitter_handle_list'].append(name)
+                    if not retrieve_list:
+                        break
+            if scrape_values['twitter_handle_found'] and not retrieve_list:
+                break
+
+    if retrieve_list or not scrape_values['facebook_page_found']:
+        for match in facebook_pattern.finditer(decoded_line):
+            for possible_page in [match.group(0), match.group(2)]:
+                if possible_page is not None and possible_page not in FACEBOOK_BLACKLIST:
+                    scrape_values['facebook_page'] = possible_page
+                    scrape_values['facebook_page_found'] = True
+                    if possible_page not in scrape_values['facebook_page_list']:
+                        scrape_values['facebook_page_list'].append(possible_page)
+                    if not retrieve_list:
+                        return
+
+
+def scrape_social_media_from_one_site(site_url, retrieve_list=False, host_limiter=None,
+                                      conditional_get_cache=social_media_conditional_get_cache):
+    """
+    Read the page once, a line at a time as it arrives, and stop as soon as we have a Twitter handle and a Facebook
+    page (unless retrieve_list, where we read it all).
+    :param site_url:
+    :param retrieve_list: Return every handle and page we find, not just the first of each
+    :param host_limiter: HostPolitenessLimiter, when crawling many sites at once
+    :param conditional_get_cache: ConditionalGetCache, or None to always read the page
+    :return:
+    """
+    status = ""
+    success = False
+    scrape_values = {
+        'twitter_handle':       '',
+        'twitter_handle_found': False,
+        'twitter_handle_list':  [],
+        'facebook_page':        '',
+        'facebook_page_found':  False,
+        'facebook_page_list':   [],
+    }
+    if not positive_value_exists(site_url) or len(site_url) < 10:
+        status = 'PROPER_URL_NOT_PROVIDED: ' + str(site_url)
+        results = {
+            'status':               status,
+            'success':              success,
+            'page_redirected':      '',
+        }
+        results.update(scrape_values)
+        return results
+
+    cache_key = (site_url, positive_value_exists(retrieve_list))
+    cache_entry = conditional_get_cache.get(cache_key) if conditional_get_cache is not None else None
+    headers = dict(staticUserAgent())
+    if cache_entry is not None:
+        if positive_value_exists(cache_entry['etag']):
+            headers['If-None-Match'] = cache_entry['etag']
+        if positive_value_exists(cache_entry['last_modified']):
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+    host = urllib.parse.urlsplit(site_url).netloc.lower()
+    try:
+        with host_limiter.request_slot(host) if host_limiter is not None else nullcontext():
+            request = urllib.request.Request(site_url, None, headers)
+            with urllib.request.urlopen(request, timeout=SOCIAL_MEDIA_CRAWLER_TIMEOUT_SECONDS) as page:
+                bytes_read = 0
+                for line in page:
+                    bytes_read += len(line)
+                    extract_social_media_from_line(line.decode('utf-8', errors='ignore'), scrape_values, retrieve_list)
+                    if not retrieve_list and scrape_values['twitter_handle_found'] \
+                            and scrape_values['facebook_page_found']:
+                        status += 'SOCIAL_MEDIA_FOUND-STOPPED_READING '
+                        break
+                    if bytes_read > SOCIAL_MEDIA_CRAWLER_MAX_BYTES:
+                        status += 'PAGE_TOO_LONG-STOPPED_READING '
+                        break
+                etag = page.headers.get('ETag')
+                last_modified = page.headers.get('Last-Modified')
+        success = True
+        status += 'FINISHED_SCRAPING_PAGE '
+        if conditional_get_cache is not None:
+            conditional_get_cache.set(cache_key, etag, last_modified, dict(scrape_values))
+    except urllib.error.HTTPError as error_instance:
+        if error_instance.code == 304 and cache_entry is not None:
+            scrape_values = dict(cache_entry['results'])
+            success = True
+            status += 'PAGE_NOT_MODIFIED '
+        else:
+            status += "SCRAPE_SOCIAL_HTTP_ERROR: {error_message} ".format(error_message=error_instance)
+    except timeout:
+        status += "SCRAPE_TIMEOUT_ERROR "
+    except IOError as error_instance:
+        # Catch the error message coming back from urllib.request.urlopen and pass it in the status
+        status += "SCRAPE_SOCIAL_IO_ERROR: {error_message} ".format(error_message=error_instance)
+    except Exception as error_instance:
+        status += "SCRAPE_GENERAL_EXCEPTION_ERROR: {error_message} ".format(error_message=error_instance)
+
+    results = {
+        'status':               status,
+        'success':              success,
+        'page_redirected':      scrape_values['twitter_handle'],
+    }
+    results.update(scrape_values)
+    return results
+
+
+def interleave_site_urls_by_host(site_url_list):
+    """
+    Round-robin across hosts, so the workers aren't all waiting on the politeness limit of one host.
+    """
+    site_url_list_by_host = OrderedDict()
+    for site_url in site_url_list:
+        host = urllib.parse.urlsplit(site_url).netloc.lower()
+        site_url_list_by_host.setdefault(host, []).append(site_url)
+    interleaved_site_url_list = []
+    for url_index in range(max((len(url_list) for url_list in site_url_list_by_host.values()), default=0)):
+        for url_list in site_url_list_by_host.values():
+            if url_index < len(url_list):
+                interleaved_site_url_list.append(url_list[url_index])
+    return interleaved_site_url_list
+
+
+def crawl_social_media_from_sites(site_url_list, retrieve_list=False, number_of_workers=SOCIAL_MEDIA_CRAWLER_WORKERS,
+                                  host_limiter=None, conditional_get_cache=social_media_conditional_get_cache):
+    """
+    scrape_social_media_from_one_site for every site, from a pool of threads, politely.
+    :return: dict from site_url to its scrape results
+    """
+    host_limiter = host_limiter if host_limiter is not None else HostPolitenessLimiter()
+    unique_site_url_list = list(OrderedDict.fromkeys(site_url for site_url in site_url_list
+                                                     if positive_value_exists(site_url)))
+    scrape_results_by_site_url = {}
+    with ThreadPoolExecutor(max_workers=number_of_workers, thread_name_prefix='social_media_crawler') as executor:
+        site_url_by_future = {
+            executor.submit(scrape_social_media_from_one_site, site_url, retrieve_list, host_limiter,
+                            conditional_get_cache): site_url
+            for site_url in interleave_site_urls_by_host(unique_site_url_list)}
+        for future in as_completed(site_url_by_future):
+            scrape_results_by_site_url[site_url_by_future[future]] = future.result()
+    return scrape_results_by_site_url
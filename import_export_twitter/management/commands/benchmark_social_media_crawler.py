@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from import_export_twitter.controllers_social_media_crawler import ConditionalGetCache, \
+    crawl_social_media_from_sites, HostPolitenessLimiter, scrape_social_media_from_one_site, \
+    SOCIAL_MEDIA_CRAWLER_REQUESTS_PER_HOST, SOCIAL_MEDIA_CRAWLER_SECONDS_BETWEEN_REQUESTS_PER_HOST, \
+    SOCIAL_MEDIA_CRAWLER_WORKERS
+from import_export_twitter.social_media_fixture_server import generate_social_media_fixture_url_list, \
+    run_social_media_fixture_servers
+
+
+class Command(BaseCommand):
+    help = 'Measures pages per second for the social media scraper, one site at a time (how we used to do it) and ' \
+           'with the concurrent crawler, then again with its conditional GET cache, against local fixture sites.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', type=int, default=200)
+        parser.add_argument('--hosts', type=int, default=20)
+        parser.add_argument('--latency-ms', type=int, default=200, help='Simulated site response time')
+        parser.add_argument('--filler-kb', type=int, default=256, help='Page size beyond the fixture html')
+        parser.add_argument('--workers', type=int, default=SOCIAL_MEDIA_CRAWLER_WORKERS)
+        parser.add_argument('--requests-per-host', type=int, default=SOCIAL_MEDIA_CRAWLER_REQUESTS_PER_HOST)
+        parser.add_argument('--seconds-between-requests', type=float,
+                            default=SOCIAL_MEDIA_CRAWLER_SECONDS_BETWEEN_REQUESTS_PER_HOST)
+
+    def handle(self, *args, **options):
+        with run_social_media_fixture_servers(
+                number_of_hosts=options['hosts'], latency_seconds=options['latency_ms'] / 1000.0,
+                filler_bytes=options['filler_kb'] * 1024) as server_list:
+            site_url_list = generate_social_media_fixture_url_list(server_list, options['sites'])
+
+            start_time = time.perf_counter()
+            for site_url in site_url_list:
+                scrape_social_media_from_one_site(site_url, conditional_get_cache=None)
+            self.write_pages_per_second('One site at a time', len(site_url_list), start_time)
+
+            conditional_get_cache = ConditionalGetCache()
+            for label in ['Crawler', 'Crawler, pages not modified']:
+                start_time = time.perf_counter()
+                scrape_results_by_site_url = crawl_social_media_from_sites(
+                    site_url_list, number_of_workers=options['workers'],
+                    host_limiter=HostPolitenessLimiter(options['requests_per_host'],
+                                                       options['seconds_between_requests']),
+                    conditional_get_cache=conditional_get_cache)
+                self.write_pages_per_second(
+                    "{label} ({workers} workers)".format(label=label, workers=options['workers']),
+                    len(site_url_list), start_time)
+
+            twitter_handles_found = sum(1 for scrape_results in scrape_results_by_site_url.values()
+                                        if scrape_results['twitter_handle_found'])
+            facebook_pages_found = sum(1 for scrape_results in scrape_results_by_site_url.values()
+                                       if scrape_results['facebook_page_found'])
+            not_modified_count = sum(server.not_modified_count for server in server_list)
+            self.stdout.write("{twitter:,} Twitter handles, {facebook:,} Facebook pages, {not_modified:,} pages not "
+                              "modified".format(twitter=twitter_handles_found, facebook=facebook_pages_found,
+                                                not_modified=not_modified_count))
+
+    def write_pages_per_second(self, label, number_of_pages, start_time):
+        elapsed_seconds = time.perf_counter() - start_time
+        self.stdout.write("{label:40} {pages_per_second:10,.1f} pages/second".format(
+            label=label, pages_per_second=number_of_pages / elapsed_seconds))
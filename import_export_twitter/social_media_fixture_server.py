@@ -0,0 +1,111 @@
+# import_export_twitter/social_media_fixture_server.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# A local stand-in for organization and candidate websites, so the social media crawler can be tested and benchmarked
+# offline. Every path /<fixture_name>/<anything> serves fixtures/social_media/<fixture_name>.html
+
+from contextlib import contextmanager
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+from threading import Lock, Thread
+import time
+
+SOCIAL_MEDIA_FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'social_media')
+SOCIAL_MEDIA_FIXTURE_NAME_LIST = ['twitter_and_facebook', 'twitter_only', 'facebook_only', 'no_social_media']
+# One line of page filler, e.g. the inline scripts and styles most campaign sites carry
+SOCIAL_MEDIA_FIXTURE_FILLER_LINE = b'  <p class="filler">' + b'x' * 100 + b'</p>\n'
+
+
+def retrieve_social_media_fixture_body(fixture_name, filler_bytes=0):
+    """
+    The fixture page, with filler_bytes of filler lines added after its first half, so a page is only read to the end
+    when the crawler has to.
+    """
+    with open(os.path.join(SOCIAL_MEDIA_FIXTURE_DIRECTORY, fixture_name + '.html'), 'rb') as fixture_file:
+        line_list = fixture_file.readlines()
+    filler = SOCIAL_MEDIA_FIXTURE_FILLER_LINE * (filler_bytes // len(SOCIAL_MEDIA_FIXTURE_FILLER_LINE))
+    middle = len(line_list) // 2
+    return b''.join(line_list[:middle]) + filler + b''.join(line_list[middle:])
+
+
+class SocialMediaFixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        fixture_name = self.path.strip('/').split('/')[0]
+        with server.lock:
+            server.request_count += 1
+        if fixture_name not in SOCIAL_MEDIA_FIXTURE_NAME_LIST:
+            self.send_error(404)
+            return
+        time.sleep(server.latency_seconds)
+        body = server.body_by_fixture_name[fixture_name]
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if server.conditional_get and self.headers.get('If-None-Match') == etag:
+            with server.lock:
+                server.not_modified_count += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if server.conditional_get:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        try:
+            # Send the page a line at a time, so a crawler that stops reading early also stops the download
+            for line in body.splitlines(keepends=True):
+                self.wfile.write(line)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def run_social_media_fixture_servers(number_of_hosts=4, latency_seconds=0.0, filler_bytes=0, conditional_get=True):
+    """
+    Start one server per host on 127.0.0.1, each on its own port, so the crawler sees them as separate hosts.
+    :param number_of_hosts:
+    :param latency_seconds: Time each response waits before it starts, like a slow site
+    :param filler_bytes: Page filler, see retrieve_social_media_fixture_body
+    :param conditional_get: Send an ETag, and answer 304 Not Modified to a matching If-None-Match
+    :return: list of the servers, each with its base_url, request_count and not_modified_count
+    """
+    body_by_fixture_name = {fixture_name: retrieve_social_media_fixture_body(fixture_name, filler_bytes)
+                            for fixture_name in SOCIAL_MEDIA_FIXTURE_NAME_LIST}
+    server_list = []
+    try:
+        for _ in range(number_of_hosts):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), SocialMediaFixtureRequestHandler)
+            server.daemon_threads = True
+            server.body_by_fixture_name = body_by_fixture_name
+            server.latency_seconds = latency_seconds
+            server.conditional_get = conditional_get
+            server.lock = Lock()
+            server.request_count = 0
+            server.not_modified_count = 0
+            server.base_url = 'http://127.0.0.1:{port}/'.format(port=server.server_address[1])
+            Thread(target=server.serve_forever, daemon=True).start()
+            server_list.append(server)
+        yield server_list
+    finally:
+        for server in server_list:
+            server.shutdown()
+            server.server_close()
+
+
+def generate_social_media_fixture_url_list(server_list, number_of_sites):
+    """
+    number_of_sites distinct urls, spread across the servers and the fixture pages.
+    """
+    return [server_list[site_number % len(server_list)].base_url + "{fixture_name}/{site_number}".format(
+        fixture_name=SOCIAL_MEDIA_FIXTURE_NAME_LIST[
+            (site_number // len(server_list)) % len(SOCIAL_MEDIA_FIXTURE_NAME_LIST)],
+        site_number=site_number) for site_number in range(number_of_sites)]
@@ -4,6 +4,42 @@
 
 # See also WeVoteServer/twitter/tests.py for routines that manage internal twitter data
 
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase
+
+from import_export_twitter.controllers import scrape_and_save_social_media_from_all_organizations
+from organization.models import Organization
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' organization query see the organizations saved here
+class ScrapeSocialMediaTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def test_bulk_updated_organizations_send_post_save(self):
+        Organization.objects.create(organization_name='Changed Org', organization_website='https://changed.org')
+        Organization.objects.create(organization_name='Same Org', organization_website='https://same.org',
+                                    organization_twitter_handle='sameorg')
+        saved_instance_list = []
+
+        def record_saved_instance(sender, instance, **kwargs):
+            saved_instance_list.append((instance, kwargs['update_fields']))
+
+        post_save.connect(record_saved_instance, sender=Organization)
+        self.addCleanup(post_save.disconnect, record_saved_instance, sender=Organization)
+        scrape_results_by_site_url = {
+            website: {'twitter_handle_found': True, 'twitter_handle': 'sameorg' if 'same' in website else 'changedorg',
+                      'facebook_page_found': False, 'facebook_page': ''}
+            for website in ['https://changed.org', 'https://same.org']}
+        with mock.patch('import_export_twitter.controllers.crawl_social_media_from_sites',
+                        return_value=scrape_results_by_site_url):
+            results = scrape_and_save_social_media_from_all_organizations(force_retrieve=True)
+
+        self.assertEqual(results['organizations_updated'], 1)
+        self.assertEqual(len(saved_instance_list), 1)
+        instance, update_fields = saved_instance_list[0]
+        # The whole row, like the search index receivers need
+        self.assertEqual(instance.organization_name, 'Changed Org')
+        self.assertEqual(instance.organization_twitter_handle, 'changedorg')
+        self.assertIn('organization_twitter_handle', update_fields)
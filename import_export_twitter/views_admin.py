@@ -26,9 +26,10 @@ from .controllers import delete_possible_twitter_handles, make_item_in_list_prim
     retrieve_possible_twitter_handles, retrieve_possible_twitter_handles_in_bulk
 from .controllers import refresh_twitter_candidate_details, refresh_twitter_data_for_organizations, \
     refresh_twitter_organization_details, refresh_twitter_politician_details, refresh_twitter_representative_details, \
-    scrape_social_media_from_one_site, refresh_twitter_candidate_details_for_election, \
+    refresh_twitter_candidate_details_for_election, \
     scrape_and_save_social_media_for_candidates_in_one_election, scrape_and_save_social_media_from_all_organizations, \
     transfer_candidate_twitter_handles_from_google_civic
+from .controllers_social_media_crawler import scrape_social_media_from_one_site
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -291,6 +291,21 @@ def retrieve_vote_usa_ballot_items_for_one_voter_api(
     return results
 
 
+def fetch_vote_usa_voter_info_response(election_day_text="", latitude=0.0, longitude=0.0, state_code="",
+                                       timeout=None):
+    return requests.get(
+        VOTE_USA_VOTER_INFO_URL,
+        headers=HEADERS_FOR_VOTE_USA_API_CALL,
+        params={
+            "accessKey": VOTE_USA_API_KEY,
+            "electionDay": election_day_text,
+            "latitude": latitude,
+            "longitude": longitude,
+            "state": state_code,
+        },
+        timeout=timeout)
+
+
 def retrieve_vote_usa_ballot_items_from_polling_location_api(
         google_civic_election_id=0,
         election_day_text="",
@@ -306,7 +321,10 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
         new_office_we_vote_ids_list=[],
         new_candidate_we_vote_ids_list=[],
         new_measure_we_vote_ids_list=[],
-        update_or_create_rules={}):
+        update_or_create_rules={},
+        prefetched_response=None,
+        prefetch_failed_status='',
+        ballot_fingerprint_dict=None):
     """
 
     :param google_civic_election_id:
@@ -324,6 +342,9 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
     :param new_candidate_we_vote_ids_list:
     :param new_measure_we_vote_ids_list:
     :param update_or_create_rules:
+    :param prefetched_response: Vote USA's response for this map point, from harvest_map_point_responses
+    :param prefetch_failed_status: why harvest_map_point_responses has no response for this map point
+    :param ballot_fingerprint_dict: ballots already groomed in this BatchSet, by contest fingerprint
     :return:
     """
     success = True
@@ -331,6 +352,8 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
     ballot_items_count = 0
     polling_location_found = False
     batch_header_id = 0
+    ballot_fingerprint = ''
+    ballot_fingerprint_hit = False
 
     if not positive_value_exists(google_civic_election_id):
         status += "MISSING_ELECTION_ID "
@@ -444,18 +467,19 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
                 state_code = "na"
 
         try:
-            api_key = VOTE_USA_API_KEY
-            # Get the ballot info at this address
-            response = requests.get(
-                VOTE_USA_VOTER_INFO_URL,
-                headers=HEADERS_FOR_VOTE_USA_API_CALL,
-                params={
-                    "accessKey": api_key,
-                    "electionDay": election_day_text,
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "state": state_code,
-                })
+            if prefetched_response is not None:
+                # The map point harvester already asked Vote USA for this map point
+                response = prefetched_response
+            elif positive_value_exists(prefetch_failed_status):
+                # The map point harvester already retried this map point, so we don't ask Vote USA again
+                raise ValueError('MAP_POINT_HARVESTER_FAILED: ' + prefetch_failed_status)
+            else:
+                # Get the ballot info at this address
+                response = fetch_vote_usa_voter_info_response(
+                    election_day_text=election_day_text,
+                    latitude=latitude,
+                    longitude=longitude,
+                    state_code=state_code)
             one_ballot_json = json.loads(response.text)
         except Exception as e:
             success = False
@@ -502,9 +526,10 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
                 google_civic_election_id=google_civic_election_id)
 
             if 'contests' in one_ballot_json:
-                from import_export_google_civic.controllers import groom_and_store_google_civic_ballot_json_2021
-                groom_results = groom_and_store_google_civic_ballot_json_2021(
+                from import_export_google_civic.controllers import groom_or_reuse_google_civic_ballot_json_2021
+                groom_results = groom_or_reuse_google_civic_ballot_json_2021(
                     one_ballot_json,
+                    ballot_fingerprint_dict=ballot_fingerprint_dict,
                     google_civic_election_id=google_civic_election_id,
                     state_code=state_code,
                     polling_location_we_vote_id=polling_location_we_vote_id,
@@ -520,6 +545,8 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
                     use_vote_usa=True,
                     )
                 status += groom_results['status']
+                ballot_fingerprint = groom_results['ballot_fingerprint']
+                ballot_fingerprint_hit = groom_results['ballot_fingerprint_hit']
                 ballot_item_dict_list = groom_results['ballot_item_dict_list']
                 existing_offices_by_election_dict = groom_results['existing_offices_by_election_dict']
                 existing_candidate_objects_dict = groom_results['existing_candidate_objects_dict']
@@ -660,6 +687,8 @@ def retrieve_vote_usa_ballot_items_from_polling_location_api(
         'new_office_we_vote_ids_list':              new_office_we_vote_ids_list,
         'new_candidate_we_vote_ids_list':           new_candidate_we_vote_ids_list,
         'new_measure_we_vote_ids_list':             new_measure_we_vote_ids_list,
+        'ballot_fingerprint':                       ballot_fingerprint,
+        'ballot_fingerprint_hit':                   ballot_fingerprint_hit,
     }
     return results
 
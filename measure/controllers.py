@@ -441,6 +441,42 @@ def push_contest_measure_data_to_other_table_caches(contest_measure_id=0, contes
         return results
 
 
+def measure_list_for_upcoming_elections_retrieve_for_api(  # measureListForUpcomingElectionsRetrieve
+        google_civic_election_id_list=[],
+        state_code=''):
+    """
+    Return all measures for the elections in google_civic_election_id_list
+    :param google_civic_election_id_list:
+    :param state_code:
+    :return:
+    """
+    status = ""
+    # We will need all candidates for all upcoming elections so we can search the HTML of
+    #  the possible voter guide for these names
+    measure_list_light = []
+    results = retrieve_measure_list_for_all_upcoming_elections(google_civic_election_id_list,
+                                                               limit_to_this_state_code=state_code)
+    if results['measure_list_found']:
+        measure_list_light = results['measure_list_light']
+
+        expand_results = add_measure_name_alternatives_to_measure_list_light(measure_list_light)
+        if expand_results['success']:
+            measure_list_light = expand_results['measure_list_light']
+
+    google_civic_election_id_list = results['google_civic_election_id_list']
+
+    status += results['status']
+    success = results['success']
+
+    json_data = {
+        'status':                           status,
+        'success':                          success,
+        'google_civic_election_id_list':    google_civic_election_id_list,
+        'measure_list':                   measure_list_light,
+    }
+    return json_data
+
+
 def retrieve_measure_list_for_all_upcoming_elections(
         google_civic_election_id_list=[],
         limit_to_this_state_code="",
@@ -3,16 +3,20 @@
 # -*- coding: UTF-8 -*-
 
 from config.base import get_environment_variable
+from geoip.models import geocode_with_cache
 from django.db import models
 from django.db.models import F, Q, Count, FloatField, ExpressionWrapper, Func
 from geopy.geocoders import get_geocoder_for_service
 from geopy.exc import GeocoderQuotaExceeded
 from exception.models import handle_exception, handle_record_found_more_than_one_exception
+from functools import partial
 import sys
 from wevote_settings.constants import OFFICE_HELD_YEARS_AVAILABLE
 from wevote_settings.models import fetch_site_unique_id_prefix, fetch_next_we_vote_id_office_held_integer
 import wevote_functions.admin
 from wevote_functions.functions import convert_to_int, extract_state_from_ocd_division_id, positive_value_exists
+from wevote_functions.functions_geo import OFFICES_HELD_FOR_LOCATION_MAP_POINTS, filter_queryset_to_bounding_box, \
+    find_nearest_map_point_ids_in_spatial_index, retrieve_map_point_spatial_index
 
 DEG_TO_RADS = 0.0174533
 DISTANCE_LIMIT_IN_MILES = 25
@@ -300,6 +304,64 @@ class OfficeHeldManager(models.Manager):
             return results['office_held_we_vote_id']
         return 0
 
+    @staticmethod
+    def retrieve_closest_map_point_offices_held_for_location(queryset=None, location=None, state_code=''):
+        """
+        Return the first entry in queryset, which find_closest_offices_held_for_location has already limited to
+        map points within DISTANCE_LIMIT_IN_MILES of location and ordered by distance. When we know the state,
+        we look up the nearest map points in this worker's spatial index first, so the database only calculates
+        the distance for those few rows.
+        :param queryset:
+        :param location:
+        :param state_code:
+        :return:
+        """
+        if not positive_value_exists(state_code) or len(state_code) != 2:
+            return queryset.first()
+
+        spatial_index = retrieve_map_point_spatial_index(
+            kind_of_map_point=OFFICES_HELD_FOR_LOCATION_MAP_POINTS,
+            state_code=state_code,
+            retrieve_map_point_location_list_function=partial(
+                OfficeHeldManager.retrieve_offices_held_for_location_map_point_location_list,
+                state_code=state_code))
+        if spatial_index is None:
+            return queryset.first()
+
+        nearest_id_list = find_nearest_map_point_ids_in_spatial_index(
+            spatial_index=spatial_index,
+            latitude=location.latitude,
+            longitude=location.longitude,
+            distance_in_miles=DISTANCE_LIMIT_IN_MILES)
+        if not len(nearest_id_list):
+            # Nothing nearby in the index, which may have been built before the map points nearest location were saved
+            return queryset.first()
+        offices_held_for_location = queryset.filter(id__in=nearest_id_list).first()
+        if offices_held_for_location is None:
+            # The nearest map points have changed since the index was built
+            offices_held_for_location = queryset.first()
+        return offices_held_for_location
+
+    @staticmethod
+    def retrieve_offices_held_for_location_map_point_location_list(state_code=''):
+        """
+        The (id, latitude, longitude) of every map point entry in this state, for the spatial index
+        used by find_closest_offices_held_for_location.
+        :param state_code:
+        :return:
+        """
+        if 'test' in sys.argv:
+            queryset = OfficesHeldForLocation.objects.all()
+        else:
+            queryset = OfficesHeldForLocation.objects.using('readonly').all()
+        queryset = queryset.exclude(
+            Q(polling_location_we_vote_id__isnull=True) | Q(polling_location_we_vote_id=""))
+        queryset = queryset.filter(
+            state_code__iexact=state_code,
+            latitude__isnull=False,
+            longitude__isnull=False)
+        return list(queryset.values_list('id', 'latitude', 'longitude'))
+
     def find_closest_offices_held_for_location(
             self,
             text_for_map_search='',
@@ -335,7 +397,7 @@ class OfficeHeldManager(models.Manager):
         # keep using the GeoPy as a wrapper, in case some day we want to swap out google for geolocation, with a better
         # competitor.  (GeoPy doesn't have much value in our use case.)
         try:
-            location = self.google_client.geocode(text_for_map_search, sensor=False, timeout=GEOCODE_TIMEOUT)
+            location = geocode_with_cache(self.google_client, text_for_map_search, timeout=GEOCODE_TIMEOUT)
         except GeocoderQuotaExceeded:
             # try_without_maps_key = True
             status += "GEOCODER_QUOTA_EXCEEDED "
@@ -440,6 +502,9 @@ class OfficeHeldManager(models.Manager):
                 queryset = queryset.filter(state_code__iexact=state_code)
 
             try:
+                # Only calculate the distance for map points inside the bounding box, which can use an index
+                queryset = filter_queryset_to_bounding_box(
+                    queryset, location.latitude, location.longitude, DISTANCE_LIMIT_IN_MILES)
                 lat_rads_ploc = location.latitude * DEG_TO_RADS
                 lon_rads_ploc = location.longitude * DEG_TO_RADS
                 queryset = queryset.annotate(
@@ -464,7 +529,10 @@ class OfficeHeldManager(models.Manager):
 
             queryset = queryset.order_by('distance')
             try:
-                offices_held_for_location = queryset.first()
+                offices_held_for_location = self.retrieve_closest_map_point_offices_held_for_location(
+                    queryset=queryset,
+                    location=location,
+                    state_code=state_code)
                 if offices_held_for_location is None:
                     status += "OFFICES_HELD_FOR_LOCATION_QUERY_FIRST_FAILED-" \
                               "HAS_LOCATION_AND_POSITIVE_GOOGLE_CIVIC_ID__BALLOT_NONE "
@@ -499,6 +567,8 @@ class OfficeHeldManager(models.Manager):
                 # Calculate the approximate great circle distance between two coordinates
                 # https://medium.com/@petehouston/calculate-distance-of-two-locations-on-earth-using-python-1501b1944d97
                 try:
+                    queryset = filter_queryset_to_bounding_box(
+                        queryset, location.latitude, location.longitude, DISTANCE_LIMIT_IN_MILES)
                     lat_rads_ploc = location.latitude * DEG_TO_RADS
                     lon_rads_ploc = location.longitude * DEG_TO_RADS
                     queryset = queryset.annotate(
@@ -1201,3 +1271,11 @@ class OfficesHeldForLocation(models.Model):
     year_with_data_2024 = models.BooleanField(default=None, null=True)
     year_with_data_2025 = models.BooleanField(default=None, null=True)
     year_with_data_2026 = models.BooleanField(default=None, null=True)
+
+    class Meta:
+        indexes = [
+            # For bounding-box prefilters in find_closest_offices_held_for_location
+            models.Index(
+                fields=['state_code', 'latitude', 'longitude'],
+                name='offices_held_loc_state_lat'),
+        ]
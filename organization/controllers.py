@@ -7,6 +7,7 @@ import json
 import re
 from io import BytesIO
 
+import requests
 import robot_detection
 import tweepy
 from PIL import Image, ImageOps
@@ -45,8 +46,9 @@ from wevote_functions.functions import convert_to_int, convert_to_political_part
     DEMOCRAT, GREEN, INDEPENDENT, LIBERTARIAN, REPUBLICAN
 from .controllers_fastly import add_wevote_subdomain_to_fastly, add_subdomain_route53_record, \
     get_wevote_subdomain_status
-from .models import Organization, OrganizationChangeLog, OrganizationListManager, OrganizationManager, \
-    OrganizationMembershipLinkToVoter, \
+from .models import CHOSEN_FAVICON_ALLOWED, CHOSEN_GOOGLE_ANALYTICS_ALLOWED, CHOSEN_SOCIAL_SHARE_IMAGE_ALLOWED, \
+    CHOSEN_SOCIAL_SHARE_DESCRIPTION_ALLOWED, Organization, OrganizationChangeLog, OrganizationListManager, \
+    OrganizationManager, OrganizationMembershipLinkToVoter, \
     OrganizationReservedDomain, OrganizationTeamMember, ORGANIZATION_UNIQUE_IDENTIFIERS, PUBLIC_FIGURE
 
 logger = wevote_functions.admin.get_logger(__name__)
@@ -4012,3 +4014,150 @@ def save_image_to_organization_table(organization, image_url, source_link, url_i
         'status': status,
     }
     return results
+
+
+def organization_index_template_values_retrieve(organization_incoming_domain=''):  # organizationIndex
+    """
+    Everything organization/organization_index.html needs for one incoming domain
+    :param organization_incoming_domain:
+    :return:
+    """
+    status = ""
+
+    # Default values
+    chosen_domain_type_is_campaign = True
+    chosen_favicon_url_https = None
+    chosen_google_analytics_tracking_id = ''
+    chosen_html_verification_string = None
+    chosen_prevent_sharing_opinions = None
+    chosen_social_share_description = \
+        "We Vote helps you vote your values, with help from your friends and other " \
+        "people you trust. Through our nonpartisan, open source platform, we'll help you become a " \
+        "better voter, up and down the ballot."
+    chosen_social_share_master_image_url_https = None
+    hide_favicon = False
+    hide_social_share_image = False
+    html_title = "We Vote"
+
+    if organization_incoming_domain == 'wevote.us':             # Only used to test the doc page
+        chosen_domain_type_is_campaign = False
+    elif organization_incoming_domain == 'campaigns.wevote.us':    # Only used to test the doc page
+        chosen_domain_type_is_campaign = True
+    else:
+        organization_manager = OrganizationManager()
+        results = organization_manager.retrieve_organization_from_incoming_hostname(
+            organization_incoming_domain, read_only=True)
+        organization_found = results['organization_found']
+        organization = results['organization']
+        status += results['status']
+
+        if organization_found:
+            master_features_provided_bitmap = 0
+            chosen_domain_type_is_campaign = organization.chosen_domain_type_is_campaign
+            if positive_value_exists(chosen_domain_type_is_campaign):
+                # Change the default
+                chosen_social_share_description = "Vote for candidates you like. Oppose candidates you don't."
+            features_provided_bitmap = organization.features_provided_bitmap
+            chosen_hide_we_vote_logo = organization.chosen_hide_we_vote_logo
+            chosen_html_verification_string = organization.chosen_html_verification_string
+            chosen_prevent_sharing_opinions = organization.chosen_prevent_sharing_opinions
+            if not positive_value_exists(features_provided_bitmap) \
+                    and positive_value_exists(organization.chosen_feature_package) \
+                    and organization.chosen_feature_package not in 'FREE':
+                try:
+                    from donate.models import DonationManager
+                    donation_manager = DonationManager()
+                    results = donation_manager.retrieve_master_feature_package(organization.chosen_feature_package)
+                    if results['master_feature_package_found']:
+                        master_feature_package = results['master_feature_package']
+                        master_features_provided_bitmap = master_feature_package.features_provided_bitmap
+                except Exception as e:
+                    # Could not retrieve master_feature_package
+                    pass
+                if positive_value_exists(master_features_provided_bitmap):
+                    try:
+                        features_provided_bitmap = master_features_provided_bitmap
+                        organization.features_provided_bitmap = master_features_provided_bitmap
+                        organization.save()
+                    except Exception as e:
+                        # Could not save features_provided_bitmap update to organization
+                        pass
+
+            if features_provided_bitmap & CHOSEN_FAVICON_ALLOWED:
+                if positive_value_exists(organization.chosen_favicon_url_https):
+                    chosen_favicon_url_https = organization.chosen_favicon_url_https
+                    hide_favicon = False
+                elif positive_value_exists(chosen_hide_we_vote_logo):
+                    chosen_favicon_url_https = None
+                    hide_favicon = True
+                else:
+                    # Show We Vote favicon if a new favicon has not been uploaded, and We Vote logo not hidden
+                    chosen_favicon_url_https = None
+                    hide_favicon = False
+
+            if features_provided_bitmap & CHOSEN_SOCIAL_SHARE_IMAGE_ALLOWED:
+                if positive_value_exists(organization.chosen_social_share_master_image_url_https):
+                    chosen_social_share_master_image_url_https = organization.chosen_social_share_master_image_url_https
+                    hide_social_share_image = False
+                elif positive_value_exists(organization.chosen_logo_url_https):
+                    chosen_social_share_master_image_url_https = organization.chosen_logo_url_https
+                    hide_social_share_image = False
+                elif positive_value_exists(chosen_hide_we_vote_logo):
+                    chosen_social_share_master_image_url_https = None
+                    hide_social_share_image = True
+                else:
+                    # Show We Vote social share image if a new image has not been uploaded, and We Vote logo not hidden
+                    chosen_social_share_master_image_url_https = None
+                    hide_social_share_image = False
+
+            if features_provided_bitmap & CHOSEN_SOCIAL_SHARE_DESCRIPTION_ALLOWED:
+                html_title = organization.chosen_website_name if organization.chosen_website_name \
+                    else organization.organization_name
+                chosen_social_share_description = organization.chosen_social_share_description
+
+            if features_provided_bitmap & CHOSEN_GOOGLE_ANALYTICS_ALLOWED:
+                chosen_google_analytics_tracking_id = organization.chosen_google_analytics_tracking_id
+                google_analytics_valid = False
+                # Make sure this is a valid account number
+                if positive_value_exists(chosen_google_analytics_tracking_id) \
+                        and isinstance(chosen_google_analytics_tracking_id, str):
+                    chosen_google_analytics_tracking_id = chosen_google_analytics_tracking_id.strip()
+                    if chosen_google_analytics_tracking_id.startswith('UA-') \
+                            and len(chosen_google_analytics_tracking_id) < 20:
+                        # We do these primitive validity checks
+                        google_analytics_valid = True
+                if not google_analytics_valid:
+                    chosen_google_analytics_tracking_id = None
+
+    # Regardless of the number and varieties of customized sites, immediately after a WebApp or Campaigns build update,
+    # a main.name.html will be in the build directory for both the base WebApp or Campaigns sites.  For any site,
+    # customized or un-customized, we need to get the full name of the build's main.[hash].js and feed that to Fastly
+    # when it requests a customized index.html
+
+    if chosen_domain_type_is_campaign:
+        req_url = 'https://campaigns.wevote.us/main.name.html'
+    else:
+        req_url = 'https://wevote.us/main.name.html'
+
+    verify_bool = not ('localhost' in organization_incoming_domain or '127.0.0.1' in organization_incoming_domain or
+                       'wevotedeveloper.com')
+    text = requests.get(req_url, verify=verify_bool).text
+    main_js = re.search(r"<body>(.*?)<\/body>", text)[1]
+
+    template_values = {
+        'chosen_domain_type_is_campaign':             chosen_domain_type_is_campaign,
+        'chosen_favicon_url_https':                   chosen_favicon_url_https,
+        'chosen_google_analytics_tracking_id':        chosen_google_analytics_tracking_id,
+        'chosen_html_verification_string':            chosen_html_verification_string,
+        'chosen_prevent_sharing_opinions':            chosen_prevent_sharing_opinions,
+        'chosen_social_share_description':            chosen_social_share_description,
+        'chosen_social_share_master_image_url_https': chosen_social_share_master_image_url_https,
+        'hide_favicon':                               hide_favicon,
+        'hide_social_share_image':                    hide_social_share_image,
+        'html_title':                                 html_title,
+        'organization_incoming_domain':               organization_incoming_domain,
+        'some_numerical_string':                      '12345hi',
+        'main_js':                                    main_js,
+    }
+
+    return template_values
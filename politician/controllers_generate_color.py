@@ -1,64 +1,248 @@
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from urllib import request
-import math, re
-
+import re
 
-def generate_background(politician, base=None):
-    # specify how many bins will be generated for color sorting, the number of bins is base**3
-    base = base or 3
- 
-    # this is the speed bottleneck, not sure if this can be sped up
-    try:
-        res = request.urlopen(politician.we_vote_hosted_profile_image_url_large).read()
-        image = Image.open(BytesIO(res))
+import numpy
+from PIL import Image
 
-        image_crop_left = image.crop((0, 0, 20, 20))
-        image_crop_right = image.crop((image.width - 20, 0, image.width, 20))
+from config.base import get_environment_variable_default
+from wevote_functions.functions import convert_to_int, positive_value_exists
 
-        pixels_left = image_crop_left.convert('RGBA')
-        pixels_right = image_crop_right.convert('RGBA')
-        left_list = list(pixels_left.getdata())
-        right_list = list(pixels_right.getdata())
+# The corners we sample at the top left and top right of the image, in pixels
+BACKGROUND_COLOR_CORNER_SIZE = 20
+BACKGROUND_COLOR_WORKERS = convert_to_int(get_environment_variable_default('BACKGROUND_COLOR_WORKERS', 8))
 
-        for pixel in right_list:
-            left_list.append(pixel)
 
-        bins = []
-        for bin in range(base**3, 0, -1):
-            bins.append([])
+def generate_background_color_from_python_image(python_image, base=None):
+    """
+    The average of the two most common color bins in the top left and top right corners of python_image
+    :param python_image: PIL image, e.g. the large size of a profile image
+    :param base: How many bins to sort colors into per channel, so there are base**3 bins
+    :return: hex like "#1a2b3c", or '' if there is no color to be had
+    """
+    base = base or 3
+    try:
+        corner_size = BACKGROUND_COLOR_CORNER_SIZE
+        # crop pads past the edge of a small image with transparent black, the same as we always have
+        corner_left = python_image.crop((0, 0, corner_size, corner_size)).convert('RGBA')
+        corner_right = python_image.crop(
+            (python_image.width - corner_size, 0, python_image.width, corner_size)).convert('RGBA')
+        pixels = numpy.concatenate([
+            numpy.asarray(corner_left).reshape(-1, 4)[:, :3],
+            numpy.asarray(corner_right).reshape(-1, 4)[:, :3],
+        ]).astype(numpy.int64)
+
+        divisor = 255 / base
+        binned = numpy.minimum(numpy.floor(pixels / divisor), base - 1).astype(numpy.int64)
+        bin_index = binned[:, 0] * (base ** 2) + binned[:, 1] * base + binned[:, 2]
+        bin_count = numpy.bincount(bin_index, minlength=base ** 3)
+        # Most common first, and the lower bin first when two are tied
+        top_bin_list = numpy.argsort(-bin_count, kind='stable')[:2]
+        top_pixels = pixels[numpy.isin(bin_index, top_bin_list)]
+        if len(top_pixels) == 0:
+            return ''
+        red, green, blue = top_pixels.sum(axis=0) // len(top_pixels)
+        return '#{:02x}{:02x}{:02x}'.format(int(red), int(green), int(blue))
+    except Exception:
+        return ''
 
-        divisor = 255/base
 
-        for r, g, b, a in left_list:
-           r_binned = min(math.floor(r/divisor), base-1)
-           g_binned = min(math.floor(g/divisor), base-1)
-           b_binned = min(math.floor(b/divisor), base-1)
-           bin_index = (r_binned * (base**2)) + (g_binned * base) + b_binned
-           bins[bin_index].append((r,g,b))
+def generate_background_color_from_image_bytes(image_bytes, base=None):
+    try:
+        return generate_background_color_from_python_image(Image.open(BytesIO(image_bytes)), base=base)
+    except Exception:
+        return ''
 
-        bins.sort(key=lambda l: -len(l))
 
-        final_color = [0, 0, 0, 255]
-        denominator = 0
+def retrieve_background_color_dict(image_url_list, base=None):
+    """
+    Background colors for our own hosted images. The color saved when we cached the image is used if there is one,
+    otherwise the image is read from storage (not over HTTP), in parallel.
+    :param image_url_list: we_vote_hosted_profile_image_url_large values
+    :return: dict of color by image url. Urls of images we don't have are left out
+    """
+    from image.models import WeVoteImage
+    image_url_list = list(set(image_url for image_url in image_url_list if positive_value_exists(image_url)))
+    background_color_by_image_url = {}
+    if not image_url_list:
+        return background_color_by_image_url
+
+    file_location_by_image_url = {}
+    we_vote_image_query = WeVoteImage.objects.using('readonly') \
+        .filter(kind_of_image_large=True, we_vote_image_url__in=image_url_list) \
+        .order_by('-id') \
+        .values_list('we_vote_image_url', 'we_vote_image_file_location', 'profile_image_background_color')
+    for image_url, file_location, background_color in we_vote_image_query:
+        if image_url in background_color_by_image_url or image_url in file_location_by_image_url:
+            continue
+        if positive_value_exists(background_color):
+            background_color_by_image_url[image_url] = background_color
+        elif positive_value_exists(file_location):
+            file_location_by_image_url[image_url] = file_location
+
+    background_color_by_image_url.update(
+        generate_background_color_dict_from_storage(file_location_by_image_url, base=base))
+    return background_color_by_image_url
+
+
+def generate_background_color_dict_from_storage(file_location_by_key, base=None):
+    """
+    Reads each image from our image storage and finds its background color, BACKGROUND_COLOR_WORKERS at a time
+    :param file_location_by_key: we_vote_image_file_location by whatever the caller wants the colors by
+    :return: dict of color by the same keys, '' where the image couldn't be read
+    """
+    from image.controllers_image_storage import retrieve_image_storage_service
+    image_storage_service = retrieve_image_storage_service()
+
+    def generate_background_color_from_storage(file_location):
+        image_bytes = image_storage_service.retrieve_image_bytes(file_location)
+        return generate_background_color_from_image_bytes(image_bytes, base=base) if image_bytes else ''
+
+    key_list = list(file_location_by_key.keys())
+    if not key_list:
+        return {}
+    with ThreadPoolExecutor(max_workers=BACKGROUND_COLOR_WORKERS, thread_name_prefix='background_color') as executor:
+        return dict(zip(key_list, executor.map(
+            generate_background_color_from_storage, [file_location_by_key[key] for key in key_list])))
 
-        for bin in range(0, 2, 1):
-            for rgb in bins[bin]:
-                final_color[0] += rgb[0]
-                final_color[1] += rgb[1]
-                final_color[2] += rgb[2]
-            denominator += len(bins[bin])
 
-        final_color[0]=math.floor(final_color[0]/denominator)
-        final_color[1]=math.floor(final_color[1]/denominator)
-        final_color[2]=math.floor(final_color[2]/denominator)
+def generate_background(politician, base=None):
+    """
+    Background color for the large profile image of a politician or candidate
+    :param politician: Anything with we_vote_hosted_profile_image_url_large
+    :param base: How many bins to sort colors into per channel
+    :return: hex like "#1a2b3c", or '' if there is no color to be had
+    """
+    image_url = politician.we_vote_hosted_profile_image_url_large
+    if not positive_value_exists(image_url):
+        return ''
+    try:
+        background_color_by_image_url = retrieve_background_color_dict([image_url], base=base)
+        if image_url in background_color_by_image_url:
+            return background_color_by_image_url[image_url]
+        return generate_background_color_from_image_url(image_url, base=base)
+    except Exception:
+        return ''
 
-        hex = '#{:02x}{:02x}{:02x}'.format(final_color[0], final_color[1], final_color[2])
 
-        return hex
-    except Exception as e:
+def generate_background_color_from_image_url(image_url, base=None):
+    """
+    For images that aren't ours, so we have to download them
+    """
+    try:
+        return generate_background_color_from_image_bytes(request.urlopen(image_url).read(), base=base)
+    except Exception:
         return ''
 
 
+def update_profile_image_background_color_list(object_list, download_images_not_cached=True):
+    """
+    Sets profile_image_background_color on each politician or candidate in object_list, all from one query and the
+    storage reads running in parallel. Also sets profile_image_background_color_needed to False. Doesn't save.
+    :param object_list: Politicians or CandidateCampaigns
+    :param download_images_not_cached: If False, images we haven't cached are left as still needed
+    :return: results with updated_count and not_updated_count (those without a picture url)
+    """
+    background_color_by_image_url = retrieve_background_color_dict(
+        [one_object.we_vote_hosted_profile_image_url_large for one_object in object_list])
+    updated_count = 0
+    not_updated_count = 0
+    for one_object in object_list:
+        image_url = one_object.we_vote_hosted_profile_image_url_large
+        if not positive_value_exists(image_url):
+            one_object.profile_image_background_color_needed = False
+            not_updated_count += 1
+        elif image_url in background_color_by_image_url:
+            one_object.profile_image_background_color = background_color_by_image_url[image_url]
+            one_object.profile_image_background_color_needed = False
+            updated_count += 1
+        elif download_images_not_cached:
+            one_object.profile_image_background_color = generate_background_color_from_image_url(image_url)
+            one_object.profile_image_background_color_needed = False
+            updated_count += 1
+    results = {
+        'success':              True,
+        'status':               "PROFILE_IMAGE_BACKGROUND_COLORS_UPDATED ",
+        'updated_count':        updated_count,
+        'not_updated_count':    not_updated_count,
+    }
+    return results
+
+
+def backfill_we_vote_image_background_colors(batch_size=500, limit=0):
+    """
+    Finds the background color of each large image cached before we found them at cache time, reading the images from
+    storage in parallel, then fills in the politicians and candidates which still need a background color.
+    :param batch_size:
+    :param limit: Stop after this many images, if more than 0
+    :return:
+    """
+    from candidate.models import CandidateCampaign
+    from image.models import WeVoteImage
+    from politician.models import Politician
+    images_updated = 0
+    images_without_color = 0
+    last_id = 0
+    while not positive_value_exists(limit) or images_updated + images_without_color < limit:
+        this_batch_size = batch_size if not positive_value_exists(limit) \
+            else min(batch_size, limit - images_updated - images_without_color)
+        we_vote_image_list = list(
+            WeVoteImage.objects.using('readonly')
+            .filter(kind_of_image_large=True, profile_image_background_color__isnull=True, id__gt=last_id)
+            .exclude(we_vote_image_file_location__isnull=True)
+            .exclude(we_vote_image_file_location='')
+            .order_by('id')
+            .only('id', 'we_vote_image_file_location')[:this_batch_size])
+        if not we_vote_image_list:
+            break
+        last_id = we_vote_image_list[-1].id
+        background_color_by_id = generate_background_color_dict_from_storage(
+            {we_vote_image.id: we_vote_image.we_vote_image_file_location for we_vote_image in we_vote_image_list})
+        update_list = []
+        for we_vote_image in we_vote_image_list:
+            if positive_value_exists(background_color_by_id.get(we_vote_image.id)):
+                we_vote_image.profile_image_background_color = background_color_by_id[we_vote_image.id]
+                update_list.append(we_vote_image)
+            else:
+                images_without_color += 1
+        WeVoteImage.objects.bulk_update(update_list, ['profile_image_background_color'], batch_size=batch_size)
+        images_updated += len(update_list)
+
+    updated_count_by_model = {}
+    for model in [Politician, CandidateCampaign]:
+        updated_count_by_model[model] = 0
+        last_id = 0
+        while True:
+            object_list = list(
+                model.objects.using('readonly')
+                .exclude(profile_image_background_color_needed=False)
+                .exclude(we_vote_hosted_profile_image_url_large__isnull=True)
+                .exclude(we_vote_hosted_profile_image_url_large='')
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'we_vote_hosted_profile_image_url_large', 'profile_image_background_color',
+                      'profile_image_background_color_needed')[:batch_size])
+            if not object_list:
+                break
+            last_id = object_list[-1].id
+            background_color_results = update_profile_image_background_color_list(
+                object_list, download_images_not_cached=False)
+            model.objects.bulk_update(
+                object_list, ['profile_image_background_color', 'profile_image_background_color_needed'],
+                batch_size=batch_size)
+            updated_count_by_model[model] += background_color_results['updated_count']
+
+    results = {
+        'success':                  True,
+        'status':                   "WE_VOTE_IMAGE_BACKGROUND_COLORS_BACKFILLED ",
+        'images_updated':           images_updated,
+        'images_without_color':     images_without_color,
+        'politicians_updated':      updated_count_by_model[Politician],
+        'candidates_updated':       updated_count_by_model[CandidateCampaign],
+    }
+    return results
+
+
 def validate_hex(hex):
-   return re.search("#[A-Fa-f0-9]{6}", hex[:7])
+    return re.search("#[A-Fa-f0-9]{6}", hex[:7])
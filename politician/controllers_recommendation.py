@@ -1,260 +1,377 @@
-from .models import RecommendedPoliticianLinkByPolitician
-
-from politician.models import Politician
-import pandas
-from sklearn.cluster import KMeans
+# politician/controllers_recommendation.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+import csv
+from functools import lru_cache
+import hashlib
+import os
+import pickle
+import re
+
+from django.db import transaction
+from django.utils.timezone import now
 import numpy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
-import nltk
-import warnings
-import polars
 
-warnings.simplefilter("ignore")
-pandas.set_option('display.max_rows', None)
-pandas.set_option('display.max_columns', None)
-nltk.download('punkt')
+from config.base import get_environment_variable_default
+from .models import Politician, RecommendedPoliticianLinkByPolitician
+import wevote_functions.admin
+from wevote_functions.functions import is_private_directory, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+RECOMMENDATION_CLUSTER_COUNT = 300
+RECOMMENDATIONS_PER_POLITICIAN = 5
+# Of the RECOMMENDATIONS_PER_POLITICIAN, how many come from the politician's own cluster
+RECOMMENDATIONS_FROM_SAME_CLUSTER = 4
+RECOMMENDATION_TFIDF_MAX_FEATURES = 100
+# Parties with this many politicians or fewer are grouped together as "others"
+RECOMMENDATION_MINORITY_PARTY_COUNT = 15
+# Refit from scratch, instead of assigning to the cached clusters, when more than this share of politicians changed
+RECOMMENDATION_REFIT_CHANGED_SHARE = 0.25
+RECOMMENDATION_KMEANS_BATCH_SIZE = 4096
+RECOMMENDATION_BULK_CREATE_SIZE = 5000
+# The fitted model is only cached between runs in this directory, which must be ours and not writable by anyone
+#  else, since the cache is unpickled. Without it, every run fits the model from scratch.
+RECOMMENDATION_MODEL_DIRECTORY = get_environment_variable_default('POLITICIAN_RECOMMENDATION_MODEL_DIRECTORY', '')
+RECOMMENDATION_MODEL_FILE_NAME = 'politician_recommendation_model.pickle'
+STATE_LOCATION_FILE_PATH = "politician/static/stateLocation/state_code.csv"
+DEFAULT_LONGITUDE = -76.6413
+DEFAULT_LATITUDE = 39.0458
+
+# We turn these into 1 if the politician has a value, and 0 if not
+POLITICIAN_RECOMMENDATION_FLAG_FIELD_LIST = [
+    'facebook_url', 'politician_phone_number', 'google_civic_candidate_name',
+    'we_vote_hosted_profile_image_url_large', 'politician_email_address',
+]
+POLITICIAN_RECOMMENDATION_FIELD_LIST = [
+    'we_vote_id', 'political_party', 'state_code', 'twitter_followers_count', 'twitter_description',
+] + POLITICIAN_RECOMMENDATION_FLAG_FIELD_LIST
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1)
+def get_porter_stemmer():
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+@lru_cache(maxsize=100000)
+def stem_word(word):
+    return get_porter_stemmer().stem(word)
+
+
+def stem_text(text):
+    if not positive_value_exists(text):
+        return ""
+    return " ".join(stem_word(word) for word in WORD_PATTERN.findall(text.lower()))
 
 
-def add_cluster(df: pandas.DataFrame, k: int = 300) -> pandas.DataFrame:
+@lru_cache(maxsize=1)
+def retrieve_state_location_dict():
     """
-        Add a clustering column to the DataFrame using KMeans.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - k (int): Number of clusters for KMeans (default is 300).
-        Returns:
-        - pandas.DataFrame: DataFrame with an additional 'Cluster' column.
-        """
-
-    try:
-        kmeans = KMeans(n_clusters=k)
-        kmeans.fit(df)
-        df['Cluster'] = kmeans.labels_
-        return df
-
-    except Exception as e:
-        df['Cluster'] = k
-        return df
+    :return: dict from lower case state_code to (longitude, latitude)
+    """
+    state_location_dict = {}
+    with open(STATE_LOCATION_FILE_PATH) as state_location_file:
+        for state_location in csv.DictReader(state_location_file):
+            state_location_dict[state_location['state_code'].lower()] = \
+                (float(state_location['lon']), float(state_location['lat']))
+    return state_location_dict
 
 
-def make_flag(df: pandas.DataFrame, col: str) -> pandas.DataFrame:
+def retrieve_politician_recommendation_rows():
     """
-       Create flag columns show whether politician has social media or not in the DataFrame.
-       Parameters:
-       - df (pandas.DataFrame): Input DataFrame.
-       - col (str): Name of the column.
-       Returns:
-       - pandas.DataFrame: DataFrame with an additional '{col}_flag' column.
+    Only the columns the recommendation features are built from, as tuples in POLITICIAN_RECOMMENDATION_FIELD_LIST
+    order, sorted by we_vote_id so seeded runs are repeatable.
     """
+    queryset = Politician.objects.using('readonly').order_by('we_vote_id') \
+        .values_list(*POLITICIAN_RECOMMENDATION_FIELD_LIST)
+    return list(queryset.iterator(chunk_size=RECOMMENDATION_BULK_CREATE_SIZE))
 
-    if col in df.columns:
-        target = df[[col]]
-    else:
-        return df
-    # replace value with 1 and None with 0
-    target = target.applymap(replacer)
-    df[f'{col}_flag'] = target
-    df = df.drop(col, axis=1)
-    return df
 
+def generate_politician_feature_fingerprint(politician_row):
+    # Leave out twitter_followers_count, which changes for most politicians between runs, so a politician is only
+    #  reassigned when their party, state, description or flags change
+    return hashlib.md5(repr(politician_row[1:3] + politician_row[4:]).encode('utf-8')).hexdigest()
 
-def tfidf(df: pandas.DataFrame, col: str) -> pandas.DataFrame:
+
+class PoliticianRecommendationModel:
     """
-        Calculate TF-IDF values for the twitter description column in the DataFrame.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - col (str): Name of the text column.
-        Returns:
-        - pandas.DataFrame: DataFrame with additional columns for TF-IDF values.
+    What we keep between runs: the party columns, the fitted TF-IDF vectorizer, the column scaling and the
+    MiniBatchKMeans centroids, plus the cluster and feature fingerprint of every politician, so a later run only
+    has to assign the politicians that are new or changed.
     """
 
-    if col not in df.columns:
-        return pandas.DataFrame()
+    def __init__(self, seed=None):
+        self.seed = seed
+        self.party_list = []
+        self.vectorizer = None
+        self.column_mean = None
+        self.column_std = None
+        self.kmeans = None
+        self.cluster_by_we_vote_id = {}
+        self.fingerprint_by_we_vote_id = {}
+        self.date_fitted = None
+
+    def build_unscaled_feature_matrix(self, politician_row_list):
+        state_location_dict = retrieve_state_location_dict()
+        party_column_by_party = {party: column for column, party in enumerate(self.party_list)}
+        others_column = len(self.party_list)
+        flag_count = len(POLITICIAN_RECOMMENDATION_FLAG_FIELD_LIST)
+
+        # twitter_followers_count, longitude, latitude, the flags, then one column per party plus "others"
+        party_column_offset = 3 + flag_count
+        feature_matrix = numpy.zeros(
+            (len(politician_row_list), party_column_offset + others_column + 1), dtype=numpy.float32)
+        description_list = []
+        for row_index, politician_row in enumerate(politician_row_list):
+            political_party = (politician_row[1] or '').lower()
+            state_code = (politician_row[2] or '').lower()
+            longitude, latitude = state_location_dict.get(state_code, (DEFAULT_LONGITUDE, DEFAULT_LATITUDE))
+            feature_matrix[row_index, 0] = politician_row[3] or 0
+            feature_matrix[row_index, 1] = longitude
+            feature_matrix[row_index, 2] = latitude
+            for flag_index, flag_value in enumerate(politician_row[5:]):
+                if positive_value_exists(flag_value):
+                    feature_matrix[row_index, 3 + flag_index] = 1
+            party_column = party_column_by_party.get(political_party, others_column)
+            feature_matrix[row_index, party_column_offset + party_column] = 1
+            description_list.append(stem_text(politician_row[4]))
+
+        description_matrix = self.vectorizer.transform(description_list).toarray().astype(numpy.float32)
+        return numpy.hstack([feature_matrix, description_matrix])
+
+    def build_feature_matrix(self, politician_row_list):
+        return (self.build_unscaled_feature_matrix(politician_row_list) - self.column_mean) / self.column_std
+
+    def fit(self, politician_row_list):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        party_count_by_party = {}
+        for politician_row in politician_row_list:
+            political_party = (politician_row[1] or '').lower()
+            party_count_by_party[political_party] = party_count_by_party.get(political_party, 0) + 1
+        self.party_list = sorted(
+            political_party for political_party, party_count in party_count_by_party.items()
+            if positive_value_exists(political_party) and party_count > RECOMMENDATION_MINORITY_PARTY_COUNT)
+
+        self.vectorizer = TfidfVectorizer(
+            stop_words='english', max_features=RECOMMENDATION_TFIDF_MAX_FEATURES, dtype=numpy.float32)
+        try:
+            self.vectorizer.fit([stem_text(politician_row[4]) for politician_row in politician_row_list])
+        except ValueError:
+            # No words at all, so fit on a placeholder vocabulary
+            self.vectorizer.fit(["politician"])
+
+        unscaled_feature_matrix = self.build_unscaled_feature_matrix(politician_row_list)
+        self.column_mean = unscaled_feature_matrix.mean(axis=0)
+        self.column_std = unscaled_feature_matrix.std(axis=0)
+        self.column_std[self.column_std == 0] = 1
+        feature_matrix = (unscaled_feature_matrix - self.column_mean) / self.column_std
+
+        self.kmeans = MiniBatchKMeans(
+            n_clusters=min(RECOMMENDATION_CLUSTER_COUNT, len(politician_row_list)),
+            batch_size=RECOMMENDATION_KMEANS_BATCH_SIZE,
+            n_init=3,
+            random_state=self.seed)
+        cluster_list = self.kmeans.fit_predict(feature_matrix).tolist()
+        self.cluster_by_we_vote_id = {
+            politician_row[0]: cluster for politician_row, cluster in zip(politician_row_list, cluster_list)}
+        self.fingerprint_by_we_vote_id = {
+            politician_row[0]: generate_politician_feature_fingerprint(politician_row)
+            for politician_row in politician_row_list}
+        self.date_fitted = now()
+
+    def find_changed_rows(self, politician_row_list):
+        return [politician_row for politician_row in politician_row_list
+                if self.fingerprint_by_we_vote_id.get(politician_row[0]) !=
+                generate_politician_feature_fingerprint(politician_row)]
+
+    def assign(self, changed_politician_row_list, politician_row_list):
+        """
+        Put new and changed politicians in the nearest existing cluster, and forget the politicians who are gone.
+        """
+        if len(changed_politician_row_list):
+            cluster_list = self.kmeans.predict(self.build_feature_matrix(changed_politician_row_list)).tolist()
+            for politician_row, cluster in zip(changed_politician_row_list, cluster_list):
+                self.cluster_by_we_vote_id[politician_row[0]] = cluster
+                self.fingerprint_by_we_vote_id[politician_row[0]] = \
+                    generate_politician_feature_fingerprint(politician_row)
+        current_we_vote_id_set = set(politician_row[0] for politician_row in politician_row_list)
+        for we_vote_id in list(self.cluster_by_we_vote_id.keys()):
+            if we_vote_id not in current_we_vote_id_set:
+                del self.cluster_by_we_vote_id[we_vote_id]
+                self.fingerprint_by_we_vote_id.pop(we_vote_id, None)
+
+
+def generate_politician_recommendation_model_path(model_directory=RECOMMENDATION_MODEL_DIRECTORY):
+    """
+    :return: where to cache the model, or '' if model_directory isn't set or isn't private
+    """
+    if not positive_value_exists(model_directory) or not is_private_directory(model_directory):
+        return ''
+    return os.path.join(model_directory, RECOMMENDATION_MODEL_FILE_NAME)
 
-    ps = PorterStemmer()
-    sentences = list(df[col].fillna(""))
-    sentences = [stemming(i, ps) for i in sentences]
+
+def load_politician_recommendation_model(model_path):
+    if not os.path.exists(model_path):
+        return None
     try:
-        vectorized = TfidfVectorizer(stop_words='english', max_features=100)
-        tfidf_matrix = vectorized.fit_transform(sentences)
-        return pandas.DataFrame(tfidf_matrix.toarray(), columns=vectorized.get_feature_names_out())
+        with open(model_path, 'rb') as model_file:
+            return pickle.load(model_file)
     except Exception as e:
-        return pandas.DataFrame()
-
+        logger.error("POLITICIAN_RECOMMENDATION_MODEL_NOT_LOADED: " + str(e))
+        return None
 
-def replacer(value):
-    if value is None:
-        return 0
-    else:
-        return 1
 
+def save_politician_recommendation_model(model, model_path):
+    temporary_model_path = model_path + '.' + str(os.getpid())
+    with os.fdopen(os.open(temporary_model_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as model_file:
+        pickle.dump(model, model_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_model_path, model_path)
 
-def stemming(sentence, ps):
-    if sentence is None:
-        return ""
 
-    words = word_tokenize(sentence)
-    output = ""
-    for w in words:
-        output += " "
-        output += ps.stem(w)
-    return output
-
-
-def one_hot_add(df, category):
-    if category not in df.columns:
-        return df
-
-    try:
-        return pandas.get_dummies(df, columns=[category], prefix=[category])
-
-    except Exception as e:
-        df = df.drop([category], axis=1)
-        return df
-
-
-def remove_minority(df: pandas.DataFrame, col: str, num: int) -> pandas.DataFrame:
+def sample_distinct_columns(random_generator, row_count, population_size, column_count):
     """
-        Combine small parties in a DataFrame column into an 'Others' if their count is below a specified threshold.
-        Parameters:
-        - df (pandas.DataFrame): Input DataFrame.
-        - col (str): Name of the column containing party information.
-        - num (int): Threshold count. Parties with counts less than or equal to this threshold will be combined into
-        'Others'.
-        Returns:
-        - pandas.DataFrame: DataFrame with small parties combined into 'Others' in the specified column.
+    :return: a row_count x column_count array, where each row holds distinct integers from range(population_size)
     """
-
-    if col not in df.columns:
-        return df
-
-    for i, k in dict(df[col].value_counts()).items():
-        if k <= num:
-            df = df.replace(to_replace=i, value="Others")
-    return df
-
-
-def update_recommend():
+    if column_count >= population_size:
+        return numpy.tile(numpy.arange(population_size), (row_count, 1))
+    sample = random_generator.integers(0, population_size, size=(row_count, column_count))
+    while True:
+        sorted_sample = numpy.sort(sample, axis=1)
+        duplicate_row_list = numpy.nonzero((sorted_sample[:, 1:] == sorted_sample[:, :-1]).any(axis=1))[0]
+        if not len(duplicate_row_list):
+            return sample
+        sample[duplicate_row_list] = random_generator.integers(
+            0, population_size, size=(len(duplicate_row_list), column_count))
+
+
+def generate_recommended_politician_pairs(cluster_by_we_vote_id, random_generator):
     """
-        Update recommended politicians based on clustering and selection criteria.
-        Returns:
-        - None
+    For every politician, RECOMMENDATIONS_FROM_SAME_CLUSTER other politicians from the same cluster and the rest
+    from outside it (more from outside when the cluster is small). Sampled per cluster with numpy.
+    :return: list of (from_politician_we_vote_id, recommended_politician_we_vote_id)
     """
-
-    """df of all politician data"""
-    all_data = Politician.objects.values()
-    df = pandas.DataFrame(all_data)
-    df = df.replace(numpy.NaN, None)
-
-    """df of location of state"""
-    state_df = pandas.read_csv("politician/static/stateLocation/state_code.csv")
-
-    """lower case"""
-    df.political_party = df.political_party.str.lower()
-    df.state_code = df.state_code.str.lower()
-    df = pandas.merge(df, state_df, on='state_code', how='left')
-    del state_df
-
-    for col in ['facebook_url', 'politician_phone_number', 'google_civic_candidate_name',
-                'we_vote_hosted_profile_image_url_large', 'politician_email_address']:
-        df = make_flag(df, col)
-
-    all_we_need = ['we_vote_id', 'political_party', 'politician_url', 'state_code', 'twitter_followers_count',
-                   'twitter_description', 'lon', 'lat'] + [item for item in df.columns if item.endswith("flag")]
-
-    all_we_need = [col for col in df.columns if col in all_we_need]
-
-    df = df[all_we_need]
-    df = remove_minority(df, "political_party", 15)
-
-    if 'political_party' in df.columns:
-        df['political_party'] = df['political_party'].fillna('Others')
-
-    if 'twitter_description' in df.columns:
-        df['twitter_description'] = df['twitter_description'].fillna("")
-
-    if 'lon' in df.columns:
-        df['lon'] = df['lon'].fillna(-76.6413)
-
-    if 'lat' in df.columns:
-        df['lat'] = df['lat'].fillna(39.0458)
-
-    one_hot_list = ['political_party']
-
-    for col in one_hot_list:
-        df = one_hot_add(df, col)
-
-    df = df.reset_index(drop=True)
-
-    for col in ["twitter_description"]:
-        df = pandas.concat([df, tfidf(df, col)], axis=1)
-
-    drop_list = []
-    ids = df['we_vote_id']
-
-    for col in df.columns:
-        if df[col].dtype != 'O':
-            df[col] = (df[col] - numpy.mean(df[col])) / numpy.std(df[col])
-        elif df[col].dtype == 'O':
-            drop_list.append(col)
-
-    df = df.drop(drop_list, axis=1)
-
-    k = 300
-    df = add_cluster(df, k)
-
-    if int(numpy.mean(df['Cluster'])) == k:
-        return 0
-
-    df = pandas.concat([ids, df], axis=1)
-    df = polars.from_pandas(df)
-    df = df.select(['Cluster', 'we_vote_id'])
-
-    """choose 4 from same group, 1 from outside group"""
-    bulk_update_list = []
-
-    for clus in range(0, k):
-        diff_df = df.filter(polars.col("Cluster") != clus)
-        same_df = df.filter((polars.col("Cluster") == clus))
-        size = same_df.shape[0]
-        for we_id in same_df["we_vote_id"]:
-
-            cand_list = []
-            k = 5
-
-            if size == 0:
-                cand_list = diff_df.sample(k).select("we_vote_id").to_series().to_list()
-
-            elif size < 4:
-                temp_list = same_df.sample(size).select("we_vote_id").to_series().to_list()
-                cand_list.extend(temp_list)
-                k = k - len(cand_list)
-                cand_list.extend(diff_df.sample(k).select("we_vote_id").to_series().to_list())
-
-            else:
-                temp_list = same_df.sample(k - 1).select("we_vote_id").to_series().to_list()
-                cand_list.extend(temp_list)
-                k = k - len(cand_list)
-                cand_list.extend(diff_df.sample(k).select("we_vote_id").to_series().to_list())
-
-            # no_duplicates
-            cand_list = list(set(cand_list))
-
-            if len(cand_list) == 5:
-                for i in cand_list:
-
-                    # # WV-430 removes politician self-recommendation but then only provides 4 recommendations
-                    # if we_id != i:
-                    #     record = RecommendedPoliticianLinkByPolitician(
-                    #         from_politician_we_vote_id=we_id,
-                    #         recommended_politician_we_vote_id=i)
-                    #     bulk_update_list.append(record)
-
-                    # original code
-                    record = RecommendedPoliticianLinkByPolitician(
-                        from_politician_we_vote_id=we_id,
-                        recommended_politician_we_vote_id=i)
-                    bulk_update_list.append(record)
-
-    RecommendedPoliticianLinkByPolitician.objects.bulk_create(bulk_update_list)
+    we_vote_id_array = numpy.array(sorted(cluster_by_we_vote_id.keys()), dtype=object)
+    if not len(we_vote_id_array):
+        return []
+    cluster_array = numpy.array([cluster_by_we_vote_id[we_vote_id] for we_vote_id in we_vote_id_array])
+    order = numpy.argsort(cluster_array, kind='stable')
+    total_count = len(order)
+    cluster_list, cluster_start_list, cluster_size_list = \
+        numpy.unique(cluster_array[order], return_index=True, return_counts=True)
+
+    from_index_list = []
+    recommended_index_list = []
+    for cluster_start, cluster_size in zip(cluster_start_list, cluster_size_list):
+        members = order[cluster_start:cluster_start + cluster_size]
+        same_cluster_count = min(RECOMMENDATIONS_FROM_SAME_CLUSTER, cluster_size - 1)
+        outside_count = min(RECOMMENDATIONS_PER_POLITICIAN - same_cluster_count, total_count - cluster_size)
+        recommended_block_list = []
+        if same_cluster_count > 0:
+            positions = sample_distinct_columns(random_generator, cluster_size, cluster_size - 1, same_cluster_count)
+            # Skip over the politician's own position
+            positions += positions >= numpy.arange(cluster_size)[:, None]
+            recommended_block_list.append(members[positions])
+        if outside_count > 0:
+            positions = sample_distinct_columns(
+                random_generator, cluster_size, total_count - cluster_size, outside_count)
+            # Skip over this cluster's block in the sorted order
+            positions += (positions >= cluster_start) * cluster_size
+            recommended_block_list.append(order[positions])
+        if recommended_block_list:
+            recommended_block = numpy.hstack(recommended_block_list)
+            from_index_list.append(numpy.repeat(members, recommended_block.shape[1]))
+            recommended_index_list.append(recommended_block.ravel())
+    if not from_index_list:
+        return []
+    return list(zip(we_vote_id_array[numpy.concatenate(from_index_list)].tolist(),
+                    we_vote_id_array[numpy.concatenate(recommended_index_list)].tolist()))
+
+
+def replace_recommended_politician_links(recommended_politician_pair_list):
+    """
+    Swap in the new links in one transaction, so readers see either the old set or the new one.
+    """
+    link_list = [
+        RecommendedPoliticianLinkByPolitician(
+            from_politician_we_vote_id=from_politician_we_vote_id,
+            recommended_politician_we_vote_id=recommended_politician_we_vote_id)
+        for from_politician_we_vote_id, recommended_politician_we_vote_id in recommended_politician_pair_list]
+    with transaction.atomic():
+        RecommendedPoliticianLinkByPolitician.objects.all().delete()
+        RecommendedPoliticianLinkByPolitician.objects.bulk_create(link_list, batch_size=RECOMMENDATION_BULK_CREATE_SIZE)
+    return len(link_list)
+
+
+def update_recommend(seed=None, refit=False, model_directory=RECOMMENDATION_MODEL_DIRECTORY,
+                     politician_row_list=None):
+    """
+    Update recommended politicians based on clustering and selection criteria.
+    :param seed: makes the clustering and the sampling repeatable
+    :param refit: fit new clusters even if the cached model could be reused
+    :param model_directory: the private directory the fitted model is cached in between runs
+    :param politician_row_list: defaults to retrieve_politician_recommendation_rows()
+    :return:
+    """
+    status = ""
+    success = True
+    if politician_row_list is None:
+        politician_row_list = retrieve_politician_recommendation_rows()
+    if not len(politician_row_list):
+        results = {
+            'success':                  success,
+            'status':                   "POLITICIAN_RECOMMENDATION-NO_POLITICIANS ",
+            'changed_politician_count': 0,
+            'links_saved_count':        0,
+        }
+        return results
+
+    model_path = generate_politician_recommendation_model_path(model_directory)
+    if not positive_value_exists(model_path):
+        status += "POLITICIAN_RECOMMENDATION_MODEL_DIRECTORY_NOT_PRIVATE "
+    model = None if refit or not positive_value_exists(model_path) else \
+        load_politician_recommendation_model(model_path)
+    if model is not None and model.seed != seed:
+        status += "POLITICIAN_RECOMMENDATION_MODEL_SEED_CHANGED "
+        model = None
+    changed_politician_row_list = politician_row_list
+    if model is not None:
+        changed_politician_row_list = model.find_changed_rows(politician_row_list)
+        if len(changed_politician_row_list) > RECOMMENDATION_REFIT_CHANGED_SHARE * len(politician_row_list):
+            status += "POLITICIAN_RECOMMENDATION_TOO_MANY_CHANGES "
+            model = None
+    if model is None:
+        model = PoliticianRecommendationModel(seed=seed)
+        model.fit(politician_row_list)
+        status += "POLITICIAN_RECOMMENDATION_MODEL_FITTED "
+    else:
+        model.assign(changed_politician_row_list, politician_row_list)
+        status += "POLITICIAN_RECOMMENDATION_ASSIGNED: " + str(len(changed_politician_row_list)) + " "
+
+    if positive_value_exists(model_path):
+        try:
+            save_politician_recommendation_model(model, model_path)
+        except Exception as e:
+            status += "POLITICIAN_RECOMMENDATION_MODEL_NOT_SAVED: " + str(e) + " "
+
+    recommended_politician_pair_list = \
+        generate_recommended_politician_pairs(model.cluster_by_we_vote_id, numpy.random.default_rng(seed))
+    links_saved_count = 0
+    try:
+        links_saved_count = replace_recommended_politician_links(recommended_politician_pair_list)
+    except Exception as e:
+        success = False
+        status += "POLITICIAN_RECOMMENDATION_LINKS_NOT_SAVED: " + str(e) + " "
+
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'changed_politician_count': len(changed_politician_row_list),
+        'links_saved_count':        links_saved_count,
+    }
+    return results
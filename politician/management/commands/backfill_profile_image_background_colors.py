@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from politician.controllers_generate_color import backfill_we_vote_image_background_colors
+
+
+class Command(BaseCommand):
+    help = 'Finds the background color of every large image cached before we found them at cache time, reading the ' \
+           'images from our image storage in parallel, then fills in politicians and candidates still needing one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many images')
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        results = backfill_we_vote_image_background_colors(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(
+            "{status}{images_updated:,} images updated, {images_without_color:,} without a color, "
+            "{politicians_updated:,} politicians and {candidates_updated:,} candidates updated in {seconds:.1f} "
+            "seconds".format(
+                status=results['status'], images_updated=results['images_updated'],
+                images_without_color=results['images_without_color'],
+                politicians_updated=results['politicians_updated'], candidates_updated=results['candidates_updated'],
+                seconds=time.perf_counter() - start_time))
@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+import numpy
+
+from politician.controllers_recommendation import PoliticianRecommendationModel, \
+    generate_recommended_politician_pairs, retrieve_state_location_dict
+
+PARTY_WEIGHT_LIST = [
+    ('Democratic', 40), ('Republican', 40), ('Nonpartisan', 10), ('Libertarian', 4), ('Green', 3), ('', 3)]
+DESCRIPTION_WORD_LIST = [
+    'senator', 'representative', 'mayor', 'council', 'veteran', 'teacher', 'lawyer', 'mother', 'father', 'fighting',
+    'families', 'jobs', 'healthcare', 'education', 'schools', 'climate', 'energy', 'taxes', 'small', 'business',
+    'farmer', 'nurse', 'community', 'organizer', 'district', 'county', 'state', 'proud', 'serving', 'freedom',
+]
+
+
+class Command(BaseCommand):
+    help = 'Times the politician recommendation pipeline on a synthetic politician table, without the database: ' \
+           'the full fit, assigning the changed politicians to the cached clusters, and generating the links.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--politicians', type=int, default=200000)
+        parser.add_argument('--changed-share', type=float, default=0.01,
+                            help='Share of politicians changed before the incremental run')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        random.seed(seed)
+        state_code_list = list(retrieve_state_location_dict().keys())
+        party_list = [party for party, weight in PARTY_WEIGHT_LIST]
+        party_weight_list = [weight for party, weight in PARTY_WEIGHT_LIST]
+
+        def generate_politician_row(politician_number):
+            return (
+                'wv01pol{number}'.format(number=politician_number),
+                random.choices(party_list, party_weight_list)[0],
+                random.choice(state_code_list).upper(),
+                int(random.lognormvariate(6, 2)),
+                ' '.join(random.choices(DESCRIPTION_WORD_LIST, k=random.randint(0, 12))),
+            ) + tuple(
+                'x' if random.random() < 0.5 else None for _ in range(5))
+
+        politician_row_list = [generate_politician_row(number) for number in range(options['politicians'])]
+        model = PoliticianRecommendationModel(seed=seed)
+
+        start_time = time.perf_counter()
+        model.fit(politician_row_list)
+        self.stdout.write("{label:32} {seconds:8.2f} seconds".format(
+            label='Fit', seconds=time.perf_counter() - start_time))
+
+        for index in random.sample(range(len(politician_row_list)),
+                                   int(len(politician_row_list) * options['changed_share'])):
+            politician_row_list[index] = generate_politician_row(index)
+        start_time = time.perf_counter()
+        changed_politician_row_list = model.find_changed_rows(politician_row_list)
+        model.assign(changed_politician_row_list, politician_row_list)
+        self.stdout.write("{label:32} {seconds:8.2f} seconds".format(
+            label='Assign {count:,} changed'.format(count=len(changed_politician_row_list)),
+            seconds=time.perf_counter() - start_time))
+
+        start_time = time.perf_counter()
+        recommended_politician_pair_list = \
+            generate_recommended_politician_pairs(model.cluster_by_we_vote_id, numpy.random.default_rng(seed))
+        self.stdout.write("{label:32} {seconds:8.2f} seconds".format(
+            label='Generate {count:,} links'.format(count=len(recommended_politician_pair_list)),
+            seconds=time.perf_counter() - start_time))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from politician.controllers_recommendation import update_recommend
+
+
+class Command(BaseCommand):
+    help = 'Assigns new and changed politicians to the cached recommendation clusters (or refits them), ' \
+           'then replaces every RecommendedPoliticianLinkByPolitician in one transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=None, help='Makes the clusters and the links repeatable')
+        parser.add_argument('--refit', action='store_true', help='Fit new clusters even if the cached ones are fine')
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        results = update_recommend(seed=options['seed'], refit=options['refit'])
+        self.stdout.write("{status}Saved {links_saved_count:,} links in {seconds:.1f} seconds".format(
+            status=results['status'], links_saved_count=results['links_saved_count'],
+            seconds=time.perf_counter() - start_time))
@@ -1358,41 +1358,13 @@ class PoliticianManager(models.Manager):
         politician_search_results_list = []
 
         try:
+            from search.controllers_database_search import retrieve_search_field_dict, search_queryset, \
+                SEARCH_KIND_POLITICIAN
             queryset = Politician.objects.using('readonly').all()
-            if name_search_terms is not None:
-                name_search_words = name_search_terms.split()
-            else:
-                name_search_words = []
-            for one_word in name_search_words:
-                filters = []  # Reset for each search word
-                new_filter = Q(politician_name__icontains=one_word)
-                filters.append(new_filter)
-
-                new_filter = Q(politician_twitter_handle__icontains=one_word)
-                filters.append(new_filter)
-
-                new_filter = Q(politician_twitter_handle2__icontains=one_word)
-                filters.append(new_filter)
-
-                new_filter = Q(politician_twitter_handle3__icontains=one_word)
-                filters.append(new_filter)
-
-                new_filter = Q(politician_twitter_handle4__icontains=one_word)
-                filters.append(new_filter)
-
-                new_filter = Q(politician_twitter_handle5__icontains=one_word)
-                filters.append(new_filter)
-
-                # Add the first query
-                if len(filters):
-                    final_filters = filters.pop()
-
-                    # ...and "OR" the remaining items in the list
-                    for item in filters:
-                        final_filters |= item
-
-                    queryset = queryset.filter(final_filters)
-
+            if positive_value_exists(name_search_terms):
+                # Every word in the name or a Twitter handle, most similar first
+                politician_model, search_field_list = retrieve_search_field_dict()[SEARCH_KIND_POLITICIAN]
+                queryset = search_queryset(queryset, search_field_list, name_search_terms)
             politician_search_results_list = list(queryset)
         except Exception as e:
             success = False
@@ -0,0 +1,160 @@
+import math
+import os
+import tempfile
+from unittest import mock
+
+import numpy
+from django.test import SimpleTestCase, TransactionTestCase
+from PIL import Image
+
+from image.models import WeVoteImage
+from politician.controllers_generate_color import generate_background_color_from_python_image, \
+    retrieve_background_color_dict
+from politician.controllers_recommendation import generate_politician_feature_fingerprint, \
+    generate_politician_recommendation_model_path, generate_recommended_politician_pairs, \
+    RECOMMENDATIONS_FROM_SAME_CLUSTER, RECOMMENDATIONS_PER_POLITICIAN, sample_distinct_columns
+
+
+class PoliticianRecommendationTestCase(SimpleTestCase):
+
+    def test_sample_distinct_columns(self):
+        random_generator = numpy.random.default_rng(1)
+        sample = sample_distinct_columns(random_generator, 500, 6, 5)
+        self.assertEqual(sample.shape, (500, 5))
+        self.assertTrue(((sample >= 0) & (sample < 6)).all())
+        for sample_row in sample:
+            self.assertEqual(len(set(sample_row.tolist())), 5)
+        # Asking for the whole population, or more, returns all of it in every row
+        self.assertEqual(sample_distinct_columns(random_generator, 2, 3, 4).tolist(), [[0, 1, 2], [0, 1, 2]])
+
+    def assert_recommendations_are_valid(self, cluster_by_we_vote_id, recommended_politician_pair_list):
+        recommended_we_vote_ids_by_politician = {}
+        for from_politician_we_vote_id, recommended_politician_we_vote_id in recommended_politician_pair_list:
+            recommended_we_vote_ids_by_politician.setdefault(from_politician_we_vote_id, []) \
+                .append(recommended_politician_we_vote_id)
+        total_count = len(cluster_by_we_vote_id)
+        for we_vote_id, cluster in cluster_by_we_vote_id.items():
+            recommended_we_vote_id_list = recommended_we_vote_ids_by_politician.get(we_vote_id, [])
+            self.assertNotIn(we_vote_id, recommended_we_vote_id_list)
+            self.assertEqual(len(set(recommended_we_vote_id_list)), len(recommended_we_vote_id_list))
+            self.assertEqual(len(recommended_we_vote_id_list), min(RECOMMENDATIONS_PER_POLITICIAN, total_count - 1))
+            cluster_size = list(cluster_by_we_vote_id.values()).count(cluster)
+            same_cluster_count = len([
+                recommended_we_vote_id for recommended_we_vote_id in recommended_we_vote_id_list
+                if cluster_by_we_vote_id[recommended_we_vote_id] == cluster])
+            self.assertEqual(same_cluster_count, min(RECOMMENDATIONS_FROM_SAME_CLUSTER, cluster_size - 1))
+
+    def test_recommended_pairs_by_cluster(self):
+        # Clusters of 1, 2, 3, 7 and 20 politicians, with ids that don't sort in cluster order
+        cluster_by_we_vote_id = {}
+        politician_number = 0
+        for cluster, cluster_size in [(4, 1), (0, 2), (9, 3), (2, 7), (5, 20)]:
+            for _ in range(cluster_size):
+                politician_number += 1
+                cluster_by_we_vote_id['wvpol' + str((politician_number * 37) % 101)] = cluster
+        for seed in range(5):
+            self.assert_recommendations_are_valid(
+                cluster_by_we_vote_id,
+                generate_recommended_politician_pairs(cluster_by_we_vote_id, numpy.random.default_rng(seed)))
+
+    def test_recommended_pairs_with_few_politicians(self):
+        for cluster_by_we_vote_id in [
+                {'wvpola': 0, 'wvpolb': 0, 'wvpolc': 1},
+                {'wvpola': 0, 'wvpolb': 1, 'wvpolc': 2, 'wvpold': 3},
+                {'wvpola': 0, 'wvpolb': 0, 'wvpolc': 0}]:
+            self.assert_recommendations_are_valid(
+                cluster_by_we_vote_id,
+                generate_recommended_politician_pairs(cluster_by_we_vote_id, numpy.random.default_rng(0)))
+        self.assertEqual(generate_recommended_politician_pairs({'wvpola': 0}, numpy.random.default_rng(0)), [])
+        self.assertEqual(generate_recommended_politician_pairs({}, numpy.random.default_rng(0)), [])
+
+    def test_fingerprint_ignores_twitter_followers_count(self):
+        politician_row = ('wvpola', 'Democrat', 'CA', 1000, 'Senator', None, '555', None, None, None)
+        self.assertEqual(generate_politician_feature_fingerprint(politician_row),
+                         generate_politician_feature_fingerprint(politician_row[:3] + (1200,) + politician_row[4:]))
+        self.assertNotEqual(generate_politician_feature_fingerprint(politician_row),
+                            generate_politician_feature_fingerprint(politician_row[:2] + ('NY',) + politician_row[3:]))
+
+    def test_model_is_only_cached_in_private_directory(self):
+        model_directory = tempfile.mkdtemp()
+        self.assertEqual(generate_politician_recommendation_model_path(model_directory),
+                         os.path.join(model_directory, 'politician_recommendation_model.pickle'))
+        os.chmod(model_directory, 0o777)
+        self.assertEqual(generate_politician_recommendation_model_path(model_directory), '')
+        self.assertEqual(generate_politician_recommendation_model_path(''), '')
+        os.rmdir(model_directory)
+
+
+def generate_background_color_the_old_way(image, base=None):
+    # How generate_background found the color, one pixel at a time, before it used numpy
+    base = base or 3
+    try:
+        image_crop_left = image.crop((0, 0, 20, 20))
+        image_crop_right = image.crop((image.width - 20, 0, image.width, 20))
+        left_list = list(image_crop_left.convert('RGBA').getdata())
+        left_list += list(image_crop_right.convert('RGBA').getdata())
+        bins = [[] for _ in range(base ** 3)]
+        divisor = 255 / base
+        for r, g, b, a in left_list:
+            r_binned = min(math.floor(r / divisor), base - 1)
+            g_binned = min(math.floor(g / divisor), base - 1)
+            b_binned = min(math.floor(b / divisor), base - 1)
+            bins[(r_binned * (base ** 2)) + (g_binned * base) + b_binned].append((r, g, b))
+        bins.sort(key=lambda one_bin: -len(one_bin))
+        final_color = [0, 0, 0]
+        denominator = 0
+        for bin_number in range(2):
+            for rgb in bins[bin_number]:
+                for channel in range(3):
+                    final_color[channel] += rgb[channel]
+            denominator += len(bins[bin_number])
+        return '#{:02x}{:02x}{:02x}'.format(*[math.floor(channel / denominator) for channel in final_color])
+    except Exception:
+        return ''
+
+
+class GenerateBackgroundColorTestCase(SimpleTestCase):
+
+    def assert_same_color_as_before(self, python_image, base=None):
+        self.assertEqual(generate_background_color_from_python_image(python_image, base=base),
+                         generate_background_color_the_old_way(python_image, base=base))
+
+    def test_random_images_match_old_algorithm(self):
+        random_generator = numpy.random.default_rng(7)
+        for image_index in range(40):
+            width = int(random_generator.integers(5, 80))
+            height = int(random_generator.integers(5, 40))
+            # Few distinct values, so bins often have the same count
+            pixel_array = (random_generator.integers(0, 4, size=(height, width, 3)) * 85).astype(numpy.uint8)
+            python_image = Image.fromarray(pixel_array, 'RGB')
+            for image_mode in ['RGB', 'RGBA', 'L', 'P']:
+                self.assert_same_color_as_before(python_image.convert(image_mode), base=2 + image_index % 4)
+
+    def test_tied_bins_are_taken_in_bin_order(self):
+        # 40x20: the left corner is red, the right corner is half green and half blue, which tie for second place
+        python_image = Image.new('RGB', (40, 20), (250, 10, 10))
+        python_image.paste(Image.new('RGB', (20, 10), (10, 250, 10)), (20, 0))
+        python_image.paste(Image.new('RGB', (20, 10), (10, 10, 250)), (20, 10))
+        # Blue's bin comes before green's, so red and blue are averaged: (400 * 250 + 200 * 10) // 600 == 0xaa
+        self.assertEqual(generate_background_color_from_python_image(python_image), '#aa0a5a')
+        self.assert_same_color_as_before(python_image)
+        # A corner past the edge of a small image is padded with transparent black, like before
+        self.assert_same_color_as_before(Image.new('RGB', (8, 8), (200, 200, 200)))
+        self.assert_same_color_as_before(Image.new('RGB', (0, 0)))
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' image query see the images saved here
+class RetrieveBackgroundColorTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def test_color_saved_with_the_large_image_is_used(self):
+        image_url = 'https://wevote-images.s3.amazonaws.com/wvtestpol1/twitter_profile_image-large.jpg'
+        WeVoteImage.objects.create(we_vote_image_url=image_url, kind_of_image_large=True,
+                                   profile_image_background_color='#102030')
+        # Only large images are looked up
+        WeVoteImage.objects.create(we_vote_image_url=image_url, profile_image_background_color='#ffffff')
+        with mock.patch('politician.controllers_generate_color.generate_background_color_dict_from_storage',
+                        return_value={}) as mock_generate_from_storage:
+            self.assertEqual(retrieve_background_color_dict([image_url, '', None, 'https://example.org/not_ours.jpg']),
+                             {image_url: '#102030'})
+        mock_generate_from_storage.assert_called_once_with({}, base=None)
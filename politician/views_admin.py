@@ -60,7 +60,8 @@ from .controllers import add_alternate_names_to_next_spot, add_twitter_handle_to
 from .models import Politician, PoliticianChangeLog, PoliticianManager, POLITICIAN_UNIQUE_ATTRIBUTES_TO_BE_CLEARED, \
     POLITICIAN_UNIQUE_IDENTIFIERS, PoliticiansArePossibleDuplicates, POLITICAL_DATA_MANAGER, UNKNOWN, \
     RecommendedPoliticianLinkByPolitician
-from politician.controllers_generate_color import generate_background, validate_hex
+from politician.controllers_generate_color import generate_background, \
+    update_profile_image_background_color_list, validate_hex
 POLITICIANS_SYNC_URL = get_environment_variable("POLITICIANS_SYNC_URL")  # politiciansSyncOut
 WE_VOTE_SERVER_ROOT_URL = get_environment_variable("WE_VOTE_SERVER_ROOT_URL")
 WEB_APP_ROOT_URL = get_environment_variable("WEB_APP_ROOT_URL")
@@ -661,19 +662,11 @@ def politician_list_view(request):
         total_to_convert = politician_query.count()
         total_to_convert_after = total_to_convert - number_to_generate if total_to_convert > number_to_generate else 0
         politician_list_to_convert = list(politician_query[:number_to_generate])
-        update_list = []
-        politicians_updated = 0
-        politicians_not_updated = 0
-
-        for politician in politician_list_to_convert:
-            politician.profile_image_background_color_needed = False
-            if positive_value_exists(politician.we_vote_hosted_profile_image_url_large):
-                hex = generate_background(politician)
-                politician.profile_image_background_color = hex
-                politicians_updated += 1
-                update_list.append(politician)
-            else:
-                politicians_not_updated += 1
+        update_list = [politician for politician in politician_list_to_convert
+                       if positive_value_exists(politician.we_vote_hosted_profile_image_url_large)]
+        background_color_results = update_profile_image_background_color_list(politician_list_to_convert)
+        politicians_updated = background_color_results['updated_count']
+        politicians_not_updated = background_color_results['not_updated_count']
 
         if len(update_list) > 0:
             try:
@@ -4224,18 +4217,10 @@ def update_profile_image_background_color_view_for_politicians(request):
     else:
         message += "{count:,} politicians need a background color for profile photo. ".format(count=politician_list_count)
 
-    bulk_update_list = []
-    politicians_updated = 0
-    politicians_not_updated = 0
-    for politician in politician_list:
-        politician.profile_image_background_color_needed = False
-        if positive_value_exists(politician.we_vote_hosted_profile_image_url_large):
-            hex = generate_background(politician)
-            politician.profile_image_background_color = hex
-            politicians_updated += 1
-        else:
-            politicians_not_updated += 1
-        bulk_update_list.append(politician)
+    background_color_results = update_profile_image_background_color_list(politician_list)
+    politicians_updated = background_color_results['updated_count']
+    politicians_not_updated = background_color_results['not_updated_count']
+    bulk_update_list = politician_list
     try:
         Politician.objects.bulk_update(
             bulk_update_list,
@@ -6,6 +6,7 @@ from config.base import get_environment_variable
 from django.db import models
 from django.db.models import Q
 from exception.models import handle_record_not_found_exception
+from geoip.models import geocode_with_cache
 from geopy.geocoders import get_geocoder_for_service
 from geopy.exc import GeocoderQuotaExceeded
 import wevote_functions.admin
@@ -289,9 +290,11 @@ class PollingLocationManager(models.Manager):
             longitude=None,
             source_code='',
             use_for_bulk_retrieve=False,
-            polling_location_deleted=False):
+            polling_location_deleted=False,
+            we_vote_id_for_new_entry=''):
         """
         Either update or create an polling_location entry.
+        :param we_vote_id_for_new_entry: For bulk importers which reserved the we_vote_ids of the entries they create
         """
         exception_multiple_object_returned = False
         polling_location_created = False
@@ -354,6 +357,7 @@ class PollingLocationManager(models.Manager):
                         we_vote_id=we_vote_id, defaults=updated_values)
                 else:
                     polling_location = PollingLocation.objects.create(
+                        we_vote_id=we_vote_id_for_new_entry,
                         polling_location_id=polling_location_id,
                         county_name=county_name.strip() if county_name else '',
                         state=state,
@@ -740,7 +744,7 @@ class PollingLocationManager(models.Manager):
             polling_location.state,
             polling_location.zip_long)
         try:
-            location = self.google_client.geocode(full_ballot_address, sensor=False, timeout=GEOCODE_TIMEOUT)
+            location = geocode_with_cache(self.google_client, full_ballot_address, timeout=GEOCODE_TIMEOUT)
         except GeocoderQuotaExceeded:
             status += "GeocoderQuotaExceeded "
             results = {
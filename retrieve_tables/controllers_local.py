@@ -2,10 +2,14 @@
 # Brought to you by We Vote. Be good.
 # -*- coding: UTF-8 -*-
 
+import csv
+import gzip
+import io
 import json
 import os
 import time
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 
 import numpy as np
 import pandas as pd
@@ -13,12 +17,15 @@ import psycopg2
 import requests
 import sqlalchemy as sa
 from django.http import HttpResponse
+from django.utils.timezone import now
 from sqlalchemy.engine.reflection import Inspector
 
 import wevote_functions.admin
 from config.base import get_environment_variable
-from retrieve_tables.controllers_master import allowable_tables
-from wevote_functions.functions import get_voter_api_device_id
+from retrieve_tables.controllers_master import allowable_tables, CHANGE_TRACKING_COLUMNS, \
+    generate_checksum_column_list, generate_range_checksums_sql
+from retrieve_tables.models import RetrieveTableSyncState
+from wevote_functions.functions import get_voter_api_device_id, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 
@@ -26,6 +33,19 @@ logger = wevote_functions.admin.get_logger(__name__)
 
 dummy_unique_id = 10000000
 LOCAL_TMP_PATH = '/tmp/'
+# Streaming mode: how many tables are fetched at once, and how often each one reports progress
+FAST_LOAD_STREAM_WORKERS = 4
+FAST_LOAD_PROGRESS_ROWS = 10000
+FAST_LOAD_STREAM_TIMEOUT = (30, 1800)  # (connect, read) seconds
+FAST_LOAD_COPY_READ_SIZE = 65536
+# Delta sync: a full checksum reconcile is done at least this often, in blocks of this many ids
+FAST_LOAD_RECONCILE_DAYS = 7
+FAST_LOAD_RECONCILE_RANGE_SIZE = 10000
+BOOLEAN_STRING_MAP = {
+    'true': 't', 't': 't', '1': 't', 'yes': 't',
+    'false': 'f', 'f': 'f', '0': 'f', 'no': 'f',
+}
+COPY_NULL = '\\N'
 
 
 def save_off_database():
@@ -35,13 +55,14 @@ def save_off_database():
     time.sleep(20)
 
 
-def update_fast_load_db(host, voter_api_device_id, table_name, additional_records):
+def update_fast_load_db(host, voter_api_device_id, table_name, additional_records, rows_per_second=0):
     """
     Updates progress bar and data on fast load HTML page
     :param host:
     :param voter_api_device_id:
     :param table_name:
     :param additional_records:
+    :param rows_per_second: throughput of this table so far, if known
     :return:
     """
     try:
@@ -49,6 +70,7 @@ def update_fast_load_db(host, voter_api_device_id, table_name, additional_record
                                 verify=True,
                                 params={'table_name': table_name,
                                         'additional_records': additional_records,
+                                        'rows_per_second': int(rows_per_second),
                                         'is_running': True,
                                         'voter_api_device_id': voter_api_device_id,
                                         })
@@ -125,6 +147,10 @@ def retrieve_sql_files_from_master_server(request):
     """
     Get the json data, and create new entries in the developers local database
     Runs on the Local server (developer's Mac)
+    By default each table is streamed from the master server as gzip compressed COPY data, several tables at a time.
+    Pass streaming=0 to use the older 10,000 row JSON chunks.
+    Pass delta=1 to only copy rows inserted or changed since the last sync, and reconcile=1 to also compare
+    checksums and fix anything the delta missed.
     :return:
     """
     t0 = time.time()
@@ -142,57 +168,465 @@ def retrieve_sql_files_from_master_server(request):
     # host = 'https://wevotedeveloper.com:8000'
     host = 'https://api.wevoteusa.org'
     voter_api_device_id = get_voter_api_device_id(request)
+    streaming = positive_value_exists(request.GET.get('streaming', True))
+    delta = positive_value_exists(request.GET.get('delta', False))
+    reconcile = positive_value_exists(request.GET.get('reconcile', False))
     requests.get(host + '/apis/v1/fastLoadStatusRetrieve',
                  params={"initialize": True, "voter_api_device_id": voter_api_device_id}, verify=True)
-    for table_name in allowable_tables:
-        print(f"{table_name.upper()}\n--------------------")
-        truncate_table(engine, table_name)
-
-        max_id_params = {'table_name': table_name}
-        max_id_response = get_max_id(max_id_params)
-        max_id = max_id_response['maxID']
-        chunk_size = 10000
-        start = 0
-        end = chunk_size - 1
-        structured_json = {}
-        table_start_time = time.time()
-        # filling table with 10,000 line chunks
-        if max_id and max_id != -1:
-            while end - chunk_size < max_id:
-                print(f"{table_name}:   {((start / max_id) * 100):.0f}% -- Chunk {start} to {end} of {max_id} rows")
-                try:
-                    url = f'{host}/apis/v1/retrieveSQLTables/'
-                    params = {'table_name': table_name, 'start': start, 'end': end,
-                              'voter_api_device_id': voter_api_device_id}
+    if streaming:
+        retrieve_tables_as_streams_from_master_server(engine, host, voter_api_device_id, delta, reconcile)
+    else:
+        for table_name in allowable_tables:
+            retrieve_table_in_chunks_from_master_server(engine, host, voter_api_device_id, table_name)
+    minutes = (time.time() - t0) / 60
+    print(f"Total time for all tables: {minutes:.1f} minutes")
+    results = {'status': 'Completed', 'status_code': 200}
+    return HttpResponse(json.dumps(results), content_type='application/json')
 
-                    structured_json = fetch_data_from_api(url, params)
-                except Exception as e:
-                    print(f"FETCH_ERROR: {table_name} -- {str(e)}")
 
-                if not structured_json['success']:
-                    print(f"FAILED: Did not receive '{table_name}' from server")
-                    break
+def retrieve_table_in_chunks_from_master_server(engine, host, voter_api_device_id, table_name):
+    """
+    Truncate the local table, then refill it from retrieveSQLTables 10,000 rows at a time
+    :return:
+    """
+    print(f"{table_name.upper()}\n--------------------")
+    truncate_table(engine, table_name)
+
+    max_id_params = {'table_name': table_name}
+    max_id_response = get_max_id(max_id_params)
+    max_id = max_id_response['maxID']
+    chunk_size = 10000
+    start = 0
+    end = chunk_size - 1
+    structured_json = {}
+    table_start_time = time.time()
+    # filling table with 10,000 line chunks
+    if max_id and max_id != -1:
+        while end - chunk_size < max_id:
+            print(f"{table_name}:   {((start / max_id) * 100):.0f}% -- Chunk {start} to {end} of {max_id} rows")
+            try:
+                url = f'{host}/apis/v1/retrieveSQLTables/'
+                params = {'table_name': table_name, 'start': start, 'end': end,
+                          'voter_api_device_id': voter_api_device_id}
+
+                structured_json = fetch_data_from_api(url, params)
+            except Exception as e:
+                print(f"FETCH_ERROR: {table_name} -- {str(e)}")
+
+            if not structured_json['success']:
+                print(f"FAILED: Did not receive '{table_name}' from server")
+                break
+            try:
+                data = structured_json['files'].get(table_name, "")
+                split_data = data.splitlines(keepends=True)
+                update_fast_load_db(host, voter_api_device_id, table_name, len(split_data))
+                lines_count = process_table_data(table_name, split_data)
+                # print(f'{lines_count} lines in chunk')
+            except Exception as e:
+                print(f"TABLE_PROCESSING_ERROR: {table_name} -- {str(e)}")
+            start += chunk_size
+            end += chunk_size
+
+        print(f'Table {table_name} took {((time.time() - table_start_time) / 60):.1f} min\n')
+
+        # reset table's id sequence
+        reset_id_seq(engine, table_name)
+    else:
+        print(f"{table_name} is empty\n")
+
+
+def retrieve_tables_as_streams_from_master_server(engine, host, voter_api_device_id, delta=False, reconcile=False):
+    """
+    Stream the allowable tables from retrieveSQLTablesStream, FAST_LOAD_STREAM_WORKERS tables at a time.
+    Tables the master server can't stream (an older master without retrieveSQLTablesStream) are retrieved in JSON
+    chunks afterward.
+    :param delta: instead of truncating, only copy rows inserted or changed since each table's RetrieveTableSyncState
+    :param reconcile: with delta, also compare id block checksums with the master server and copy the blocks that
+      differ. This happens anyway every FAST_LOAD_RECONCILE_DAYS.
+    :return:
+    """
+    sync_state_by_table_name = {}
+    if delta:
+        for sync_state in RetrieveTableSyncState.objects.filter(table_name__in=allowable_tables):
+            sync_state_by_table_name[sync_state.table_name] = sync_state
+    else:
+        # Truncate everything first, so a TRUNCATE ... CASCADE can't empty a table that has already been loaded
+        for table_name in allowable_tables:
+            truncate_table(engine, table_name)
+
+    tables_to_retrieve_in_chunks = []
+    with ThreadPoolExecutor(max_workers=FAST_LOAD_STREAM_WORKERS) as executor:
+        future_to_table_name = {
+            executor.submit(sync_table_from_master_server, engine, host, voter_api_device_id, table_name,
+                            sync_state_by_table_name.get(table_name), delta, reconcile): table_name
+            for table_name in allowable_tables}
+        for future in as_completed(future_to_table_name):
+            table_name = future_to_table_name[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                results = {'success': False, 'status': str(e), 'stream_not_available': False}
+            if results['success']:
+                print(f"{table_name}: {results['rows_copied']} rows in {results['seconds']:.1f} seconds "
+                      f"({results['rows_per_second']:.0f} rows/second) {results['status']}")
+                save_table_sync_state(table_name, results)
+            elif results['stream_not_available']:
+                tables_to_retrieve_in_chunks.append(table_name)
+            else:
+                print(f"FAILED_TABLE_STREAM: {table_name} -- {results['status']}")
+
+    for table_name in tables_to_retrieve_in_chunks:
+        if delta:
+            print(f"{table_name}: the master server can't stream, so this table is copied in full")
+        retrieve_table_in_chunks_from_master_server(engine, host, voter_api_device_id, table_name)
+
+
+def sync_table_from_master_server(engine, host, voter_api_device_id, table_name, sync_state, delta, reconcile):
+    """
+    Copy one table, all of it or (with delta and a sync_state) only rows above the high-water marks, and reconcile
+    it when asked or when it is due. Runs in a worker thread, so the new high-water marks are returned in results
+    for the caller to save.
+    :return: results dict
+    """
+    inspector = Inspector.from_engine(engine)
+    col_names = [col['name'] for col in inspector.get_columns(table_name)]
+    change_column = next((col_name for col_name in CHANGE_TRACKING_COLUMNS if col_name in col_names), '')
+
+    if sync_state is None:
+        # Without a high-water mark, a delta sync upserts every row, and the table matches the master afterward
+        results = stream_table_from_master_server(engine, host, voter_api_device_id, table_name, upsert=delta)
+        results['reconciled'] = results['success']
+    else:
+        stream_params = {'since_id': sync_state.last_id}
+        if positive_value_exists(change_column) and sync_state.last_date_changed is not None:
+            stream_params['change_column'] = change_column
+            stream_params['changed_since'] = sync_state.last_date_changed.isoformat()
+        results = stream_table_from_master_server(engine, host, voter_api_device_id, table_name,
+                                                  stream_params=stream_params, upsert=True)
+        results['reconciled'] = False
+        reconcile_due = sync_state.date_last_reconciled is None or \
+            sync_state.date_last_reconciled < now() - timedelta(days=FAST_LOAD_RECONCILE_DAYS)
+        if results['success'] and (reconcile or reconcile_due):
+            reconcile_results = reconcile_table_with_master_server(engine, host, voter_api_device_id, table_name)
+            results['status'] += reconcile_results['status']
+            results['rows_skipped'] += reconcile_results.get('rows_skipped', 0)
+            results['success'] = reconcile_results['success']
+            results['reconciled'] = reconcile_results['success']
+
+    if results['success']:
+        results['change_column'] = change_column
+        with engine.connect() as conn:
+            results['last_id'] = conn.execute(sa.text(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}")).scalar()
+            results['last_date_changed'] = conn.execute(
+                sa.text(f"SELECT MAX({change_column}) FROM {table_name}")).scalar() \
+                if positive_value_exists(change_column) else None
+    return results
+
+
+def reconcile_table_with_master_server(engine, host, voter_api_device_id, table_name):
+    """
+    Delta sync only sees new ids and changed rows in tables with a change column. This catches everything else,
+    including rows deleted on the master server: compare checksums of each block of FAST_LOAD_RECONCILE_RANGE_SIZE
+    ids, and replace the blocks that differ.
+    :return: results dict
+    """
+    inspector = Inspector.from_engine(engine)
+    columns = inspector.get_columns(table_name)
+    fk_cols = [col['constrained_columns'][0] for col in inspector.get_foreign_keys(table_name)]
+    checksum_null_text_by_column = {}
+    for col in columns:
+        null_text = generate_checksum_null_text(col, fk_cols)
+        if null_text is not None:
+            checksum_null_text_by_column[col['name']] = null_text
+    try:
+        response = requests.get(f'{host}/apis/v1/retrieveSQLTablesChecksums/',
+                                params={'table_name': table_name, 'range_size': FAST_LOAD_RECONCILE_RANGE_SIZE,
+                                        'checksum_columns': json.dumps(checksum_null_text_by_column)},
+                                verify=True, timeout=FAST_LOAD_STREAM_TIMEOUT)
+        master_results = response.json()
+    except Exception as e:
+        return {'success': False, 'status': f"RECONCILE_CHECKSUMS_NOT_RETRIEVED: {str(e)} "}
+    if not master_results.get('success'):
+        return {'success': False, 'status': "RECONCILE_CHECKSUMS_NOT_RETRIEVED "}
+    if 'checksum_column_list' not in master_results:
+        return {'success': False, 'status': "RECONCILE_NEEDS_NEWER_MASTER_SERVER "}
+    master_checksums = master_results['checksums']
+    # Hash exactly the columns the master server hashed. Only names of our own columns go into the SQL.
+    checksum_column_list = generate_checksum_column_list(
+        checksum_null_text_by_column, dict(master_results['checksum_column_list']))
+
+    local_checksums = {}
+    dbapi_conn = engine.raw_connection()
+    try:
+        with dbapi_conn.cursor() as cursor:
+            cursor.execute("SET TIME ZONE 'UTC'")
+            cursor.execute(*generate_range_checksums_sql(
+                table_name, FAST_LOAD_RECONCILE_RANGE_SIZE, checksum_column_list))
+            for id_block, row_count, checksum in cursor.fetchall():
+                local_checksums[str(id_block)] = [row_count, checksum]
+        dbapi_conn.rollback()
+    finally:
+        dbapi_conn.close()
+
+    id_block_list = sorted(int(id_block) for id_block in set(master_checksums) | set(local_checksums)
+                           if master_checksums.get(id_block) != local_checksums.get(id_block))
+    rows_skipped = 0
+    for id_block in id_block_list:
+        start = id_block * FAST_LOAD_RECONCILE_RANGE_SIZE
+        end = start + FAST_LOAD_RECONCILE_RANGE_SIZE - 1
+        block_results = stream_table_from_master_server(
+            engine, host, voter_api_device_id, table_name, stream_params={'start': start, 'end': end}, upsert=True,
+            delete_id_range=(start, end))
+        if not block_results['success']:
+            return {'success': False, 'status': f"RECONCILE_FAILED_ID_BLOCK_{id_block} " + block_results['status']}
+        rows_skipped += block_results['rows_skipped']
+    status = f"RECONCILED_{len(id_block_list)}_ID_BLOCKS "
+    if rows_skipped:
+        status += f"ROWS_WITH_WRONG_FIELD_COUNT_SKIPPED: {rows_skipped} "
+    return {'success': True, 'status': status, 'rows_skipped': rows_skipped}
+
+
+def save_table_sync_state(table_name, results):
+    defaults = {
+        'last_id':              results['last_id'],
+        'change_column':        results['change_column'],
+        'last_date_changed':    results['last_date_changed'],
+        'date_last_synced':     now(),
+    }
+    if results['reconciled']:
+        defaults['date_last_reconciled'] = now()
+    try:
+        RetrieveTableSyncState.objects.update_or_create(table_name=table_name, defaults=defaults)
+    except Exception as e:
+        print(f"FAILED_SYNC_STATE_SAVE: {table_name} -- {str(e)}")
+
+
+def generate_streaming_column_cleaner(column, fk_cols):
+    """
+    The streaming version of clean_df, for one column of the local table.
+    Rows arrive intact from the master's COPY, so we only fill in values the local not-null constraints need and
+    normalize types that differ between servers.
+    :param column: one entry from inspector.get_columns
+    :param fk_cols: list of cols with foreign key constraint
+    :return: function that takes the master's value (None for NULL) and returns the value to COPY (None for NULL)
+    """
+    column_type = str(column['type'])
+    not_null = not column['nullable']
+    is_fk = column['name'] in fk_cols
+
+    if column_type == "BOOLEAN":
+        def clean_value(value):
+            if value is None:
+                return 'f' if not_null else None
+            return BOOLEAN_STRING_MAP.get(value.strip().lower(), 'f' if not_null else None)
+    elif column_type == "TIMESTAMP":
+        def clean_value(value):
+            if value is None and not_null:
+                return datetime.now(timezone.utc).isoformat()
+            return value
+    elif column_type in ["INTEGER", "BIGINT"]:
+        def clean_value(value):
+            if value is not None:
                 try:
-                    data = structured_json['files'].get(table_name, "")
-                    split_data = data.splitlines(keepends=True)
-                    update_fast_load_db(host, voter_api_device_id, table_name, len(split_data))
-                    lines_count = process_table_data(table_name, split_data)
-                    # print(f'{lines_count} lines in chunk')
-                except Exception as e:
-                    print(f"TABLE_PROCESSING_ERROR: {table_name} -- {str(e)}")
-                start += chunk_size
-                end += chunk_size
+                    int(value)
+                    return value
+                except ValueError:
+                    value = None
+            return '0' if not_null and not is_fk else value
+    elif column_type == "DOUBLE PRECISION":
+        def clean_value(value):
+            return None if value == 'False' else value
+    elif column_type == "DATE":
+        def clean_value(value):
+            if value is None and not_null:
+                return "1800-01-01"
+            return value
+    elif "VARCHAR" in column_type or column_type == "TEXT":
+        def clean_value(value):
+            if value is None and not_null:
+                return ''
+            return value
+    else:
+        def clean_value(value):
+            return value
+    return clean_value
+
+
+class StreamingCopyReader:
+    """
+    File-like object for cursor.copy_expert(..., FROM STDIN), which writes rows as pipe delimited CSV only as fast
+    as Postgres reads them.
+    """
 
-            print(f'Table {table_name} took {((time.time() - table_start_time) / 60):.1f} min\n')
+    def __init__(self, row_iterator):
+        self.row_iterator = row_iterator
+        self.buffer = io.StringIO()
+        self.csv_writer = csv.writer(self.buffer, delimiter='|', lineterminator='\n')
+
+    def read(self, size=-1):
+        while size < 0 or self.buffer.tell() < size:
+            try:
+                row = next(self.row_iterator)
+            except StopIteration:
+                break
+            self.csv_writer.writerow([COPY_NULL if value is None else value for value in row])
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if 0 <= size < len(data):
+            self.buffer.write(data[size:])
+            data = data[:size]
+        return data
+
+
+def generate_checksum_null_text(column, fk_cols):
+    """
+    What a NULL from the master server becomes in this local column, as Postgres renders it with ::text, so the
+    master server can hash its NULLs the same way. A not-null timestamp gets the time it was copied, which the master
+    can't know, so that column is left out of the checksums.
+    :param column: one entry from inspector.get_columns
+    :param fk_cols: list of cols with foreign key constraint
+    :return: text, or None to leave the column out
+    """
+    column_type = str(column['type'])
+    if column_type == "TIMESTAMP" and not column['nullable']:
+        return None
+    copied_value = generate_streaming_column_cleaner(column, fk_cols)(None)
+    if copied_value is None:
+        return COPY_NULL
+    if column_type == "BOOLEAN":
+        return 'true' if copied_value == 't' else 'false'
+    return copied_value
+
+
+def generate_clean_rows(csv_reader, master_col_names, col_names, column_cleaners, progress):
+    """
+    Put each of the master's rows in local column order, cleaned for COPY. A row with the wrong number of fields
+    can't be matched up with the columns, so it is left out and counted in progress['rows_skipped'].
+    :param csv_reader: the master's rows, after its header row
+    :param master_col_names: the master's header row
+    :param col_names: local column names
+    :param column_cleaners: one generate_streaming_column_cleaner function for each local column
+    :param progress: dict with 'rows_copied' and 'rows_skipped' counts, updated as rows are read
+    """
+    # Where each local column is in the master's rows, or None if the master doesn't have that column
+    master_index_list = [master_col_names.index(col_name) if col_name in master_col_names else None
+                         for col_name in col_names]
+    for row in csv_reader:
+        if len(row) != len(master_col_names):
+            progress['rows_skipped'] += 1
+            continue
+        yield [clean_value(None if master_index is None or row[master_index] == COPY_NULL else row[master_index])
+               for clean_value, master_index in zip(column_cleaners, master_index_list)]
+        progress['rows_copied'] += 1
+
+
+def stream_table_from_master_server(engine, host, voter_api_device_id, table_name, stream_params=None, upsert=False,
+                                    delete_id_range=None):
+    """
+    Stream one table from retrieveSQLTablesStream: gunzip -> csv reader -> streaming cleaner ->
+    COPY ... FROM STDIN, without holding more than a few buffers of the table in memory.
+    Runs in a worker thread of retrieve_tables_as_streams_from_master_server.
+    :param stream_params: extra retrieveSQLTablesStream parameters, like since_id or start and end
+    :param upsert: False when the table has been truncated. True to COPY into a temporary table and then
+      INSERT ... ON CONFLICT (id) DO UPDATE, for delta sync.
+    :param delete_id_range: (start, end) of local rows to delete first, in the same transaction, when a reconcile
+      replaces a block of ids that differs from the master server
+    :return: results dict
+    """
+    table_start_time = time.time()
+    results = {
+        'success': False,
+        'status': '',
+        'stream_not_available': False,
+        'rows_copied': 0,
+        'rows_skipped': 0,
+        'seconds': 0,
+        'rows_per_second': 0,
+    }
+    response = requests.get(f'{host}/apis/v1/retrieveSQLTablesStream/',
+                            params={'table_name': table_name, 'voter_api_device_id': voter_api_device_id,
+                                    **(stream_params or {})},
+                            stream=True, verify=True, timeout=FAST_LOAD_STREAM_TIMEOUT)
+    if response.status_code != 200:
+        results['status'] = f"STREAM_HTTP_STATUS_{response.status_code} "
+        results['stream_not_available'] = response.status_code == 404
+        response.close()
+        return results
+    # Our gzip layer is part of the body. This only undoes any Content-Encoding a proxy adds on top of it.
+    response.raw.decode_content = True
 
-            # reset table's id sequence
-            reset_id_seq(engine, table_name)
-        else:
-            print(f"{table_name} is empty\n")
-    minutes = (time.time() - t0) / 60
-    print(f"Total time for all tables: {minutes:.1f} minutes")
-    results = {'status': 'Completed', 'status_code': 200}
-    return HttpResponse(json.dumps(results), content_type='application/json')
+    inspector = Inspector.from_engine(engine)
+    columns = inspector.get_columns(table_name)
+    fk_cols = [col['constrained_columns'][0] for col in inspector.get_foreign_keys(table_name)]
+    col_names = [col['name'] for col in columns]
+    column_cleaners = [generate_streaming_column_cleaner(col, fk_cols) for col in columns]
+    progress = {'rows_copied': 0, 'rows_reported': 0, 'rows_skipped': 0}
+
+    def generate_clean_rows_with_progress(csv_reader, master_col_names):
+        for clean_row in generate_clean_rows(csv_reader, master_col_names, col_names, column_cleaners, progress):
+            yield clean_row
+            if progress['rows_copied'] - progress['rows_reported'] >= FAST_LOAD_PROGRESS_ROWS:
+                update_fast_load_db(host, voter_api_device_id, table_name,
+                                    progress['rows_copied'] - progress['rows_reported'],
+                                    progress['rows_copied'] / max(time.time() - table_start_time, 0.001))
+                progress['rows_reported'] = progress['rows_copied']
+
+    dbapi_conn = engine.raw_connection()
+    try:
+        with gzip.GzipFile(fileobj=response.raw) as gzip_file:
+            text_stream = io.TextIOWrapper(gzip_file, encoding='utf-8', newline='')
+            csv_reader = csv.reader(text_stream, delimiter='|')
+            master_col_names = [col_name.strip() for col_name in next(csv_reader, [])]
+            with dbapi_conn.cursor() as cursor:
+                try:
+                    # Tables load in parallel, so foreign keys to a table that hasn't arrived yet can't be checked
+                    #  until everything is in. This needs a superuser, which local development databases usually are.
+                    cursor.execute("SET LOCAL session_replication_role = replica")
+                except Exception as e:
+                    dbapi_conn.rollback()
+                    results['status'] += "FOREIGN_KEY_CHECKS_STILL_ON "
+                if delete_id_range is not None:
+                    cursor.execute(f"DELETE FROM {table_name} WHERE id BETWEEN %s AND %s", delete_id_range)
+                column_list = ", ".join('"' + col_name + '"' for col_name in col_names)
+                if upsert:
+                    copy_table_name = "fast_load_upsert"
+                    cursor.execute(f"CREATE TEMP TABLE {copy_table_name} (LIKE {table_name} INCLUDING DEFAULTS) "
+                                   f"ON COMMIT DROP")
+                else:
+                    copy_table_name = table_name
+                sql = "COPY " + copy_table_name + " (" + column_list + \
+                      ") FROM STDIN WITH DELIMITER '|' CSV NULL '" + COPY_NULL + "'"
+                cursor.copy_expert(
+                    sql, StreamingCopyReader(generate_clean_rows_with_progress(csv_reader, master_col_names)),
+                    size=FAST_LOAD_COPY_READ_SIZE)
+                if upsert:
+                    update_list = ", ".join('"' + col_name + '" = EXCLUDED."' + col_name + '"'
+                                            for col_name in col_names if col_name != 'id')
+                    cursor.execute(f"INSERT INTO {table_name} ({column_list}) "
+                                   f"SELECT {column_list} FROM {copy_table_name} "
+                                   f"ON CONFLICT (id) DO UPDATE SET {update_list}")
+        dbapi_conn.commit()
+    except Exception as e:
+        dbapi_conn.rollback()
+        results['status'] += f"FAILED_STREAMING_COPY: {str(e)} "
+        return results
+    finally:
+        dbapi_conn.close()
+        response.close()
+
+    results['seconds'] = time.time() - table_start_time
+    results['rows_copied'] = progress['rows_copied']
+    results['rows_skipped'] = progress['rows_skipped']
+    if progress['rows_skipped']:
+        results['status'] += f"ROWS_WITH_WRONG_FIELD_COUNT_SKIPPED: {progress['rows_skipped']} "
+    results['rows_per_second'] = progress['rows_copied'] / max(results['seconds'], 0.001)
+    update_fast_load_db(host, voter_api_device_id, table_name,
+                        progress['rows_copied'] - progress['rows_reported'], results['rows_per_second'])
+    reset_id_seq(engine, table_name)
+    results['success'] = True
+    results['status'] += "TABLE_STREAMED "
+    return results
 
 
 def truncate_table(engine, table_name):
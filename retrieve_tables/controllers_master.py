@@ -3,8 +3,11 @@
 # -*- coding: UTF-8 -*-
 
 import json
+import queue
 import re
+import threading
 import time
+import zlib
 from datetime import datetime, timezone
 from io import StringIO
 
@@ -62,6 +65,14 @@ allowable_tables = [
 
 dummy_unique_id = 10000000
 LOCAL_TMP_PATH = '/tmp/'
+# Streaming COPY: how much COPY output psycopg2 hands us at a time, and how many compressed pieces may wait for the
+#  client before the COPY pauses
+STREAM_COPY_READ_SIZE = 65536
+STREAM_COPY_QUEUE_SIZE = 64
+STREAM_COPY_QUEUE_TIMEOUT_SECONDS = 300
+STREAM_GZIP_COMPRESS_LEVEL = 6
+# Delta sync picks up changed rows from the first of these columns that a table has
+CHANGE_TRACKING_COLUMNS = ['date_last_changed', 'date_last_updated']
 
 
 def get_max_id(table_name):
@@ -211,6 +222,212 @@ def retrieve_sql_tables_as_csv(voter_api_device_id, table_name, start, end):
         return results
 
 
+class StreamingCopyAborted(Exception):
+    pass
+
+
+class GzipCopyQueueWriter:
+    """
+    File-like object for cursor.copy_expert(..., TO STDOUT). Each piece of COPY output is gzip compressed and put on
+    a bounded queue, which the HTTP response generator drains as the client reads.
+    """
+
+    def __init__(self, output_queue, stop_event):
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        # wbits=31 writes a gzip header and trailer, so the client can use the gzip module
+        self.compressor = zlib.compressobj(STREAM_GZIP_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        self.bytes_in = 0
+
+    def put(self, compressed):
+        while not self.stop_event.is_set():
+            try:
+                self.output_queue.put(compressed, timeout=1)
+                return
+            except queue.Full:
+                continue
+        raise StreamingCopyAborted("client stopped reading")
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.bytes_in += len(data)
+        compressed = self.compressor.compress(data)
+        if compressed:
+            self.put(compressed)
+        return len(data)
+
+    def close(self):
+        self.put(self.compressor.flush())
+
+
+def generate_copy_to_stdout_sql(table_name, start='', end='', since_id=0, change_column='', changed_since=None):
+    """
+    :param table_name: must already be checked against allowable_tables
+    :param start: optional first id
+    :param end: optional last id
+    :param since_id: for delta sync, only rows with an id above this high-water mark...
+    :param change_column: ...or, if this is one of CHANGE_TRACKING_COLUMNS...
+    :param changed_since: ...rows changed after this datetime
+    :return:
+    """
+    start = convert_to_int(start)
+    end = convert_to_int(end)
+    since_id = convert_to_int(since_id)
+    where_list = []
+    if positive_value_exists(end):
+        where_list.append("id BETWEEN " + str(start) + " AND " + str(end))
+    if positive_value_exists(since_id) or changed_since is not None:
+        delta_clause = "id > " + str(since_id)
+        if change_column in CHANGE_TRACKING_COLUMNS and changed_since is not None:
+            delta_clause += " OR " + change_column + " > '" + changed_since.isoformat() + "'"
+        where_list.append("(" + delta_clause + ")")
+    if len(where_list):
+        return "COPY (SELECT * FROM public." + table_name + " WHERE " + " AND ".join(where_list) + \
+            " ORDER BY id) TO STDOUT WITH DELIMITER '|' CSV HEADER NULL '\\N'"
+    return "COPY " + table_name + " TO STDOUT WITH DELIMITER '|' CSV HEADER NULL '\\N'"
+
+
+def generate_range_checksums_sql(table_name, range_size, checksum_column_list):
+    """
+    One row per block of range_size ids: (block number, row count, md5 of the rows in id order).
+    Run on both servers by the delta sync full-reconcile, so only blocks that differ are copied again. Both servers
+    hash the same columns in the same order, with a NULL hashed as the value the local server stores for it, so the
+    column order of each table and the cleaning done while copying don't make every block look different.
+    :param checksum_column_list: list of (column name, text hashed for NULL), sorted by column name. The column
+      names must already be checked against the table's columns.
+    :return: (sql, params) for a psycopg2 cursor. Run SET TIME ZONE 'UTC' first, so timestamps render the same.
+    """
+    range_size = max(convert_to_int(range_size), 1)
+    value_list = ", ".join('COALESCE(t."' + column_name + '"::text, %s)' for column_name, _ in checksum_column_list)
+    sql = "SELECT id / " + str(range_size) + " AS id_block, COUNT(*), " \
+        "md5(string_agg(ROW(" + value_list + ")::text, '|' ORDER BY id)) FROM public." + table_name + \
+        " t GROUP BY id_block"
+    return sql, [null_text for _, null_text in checksum_column_list]
+
+
+def generate_checksum_column_list(table_column_names, checksum_null_text_by_column):
+    """
+    :param table_column_names: the columns this server's table has
+    :param checksum_null_text_by_column: {column name: text hashed for NULL} from the local server, or None to hash
+      every column, with NULL as \\N
+    :return: sorted list of (column name, text hashed for NULL), for the columns both servers have
+    """
+    if checksum_null_text_by_column is None:
+        checksum_null_text_by_column = {column_name: '\\N' for column_name in table_column_names}
+    return sorted((column_name, str(null_text)) for column_name, null_text in checksum_null_text_by_column.items()
+                  if column_name in table_column_names)
+
+
+def retrieve_sql_table_range_checksums(table_name, range_size, checksum_null_text_by_column=None):
+    """
+    Runs on the Master server
+    :param checksum_null_text_by_column: {column name: text hashed for NULL} from the local server
+    :return: results dict, with checksums {id_block (as a string): [row count, md5]}, and the checksum_column_list
+      the local server needs to hash its own blocks the same way
+    """
+    status = ''
+    checksums = {}
+    checksum_column_list = []
+    try:
+        conn = psycopg2.connect(
+            database=get_environment_variable('DATABASE_NAME_READONLY'),
+            user=get_environment_variable('DATABASE_USER_READONLY'),
+            password=get_environment_variable('DATABASE_PASSWORD_READONLY'),
+            host=get_environment_variable('DATABASE_HOST_READONLY'),
+            port=get_environment_variable('DATABASE_PORT_READONLY')
+        )
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT column_name FROM information_schema.columns "
+                           "WHERE table_schema = 'public' AND table_name = %s", [table_name])
+            table_column_names = {one_row[0] for one_row in cursor.fetchall()}
+            checksum_column_list = generate_checksum_column_list(table_column_names, checksum_null_text_by_column)
+            cursor.execute("SET TIME ZONE 'UTC'")
+            cursor.execute(*generate_range_checksums_sql(table_name, range_size, checksum_column_list))
+            for id_block, row_count, checksum in cursor.fetchall():
+                checksums[str(id_block)] = [row_count, checksum]
+        conn.close()
+        status += "RANGE_CHECKSUMS_RETRIEVED "
+        success = True
+    except Exception as e:
+        status += "retrieve_sql_table_range_checksums caught " + str(e) + " "
+        logger.error(status)
+        success = False
+
+    results = {
+        'success': success,
+        'status': status,
+        'table_name': table_name,
+        'range_size': convert_to_int(range_size),
+        'checksums': checksums,
+        'checksum_column_list': checksum_column_list,
+    }
+    return results
+
+
+def stream_sql_table_as_gzip_copy(table_name, start='', end='', since_id=0, change_column='', changed_since=None):
+    """
+    Generator of gzip compressed COPY ... TO STDOUT data (pipe delimited CSV with a header row) for one of the
+    allowable_tables, for StreamingHttpResponse. The COPY runs in a thread and never holds more than
+    STREAM_COPY_QUEUE_SIZE compressed pieces in memory, instead of the whole table in a StringIO and then again in JSON.
+    If the COPY fails part way, the gzip stream ends without its trailer, which the client reports as a failed table.
+    :param table_name: must already be checked against allowable_tables
+    :param start: optional first id
+    :param end: optional last id, if not set the whole table is streamed
+    :param since_id: for delta sync, see generate_copy_to_stdout_sql
+    :param change_column:
+    :param changed_since:
+    :return:
+    """
+    output_queue = queue.Queue(maxsize=STREAM_COPY_QUEUE_SIZE)
+    stop_event = threading.Event()
+    end_of_stream = object()
+
+    def run_copy():
+        t0 = time.time()
+        writer = GzipCopyQueueWriter(output_queue, stop_event)
+        conn = None
+        try:
+            conn = psycopg2.connect(
+                database=get_environment_variable('DATABASE_NAME_READONLY'),
+                user=get_environment_variable('DATABASE_USER_READONLY'),
+                password=get_environment_variable('DATABASE_PASSWORD_READONLY'),
+                host=get_environment_variable('DATABASE_HOST_READONLY'),
+                port=get_environment_variable('DATABASE_PORT_READONLY')
+            )
+            with conn.cursor() as cursor:
+                sql = generate_copy_to_stdout_sql(table_name, start, end, since_id, change_column, changed_since)
+                cursor.copy_expert(sql, writer, size=STREAM_COPY_READ_SIZE)
+            writer.close()
+            logger.error('Streaming the "' + table_name + '" table took ' + "{:.3f}".format(time.time() - t0) +
+                         ' seconds, ' + str(writer.bytes_in) + ' bytes before compression')
+        except StreamingCopyAborted:
+            logger.error('stream_sql_table_as_gzip_copy client stopped reading "' + table_name + '"')
+        except Exception as e:
+            logger.error("stream_sql_table_as_gzip_copy caught: " + str(e))
+        finally:
+            if conn is not None:
+                conn.close()
+            try:
+                output_queue.put(end_of_stream, timeout=STREAM_COPY_QUEUE_TIMEOUT_SECONDS)
+            except queue.Full:
+                pass
+
+    copy_thread = threading.Thread(target=run_copy, name='stream_copy_' + table_name, daemon=True)
+    copy_thread.start()
+    try:
+        while True:
+            compressed = output_queue.get(timeout=STREAM_COPY_QUEUE_TIMEOUT_SECONDS)
+            if compressed is end_of_stream:
+                break
+            yield compressed
+    except queue.Empty:
+        logger.error('stream_sql_table_as_gzip_copy timed out waiting for "' + table_name + '"')
+    finally:
+        # Runs when the response finishes or the client disconnects, and lets a blocked COPY thread exit
+        stop_event.set()
+
+
 def dump_row_col_labels_and_errors(table_name, header, row, index):
     if row[0] == index:
         cnt = 0
@@ -243,6 +460,7 @@ def fast_load_status_retrieve(request):   # fastLoadStatusRetrieve
     chunk = 0
     records = 0
     total = 0
+    rows_per_second = 0
     status = ""
     success = True
     started = None
@@ -260,6 +478,7 @@ def fast_load_status_retrieve(request):   # fastLoadStatusRetrieve
                     'chunk':            0,
                     'current_record':   0,
                     'total_records':    total,
+                    'rows_per_second':  0,
                 })
             row_id = row.id
             status += "ROW_INITIALIZED "
@@ -270,6 +489,7 @@ def fast_load_status_retrieve(request):   # fastLoadStatusRetrieve
             chunk = row.chunk
             records = row.current_record
             total = row.total_records
+            rows_per_second = row.rows_per_second
             started = row.started_date
             row_id = row.id
             status += "ROW_RETRIEVED "
@@ -292,6 +512,7 @@ def fast_load_status_retrieve(request):   # fastLoadStatusRetrieve
         'chunk': chunk,
         'current_record': records,
         'total_records': total,
+        'rows_per_second': rows_per_second,
         'row_id': row_id,
     }
 
@@ -314,6 +535,7 @@ def fast_load_status_update(request):
     additional_records = convert_to_int(request.GET.get('additional_records', 0))
     chunk = convert_to_int(request.GET.get('chunk', None))
     total_records = convert_to_int(request.GET.get('total_records', None))
+    rows_per_second = convert_to_int(request.GET.get('rows_per_second', None))
     is_running = positive_value_exists(request.GET.get('is_running', True))
     print('fast_load_status_update ENTRY table_name', table_name, chunk, 'no row yet', additional_records)
 
@@ -331,12 +553,15 @@ def fast_load_status_update(request):
             row.current_record += additional_records
         if positive_value_exists(total_records):
             row.total_records = total_records
+        if positive_value_exists(rows_per_second):
+            row.rows_per_second = rows_per_second
         row.save()
         status = 'ROW_SAVED'
         row_id = row.id
         response_string = (f"fast_load_status_update AFTER SAVE row_id {row_id}, started_date {row.started_date}, "
                            f"table_name {row.table_name}, chunk {row.chunk}, current_record {row.current_record}, "
-                           f"total_records {row.total_records}, voter_api_device_id {row.voter_api_device_id}, "
+                           f"total_records {row.total_records}, rows_per_second {row.rows_per_second}, "
+                           f"voter_api_device_id {row.voter_api_device_id}, "
                            f"additional_records {additional_records}")
         print(response_string)
 
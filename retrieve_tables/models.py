@@ -13,5 +13,21 @@ class RetrieveTableState(models.Model):
     chunk = models.PositiveIntegerField(verbose_name="Current chunk number", default=0)
     current_record = models.PositiveIntegerField(verbose_name="Current record counter", default=0)
     total_records = models.PositiveIntegerField(verbose_name="Total records to be exported", default=0)
+    rows_per_second = models.PositiveIntegerField(verbose_name="Rows per second for the current table", default=0)
     voter_api_device_id = models.CharField(verbose_name='voter_api_device_id', max_length=255, null=True, unique=True,
                                            db_index=True)
+
+
+class RetrieveTableSyncState(models.Model):
+    """
+    Per-table high-water marks on the developer's local server, so a delta sync only asks the master server for rows
+    inserted or changed since the last sync.
+    """
+    objects = None
+    table_name = models.CharField(verbose_name="Table name", max_length=255, unique=True, db_index=True)
+    last_id = models.BigIntegerField(verbose_name="Highest id copied", default=0)
+    change_column = models.CharField(verbose_name="date_last_changed or date_last_updated, if the table has one",
+                                     max_length=255, null=True, blank=True)
+    last_date_changed = models.DateTimeField(verbose_name="Latest change_column value copied", null=True)
+    date_last_synced = models.DateTimeField(verbose_name="Date of last sync", null=True)
+    date_last_reconciled = models.DateTimeField(verbose_name="Date of last checksum reconcile", null=True)
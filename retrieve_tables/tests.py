@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+import gzip
+import queue
+import threading
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from retrieve_tables.controllers_local import generate_checksum_null_text, generate_clean_rows, \
+    generate_streaming_column_cleaner, StreamingCopyReader
+from retrieve_tables.controllers_master import generate_checksum_column_list, generate_copy_to_stdout_sql, \
+    generate_range_checksums_sql, GzipCopyQueueWriter
+
+
+class StreamingCopyTestCase(SimpleTestCase):
+
+    def test_gzip_copy_queue_writer_output_is_one_gzip_stream(self):
+        output_queue = queue.Queue()
+        writer = GzipCopyQueueWriter(output_queue, threading.Event())
+        writer.write("id|name\n")
+        writer.write(b"1|Oakland\n")
+        writer.close()
+        compressed = b''.join(output_queue.queue)
+        self.assertEqual(gzip.decompress(compressed), b"id|name\n1|Oakland\n")
+
+    def test_streaming_copy_reader_respects_read_size(self):
+        reader = StreamingCopyReader(iter([['1', 'a|b'], ['2', None]]))
+        data = ''
+        while True:
+            piece = reader.read(4)
+            if not piece:
+                break
+            self.assertLessEqual(len(piece), 4)
+            data += piece
+        self.assertEqual(data, '1|"a|b"\n2|\\N\n')
+
+    def test_streaming_column_cleaner(self):
+        clean_boolean = generate_streaming_column_cleaner({'name': 'is_x', 'type': 'BOOLEAN', 'nullable': False}, [])
+        self.assertEqual(clean_boolean('True'), 't')
+        self.assertEqual(clean_boolean(None), 'f')
+        clean_integer = generate_streaming_column_cleaner({'name': 'n', 'type': 'INTEGER', 'nullable': False}, [])
+        self.assertEqual(clean_integer('abc'), '0')
+        clean_fk = generate_streaming_column_cleaner({'name': 'fk_id', 'type': 'INTEGER', 'nullable': True},
+                                                     ['fk_id'])
+        self.assertIsNone(clean_fk(None))
+
+    def test_clean_rows_count_rows_with_wrong_field_count(self):
+        columns = [{'name': 'id', 'type': 'INTEGER', 'nullable': False},
+                   {'name': 'city', 'type': 'VARCHAR', 'nullable': True},
+                   {'name': 'local_only', 'type': 'VARCHAR', 'nullable': True}]
+        column_cleaners = [generate_streaming_column_cleaner(column, []) for column in columns]
+        progress = {'rows_copied': 0, 'rows_skipped': 0}
+        clean_rows = list(generate_clean_rows(
+            iter([['Oakland', '1'], ['Berkeley', '2', 'extra'], ['3'], ['\\N', '4']]), ['city', 'id'],
+            [column['name'] for column in columns], column_cleaners, progress))
+        self.assertEqual(clean_rows, [['1', 'Oakland', None], ['4', None, None]])
+        self.assertEqual(progress, {'rows_copied': 2, 'rows_skipped': 2})
+
+    def test_delta_copy_sql(self):
+        sql = generate_copy_to_stdout_sql('position_positionentered', since_id=500, change_column='date_last_changed',
+                                          changed_since=datetime(2024, 9, 1, tzinfo=timezone.utc))
+        self.assertIn("WHERE (id > 500 OR date_last_changed > '2024-09-01T00:00:00+00:00') ORDER BY id", sql)
+        # Only known change columns make it into the SQL
+        sql = generate_copy_to_stdout_sql('position_positionentered', since_id=500, change_column='1; DROP TABLE',
+                                          changed_since=datetime(2024, 9, 1, tzinfo=timezone.utc))
+        self.assertIn("WHERE (id > 500) ORDER BY id", sql)
+        sql = generate_copy_to_stdout_sql('position_positionentered', start='0', end='9999', since_id='x')
+        self.assertIn("WHERE id BETWEEN 0 AND 9999 ORDER BY id", sql)
+
+
+class RangeChecksumsTestCase(TestCase):
+
+    def test_checksums_match_across_column_order_and_cleaned_nulls(self):
+        local_columns = [{'name': 'is_done', 'type': 'BOOLEAN', 'nullable': False},
+                         {'name': 'id', 'type': 'INTEGER', 'nullable': False},
+                         {'name': 'city', 'type': 'VARCHAR(255)', 'nullable': True},
+                         {'name': 'date_created', 'type': 'TIMESTAMP', 'nullable': False},
+                         {'name': 'local_only', 'type': 'VARCHAR(255)', 'nullable': True}]
+        checksum_null_text_by_column = {}
+        for column in local_columns:
+            null_text = generate_checksum_null_text(column, [])
+            if null_text is not None:
+                checksum_null_text_by_column[column['name']] = null_text
+        self.assertEqual(checksum_null_text_by_column,
+                         {'is_done': 'false', 'id': '0', 'city': '\\N', 'local_only': '\\N'})
+        checksum_column_list = generate_checksum_column_list(
+            {'id', 'city', 'is_done', 'date_created', 'master_only'}, checksum_null_text_by_column)
+        self.assertEqual(checksum_column_list, [('city', '\\N'), ('id', '0'), ('is_done', 'false')])
+
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE test_checksum_master (id integer, city varchar(255), is_done boolean, "
+                           "date_created timestamp with time zone, master_only text)")
+            cursor.execute("INSERT INTO test_checksum_master VALUES (1, 'Oakland', NULL, NULL, 'x'), "
+                           "(2, NULL, true, now(), 'y'), (10, 'A|B', false, now(), '')")
+            cursor.execute("CREATE TABLE test_checksum_local (is_done boolean NOT NULL, id integer NOT NULL, "
+                           "city varchar(255), date_created timestamp with time zone NOT NULL, local_only text)")
+            # As stream_table_from_master_server copies those rows: the NULL is_done becomes false
+            cursor.execute("INSERT INTO test_checksum_local VALUES "
+                           "(false, 1, 'Oakland', now(), NULL), (true, 2, NULL, now(), 'z'), "
+                           "(false, 10, 'A|B', now(), NULL)")
+            cursor.execute("SET TIME ZONE 'UTC'")
+            checksums_by_table_name = {}
+            for table_name in ['test_checksum_master', 'test_checksum_local']:
+                cursor.execute(*generate_range_checksums_sql(table_name, 5, checksum_column_list))
+                checksums_by_table_name[table_name] = sorted(cursor.fetchall())
+            self.assertEqual(len(checksums_by_table_name['test_checksum_master']), 2)
+            self.assertEqual(checksums_by_table_name['test_checksum_master'],
+                             checksums_by_table_name['test_checksum_local'])
+
+            cursor.execute("UPDATE test_checksum_local SET city = 'Berkeley' WHERE id = 10")
+            cursor.execute(*generate_range_checksums_sql('test_checksum_local', 5, checksum_column_list))
+            changed_checksums = sorted(cursor.fetchall())
+            self.assertEqual(changed_checksums[0], checksums_by_table_name['test_checksum_master'][0])
+            self.assertNotEqual(changed_checksums[1], checksums_by_table_name['test_checksum_master'][1])
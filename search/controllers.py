@@ -6,21 +6,25 @@ from candidate.models import CandidateManager
 from config.base import get_environment_variable
 from elasticsearch import Elasticsearch
 from organization.models import OrganizationManager
-from politician.models import PoliticianManager
+from search.controllers_database_search import retrieve_search_field_dict, search_queryset, SEARCH_KIND_LIST, \
+    SEARCH_KIND_CANDIDATE, SEARCH_KIND_MEASURE, SEARCH_KIND_ORGANIZATION, SEARCH_KIND_POLITICIAN, SEARCH_MODE_PREFIX, \
+    SEARCH_MODE_RANKED, SEARCH_PREFIX_RESULTS_LIMIT, SEARCH_RESULTS_LIMIT
 from voter.models import fetch_voter_id_from_voter_device_link
 import wevote_functions.admin
-from wevote_functions.functions import is_voter_device_id_valid, positive_value_exists
+from wevote_functions.functions import convert_to_int, is_voter_device_id_valid, positive_value_exists
 
 logger = wevote_functions.admin.get_logger(__name__)
 ELASTIC_SEARCH_CONNECTION_STRING = get_environment_variable("ELASTIC_SEARCH_CONNECTION_STRING")
 
 
-def search_all_for_api(text_from_search_field='', voter_device_id='', search_scope_list=[]):
+def search_all_for_api(text_from_search_field='', voter_device_id='', search_scope_list=[],
+                       search_mode=SEARCH_MODE_RANKED):
     """
-
+    Ranked search over the pg_trgm indexed names and Twitter handles (see controllers_database_search.py)
     :param text_from_search_field:
     :param voter_device_id:
-    :param search_scope_list:
+    :param search_scope_list: POLITICIAN (or PN), CANDIDATE, ORGANIZATION, MEASURE. Defaults to POLITICIAN.
+    :param search_mode: SEARCH_MODE_PREFIX for typeahead
     :return:
     """
     if not positive_value_exists(text_from_search_field):
@@ -59,60 +63,103 @@ def search_all_for_api(text_from_search_field='', voter_device_id='', search_sco
         }
         return results
 
-    # Example of querying ALL indexes
+    search_kind_list = []
+    for search_scope in search_scope_list:
+        # PN (POLITICIAN_NAME) is what the WebApp has always sent
+        search_kind = SEARCH_KIND_POLITICIAN if search_scope == 'PN' else search_scope
+        if search_kind in SEARCH_KIND_LIST and search_kind not in search_kind_list:
+            search_kind_list.append(search_kind)
+    if not len(search_kind_list):
+        search_kind_list = [SEARCH_KIND_POLITICIAN]
+    limit = SEARCH_PREFIX_RESULTS_LIMIT if search_mode == SEARCH_MODE_PREFIX else SEARCH_RESULTS_LIMIT
+
     search_results = []
-    search_count = 0
     status = ""
-    politician_manager = PoliticianManager()
+    search_field_dict = retrieve_search_field_dict()
     try:
-        results = politician_manager.search_politicians(name_search_terms=text_from_search_field)
-        politician_search_results_list = results['politician_search_results_list']
-        success = results['success']
-        if not positive_value_exists(success):
-            status += results['status']
-        for one_politician in politician_search_results_list:
-            # link_internal = "/office/" + one_search_result_dict['we_vote_id']
-            link_internal = ''
-
-            one_search_result = {
-                'result_title':             one_politician.display_full_name(),
-                'result_image':             one_politician.we_vote_hosted_profile_image_url_medium,
-                'result_subtitle':          "",
-                'result_summary':           "",
-                'result_score':             0,
-                'link_internal':            link_internal,
-                'kind_of_owner':            "POLITICIAN",
-                'google_civic_election_id': 0,
-                'state_code':               one_politician.state_code,
-                'twitter_handle':           one_politician.politician_twitter_handle,
-                'twitter_handle2':          one_politician.politician_twitter_handle2,
-                'twitter_handle3':          one_politician.politician_twitter_handle3,
-                'twitter_handle4':          one_politician.politician_twitter_handle4,
-                'twitter_handle5':          one_politician.politician_twitter_handle5,
-                'we_vote_id':               one_politician.we_vote_id,
-                'local_id':                 one_politician.id,
-            }
-            search_results.append(one_search_result)
-            search_count += 1
+        for search_kind in search_kind_list:
+            model, search_field_list = search_field_dict[search_kind]
+            queryset = search_queryset(
+                model.objects.using('readonly').all(), search_field_list, text_from_search_field,
+                search_mode=search_mode, limit=limit)
+            for one_result in queryset:
+                search_results.append((getattr(one_result, 'search_name_prefix', 0),
+                                       generate_search_result_dict(search_kind, one_result)))
+        # Across all kinds of owners, the same order each query used: names starting with the search text first (in
+        #  SEARCH_MODE_PREFIX), then the most similar. sorted is stable, so ties keep each kind's database order.
+        search_results = sorted(search_results, key=lambda one_search_result: (
+            -one_search_result[0], -one_search_result[1]['result_score']))
+        search_results = [one_search_result for _, one_search_result in search_results[:limit]]
 
         status += "SEARCH_ALL_COMPLETE"
         success = True
 
     except Exception as e:
-        status = 'POLITICIAN_SEARCH: ' + str(e) + " "
+        status = 'SEARCH_ALL: ' + str(e) + " "
         success = False
+        search_results = []
 
     results = {
         'status':                   status,
         'success':                  success,
         'text_from_search_field':   text_from_search_field,
         'voter_device_id':          voter_device_id,
-        'search_results_found':     True if search_count > 0 else False,
+        'search_results_found':     True if len(search_results) > 0 else False,
         'search_results':           search_results,
     }
     return results
 
 
+def generate_search_result_dict(search_kind, one_result):
+    one_search_result = {
+        'result_title':             '',
+        'result_image':             one_result.we_vote_hosted_profile_image_url_medium
+        if hasattr(one_result, 'we_vote_hosted_profile_image_url_medium') else '',
+        'result_subtitle':          "",
+        'result_summary':           "",
+        'result_score':             int(round(one_result.search_rank * 100)),
+        'link_internal':            '',
+        'kind_of_owner':            search_kind,
+        'google_civic_election_id': 0,
+        'state_code':               '',
+        'twitter_handle':           '',
+        'we_vote_id':               one_result.we_vote_id,
+        'local_id':                 one_result.id,
+    }
+    if search_kind == SEARCH_KIND_POLITICIAN:
+        one_search_result.update({
+            'result_title':     one_result.display_full_name(),
+            'state_code':       one_result.state_code,
+            'twitter_handle':   one_result.politician_twitter_handle,
+            'twitter_handle2':  one_result.politician_twitter_handle2,
+            'twitter_handle3':  one_result.politician_twitter_handle3,
+            'twitter_handle4':  one_result.politician_twitter_handle4,
+            'twitter_handle5':  one_result.politician_twitter_handle5,
+        })
+    elif search_kind == SEARCH_KIND_CANDIDATE:
+        one_search_result.update({
+            'result_title':     one_result.display_candidate_name(),
+            'state_code':       one_result.state_code,
+            'twitter_handle':   one_result.candidate_twitter_handle,
+            'twitter_handle2':  one_result.candidate_twitter_handle2,
+            'twitter_handle3':  one_result.candidate_twitter_handle3,
+        })
+    elif search_kind == SEARCH_KIND_ORGANIZATION:
+        one_search_result.update({
+            'result_title':     one_result.organization_name,
+            'state_code':       one_result.state_served_code,
+            'twitter_handle':   one_result.organization_twitter_handle,
+        })
+    elif search_kind == SEARCH_KIND_MEASURE:
+        one_search_result.update({
+            'result_title':             one_result.measure_title,
+            'result_subtitle':          one_result.measure_subtitle,
+            'google_civic_election_id': convert_to_int(one_result.google_civic_election_id),
+            'state_code':               one_result.state_code,
+        })
+    return one_search_result
+
+
 def search_all_elastic_for_api(text_from_search_field, voter_device_id):
     """
 
@@ -0,0 +1,139 @@
+# search/controllers_database_search.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+import wevote_functions.admin
+from wevote_functions.functions import positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+SEARCH_KIND_CANDIDATE = 'CANDIDATE'
+SEARCH_KIND_MEASURE = 'MEASURE'
+SEARCH_KIND_ORGANIZATION = 'ORGANIZATION'
+SEARCH_KIND_POLITICIAN = 'POLITICIAN'
+SEARCH_KIND_LIST = [SEARCH_KIND_POLITICIAN, SEARCH_KIND_CANDIDATE, SEARCH_KIND_ORGANIZATION, SEARCH_KIND_MEASURE]
+
+SEARCH_MODE_PREFIX = 'PREFIX'  # For typeahead: the last word may be partly typed
+SEARCH_MODE_RANKED = 'RANKED'
+SEARCH_PREFIX_RESULTS_LIMIT = 10
+SEARCH_RESULTS_LIMIT = 50
+# pg_trgm can't get a trigram out of a shorter '%..%' pattern, so the GIN index would read every row
+SEARCH_TRIGRAM_MINIMUM_LENGTH = 3
+
+
+def retrieve_search_field_dict():
+    """
+    For each kind of owner, the model and the fields we search: the name first, then the other fields. The
+    create_search_indexes command builds a pg_trgm GIN index and a prefix index on every one of these fields.
+    """
+    from candidate.models import CandidateCampaign
+    from measure.models import ContestMeasure
+    from organization.models import Organization
+    from politician.models import Politician
+    return {
+        SEARCH_KIND_POLITICIAN: (Politician, [
+            'politician_name', 'politician_twitter_handle', 'politician_twitter_handle2',
+            'politician_twitter_handle3', 'politician_twitter_handle4', 'politician_twitter_handle5']),
+        SEARCH_KIND_CANDIDATE: (CandidateCampaign, [
+            'candidate_name', 'candidate_twitter_handle', 'candidate_twitter_handle2', 'candidate_twitter_handle3']),
+        SEARCH_KIND_ORGANIZATION: (Organization, ['organization_name', 'organization_twitter_handle']),
+        SEARCH_KIND_MEASURE: (ContestMeasure, ['measure_title']),
+    }
+
+
+def generate_search_word_filter(search_field_list, one_word, word_prefix=False):
+    filters = Q()
+    for search_field in search_field_list:
+        if word_prefix or len(one_word) < SEARCH_TRIGRAM_MINIMUM_LENGTH:
+            # The start of the field, or the start of any later word in it
+            filters |= Q(**{search_field + '__istartswith': one_word}) | \
+                Q(**{search_field + '__icontains': ' ' + one_word})
+        else:
+            filters |= Q(**{search_field + '__icontains': one_word})
+    return filters
+
+
+def search_queryset(queryset, search_field_list, text_from_search_field, search_mode=SEARCH_MODE_RANKED, limit=0):
+    """
+    Every word has to be found in one of the search fields, with the same UPPER(...) LIKE filters icontains always
+    used, which the pg_trgm GIN indexes serve. The results are ranked by the trigram word similarity of the whole
+    search text to the closest field. In SEARCH_MODE_PREFIX the last word only has to start a word, and names that
+    start with the search text come first. A word shorter than SEARCH_TRIGRAM_MINIMUM_LENGTH ("F", "de", "12") has to
+    start a word, and search text that short isn't ranked.
+    :param queryset:
+    :param search_field_list: The name field first
+    :param text_from_search_field:
+    :param search_mode: SEARCH_MODE_RANKED or SEARCH_MODE_PREFIX
+    :param limit:
+    :return: queryset with a search_rank between 0 and 1
+    """
+    search_word_list = text_from_search_field.split()
+    for word_index, one_word in enumerate(search_word_list):
+        word_prefix = search_mode == SEARCH_MODE_PREFIX and word_index == len(search_word_list) - 1
+        queryset = queryset.filter(generate_search_word_filter(search_field_list, one_word, word_prefix))
+
+    if len(text_from_search_field.strip()) < SEARCH_TRIGRAM_MINIMUM_LENGTH:
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    else:
+        similarity_list = [
+            Coalesce(TrigramWordSimilarity(text_from_search_field, search_field), Value(0.0), output_field=FloatField())
+            for search_field in search_field_list]
+        queryset = queryset.annotate(
+            search_rank=similarity_list[0] if len(similarity_list) == 1 else Greatest(*similarity_list))
+    order_by_list = ['-search_rank', search_field_list[0]]
+    if search_mode == SEARCH_MODE_PREFIX:
+        queryset = queryset.annotate(search_name_prefix=Case(
+            When(**{search_field_list[0] + '__istartswith': text_from_search_field}, then=Value(1)),
+            default=Value(0), output_field=IntegerField()))
+        order_by_list.insert(0, '-search_name_prefix')
+    queryset = queryset.order_by(*order_by_list)
+    if positive_value_exists(limit):
+        queryset = queryset[:limit]
+    return queryset
+
+
+def create_search_indexes(using='default'):
+    """
+    Enable pg_trgm and build a GIN trigram index on UPPER(field::text) for every search field, the expression
+    icontains and istartswith filter on, plus a text_pattern_ops btree index on it for the istartswith filters on
+    search words too short for trigrams. CONCURRENTLY, so the tables stay writable while large indexes build, which is
+    also why this runs outside migrations.
+    """
+    status = ""
+    success = True
+    index_count = 0
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for model, search_field_list in retrieve_search_field_dict().values():
+                table_name = model._meta.db_table
+                for search_field in search_field_list:
+                    column_name = model._meta.get_field(search_field).column
+                    index_name = (table_name + '_' + column_name)[:58] + '_trgm'
+                    cursor.execute(
+                        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON "{table_name}" '
+                        'USING gin ((UPPER("{column_name}"::text)) gin_trgm_ops)'.format(
+                            index_name=index_name, table_name=table_name, column_name=column_name))
+                    index_count += 1
+                    cursor.execute(
+                        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON "{table_name}" '
+                        '((UPPER("{column_name}"::text)) text_pattern_ops)'.format(
+                            index_name=(table_name + '_' + column_name)[:56] + '_prefix', table_name=table_name,
+                            column_name=column_name))
+                    index_count += 1
+        status += "SEARCH_INDEXES_CREATED "
+    except Exception as e:
+        status += "SEARCH_INDEXES_NOT_CREATED: " + str(e) + " "
+        success = False
+
+    results = {
+        'success':      success,
+        'status':       status,
+        'index_count':  index_count,
+    }
+    return results
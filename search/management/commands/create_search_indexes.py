@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from search.controllers_database_search import create_search_indexes
+
+
+class Command(BaseCommand):
+    help = 'Enables pg_trgm and builds (CONCURRENTLY, if missing) the GIN trigram indexes that searchAll and ' \
+           'ballotItemsSearchRetrieve filter and rank politicians, candidates, organizations and measures with.'
+
+    def handle(self, *args, **options):
+        results = create_search_indexes()
+        self.stdout.write("{status}{index_count} indexes".format(
+            status=results['status'], index_count=results['index_count']))
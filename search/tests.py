@@ -0,0 +1,109 @@
+# search/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+
+from candidate.models import CandidateCampaign
+from measure.models import ContestMeasure
+from politician.models import Politician
+from search.controllers import search_all_for_api
+from search.controllers_database_search import generate_search_word_filter, search_queryset, SEARCH_KIND_CANDIDATE, \
+    SEARCH_KIND_MEASURE, SEARCH_KIND_POLITICIAN, SEARCH_MODE_PREFIX
+from voter.models import Voter, VoterDeviceLink
+from wevote_functions.functions import generate_voter_device_id
+
+POLITICIAN_SEARCH_FIELD_LIST = ['politician_name', 'politician_twitter_handle']
+
+
+class SearchWordFilterTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        for politician_name in ['John F Kennedy', 'Kevin de León', 'Fred Jones', 'Dee Brown']:
+            Politician.objects.create(politician_name=politician_name)
+        ContestMeasure.objects.create(measure_title='Proposition 12')
+
+    def filter_politician_names(self, one_word, word_prefix=False):
+        return sorted(Politician.objects.filter(
+            generate_search_word_filter(POLITICIAN_SEARCH_FIELD_LIST, one_word, word_prefix=word_prefix))
+            .values_list('politician_name', flat=True))
+
+    def test_short_words_match_the_start_of_any_word(self):
+        self.assertEqual(self.filter_politician_names('F'), ['Fred Jones', 'John F Kennedy'])
+        self.assertEqual(self.filter_politician_names('de'), ['Dee Brown', 'Kevin de León'])
+        # 12 starts the second word of the title, not the title
+        self.assertEqual(ContestMeasure.objects.filter(
+            generate_search_word_filter(['measure_title'], '12')).count(), 1)
+        self.assertEqual(ContestMeasure.objects.filter(
+            generate_search_word_filter(['measure_title'], '2')).count(), 0)
+
+    def test_longer_words_match_anywhere_unless_partly_typed(self):
+        self.assertEqual(self.filter_politician_names('enn'), ['John F Kennedy'])
+        self.assertEqual(self.filter_politician_names('enn', word_prefix=True), [])
+        self.assertEqual(self.filter_politician_names('Ken', word_prefix=True), ['John F Kennedy'])
+
+    def test_every_word_is_required(self):
+        # Without the ranking, which needs pg_trgm
+        queryset = search_queryset(Politician.objects.all(), POLITICIAN_SEARCH_FIELD_LIST, 'J F Ken')
+        self.assertEqual(list(queryset.order_by().values_list('politician_name', flat=True)), ['John F Kennedy'])
+        # Search text this short isn't ranked by trigram similarity
+        queryset = search_queryset(Politician.objects.all(), POLITICIAN_SEARCH_FIELD_LIST, 'F')
+        self.assertEqual([(politician.politician_name, politician.search_rank) for politician in queryset],
+                         [('Fred Jones', 0.0), ('John F Kennedy', 0.0)])
+
+    def test_names_starting_with_the_search_text_come_first(self):
+        Politician.objects.create(politician_name='Al Deer')
+        queryset = search_queryset(
+            Politician.objects.all(), POLITICIAN_SEARCH_FIELD_LIST, 'De', search_mode=SEARCH_MODE_PREFIX, limit=2)
+        self.assertEqual([politician.politician_name for politician in queryset], ['Dee Brown', 'Al Deer'])
+
+
+def generate_searched_owner(search_rank, search_name_prefix, we_vote_id):
+    return SimpleNamespace(
+        id=0, search_rank=search_rank, search_name_prefix=search_name_prefix, we_vote_id=we_vote_id,
+        display_full_name=lambda: we_vote_id, display_candidate_name=lambda: we_vote_id,
+        measure_title=we_vote_id, measure_subtitle='', google_civic_election_id='0',
+        state_code='', politician_twitter_handle='', politician_twitter_handle2='', politician_twitter_handle3='',
+        politician_twitter_handle4='', politician_twitter_handle5='', candidate_twitter_handle='',
+        candidate_twitter_handle2='', candidate_twitter_handle3='')
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' voter device link query see the link saved here
+class SearchAllForApiTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        voter = Voter.objects.create()
+        self.voter_device_id = generate_voter_device_id()
+        VoterDeviceLink.objects.create(voter_device_id=self.voter_device_id, voter_id=voter.id)
+
+    def search_kinds(self, search_scope_list):
+        with mock.patch('search.controllers.search_queryset', return_value=[]) as search_queryset_mock:
+            results = search_all_for_api('Ken', self.voter_device_id, search_scope_list)
+        self.assertTrue(results['success'])
+        return [call.args[0].model for call in search_queryset_mock.call_args_list]
+
+    def test_search_scope(self):
+        # PN is what the WebApp has always sent, and unknown or repeated scopes are skipped
+        self.assertEqual(self.search_kinds(['PN', SEARCH_KIND_POLITICIAN, 'OFFICE', SEARCH_KIND_CANDIDATE]),
+                         [Politician, CandidateCampaign])
+        self.assertEqual(self.search_kinds([SEARCH_KIND_MEASURE]), [ContestMeasure])
+        self.assertEqual(self.search_kinds([]), [Politician])
+        self.assertEqual(self.search_kinds(['OFFICE']), [Politician])
+
+    def test_names_starting_with_the_search_text_come_first_across_kinds(self):
+        searched_owner_dict = {
+            Politician: [generate_searched_owner(0.9, 0, 'wvpol1'), generate_searched_owner(0.3, 0, 'wvpol2')],
+            ContestMeasure: [generate_searched_owner(0.5, 1, 'wvmeas1'), generate_searched_owner(0.9, 0, 'wvmeas2')],
+        }
+        with mock.patch('search.controllers.search_queryset',
+                        side_effect=lambda queryset, *args, **kwargs: searched_owner_dict[queryset.model]):
+            results = search_all_for_api(
+                'Ken', self.voter_device_id, [SEARCH_KIND_POLITICIAN, SEARCH_KIND_MEASURE],
+                search_mode=SEARCH_MODE_PREFIX)
+        self.assertEqual([search_result['we_vote_id'] for search_result in results['search_results']],
+                         ['wvmeas1', 'wvpol1', 'wvmeas2', 'wvpol2'])
@@ -62,6 +62,10 @@ from sms.controllers import delete_sms_phone_number_entries_for_voter, move_sms_
 from stripe_donations.controllers import move_donation_info_to_another_voter
 from twitter.models import TwitterLinkToOrganization, TwitterLinkToVoter, TwitterUserManager
 from voter.controllers_contacts import delete_all_voter_contact_emails_for_voter
+from voter.controllers_voter_device_cache import invalidate_cached_voter_identity
+from voter.controllers_voter_heal_queue import enqueue_voter_heal, generate_organization_fields_heal, \
+    generate_voter_ballot_address_heal, generate_voter_device_link_state_code_heal, generate_voter_fields_heal, \
+    record_voter_heal_write_skipped
 from voter.models import Voter, VoterAddress, VoterDeviceLinkManager, VoterManager, VoterMergeLog, \
     MAINTENANCE_STATUS_FLAGS_TASK_ONE, \
     NOTIFICATION_FRIEND_REQUESTS_EMAIL, NOTIFICATION_SUGGESTED_FRIENDS_EMAIL, \
@@ -3706,6 +3710,9 @@ def voter_merge_two_accounts_action(  # voterMergeTwoAccounts, part 2
                  ' seconds, final_position_repair took ' + "{:.6f}".format(final_position_repair_duration) +
                  ' seconds, total took ' + "{:.6f}".format(time_difference) + ' seconds')
 
+    # The devices of from_voter now belong to to_voter
+    invalidate_cached_voter_identity(voter_id_list=[from_voter_id, to_voter_id])
+
     results = {
         'status':   status,
         'success':  success,
@@ -3813,6 +3820,8 @@ def voter_retrieve_for_api(  # voterRetrieve
     repair_twitter_link_to_voter_caching_now = False
     repair_facebook_link_to_voter_caching_now = False
     facebook_user = None
+    # The fields to heal on the voter. voterRetrieve only reads: the fixes are queued, and the response shows them
+    voter_field_values = {}
 
     status = "VOTER_RETRIEVE_START "
 
@@ -3831,8 +3840,8 @@ def voter_retrieve_for_api(  # voterRetrieve
             }
             return json_data
 
-        voter_device_link_results = \
-            voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(voter_device_id)
+        voter_device_link_results = voter_device_link_manager.retrieve_voter_device_link_from_voter_device_id(
+            voter_device_id, read_only=True)
         if voter_device_link_results['voter_device_link_found']:
             voter_device_link = voter_device_link_results['voter_device_link']
             voter_id = voter_device_link.voter_id
@@ -3895,20 +3904,30 @@ def voter_retrieve_for_api(  # voterRetrieve
             return json_data
 
     # At this point, we should have a valid voter_id
-    voter_read_only = True
     results = voter_manager.retrieve_voter_by_id(voter_id, read_only=True)
     if results['voter_found']:
         voter = results['voter']
+        # What we read, for the heal to check the primary still has before saving
+        voter_field_values_read = {
+            field_name: getattr(voter, field_name)
+            for field_name in ['twitter_id', 'twitter_screen_name', 'linked_organization_we_vote_id']}
 
         if voter_created:
             status += 'VOTER_CREATED '
         else:
             status += 'VOTER_FOUND '
 
-        # Save state_code found via IP address
+        # Save state_code found via IP address. update_voter_device_link_with_state_code also clears the election,
+        #  so we only skip it when that is already done too.
         if positive_value_exists(state_code_from_ip_address):
-            voter_device_link_manager.update_voter_device_link_with_state_code(
-                voter_device_link, state_code_from_ip_address)
+            if voter_device_link.state_code == state_code_from_ip_address and \
+                    not positive_value_exists(voter_device_link.google_civic_election_id) and \
+                    voter_device_link.date_election_last_changed is None:
+                record_voter_heal_write_skipped()
+            else:
+                heal_results = enqueue_voter_heal(generate_voter_device_link_state_code_heal(
+                    voter_device_link, state_code_from_ip_address))
+                status += heal_results['status']
 
         twitter_link_to_voter_twitter_id = 0
         # 2018-07-17 DALE Trying with this off
@@ -3931,22 +3950,13 @@ def voter_retrieve_for_api(  # voterRetrieve
                 twitter_link_to_organization_we_vote_id = twitter_link_to_organization.organization_we_vote_id
         else:
             if positive_value_exists(voter.twitter_screen_name) or positive_value_exists(voter.twitter_id):
-                # If the voter has cached twitter information, delete it now because there isn't a
+                # If the voter has cached twitter information, delete it because there isn't a
                 #  twitter_link_to_voter entry
-                # Pull voter object we can save
-                if voter_read_only:
-                    results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                    if results['voter_found']:
-                        voter = results['voter']
-                        voter_read_only = False
-                try:
-                    voter.twitter_id = 0
-                    voter.twitter_screen_name = ""
-                    voter.save()
-                    status += "VOTER_TWITTER_CLEARED1 "
-                    repair_twitter_link_to_voter_caching_now = True
-                except Exception as e:
-                    status += "UNABLE_TO_CLEAR_TWITTER_SCREEN_NAME1 "
+                voter.twitter_id = 0
+                voter.twitter_screen_name = ""
+                voter_field_values.update({'twitter_id': 0, 'twitter_screen_name': ""})
+                status += "VOTER_TWITTER_CLEARED1 "
+                repair_twitter_link_to_voter_caching_now = True
 
         if positive_value_exists(twitter_link_to_voter_twitter_id) and \
                 positive_value_exists(twitter_link_to_organization_twitter_id) and \
@@ -3956,19 +3966,10 @@ def voter_retrieve_for_api(  # voterRetrieve
             status += "VERIFYING_TWITTER_LINK_TO_ORGANIZATION "
             if voter.linked_organization_we_vote_id != twitter_link_to_organization_we_vote_id:
                 # If here there is a mismatch to fix
-                if voter_read_only:
-                    # Pull voter object we can save
-                    results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                    if results['voter_found']:
-                        voter = results['voter']
-                        voter_read_only = False
-                try:
-                    voter.linked_organization_we_vote_id = twitter_link_to_organization_we_vote_id
-                    voter.save()
-                    repair_twitter_link_to_voter_caching_now = True
-                    status += "VOTER_LINKED_ORGANIZATION_FIXED "
-                except Exception as e:
-                    status += "VOTER_LINKED_ORGANIZATION_COULD_NOT_BE_FIXED " + str(e) + " "
+                voter.linked_organization_we_vote_id = twitter_link_to_organization_we_vote_id
+                voter_field_values['linked_organization_we_vote_id'] = twitter_link_to_organization_we_vote_id
+                repair_twitter_link_to_voter_caching_now = True
+                status += "VOTER_LINKED_ORGANIZATION_FIXED "
 
         if positive_value_exists(voter.linked_organization_we_vote_id):
             existing_organization_for_this_voter_found = True
@@ -3986,53 +3987,29 @@ def voter_retrieve_for_api(  # voterRetrieve
                 twitter_link_to_voter = twitter_link_results['twitter_link_to_voter']
                 if not positive_value_exists(twitter_link_to_voter.twitter_id):
                     if positive_value_exists(voter.twitter_screen_name) or positive_value_exists(voter.twitter_id):
-                        if voter_read_only:
-                            # Pull voter object we can save
-                            results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                            if results['voter_found']:
-                                voter = results['voter']
-                                voter_read_only = False
-                        try:
-                            voter.twitter_id = 0
-                            voter.twitter_screen_name = ""
-                            voter.save()
-                            status += "VOTER_TWITTER_CLEARED2 "
-                        except Exception as e:
-                            status += "UNABLE_TO_CLEAR_TWITTER_SCREEN_NAME2: " + str(e) + " "
+                        voter.twitter_id = 0
+                        voter.twitter_screen_name = ""
+                        voter_field_values.update({'twitter_id': 0, 'twitter_screen_name': ""})
+                        status += "VOTER_TWITTER_CLEARED2 "
                 else:
                     # If here there is a twitter_link_to_voter to possibly update
                     try:
-                        value_to_save = False
                         twitter_link_to_voter_twitter_id = twitter_link_to_voter.twitter_id
                         if voter.twitter_id == twitter_link_to_voter_twitter_id:
                             status += "VOTER_TWITTER_ID_MATCHES "
                         else:
                             status += "VOTER_TWITTER_ID_DOES_NOT_MATCH_LINKED_TO_VOTER "
-                            if voter_read_only:
-                                # Pull voter object we can save
-                                results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                                if results['voter_found']:
-                                    voter = results['voter']
-                                    voter_read_only = False
                             voter.twitter_id = twitter_link_to_voter_twitter_id
-                            value_to_save = True
+                            voter_field_values['twitter_id'] = twitter_link_to_voter_twitter_id
+                            repair_twitter_link_to_voter_caching_now = True
 
                         voter_twitter_screen_name = twitter_link_to_voter.fetch_twitter_handle_locally_or_remotely()
                         if voter.twitter_screen_name == voter_twitter_screen_name:
                             status += "VOTER_TWITTER_SCREEN_NAME_MATCHES "
                         else:
                             status += "VOTER_TWITTER_SCREEN_NAME_DOES_NOT_MATCH_LINKED_TO_VOTER "
-                            if voter_read_only:
-                                # Pull voter object we can save
-                                results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                                if results['voter_found']:
-                                    voter = results['voter']
-                                    voter_read_only = False
                             voter.twitter_screen_name = voter_twitter_screen_name
-                            value_to_save = True
-
-                        if value_to_save:
-                            voter.save()
+                            voter_field_values['twitter_screen_name'] = voter_twitter_screen_name
                             repair_twitter_link_to_voter_caching_now = True
                     except Exception as e:
                         status += "UNABLE_TO_SAVE_VOTER_TWITTER_CACHED_INFO: " + str(e) + " "
@@ -4050,21 +4027,11 @@ def voter_retrieve_for_api(  # voterRetrieve
                         if positive_value_exists(twitter_link_to_organization.organization_we_vote_id):
                             if twitter_link_to_organization.organization_we_vote_id \
                                     != voter.linked_organization_we_vote_id:
-                                if voter_read_only:
-                                    # Pull voter object we can save
-                                    results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                                    if results['voter_found']:
-                                        voter = results['voter']
-                                        voter_read_only = False
-                                try:
-                                    voter.linked_organization_we_vote_id = \
-                                        twitter_link_to_organization.organization_we_vote_id
-                                    voter.save()
-                                    existing_organization_for_this_voter_found = True
-
-                                except Exception as e:
-                                    status += "UNABLE_TO_SAVE_LINKED_ORGANIZATION_FROM_TWITTER_LINK_TO_VOTER " + \
-                                              str(e) + " "
+                                voter.linked_organization_we_vote_id = \
+                                    twitter_link_to_organization.organization_we_vote_id
+                                voter_field_values['linked_organization_we_vote_id'] = \
+                                    twitter_link_to_organization.organization_we_vote_id
+                                existing_organization_for_this_voter_found = True
                     else:
                         # If an existing TwitterLinkToOrganization was not found,
                         # create the organization below, and then create TwitterLinkToOrganization
@@ -4089,15 +4056,12 @@ def voter_retrieve_for_api(  # voterRetrieve
                     # Add value to twitter_owner_voter.linked_organization_we_vote_id when done.
                     organization = create_results['organization']
                     status += "ORGANIZATION_CREATED "
-                    if voter_read_only:
-                        # Pull voter object we can save
-                        results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                        if results['voter_found']:
-                            voter = results['voter']
-                            voter_read_only = False
                     try:
+                        # This write isn't queued: the new organization is needed now, and is only made once.
+                        #  voter was read from the replica, so we name the primary and only save this field.
                         voter.linked_organization_we_vote_id = organization.we_vote_id
-                        voter.save()
+                        voter.save(using='default', update_fields=['linked_organization_we_vote_id'])
+                        voter_field_values.pop('linked_organization_we_vote_id', None)
                         existing_organization_for_this_voter_found = True
                         if create_twitter_link_to_organization:
                             create_results = twitter_user_manager.create_twitter_link_to_organization(
@@ -4134,39 +4098,38 @@ def voter_retrieve_for_api(  # voterRetrieve
 
                     organization_results = \
                         OrganizationManager().retrieve_organization_from_we_vote_id(
-                            voter.linked_organization_we_vote_id)
+                            voter.linked_organization_we_vote_id, read_only=True)
                     if organization_results['organization_found']:
                         try:
                             organization = organization_results['organization']
                             status += "FACEBOOK-ORGANIZATION_FOUND "
-                            save_organization = False
+                            organization_field_values = {}
+                            organization_empty_field_values = {}
                             # Look at the linked_organization for the voter and update with latest
-                            if positive_value_exists(facebook_user.facebook_profile_image_url_https):
-                                facebook_profile_image_different = \
-                                    not positive_value_exists(organization.facebook_profile_image_url_https) \
-                                    or facebook_user.facebook_profile_image_url_https != \
-                                    organization.facebook_profile_image_url_https
-                                if facebook_profile_image_different:
-                                    organization.facebook_profile_image_url_https = \
-                                        facebook_user.facebook_profile_image_url_https
-                                    save_organization = True
+                            if positive_value_exists(facebook_user.facebook_profile_image_url_https) and \
+                                    facebook_user.facebook_profile_image_url_https != \
+                                    organization.facebook_profile_image_url_https:
+                                organization_field_values['facebook_profile_image_url_https'] = \
+                                    facebook_user.facebook_profile_image_url_https
                             if positive_value_exists(facebook_user.facebook_background_image_url_https) and \
                                     not positive_value_exists(organization.facebook_background_image_url_https):
-                                organization.facebook_background_image_url_https = \
+                                organization_empty_field_values['facebook_background_image_url_https'] = \
                                     facebook_user.facebook_background_image_url_https
-                                save_organization = True
                             if positive_value_exists(facebook_user.facebook_user_id) and \
                                     not positive_value_exists(organization.facebook_id):
-                                organization.facebook_id = facebook_user.facebook_user_id
-                                save_organization = True
+                                organization_empty_field_values['facebook_id'] = facebook_user.facebook_user_id
                             if positive_value_exists(facebook_user.facebook_email) and \
                                     not positive_value_exists(organization.facebook_email):
-                                organization.facebook_email = facebook_user.facebook_email
-                                save_organization = True
-                            if save_organization:
+                                organization_empty_field_values['facebook_email'] = facebook_user.facebook_email
+                            if organization_field_values or organization_empty_field_values:
                                 repair_facebook_link_to_voter_caching_now = True
-                                organization.save()
-                                status += "FACEBOOK-ORGANIZATION_SAVED "
+                                heal_results = enqueue_voter_heal(generate_organization_fields_heal(
+                                    organization.we_vote_id, organization_field_values,
+                                    organization_empty_field_values,
+                                    expected_field_values={
+                                        field_name: getattr(organization, field_name)
+                                        for field_name in organization_field_values}))
+                                status += heal_results['status']
                         except Exception as e:
                             status += "FAILED_UPDATE_OR_CREATE_ORGANIZATION: " + str(e)
                             logger.error('FAILED organization_manager.update_or_create_organization. '
@@ -4193,24 +4156,25 @@ def voter_retrieve_for_api(  # voterRetrieve
             if create_results['organization_created']:
                 # Add value to twitter_owner_voter.linked_organization_we_vote_id when done.
                 organization = create_results['organization']
-                if voter_read_only:
-                    # Pull voter object we can save
-                    results = voter_manager.retrieve_voter_by_id(voter_id, read_only=False)
-                    if results['voter_found']:
-                        voter = results['voter']
-                        voter_read_only = False
                 try:
                     voter.linked_organization_we_vote_id = organization.we_vote_id
-                    voter.save()
+                    # voter was read from the replica, so we name the primary and only save this field
+                    voter.save(using='default', update_fields=['linked_organization_we_vote_id'])
+                    voter_field_values.pop('linked_organization_we_vote_id', None)
                     status += "ORGANIZATION_CREATED "
                 except Exception as e:
                     status += "UNABLE_TO_CREATE_NEW_ORGANIZATION_TO_VOTER_FROM_RETRIEVE_VOTER2: " + str(e) + " "
 
-        if repair_twitter_link_to_voter_caching_now:
-            # If here then we know that we have a twitter_link_to_voter, and there was some data cleanup done
-            repair_results = voter_manager.repair_twitter_related_voter_caching(
-                twitter_link_to_voter.twitter_id)
-            status += repair_results['status']
+        if voter_field_values or repair_twitter_link_to_voter_caching_now:
+            # If we have a twitter_link_to_voter and there was some data cleanup, the cached twitter values of the
+            #  voters sharing the Twitter account are repaired after the cleanup is saved
+            repair_twitter_user_id = twitter_link_to_voter.twitter_id if repair_twitter_link_to_voter_caching_now else 0
+            heal_results = enqueue_voter_heal(generate_voter_fields_heal(
+                voter_id, voter_field_values,
+                expected_field_values={
+                    field_name: voter_field_values_read[field_name] for field_name in voter_field_values},
+                repair_twitter_user_id=repair_twitter_user_id))
+            status += heal_results['status']
 
         # TODO DALE: Add if repair_facebook_link_to_voter_caching_now
         is_bot = user_agent_object.is_bot or robot_detection.is_robot(user_agent_string)
@@ -4278,7 +4242,7 @@ def voter_retrieve_for_api(  # voterRetrieve
 
         address_results = voter_address_retrieve_for_voter_id(voter_id)
         if address_results['success'] and not address_results['address_found']:
-            # Create new address
+            # Queue a new address. voterBallotItemsRetrieve makes the same guess if it runs before the address is saved
             if 'voter_location_found' not in voter_location_results:
                 voter_location_results = voter_location_retrieve_from_ip_for_api(request)
             if voter_location_results['voter_location_found']:
@@ -4286,14 +4250,10 @@ def voter_retrieve_for_api(  # voterRetrieve
                 text_for_map_search = voter_location_results['voter_location']
                 status += '*** ' + text_for_map_search + ' ***, '
 
-                from voter.models import VoterAddressManager
-                voter_address_manager = VoterAddressManager()
-                voter_address_save_results = voter_address_manager.update_or_create_voter_address(
-                    voter_id, BALLOT_ADDRESS, text_for_map_search)
-                status += voter_address_save_results['status'] + ", "
-
-                if voter_address_save_results['success'] and voter_address_save_results['voter_address_found']:
-                    address_results = voter_address_retrieve_for_voter_id(voter_id)
+                heal_results = enqueue_voter_heal(generate_voter_ballot_address_heal(voter_id, text_for_map_search))
+                status += heal_results['status']
+                address_results['address_type'] = BALLOT_ADDRESS
+                address_results['text_for_map_search'] = text_for_map_search
 
         team_member_list = organization_manager.retrieve_team_member_list(
             can_edit_campaignx_owned_by_organization=True,
@@ -4811,11 +4771,13 @@ def voter_sign_out_for_api(voter_device_id, sign_out_all_devices=False):  # vote
                         email_address_object.normalized_email_address)
                     status += refresh_results['status']
 
+    voter_id = fetch_voter_id_from_voter_device_link(voter_device_id)
     if positive_value_exists(sign_out_all_devices):
         results = voter_device_link_manager.delete_all_voter_device_links(voter_device_id)
     else:
         results = voter_device_link_manager.delete_voter_device_link(voter_device_id)
     status += results['status']
+    invalidate_cached_voter_identity(voter_device_id=voter_device_id, voter_id_list=[voter_id])
 
     results = {
         'success':  results['success'],
@@ -0,0 +1,172 @@
+# voter/controllers_voter_device_cache.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# One API request often resolves the same voter_device_id three or four times. VoterIdentityCacheMiddleware gives each
+# request its own memo of the VoterDeviceLinks and Voters already retrieved read-only. With SHARED_CACHE_LOCATION,
+# the read-only VoterDeviceLink lookup is also kept in the shared cache for VOTER_DEVICE_LINK_CACHE_TTL_SECONDS.
+# Every save or delete of a VoterDeviceLink or Voter drops it from both (see the receivers in voter/models.py).
+# Without SHARED_CACHE_LOCATION nothing is kept between requests: the shared cache is then each worker's own memory,
+# and signing in or out on one worker has to show on every other worker right away.
+
+from contextvars import ContextVar
+import copy
+import hashlib
+
+from django.core.cache import caches
+
+from config.base import get_environment_variable_default, SHARED_CACHE_LOCATION
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+VOTER_DEVICE_LINK_CACHE_TTL_SECONDS = \
+    convert_to_int(get_environment_variable_default('VOTER_DEVICE_LINK_CACHE_TTL_SECONDS', 30))
+
+# The memo of the request being handled, or None outside of VoterIdentityCacheMiddleware (e.g. management commands)
+request_identity_cache = ContextVar('request_identity_cache', default=None)
+
+
+def start_request_identity_cache():
+    """
+    :return: token for end_request_identity_cache
+    """
+    return request_identity_cache.set({
+        'voter_device_link_by_voter_device_id': {},
+        'voter_by_id':                          {},
+    })
+
+
+def end_request_identity_cache(token):
+    request_identity_cache.reset(token)
+
+
+def is_voter_device_link_shared_cache_on():
+    return positive_value_exists(SHARED_CACHE_LOCATION)
+
+
+def generate_voter_device_link_cache_key(voter_device_id):
+    # voter_device_id is a secret, so we don't use it in the key as it is
+    return "voter_device_link:" + hashlib.sha256(voter_device_id.encode('utf-8')).hexdigest()
+
+
+def retrieve_cached_voter_device_link(voter_device_id):
+    """
+    :param voter_device_id:
+    :return: VoterDeviceLink retrieved read-only earlier in this request, or recently in any request with
+      SHARED_CACHE_LOCATION, or None. Each caller gets its own copy.
+    """
+    if not positive_value_exists(voter_device_id):
+        return None
+    request_cache = request_identity_cache.get()
+    if request_cache is not None and voter_device_id in request_cache['voter_device_link_by_voter_device_id']:
+        return copy.copy(request_cache['voter_device_link_by_voter_device_id'][voter_device_id])
+    if not is_voter_device_link_shared_cache_on():
+        return None
+    try:
+        voter_device_link = caches['shared'].get(generate_voter_device_link_cache_key(voter_device_id))
+    except Exception as e:
+        logger.error("VOTER_DEVICE_LINK_SHARED_CACHE_ERROR: " + str(e))
+        voter_device_link = None
+    if voter_device_link is not None and request_cache is not None:
+        request_cache['voter_device_link_by_voter_device_id'][voter_device_id] = copy.copy(voter_device_link)
+    return voter_device_link
+
+
+def cache_voter_device_link(voter_device_link):
+    """
+    Only for VoterDeviceLinks retrieved read-only
+    :param voter_device_link:
+    :return:
+    """
+    voter_device_id = voter_device_link.voter_device_id
+    if not positive_value_exists(voter_device_id):
+        return
+    request_cache = request_identity_cache.get()
+    if request_cache is not None:
+        request_cache['voter_device_link_by_voter_device_id'][voter_device_id] = copy.copy(voter_device_link)
+    if not is_voter_device_link_shared_cache_on():
+        return
+    try:
+        caches['shared'].set(generate_voter_device_link_cache_key(voter_device_id), voter_device_link,
+                             VOTER_DEVICE_LINK_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.error("VOTER_DEVICE_LINK_SHARED_CACHE_SET_ERROR: " + str(e))
+
+
+def invalidate_cached_voter_device_link(voter_device_id):
+    invalidate_cached_voter_device_links([voter_device_id])
+
+
+def invalidate_cached_voter_device_links(voter_device_id_list):
+    voter_device_id_list = [voter_device_id for voter_device_id in voter_device_id_list
+                            if positive_value_exists(voter_device_id)]
+    request_cache = request_identity_cache.get()
+    if request_cache is not None:
+        for voter_device_id in voter_device_id_list:
+            request_cache['voter_device_link_by_voter_device_id'].pop(voter_device_id, None)
+    if not is_voter_device_link_shared_cache_on() or not len(voter_device_id_list):
+        return
+    try:
+        caches['shared'].delete_many([generate_voter_device_link_cache_key(voter_device_id)
+                                      for voter_device_id in voter_device_id_list])
+    except Exception as e:
+        logger.error("VOTER_DEVICE_LINK_SHARED_CACHE_DELETE_ERROR: " + str(e))
+
+
+def retrieve_cached_voter(voter_id):
+    """
+    :param voter_id:
+    :return: Voter retrieved read-only earlier in this request, or None. Each caller gets its own copy.
+    """
+    request_cache = request_identity_cache.get()
+    if request_cache is None or voter_id not in request_cache['voter_by_id']:
+        return None
+    return copy.copy(request_cache['voter_by_id'][voter_id])
+
+
+def cache_voter(voter):
+    """
+    Only for Voters retrieved read-only
+    :param voter:
+    :return:
+    """
+    request_cache = request_identity_cache.get()
+    if request_cache is not None and positive_value_exists(voter.id):
+        request_cache['voter_by_id'][voter.id] = copy.copy(voter)
+
+
+def invalidate_cached_voter(voter_id):
+    request_cache = request_identity_cache.get()
+    if request_cache is not None:
+        request_cache['voter_by_id'].pop(voter_id, None)
+
+
+def invalidate_cached_voter_identity(voter_device_id='', voter_id_list=None):
+    """
+    For voterSignOut and account merges, which change which voter a device belongs to, often with a queryset update
+    that sends no post_save. Drops the device, the voters and every device of those voters from this request's memo
+    and the shared cache.
+    :param voter_device_id:
+    :param voter_id_list:
+    :return:
+    """
+    voter_id_list = [voter_id for voter_id in voter_id_list or [] if positive_value_exists(voter_id)]
+    voter_device_id_list = [voter_device_id]
+    request_cache = request_identity_cache.get()
+    for voter_id in voter_id_list:
+        invalidate_cached_voter(voter_id)
+        if request_cache is not None:
+            voter_device_id_list += [
+                cached_voter_device_id for cached_voter_device_id, voter_device_link
+                in request_cache['voter_device_link_by_voter_device_id'].items()
+                if voter_device_link.voter_id == voter_id]
+    if is_voter_device_link_shared_cache_on() and len(voter_id_list):
+        from voter.models import VoterDeviceLink
+        try:
+            voter_device_id_list += list(VoterDeviceLink.objects.filter(voter_id__in=voter_id_list)
+                                         .values_list('voter_device_id', flat=True))
+        except Exception as e:
+            logger.error("VOTER_DEVICE_LINK_SHARED_CACHE_VOTER_DEVICES_ERROR: " + str(e))
+    invalidate_cached_voter_device_links(voter_device_id_list)
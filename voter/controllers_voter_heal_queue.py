@@ -0,0 +1,503 @@
+# voter/controllers_voter_heal_queue.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+# voterRetrieve runs on every page load, so it no longer writes to the primary database when it finds a voter whose
+# cached Twitter values, linked organization, Facebook organization values, device state code or ballot address need
+# repair. It queues a heal instead and answers from what it read. A thread in each worker applies the queued heals in
+# batches, checking each one against the primary database first: a heal carries the values voterRetrieve read, and is
+# dropped if the record has been changed since, e.g. by a sign in. Heals of the same kind for the same record are
+# merged while they wait, so a voter reloading the page ten times costs one write.
+# The queue is only in memory: a heal lost when a worker stops is found again on the voter's next voterRetrieve.
+
+import atexit
+import os
+import socket
+import sys
+from threading import Event, Lock, Thread
+import time
+
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.utils.timezone import now
+
+from config.base import get_environment_variable_default
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+VOTER_HEAL_QUEUE_ENABLED = positive_value_exists(get_environment_variable_default('VOTER_HEAL_QUEUE_ENABLED', True))
+# Heals wait in this worker's memory until there are this many, or this many seconds have passed
+VOTER_HEAL_QUEUE_FLUSH_SIZE = convert_to_int(get_environment_variable_default('VOTER_HEAL_QUEUE_FLUSH_SIZE', 100))
+VOTER_HEAL_QUEUE_FLUSH_SECONDS = convert_to_int(get_environment_variable_default('VOTER_HEAL_QUEUE_FLUSH_SECONDS', 5))
+VOTER_HEAL_QUEUE_STATS_TTL_SECONDS = 10 * 60
+# Each worker stores its stats under one of this many keys, claimed with cache.add so no two workers share one
+VOTER_HEAL_QUEUE_STATS_SLOT_COUNT = 100
+
+# Set state_code on a VoterDeviceLink, the way update_voter_device_link_with_state_code does
+HEAL_VOTER_DEVICE_LINK_STATE_CODE = 'VOTER_DEVICE_LINK_STATE_CODE'
+# Set fields on a Voter, then repair the cached Twitter values of the voters sharing its Twitter account
+HEAL_VOTER_FIELDS = 'VOTER_FIELDS'
+# Set fields on an Organization, some only if they are still empty
+HEAL_ORGANIZATION_FIELDS = 'ORGANIZATION_FIELDS'
+# Save the location found from the voter's IP address as the ballot address, if the voter still has none
+HEAL_VOTER_BALLOT_ADDRESS = 'VOTER_BALLOT_ADDRESS'
+
+
+def generate_voter_device_link_state_code_heal(voter_device_link, state_code):
+    """
+    :param voter_device_link: As voterRetrieve read it
+    :param state_code:
+    :return:
+    """
+    return {
+        'heal_type':                HEAL_VOTER_DEVICE_LINK_STATE_CODE,
+        'voter_device_link_id':     voter_device_link.id,
+        'state_code':               state_code,
+        # The heal also clears the election, which the voter may have chosen since
+        'expected_field_values':    {
+            'state_code':               voter_device_link.state_code,
+            'google_civic_election_id': voter_device_link.google_civic_election_id,
+        },
+    }
+
+
+def generate_voter_fields_heal(voter_id, field_values, expected_field_values=None, repair_twitter_user_id=0):
+    """
+    :param voter_id:
+    :param field_values: dict of the values to save by field name
+    :param expected_field_values: dict of the values voterRetrieve read by field name. The heal is dropped if the
+      primary database has neither this value nor the one to save in one of these fields.
+    :param repair_twitter_user_id: Call repair_twitter_related_voter_caching for this Twitter account afterwards
+    :return:
+    """
+    return {
+        'heal_type':                HEAL_VOTER_FIELDS,
+        'voter_id':                 voter_id,
+        'field_values':             field_values,
+        'expected_field_values':    expected_field_values or {},
+        'repair_twitter_user_ids':  [repair_twitter_user_id] if positive_value_exists(repair_twitter_user_id) else [],
+    }
+
+
+def generate_organization_fields_heal(organization_we_vote_id, field_values=None, empty_field_values=None,
+                                      expected_field_values=None):
+    """
+    :param organization_we_vote_id:
+    :param field_values: dict of the values to save by field name
+    :param empty_field_values: dict of the values to save by field name, for the fields that are still empty
+    :param expected_field_values: dict of the values voterRetrieve read by field name, for field_values
+    :return:
+    """
+    return {
+        'heal_type':                HEAL_ORGANIZATION_FIELDS,
+        'organization_we_vote_id':  organization_we_vote_id,
+        'field_values':             field_values or {},
+        'empty_field_values':       empty_field_values or {},
+        'expected_field_values':    expected_field_values or {},
+    }
+
+
+def generate_voter_ballot_address_heal(voter_id, text_for_map_search):
+    return {
+        'heal_type':                HEAL_VOTER_BALLOT_ADDRESS,
+        'voter_id':                 voter_id,
+        'text_for_map_search':      text_for_map_search,
+    }
+
+
+def generate_voter_heal_key(heal):
+    if heal['heal_type'] == HEAL_VOTER_DEVICE_LINK_STATE_CODE:
+        return heal['heal_type'], heal['voter_device_link_id']
+    if heal['heal_type'] == HEAL_ORGANIZATION_FIELDS:
+        return heal['heal_type'], heal['organization_we_vote_id']
+    return heal['heal_type'], heal['voter_id']
+
+
+def merge_voter_heals(earlier_heal, later_heal):
+    """
+    One heal with the values of both, the later values winning
+    """
+    merged_heal = dict(later_heal)
+    for key in ['field_values', 'empty_field_values', 'expected_field_values']:
+        if key in earlier_heal:
+            merged_heal[key] = dict(earlier_heal[key], **later_heal[key])
+    if 'repair_twitter_user_ids' in earlier_heal:
+        merged_heal['repair_twitter_user_ids'] = list(dict.fromkeys(
+            earlier_heal['repair_twitter_user_ids'] + later_heal['repair_twitter_user_ids']))
+    return merged_heal
+
+
+def is_voter_heal_out_of_date(record, field_values, expected_field_values):
+    """
+    :param record: As read from the primary database
+    :param field_values: dict of the values the heal saves by field name
+    :param expected_field_values: dict of the values voterRetrieve read by field name
+    :return: True if a field the heal would change has been changed by something else since voterRetrieve read it,
+      so the heal was worked out from values that no longer hold
+    """
+    for field_name, value in field_values.items():
+        current_value = getattr(record, field_name)
+        if current_value != value and field_name in expected_field_values and \
+                current_value != expected_field_values[field_name]:
+            return True
+    return False
+
+
+def apply_voter_heal_list(heal_list):
+    """
+    Applies the heals which still need applying, reading each record from the primary database first and only saving
+    the fields that are still different. Heals that are out of date are dropped: if they are still needed, the
+    voter's next voterRetrieve queues them again from the current values.
+    :param heal_list: Heals from the generate_*_heal functions, at most one per generate_voter_heal_key
+    :return: results with primary_writes, the number of records saved, heals_already_applied and heals_out_of_date
+    """
+    from organization.models import Organization
+    from voter.models import BALLOT_ADDRESS, Voter, VoterAddressManager, VoterDeviceLink, VoterDeviceLinkManager, \
+        VoterManager
+    status = ""
+    success = True
+    primary_writes = 0
+    heals_already_applied = 0
+    heals_out_of_date = 0
+    heal_list_by_type = {}
+    for heal in heal_list:
+        heal_list_by_type.setdefault(heal['heal_type'], []).append(heal)
+
+    # VoterDeviceLinks
+    heal_by_id = {heal['voter_device_link_id']: heal
+                  for heal in heal_list_by_type.get(HEAL_VOTER_DEVICE_LINK_STATE_CODE, [])}
+    if heal_by_id:
+        voter_device_link_manager = VoterDeviceLinkManager()
+        try:
+            for voter_device_link in VoterDeviceLink.objects.filter(id__in=list(heal_by_id.keys())):
+                heal = heal_by_id[voter_device_link.id]
+                state_code = heal['state_code']
+                # update_voter_device_link_with_state_code also sets google_civic_election_id to 0
+                if voter_device_link.state_code == state_code and \
+                        not positive_value_exists(voter_device_link.google_civic_election_id) and \
+                        voter_device_link.date_election_last_changed is None:
+                    heals_already_applied += 1
+                    continue
+                if is_voter_heal_out_of_date(
+                        voter_device_link, {'state_code': state_code, 'google_civic_election_id': 0},
+                        heal.get('expected_field_values', {})):
+                    heals_out_of_date += 1
+                    continue
+                results = voter_device_link_manager.update_voter_device_link_with_state_code(
+                    voter_device_link, state_code)
+                if results['success']:
+                    primary_writes += 1
+                else:
+                    status += results['status']
+        except Exception as e:
+            success = False
+            status += "VOTER_HEAL-VOTER_DEVICE_LINK_STATE_CODE_FAILED: " + str(e) + " "
+
+    # Voters
+    heal_by_id = {heal['voter_id']: heal for heal in heal_list_by_type.get(HEAL_VOTER_FIELDS, [])}
+    repair_twitter_user_id_list = []
+    if heal_by_id:
+        try:
+            for voter in Voter.objects.filter(id__in=list(heal_by_id.keys())):
+                heal = heal_by_id[voter.id]
+                if is_voter_heal_out_of_date(voter, heal['field_values'], heal.get('expected_field_values', {})):
+                    heals_out_of_date += 1
+                    continue
+                repair_twitter_user_id_list += heal['repair_twitter_user_ids']
+                changed_field_list = []
+                for field_name, value in heal['field_values'].items():
+                    if getattr(voter, field_name) != value:
+                        setattr(voter, field_name, value)
+                        changed_field_list.append(field_name)
+                if not changed_field_list:
+                    heals_already_applied += 1
+                    continue
+                try:
+                    voter.save(update_fields=changed_field_list)
+                    primary_writes += 1
+                except Exception as e:
+                    status += "VOTER_HEAL-VOTER_NOT_SAVED " + str(voter.id) + ": " + str(e) + " "
+        except Exception as e:
+            success = False
+            status += "VOTER_HEAL-VOTER_FIELDS_FAILED: " + str(e) + " "
+    if repair_twitter_user_id_list:
+        voter_manager = VoterManager()
+        for twitter_user_id in dict.fromkeys(repair_twitter_user_id_list):
+            try:
+                voter_manager.repair_twitter_related_voter_caching(twitter_user_id)
+            except Exception as e:
+                status += "VOTER_HEAL-TWITTER_CACHING_NOT_REPAIRED: " + str(e) + " "
+
+    # Organizations
+    heal_by_we_vote_id = {heal['organization_we_vote_id']: heal
+                          for heal in heal_list_by_type.get(HEAL_ORGANIZATION_FIELDS, [])}
+    if heal_by_we_vote_id:
+        try:
+            for organization in Organization.objects.filter(we_vote_id__in=list(heal_by_we_vote_id.keys())):
+                heal = heal_by_we_vote_id[organization.we_vote_id]
+                if is_voter_heal_out_of_date(organization, heal['field_values'], heal.get('expected_field_values', {})):
+                    heals_out_of_date += 1
+                    continue
+                changed_field_list = []
+                for field_name, value in heal['field_values'].items():
+                    if getattr(organization, field_name) != value:
+                        setattr(organization, field_name, value)
+                        changed_field_list.append(field_name)
+                for field_name, value in heal['empty_field_values'].items():
+                    if not positive_value_exists(getattr(organization, field_name)):
+                        setattr(organization, field_name, value)
+                        changed_field_list.append(field_name)
+                if not changed_field_list:
+                    heals_already_applied += 1
+                    continue
+                try:
+                    organization.save(update_fields=changed_field_list)
+                    primary_writes += 1
+                except Exception as e:
+                    status += "VOTER_HEAL-ORGANIZATION_NOT_SAVED " + organization.we_vote_id + ": " + str(e) + " "
+        except Exception as e:
+            success = False
+            status += "VOTER_HEAL-ORGANIZATION_FIELDS_FAILED: " + str(e) + " "
+
+    # Ballot addresses
+    voter_address_manager = VoterAddressManager()
+    for heal in heal_list_by_type.get(HEAL_VOTER_BALLOT_ADDRESS, []):
+        try:
+            # The voter may have entered an address since, which we mustn't replace with a guess
+            address_results = voter_address_manager.retrieve_ballot_address_from_voter_id(heal['voter_id'])
+            if address_results['voter_address_found']:
+                heals_already_applied += 1
+                continue
+            results = voter_address_manager.update_or_create_voter_address(
+                heal['voter_id'], BALLOT_ADDRESS, heal['text_for_map_search'])
+            if results['success']:
+                primary_writes += 1
+            else:
+                status += results['status']
+        except Exception as e:
+            success = False
+            status += "VOTER_HEAL-BALLOT_ADDRESS_FAILED: " + str(e) + " "
+
+    if not success:
+        logger.error(status)
+    status += "VOTER_HEALS_APPLIED "
+    results = {
+        'success':                  success,
+        'status':                   status,
+        'primary_writes':           primary_writes,
+        'heals_already_applied':    heals_already_applied,
+        'heals_out_of_date':        heals_out_of_date,
+    }
+    return results
+
+
+class VoterHealQueue:
+    """
+    A per-worker queue of heals found by voterRetrieve. enqueue only merges the heal into a dict, and a background
+    thread applies them with apply_voter_heal_list when there are VOTER_HEAL_QUEUE_FLUSH_SIZE of them,
+    or every VOTER_HEAL_QUEUE_FLUSH_SECONDS.
+    """
+
+    def __init__(self, flush_size=VOTER_HEAL_QUEUE_FLUSH_SIZE, flush_seconds=VOTER_HEAL_QUEUE_FLUSH_SECONDS,
+                 start_flush_thread=True):
+        self.flush_size = max(flush_size, 1)
+        self.flush_seconds = max(flush_seconds, 1)
+        self.pid = os.getpid()
+        self.worker_name = "{host}:{pid}".format(host=socket.gethostname(), pid=self.pid)
+        # Dicts keep their order, so heals are applied in the order they were first queued
+        self.heal_by_key = {}
+        self.queue_lock = Lock()
+        self.flush_lock = Lock()
+        self.flush_requested = Event()
+        self.heals_enqueued = 0
+        self.heals_merged = 0
+        self.heals_applied = 0
+        self.heals_already_applied = 0
+        self.heals_out_of_date = 0
+        self.primary_writes = 0
+        self.primary_writes_skipped = 0
+        self.max_queue_depth = 0
+        self.flush_count = 0
+        self.last_flush_latency_ms = 0
+        self.max_flush_latency_ms = 0
+        self.date_last_flushed = None
+        self.stats_slot = None
+        if start_flush_thread:
+            Thread(target=self.run_flush_loop, name='voter_heal_queue', daemon=True).start()
+
+    def enqueue(self, heal):
+        heal_key = generate_voter_heal_key(heal)
+        with self.queue_lock:
+            self.heals_enqueued += 1
+            if heal_key in self.heal_by_key:
+                self.heal_by_key[heal_key] = merge_voter_heals(self.heal_by_key[heal_key], heal)
+                self.heals_merged += 1
+            else:
+                self.heal_by_key[heal_key] = heal
+            queue_depth = len(self.heal_by_key)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        if queue_depth >= self.flush_size:
+            self.flush_requested.set()
+        return queue_depth
+
+    def record_primary_write_skipped(self):
+        """
+        For writes the read path used to make that wouldn't have changed anything, so there is nothing to queue
+        """
+        with self.queue_lock:
+            self.primary_writes_skipped += 1
+
+    def queue_depth(self):
+        return len(self.heal_by_key)
+
+    def flush(self):
+        status = ""
+        success = True
+        heals_applied = 0
+        with self.flush_lock:
+            with self.queue_lock:
+                heal_list = list(self.heal_by_key.values())
+                self.heal_by_key = {}
+            if heal_list:
+                start_time = time.perf_counter()
+                try:
+                    results = apply_voter_heal_list(heal_list)
+                    success = results['success']
+                    status += results['status']
+                    heals_applied = len(heal_list)
+                    self.primary_writes += results['primary_writes']
+                    self.heals_already_applied += results['heals_already_applied']
+                    self.heals_out_of_date += results['heals_out_of_date']
+                except Exception as e:
+                    success = False
+                    status += "VOTER_HEAL_QUEUE_FLUSH_FAILED: " + str(e) + " "
+                    logger.error(status)
+                flush_latency_ms = int((time.perf_counter() - start_time) * 1000)
+                self.flush_count += 1
+                self.heals_applied += heals_applied
+                self.last_flush_latency_ms = flush_latency_ms
+                self.max_flush_latency_ms = max(self.max_flush_latency_ms, flush_latency_ms)
+                self.date_last_flushed = now()
+        status += "VOTER_HEALS_FLUSHED: " + str(heals_applied) + " "
+        return {
+            'success':          success,
+            'status':           status,
+            'heals_applied':    heals_applied,
+        }
+
+    def run_flush_loop(self):
+        while True:
+            self.flush_requested.wait(timeout=self.flush_seconds)
+            self.flush_requested.clear()
+            # Like a request would: don't reuse a connection the database has closed, or one past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.flush()
+                self.store_stats_in_shared_cache()
+            except Exception as e:
+                logger.error("VOTER_HEAL_QUEUE_FLUSH_LOOP_ERROR: " + str(e))
+            finally:
+                close_old_connections()
+
+    def generate_stats(self):
+        # Each heal queued stands for one write voterRetrieve used to make inline
+        primary_writes_avoided = self.heals_enqueued + self.primary_writes_skipped - self.primary_writes
+        return {
+            'worker_name':              self.worker_name,
+            'queue_depth':              self.queue_depth(),
+            'max_queue_depth':          self.max_queue_depth,
+            'heals_enqueued':           self.heals_enqueued,
+            'heals_merged':             self.heals_merged,
+            'heals_applied':            self.heals_applied,
+            'heals_already_applied':    self.heals_already_applied,
+            'heals_out_of_date':        self.heals_out_of_date,
+            'primary_writes':           self.primary_writes,
+            'primary_writes_avoided':   max(primary_writes_avoided, 0),
+            'flush_count':              self.flush_count,
+            'last_flush_latency_ms':    self.last_flush_latency_ms,
+            'max_flush_latency_ms':     self.max_flush_latency_ms,
+            'date_last_flushed':        self.date_last_flushed.isoformat() if self.date_last_flushed else '',
+        }
+
+    def store_stats_in_shared_cache(self):
+        stats = self.generate_stats()
+        try:
+            shared_cache = caches['shared']
+            if self.stats_slot is not None:
+                stats_key = generate_voter_heal_queue_stats_key(self.stats_slot)
+                stored_stats = shared_cache.get(stats_key)
+                if stored_stats is not None and stored_stats['worker_name'] == self.worker_name:
+                    shared_cache.set(stats_key, stats, VOTER_HEAL_QUEUE_STATS_TTL_SECONDS)
+                    return
+            # Our slot expired or was never claimed. add() only succeeds for the first worker to claim a free slot.
+            for stats_slot in range(VOTER_HEAL_QUEUE_STATS_SLOT_COUNT):
+                if shared_cache.add(generate_voter_heal_queue_stats_key(stats_slot), stats,
+                                    VOTER_HEAL_QUEUE_STATS_TTL_SECONDS):
+                    self.stats_slot = stats_slot
+                    return
+            self.stats_slot = None
+            logger.error("VOTER_HEAL_QUEUE_STATS_NO_FREE_SLOT: " + self.worker_name)
+        except Exception as e:
+            logger.error("VOTER_HEAL_QUEUE_STATS_NOT_STORED: " + str(e))
+
+
+def generate_voter_heal_queue_stats_key(stats_slot):
+    return 'voter_heal_queue:stats:' + str(stats_slot)
+
+
+# One queue per worker process. Recreated after a fork, since threads don't carry over.
+voter_heal_queue = None
+voter_heal_queue_lock = Lock()
+
+
+def get_voter_heal_queue():
+    global voter_heal_queue
+    if voter_heal_queue is None or voter_heal_queue.pid != os.getpid():
+        with voter_heal_queue_lock:
+            if voter_heal_queue is None or voter_heal_queue.pid != os.getpid():
+                # Tests call flush_voter_heal_queue themselves
+                voter_heal_queue = VoterHealQueue(start_flush_thread='test' not in sys.argv)
+                atexit.register(voter_heal_queue.flush)
+    return voter_heal_queue
+
+
+def enqueue_voter_heal(heal):
+    """
+    Queues the heal, or applies it now if VOTER_HEAL_QUEUE_ENABLED is off
+    :param heal: From one of the generate_*_heal functions
+    :return:
+    """
+    if not VOTER_HEAL_QUEUE_ENABLED:
+        return apply_voter_heal_list([heal])
+    get_voter_heal_queue().enqueue(heal)
+    results = {
+        'success':  True,
+        'status':   "VOTER_HEAL_QUEUED-" + heal['heal_type'] + " ",
+    }
+    return results
+
+
+def record_voter_heal_write_skipped():
+    if VOTER_HEAL_QUEUE_ENABLED:
+        get_voter_heal_queue().record_primary_write_skipped()
+
+
+def flush_voter_heal_queue():
+    return get_voter_heal_queue().flush()
+
+
+def retrieve_voter_heal_queue_stats():
+    """
+    Queue depth and primary writes avoided for each worker that flushed in the last
+    VOTER_HEAL_QUEUE_STATS_TTL_SECONDS, for the statistics summary page.
+    Without SHARED_CACHE_LOCATION, this only finds the stats of the worker serving the page.
+    """
+    try:
+        stats_by_key = caches['shared'].get_many(
+            [generate_voter_heal_queue_stats_key(stats_slot) for stats_slot in range(VOTER_HEAL_QUEUE_STATS_SLOT_COUNT)])
+    except Exception as e:
+        logger.error("VOTER_HEAL_QUEUE_STATS_NOT_RETRIEVED: " + str(e))
+        return []
+    return sorted(stats_by_key.values(), key=lambda worker_stats: worker_stats['worker_name'])
@@ -0,0 +1,24 @@
+# voter/middleware.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from .controllers_voter_device_cache import end_request_identity_cache, start_request_identity_cache
+
+
+class VoterIdentityCacheMiddleware:
+    """
+    Gives each request its own memo of the VoterDeviceLinks and Voters retrieved read-only, so the many places that
+    resolve the same voter_device_id during one request (fetch_voter_id_from_voter_device_link,
+    VoterDeviceLinkManager.retrieve_voter_device_link, VoterManager.retrieve_voter_from_voter_device_id) only reach
+    the database once. The memo is dropped when the response is returned.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request_identity_cache()
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_identity_cache(token)
@@ -14,6 +14,8 @@ from django.contrib.auth.models import (BaseUserManager, AbstractBaseUser)  # Pe
 from django.core.validators import RegexValidator
 from django.db import (models, IntegrityError)
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from geopy import get_geocoder_for_service
 from validate_email import validate_email
@@ -23,9 +25,12 @@ from apple.models import AppleUser
 from config.base import get_environment_variable, get_environment_variable_default
 from exception.models import handle_exception, handle_record_found_more_than_one_exception, \
     handle_record_not_saved_exception
+from geoip.models import geocode_with_cache
 from import_export_facebook.models import FacebookManager
 from sms.models import SMSManager
 from twitter.models import TwitterUserManager
+from voter.controllers_voter_device_cache import cache_voter, cache_voter_device_link, invalidate_cached_voter, \
+    invalidate_cached_voter_device_link, retrieve_cached_voter, retrieve_cached_voter_device_link
 from wevote_functions.functions import extract_state_code_from_address_string, convert_to_int, generate_random_string, \
     generate_voter_device_id, get_voter_api_device_id, positive_value_exists
 from wevote_functions.functions_date import generate_localized_datetime_from_obj
@@ -1155,8 +1160,20 @@ class VoterManager(BaseUserManager):
             }
             return results
 
-        voter_manager = VoterManager()
-        results = voter_manager.retrieve_voter_by_id(voter_id, read_only=read_only)
+        cached_voter = retrieve_cached_voter(voter_id) if read_only else None
+        if cached_voter is not None:
+            results = {
+                'status':       "VOTER_FOUND_IN_REQUEST_CACHE ",
+                'success':      True,
+                'voter_found':  True,
+                'voter_id':     cached_voter.id,
+                'voter':        cached_voter,
+            }
+        else:
+            voter_manager = VoterManager()
+            results = voter_manager.retrieve_voter_by_id(voter_id, read_only=read_only)
+            if read_only and results['voter_found']:
+                cache_voter(results['voter'])
         status += results['status']
         if not results['success']:
             success = False
@@ -3900,9 +3917,15 @@ class VoterDeviceLinkManager(models.Manager):
         try:
             if positive_value_exists(voter_device_id):
                 status += " RETRIEVE_VOTER_DEVICE_LINK-GET_BY_VOTER_DEVICE_ID "
-                if read_only and 'test' not in sys.argv:
-                    voter_device_link_on_stage = VoterDeviceLink.objects.using('readonly').get(
-                        voter_device_id=voter_device_id)
+                if read_only:
+                    voter_device_link_on_stage = retrieve_cached_voter_device_link(voter_device_id)
+                    if voter_device_link_on_stage is not None:
+                        status += "FOUND_IN_CACHE "
+                    else:
+                        voter_device_link_query = VoterDeviceLink.objects.using('readonly') \
+                            if 'test' not in sys.argv else VoterDeviceLink.objects
+                        voter_device_link_on_stage = voter_device_link_query.get(voter_device_id=voter_device_id)
+                        cache_voter_device_link(voter_device_link_on_stage)
                 else:
                     voter_device_link_on_stage = VoterDeviceLink.objects.get(voter_device_id=voter_device_id)
                 voter_device_link_id = voter_device_link_on_stage.id
@@ -4383,6 +4406,18 @@ class VoterIssuesLookup(models.Model):
     womens_equality = models.BooleanField(default=None, null=True)
 
 
+@receiver(post_save, sender=VoterDeviceLink)
+@receiver(post_delete, sender=VoterDeviceLink)
+def invalidate_cached_voter_device_link_on_change(sender, instance, **kwargs):
+    invalidate_cached_voter_device_link(instance.voter_device_id)
+
+
+@receiver(post_save, sender=Voter)
+@receiver(post_delete, sender=Voter)
+def invalidate_cached_voter_on_change(sender, instance, **kwargs):
+    invalidate_cached_voter(instance.id)
+
+
 # This method *just* returns the voter_id or 0
 def fetch_voter_id_from_voter_device_link(voter_device_id):
     voter_device_link_manager = VoterDeviceLinkManager()
@@ -4830,13 +4865,12 @@ class VoterAddressManager(models.Manager):
                 fips, county, latitude, longitude = '', '', '', ''
                 if place_found:             # if a city was found, then hopefully a line1 was found
                     invalid_address = False
-                    location = google_client.geocode(raw_address_text, sensor=False,
-                                                     timeout=GEOCODE_TIMEOUT)
+                    location = geocode_with_cache(google_client, raw_address_text, timeout=GEOCODE_TIMEOUT)
                     latitude, longitude = location.latitude, location.longitude
                     fips, county, fallback = self.get_fips_from_fcc(latitude, longitude, city, state)
                 elif len(zip_code) > 0:     # With no city, Google can do plenty with just a zip code (but no line1)
                     invalid_address = False
-                    loc = google_client.geocode(zip_code, sensor=False, timeout=GEOCODE_TIMEOUT)
+                    loc = geocode_with_cache(google_client, zip_code, timeout=GEOCODE_TIMEOUT)
                     address, latitude, longitude = loc.address, loc.latitude, loc.longitude
                     place_found, line1, state, city, zip_code = self.parse_address(address)
                     fips, county, fallback = self.get_fips_from_fcc(latitude, longitude, city, state)
@@ -5274,14 +5308,13 @@ class VoterAddressManager(models.Manager):
                             google_lookups += 1
                             if (len(state) == 0 or len(state) > 2 or len(city) == 0) and len(zip_code) > 4:
                                 # If all we have is a zip code, Google does pretty well
-                                loc = google_client.geocode(zip_code, sensor=False, timeout=GEOCODE_TIMEOUT)
+                                loc = geocode_with_cache(google_client, zip_code, timeout=GEOCODE_TIMEOUT)
                                 if loc is None:
                                     raise Exception("Google geocode failed to process zip_code: " + zip_code)
                                 address, latitude, longitude = loc.address, loc.latitude, loc.longitude
                                 place_found, line1, state, city, zip_code = self.parse_address(address)
                             else:
-                                loc = google_client.geocode(this_text_for_map_search, sensor=False,
-                                                            timeout=GEOCODE_TIMEOUT)
+                                loc = geocode_with_cache(google_client, this_text_for_map_search, timeout=GEOCODE_TIMEOUT)
                                 if loc is None:
                                     raise Exception("Google geocode failed to process address: " +
                                                     this_text_for_map_search)
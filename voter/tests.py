@@ -0,0 +1,254 @@
+# voter/tests.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from unittest import mock
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase
+
+from organization.models import Organization
+from voter.controllers import voter_retrieve_for_api
+from voter.controllers_voter_device_cache import end_request_identity_cache, invalidate_cached_voter_identity, \
+    request_identity_cache, start_request_identity_cache
+from voter.controllers_voter_heal_queue import enqueue_voter_heal, flush_voter_heal_queue, \
+    generate_organization_fields_heal, generate_voter_ballot_address_heal, generate_voter_device_link_state_code_heal, \
+    generate_voter_fields_heal, generate_voter_heal_queue_stats_key, get_voter_heal_queue, \
+    retrieve_voter_heal_queue_stats, VoterHealQueue
+from voter.middleware import VoterIdentityCacheMiddleware
+from voter.models import BALLOT_ADDRESS, fetch_voter_id_from_voter_device_link, Voter, VoterAddress, VoterDeviceLink, \
+    VoterDeviceLinkManager, VoterManager
+from wevote_functions.functions import generate_voter_device_id
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' voter queries see the voters saved here
+class VoterIdentityCacheTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def start_request(self):
+        token = start_request_identity_cache()
+        self.addCleanup(end_request_identity_cache, token)
+
+    def test_device_link_retrieved_once_per_request(self):
+        VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        self.start_request()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+        with self.assertNumQueries(0):
+            results = VoterDeviceLinkManager.retrieve_voter_device_link('device_a', read_only=True)
+        self.assertIn("FOUND_IN_CACHE", results['status'])
+        self.assertEqual(results['voter_device_link'].voter_id, 101)
+        # Each caller gets its own copy
+        results['voter_device_link'].voter_id = 999
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+
+    def test_nothing_is_kept_between_requests(self):
+        VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+        # Like a sign in handled by another worker, which sends no signal to this one
+        VoterDeviceLink.objects.filter(voter_device_id='device_a').update(voter_id=202)
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 202)
+
+        def get_response(request):
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 202)
+            self.assertIsNotNone(request_identity_cache.get())
+            return HttpResponse()
+
+        VoterIdentityCacheMiddleware(get_response)(None)
+        self.assertIsNone(request_identity_cache.get())
+
+    def test_saved_device_link_is_dropped_from_request_cache(self):
+        voter_device_link = VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        self.start_request()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+        voter_device_link.voter_id = 202
+        voter_device_link.save()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 202)
+
+    def test_invalidate_identity_drops_every_device_of_the_voter(self):
+        VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        VoterDeviceLink.objects.create(voter_device_id='device_b', voter_id=101)
+        VoterDeviceLink.objects.create(voter_device_id='device_c', voter_id=303)
+        self.start_request()
+        for voter_device_id in ['device_a', 'device_b', 'device_c']:
+            fetch_voter_id_from_voter_device_link(voter_device_id)
+        # An account merge moves every device of voter 101 to voter 202
+        VoterDeviceLink.objects.filter(voter_id=101).update(voter_id=202)
+        invalidate_cached_voter_identity(voter_device_id='device_a', voter_id_list=[101])
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_b'), 202)
+        with self.assertNumQueries(0):
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device_c'), 303)
+
+    @mock.patch('voter.controllers_voter_device_cache.SHARED_CACHE_LOCATION', 'redis://shared-cache:6379/1')
+    def test_shared_cache_keeps_device_link_between_requests(self):
+        caches['shared'].clear()
+        voter_device_link = VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+        with self.assertNumQueries(0):
+            self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 101)
+        # Saves and deletes drop it from the shared cache
+        voter_device_link.voter_id = 202
+        voter_device_link.save()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 202)
+        voter_device_link.delete()
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_a'), 0)
+
+    @mock.patch('voter.controllers_voter_device_cache.SHARED_CACHE_LOCATION', 'redis://shared-cache:6379/1')
+    def test_invalidate_identity_drops_every_device_of_the_voter_from_shared_cache(self):
+        caches['shared'].clear()
+        VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=101)
+        VoterDeviceLink.objects.create(voter_device_id='device_b', voter_id=101)
+        for voter_device_id in ['device_a', 'device_b']:
+            fetch_voter_id_from_voter_device_link(voter_device_id)
+        # An account merge moves every device of voter 101 to voter 202, without a post_save
+        VoterDeviceLink.objects.filter(voter_id=101).update(voter_id=202)
+        invalidate_cached_voter_identity(voter_id_list=[101, 202])
+        self.assertEqual(fetch_voter_id_from_voter_device_link('device_b'), 202)
+
+    def test_voter_retrieved_once_per_request(self):
+        voter = Voter.objects.create(first_name='Ada')
+        VoterDeviceLink.objects.create(voter_device_id='device_a', voter_id=voter.id)
+        self.start_request()
+        self.assertEqual(
+            VoterManager.retrieve_voter_from_voter_device_id('device_a', read_only=True)['voter'].first_name, 'Ada')
+        with self.assertNumQueries(0):
+            results = VoterManager.retrieve_voter_from_voter_device_id('device_a', read_only=True)
+        self.assertEqual(results['voter'].first_name, 'Ada')
+        voter.first_name = 'Grace'
+        voter.save()
+        self.assertEqual(
+            VoterManager.retrieve_voter_from_voter_device_id('device_a', read_only=True)['voter'].first_name, 'Grace')
+
+
+# Inheriting from TransactionTestCase lets the 'readonly' voter queries see the voters saved here
+class VoterHealQueueTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def create_voter_with_device(self, **voter_field_values):
+        voter = VoterManager().create_voter()['voter']
+        if voter_field_values:
+            Voter.objects.filter(id=voter.id).update(**voter_field_values)
+        voter_device_id = generate_voter_device_id()
+        VoterDeviceLinkManager.save_new_voter_device_link(voter_device_id, voter.id)
+        # Heals queued by another test
+        self.addCleanup(flush_voter_heal_queue)
+        flush_voter_heal_queue()
+        return Voter.objects.get(id=voter.id), voter_device_id
+
+    def test_voter_retrieve_queues_heals_instead_of_writing(self):
+        voter, voter_device_id = self.create_voter_with_device(twitter_id=1234, twitter_screen_name='stale_handle')
+        json_data = voter_retrieve_for_api(
+            state_code_from_ip_address='CA',
+            user_agent_string='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 Safari/605.1.15',
+            user_agent_object=mock.Mock(is_bot=False, is_mobile=False, is_pc=True, is_tablet=False),
+            voter_device_id=voter_device_id,
+            voter_location_results={'voter_location_found': False})
+
+        self.assertTrue(json_data['success'])
+        # There is no TwitterLinkToVoter, so the response leaves out the cached Twitter values...
+        self.assertEqual(json_data['twitter_screen_name'], '')
+        self.assertIn("VOTER_HEAL_QUEUED-", json_data['status'])
+        # ...which are only cleared on the primary when the queue is flushed
+        self.assertEqual(Voter.objects.get(id=voter.id).twitter_id, 1234)
+        self.assertIsNone(VoterDeviceLink.objects.get(voter_device_id=voter_device_id).state_code)
+        self.assertEqual(get_voter_heal_queue().queue_depth(), 2)
+
+        results = flush_voter_heal_queue()
+        self.assertEqual(results['heals_applied'], 2)
+        voter = Voter.objects.get(id=voter.id)
+        self.assertEqual(voter.twitter_id, 0)
+        self.assertEqual(voter.twitter_screen_name, '')
+        self.assertEqual(VoterDeviceLink.objects.get(voter_device_id=voter_device_id).state_code, 'CA')
+
+    def test_heals_for_one_record_are_merged(self):
+        voter, voter_device_id = self.create_voter_with_device(twitter_id=1234, twitter_screen_name='stale_handle')
+        heal_queue = get_voter_heal_queue()
+        heals_enqueued = heal_queue.heals_enqueued
+        for _ in range(3):
+            enqueue_voter_heal(generate_voter_fields_heal(
+                voter.id, {'twitter_id': 0}, expected_field_values={'twitter_id': 1234}))
+        enqueue_voter_heal(generate_voter_fields_heal(
+            voter.id, {'twitter_screen_name': ''}, expected_field_values={'twitter_screen_name': 'stale_handle'}))
+        self.assertEqual(heal_queue.heals_enqueued - heals_enqueued, 4)
+        self.assertEqual(heal_queue.queue_depth(), 1)
+
+        primary_writes = heal_queue.primary_writes
+        flush_voter_heal_queue()
+        self.assertEqual(heal_queue.primary_writes - primary_writes, 1)
+        voter = Voter.objects.get(id=voter.id)
+        self.assertEqual((voter.twitter_id, voter.twitter_screen_name), (0, ''))
+
+    def test_heal_is_dropped_if_the_record_changed_since(self):
+        voter, voter_device_id = self.create_voter_with_device(twitter_id=1234, twitter_screen_name='stale_handle')
+        voter_device_link = VoterDeviceLink.objects.get(voter_device_id=voter_device_id)
+        enqueue_voter_heal(generate_voter_fields_heal(
+            voter.id, {'twitter_id': 0, 'twitter_screen_name': ''},
+            expected_field_values={'twitter_id': 1234, 'twitter_screen_name': 'stale_handle'}))
+        enqueue_voter_heal(generate_voter_device_link_state_code_heal(voter_device_link, 'CA'))
+        # Before the queue is flushed the voter signs in with Twitter, and chooses an election on this device
+        Voter.objects.filter(id=voter.id).update(twitter_id=5678, twitter_screen_name='new_handle')
+        VoterDeviceLink.objects.filter(id=voter_device_link.id).update(google_civic_election_id=4000)
+
+        heal_queue = get_voter_heal_queue()
+        heals_out_of_date = heal_queue.heals_out_of_date
+        flush_voter_heal_queue()
+        self.assertEqual(heal_queue.heals_out_of_date - heals_out_of_date, 2)
+        voter = Voter.objects.get(id=voter.id)
+        self.assertEqual((voter.twitter_id, voter.twitter_screen_name), (5678, 'new_handle'))
+        voter_device_link = VoterDeviceLink.objects.get(id=voter_device_link.id)
+        self.assertEqual((voter_device_link.state_code, voter_device_link.google_civic_election_id), (None, 4000))
+
+    def test_heals_only_save_what_is_still_needed(self):
+        voter, voter_device_id = self.create_voter_with_device()
+        organization = Organization.objects.create(organization_name='Heal Org', facebook_email='kept@example.org')
+        enqueue_voter_heal(generate_organization_fields_heal(
+            organization.we_vote_id,
+            {'facebook_profile_image_url_https': 'https://example.org/new.jpg'},
+            {'facebook_email': 'new@example.org', 'facebook_id': 42},
+            expected_field_values={'facebook_profile_image_url_https': None}))
+        # The voter entered an address since, which the guess from the IP address mustn't replace
+        VoterAddress.objects.create(voter_id=voter.id, address_type=BALLOT_ADDRESS, text_for_map_search='Oakland, CA')
+        enqueue_voter_heal(generate_voter_ballot_address_heal(voter.id, 'Los Angeles, CA'))
+
+        heal_queue = get_voter_heal_queue()
+        heals_already_applied = heal_queue.heals_already_applied
+        flush_voter_heal_queue()
+        self.assertEqual(heal_queue.heals_already_applied - heals_already_applied, 1)
+        organization = Organization.objects.get(id=organization.id)
+        self.assertEqual(organization.facebook_profile_image_url_https, 'https://example.org/new.jpg')
+        self.assertEqual(organization.facebook_email, 'kept@example.org')
+        self.assertEqual(organization.facebook_id, 42)
+        self.assertEqual(VoterAddress.objects.get(voter_id=voter.id).text_for_map_search, 'Oakland, CA')
+
+
+class VoterHealQueueStatsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.addCleanup(caches['shared'].clear)
+
+    @staticmethod
+    def create_heal_queue(worker_name):
+        heal_queue = VoterHealQueue(start_flush_thread=False)
+        heal_queue.worker_name = worker_name
+        return heal_queue
+
+    def test_each_worker_keeps_its_own_stats_slot(self):
+        heal_queue_list = [self.create_heal_queue('web-{0}:1'.format(number)) for number in range(3)]
+        for heal_queue in heal_queue_list:
+            heal_queue.store_stats_in_shared_cache()
+        heal_queue_list[0].heals_enqueued = 5
+        heal_queue_list[0].store_stats_in_shared_cache()
+        self.assertEqual(sorted(heal_queue.stats_slot for heal_queue in heal_queue_list), [0, 1, 2])
+        worker_stats_list = retrieve_voter_heal_queue_stats()
+        self.assertEqual([worker_stats['worker_name'] for worker_stats in worker_stats_list],
+                         ['web-0:1', 'web-1:1', 'web-2:1'])
+        self.assertEqual(worker_stats_list[0]['heals_enqueued'], 5)
+
+        # A worker whose slot expired and was claimed by another worker moves to a free slot
+        caches['shared'].delete(generate_voter_heal_queue_stats_key(heal_queue_list[1].stats_slot))
+        new_heal_queue = self.create_heal_queue('web-3:1')
+        new_heal_queue.store_stats_in_shared_cache()
+        heal_queue_list[1].store_stats_in_shared_cache()
+        self.assertEqual(sorted(worker_stats['worker_name'] for worker_stats in retrieve_voter_heal_queue_stats()),
+                         ['web-0:1', 'web-1:1', 'web-2:1', 'web-3:1'])
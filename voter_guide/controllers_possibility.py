@@ -9,7 +9,8 @@ from candidate.controllers import find_candidate_endorsements_on_one_candidate_w
     retrieve_candidate_list_for_all_upcoming_elections
 from candidate.models import CandidateCampaign, CandidateListManager, CandidateManager
 from election.controllers import retrieve_this_and_next_years_election_id_list
-from import_export_twitter.controllers import refresh_twitter_organization_details, scrape_social_media_from_one_site
+from import_export_twitter.controllers import refresh_twitter_organization_details
+from import_export_twitter.controllers_social_media_crawler import scrape_social_media_from_one_site
 from organization.controllers import retrieve_organization_list_for_all_upcoming_elections
 from organization.models import Organization, OrganizationListManager, OrganizationManager, GROUP, PUBLIC_FIGURE
 from measure.controllers import add_measure_name_alternatives_to_measure_list_light, \
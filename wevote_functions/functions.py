@@ -4,8 +4,10 @@
 
 import datetime
 import json
+import os
 import random
 import re
+import stat
 import string
 from math import log10
 import django.utils.html
@@ -1941,6 +1943,18 @@ def remove_period_from_name_prefix_and_suffix(name):
     return results
 
 
+def is_private_directory(directory_path):
+    """
+    :return: True if directory_path is a directory owned by this user, that no one else can write to
+    """
+    try:
+        directory_stat = os.stat(directory_path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(directory_stat.st_mode) and directory_stat.st_uid == os.getuid() and \
+        not directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
 def return_first_x_words(original_string, number_of_words_to_return, include_ellipses=False):
     # Mimics returnFirstXWords in WebApp and Campaigns site
     if not original_string:
@@ -0,0 +1,231 @@
+# wevote_functions/functions_geo.py
+# Brought to you by We Vote. Be good.
+# -*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+import math
+from threading import Lock
+import time
+
+from django.core.cache import caches
+import numpy
+from sklearn.neighbors import KDTree
+
+from config.base import SHARED_CACHE_LOCATION
+import wevote_functions.admin
+from wevote_functions.functions import convert_to_int, positive_value_exists
+
+logger = wevote_functions.admin.get_logger(__name__)
+
+RADIUS_OF_EARTH_IN_MILES = 3958.756
+MILES_PER_DEGREE_OF_LATITUDE = 2 * math.pi * RADIUS_OF_EARTH_IN_MILES / 360
+
+# Kinds of map point tables we build spatial indexes for
+BALLOT_RETURNED_MAP_POINTS = 'BALLOT_RETURNED_MAP_POINTS'
+OFFICES_HELD_FOR_LOCATION_MAP_POINTS = 'OFFICES_HELD_FOR_LOCATION_MAP_POINTS'
+
+# Imports call invalidate_map_point_spatial_index when they finish. This is the backstop for changes made elsewhere.
+#  Without SHARED_CACHE_LOCATION the invalidation only reaches the process that ran the import, so we rebuild sooner.
+MAP_POINT_SPATIAL_INDEX_TTL_SECONDS = 60 * 60 if SHARED_CACHE_LOCATION else 5 * 60
+# How many (kind, election, state) indexes each worker keeps in memory
+MAP_POINT_SPATIAL_INDEX_MAX_ENTRIES = 64
+# How many of the nearest map points we hand back to the database, in case some were deleted since the index was built
+MAP_POINT_SPATIAL_INDEX_CANDIDATES = 5
+
+# Process-local LRU: index_key -> spatial_index dict
+map_point_spatial_index_cache = OrderedDict()
+map_point_spatial_index_cache_lock = Lock()
+
+
+def generate_bounding_box_for_distance(latitude, longitude, distance_in_miles):
+    """
+    Return the latitude/longitude box that contains every point within distance_in_miles of (latitude, longitude).
+    Filtering on this box first lets the database use the (latitude, longitude) indexes before we calculate the
+    great circle distance, which is only needed for the few rows inside the box.
+    :param latitude:
+    :param longitude:
+    :param distance_in_miles:
+    :return:
+    """
+    latitude_delta = distance_in_miles / MILES_PER_DEGREE_OF_LATITUDE
+    latitude_min = max(latitude - latitude_delta, -90.0)
+    latitude_max = min(latitude + latitude_delta, 90.0)
+    # A degree of longitude gets shorter as we move away from the equator, so use the widest latitude in the box
+    widest_latitude = max(abs(latitude_min), abs(latitude_max))
+    cos_of_widest_latitude = math.cos(math.radians(widest_latitude))
+    if cos_of_widest_latitude < 0.01:
+        longitude_min = -180.0
+        longitude_max = 180.0
+    else:
+        longitude_delta = distance_in_miles / (MILES_PER_DEGREE_OF_LATITUDE * cos_of_widest_latitude)
+        longitude_min = longitude - longitude_delta
+        longitude_max = longitude + longitude_delta
+        if longitude_min < -180.0 or longitude_max > 180.0:
+            # The box crosses the antimeridian (western Alaska), so don't limit by longitude
+            longitude_min = -180.0
+            longitude_max = 180.0
+    return {
+        'latitude_min':     latitude_min,
+        'latitude_max':     latitude_max,
+        'longitude_min':    longitude_min,
+        'longitude_max':    longitude_max,
+    }
+
+
+def filter_queryset_to_bounding_box(queryset, latitude, longitude, distance_in_miles):
+    bounding_box = generate_bounding_box_for_distance(latitude, longitude, distance_in_miles)
+    return queryset.filter(
+        latitude__gte=bounding_box['latitude_min'],
+        latitude__lte=bounding_box['latitude_max'],
+        longitude__gte=bounding_box['longitude_min'],
+        longitude__lte=bounding_box['longitude_max'],
+    )
+
+
+def convert_latitude_longitude_to_unit_vectors(latitude_array, longitude_array):
+    # Points on the unit sphere: straight-line (chord) distance between them grows with the great circle distance,
+    #  so a Euclidean KD-tree gives us the same nearest neighbors
+    latitude_radians = numpy.radians(numpy.asarray(latitude_array, dtype=numpy.float64))
+    longitude_radians = numpy.radians(numpy.asarray(longitude_array, dtype=numpy.float64))
+    cos_latitude = numpy.cos(latitude_radians)
+    return numpy.column_stack((
+        cos_latitude * numpy.cos(longitude_radians),
+        cos_latitude * numpy.sin(longitude_radians),
+        numpy.sin(latitude_radians),
+    ))
+
+
+def convert_distance_in_miles_to_chord_length(distance_in_miles):
+    return 2 * math.sin(distance_in_miles / (2 * RADIUS_OF_EARTH_IN_MILES))
+
+
+def build_map_point_spatial_index(map_point_location_list=[]):
+    """
+    :param map_point_location_list: list of (id, latitude, longitude) tuples
+    :return: spatial_index dict. With no located map points, kd_tree is None, so lookups find nothing without
+      going back to the database.
+    """
+    map_point_location_list = [
+        one_location for one_location in map_point_location_list
+        if one_location[1] is not None and one_location[2] is not None]
+    if not len(map_point_location_list):
+        return {
+            'id_array':     numpy.array([], dtype=numpy.int64),
+            'kd_tree':      None,
+            'time_built':   time.monotonic(),
+            'generation':   0,
+        }
+    id_array = numpy.array([one_location[0] for one_location in map_point_location_list], dtype=numpy.int64)
+    unit_vectors = convert_latitude_longitude_to_unit_vectors(
+        [one_location[1] for one_location in map_point_location_list],
+        [one_location[2] for one_location in map_point_location_list])
+    return {
+        'id_array':     id_array,
+        'kd_tree':      KDTree(unit_vectors),
+        'time_built':   time.monotonic(),
+        'generation':   0,
+    }
+
+
+def find_nearest_map_point_ids_in_spatial_index(
+        spatial_index=None,
+        latitude=0.0,
+        longitude=0.0,
+        distance_in_miles=0,
+        number_of_results=MAP_POINT_SPATIAL_INDEX_CANDIDATES):
+    """
+    Return the ids of the nearest map points within distance_in_miles, nearest first.
+    """
+    if spatial_index is None or spatial_index['kd_tree'] is None:
+        return []
+    number_of_results = min(number_of_results, len(spatial_index['id_array']))
+    query_vector = convert_latitude_longitude_to_unit_vectors([latitude], [longitude])
+    chord_distance_array, position_array = spatial_index['kd_tree'].query(query_vector, k=number_of_results)
+    chord_limit = convert_distance_in_miles_to_chord_length(distance_in_miles)
+    return [
+        int(spatial_index['id_array'][position])
+        for chord_distance, position in zip(chord_distance_array[0], position_array[0])
+        if chord_distance <= chord_limit]
+
+
+def generate_map_point_spatial_index_election_prefix(kind_of_map_point='', google_civic_election_id=0):
+    # Ends with the delimiter, so election 1 isn't a prefix of election 10
+    return "map_point_spatial_index:{kind_of_map_point}:{google_civic_election_id}:".format(
+        kind_of_map_point=kind_of_map_point,
+        google_civic_election_id=convert_to_int(google_civic_election_id))
+
+
+def generate_map_point_spatial_index_key(kind_of_map_point='', google_civic_election_id=0, state_code=''):
+    return generate_map_point_spatial_index_election_prefix(kind_of_map_point, google_civic_election_id) + \
+        (state_code.lower() if positive_value_exists(state_code) else '')
+
+
+def generate_map_point_spatial_index_generation_key(kind_of_map_point='', google_civic_election_id=0):
+    # One generation per election (not per state), so finishing an import for an election invalidates all its states
+    return generate_map_point_spatial_index_election_prefix(kind_of_map_point, google_civic_election_id) + \
+        ":generation"
+
+
+def fetch_map_point_spatial_index_generation(kind_of_map_point='', google_civic_election_id=0):
+    generation_key = generate_map_point_spatial_index_generation_key(kind_of_map_point, google_civic_election_id)
+    try:
+        return caches['shared'].get(generation_key, 0)
+    except Exception as e:
+        logger.error("MAP_POINT_SPATIAL_INDEX_GENERATION_ERROR: " + str(e))
+        return 0
+
+
+def invalidate_map_point_spatial_index(kind_of_map_point='', google_civic_election_id=0):
+    """
+    Called when an import of map point data finishes. Every worker rebuilds the index for this election the next time
+    it is needed.
+    :param kind_of_map_point:
+    :param google_civic_election_id:
+    :return:
+    """
+    generation_key = generate_map_point_spatial_index_generation_key(kind_of_map_point, google_civic_election_id)
+    try:
+        caches['shared'].set(generation_key, time.time(), None)
+    except Exception as e:
+        logger.error("MAP_POINT_SPATIAL_INDEX_INVALIDATE_ERROR: " + str(e))
+    index_key_prefix = generate_map_point_spatial_index_election_prefix(kind_of_map_point, google_civic_election_id)
+    with map_point_spatial_index_cache_lock:
+        for index_key in [key for key in map_point_spatial_index_cache if key.startswith(index_key_prefix)]:
+            del map_point_spatial_index_cache[index_key]
+
+
+def retrieve_map_point_spatial_index(
+        kind_of_map_point='',
+        google_civic_election_id=0,
+        state_code='',
+        retrieve_map_point_location_list_function=None):
+    """
+    Return this worker's spatial index for one (kind, election, state), building it if it is missing or stale.
+    :param kind_of_map_point:
+    :param google_civic_election_id:
+    :param state_code:
+    :param retrieve_map_point_location_list_function: returns a list of (id, latitude, longitude) tuples
+    :return: spatial_index dict, or None if it could not be built
+    """
+    index_key = generate_map_point_spatial_index_key(kind_of_map_point, google_civic_election_id, state_code)
+    generation = fetch_map_point_spatial_index_generation(kind_of_map_point, google_civic_election_id)
+    with map_point_spatial_index_cache_lock:
+        spatial_index = map_point_spatial_index_cache.get(index_key)
+        if spatial_index is not None:
+            if spatial_index['generation'] == generation and \
+                    time.monotonic() - spatial_index['time_built'] < MAP_POINT_SPATIAL_INDEX_TTL_SECONDS:
+                map_point_spatial_index_cache.move_to_end(index_key)
+                return spatial_index
+            del map_point_spatial_index_cache[index_key]
+
+    try:
+        spatial_index = build_map_point_spatial_index(retrieve_map_point_location_list_function())
+    except Exception as e:
+        logger.error("MAP_POINT_SPATIAL_INDEX_BUILD_ERROR: " + str(e))
+        return None
+    spatial_index['generation'] = generation
+    with map_point_spatial_index_cache_lock:
+        map_point_spatial_index_cache[index_key] = spatial_index
+        while len(map_point_spatial_index_cache) > MAP_POINT_SPATIAL_INDEX_MAX_ENTRIES:
+            map_point_spatial_index_cache.popitem(last=False)
+    return spatial_index
@@ -3,8 +3,9 @@
 # -*- coding: UTF-8 -*-
 
 import string
+from threading import Lock
 
-from django.db import models
+from django.db import connection, models
 
 import wevote_functions.admin
 from exception.models import handle_record_found_more_than_one_exception, \
@@ -35,6 +36,14 @@ KIND_OF_ACTION_CHOICES = (
 
 logger = wevote_functions.admin.get_logger(__name__)
 
+# Each process reserves this many we_vote_id integers at a time for each kind of object
+WE_VOTE_ID_BLOCK_SIZE = 100
+
+# setting_name -> {'next_integer': int, 'last_integer': int}
+we_vote_id_integer_blocks = {}
+we_vote_id_integer_blocks_lock = Lock()
+site_unique_id_prefix_for_this_process = ''
+
 
 class WeVoteSetting(models.Model):
     """
@@ -43,7 +52,7 @@ class WeVoteSetting(models.Model):
     DoesNotExist = None
     MultipleObjectsReturned = None
     objects = None
-    name = models.CharField(verbose_name='setting name', blank=True, null=True, max_length=255)
+    name = models.CharField(verbose_name='setting name', blank=True, null=True, max_length=255, unique=True)
 
     # We store in the settings database values of many different kind of data types
     STRING = 'S'
@@ -318,6 +327,11 @@ def fetch_batch_process_system_update_twitter_on():
 
 
 def fetch_site_unique_id_prefix():
+    # The prefix never changes once it has been set, so we only look it up once per process
+    global site_unique_id_prefix_for_this_process
+    if positive_value_exists(site_unique_id_prefix_for_this_process):
+        return site_unique_id_prefix_for_this_process
+
     we_vote_settings_manager = WeVoteSettingsManager()
     site_unique_id_prefix = we_vote_settings_manager.fetch_setting('site_unique_id_prefix')
 
@@ -336,6 +350,8 @@ def fetch_site_unique_id_prefix():
         we_vote_settings_manager.save_setting('site_unique_id_prefix', site_unique_id_prefix)
         # TODO Each We Vote site needs to keep a local copy of site_unique_id_prefix's that are in use, AND
         # TODO Each We Vote site also needs to publish site_unique_id_prefix's in use by that organization
+    if positive_value_exists(site_unique_id_prefix):
+        site_unique_id_prefix_for_this_process = site_unique_id_prefix
     return site_unique_id_prefix
 
 
@@ -388,13 +404,71 @@ def set_stripe_processing_enabled_state(new_state):
     return results['success']
 
 
+def reserve_we_vote_id_integer_block(we_vote_id_last_setting_name, block_size=WE_VOTE_ID_BLOCK_SIZE):
+    """
+    Atomically move the we_vote_id_last_*_integer setting forward by block_size with one UPDATE ... RETURNING, so
+    concurrent workers can never be handed the same integers. Inside a transaction, the reservation is only kept if
+    that transaction is committed.
+    :param we_vote_id_last_setting_name:
+    :param block_size:
+    :return: (first_integer, last_integer) of the reserved block, both included
+    """
+    block_size = max(convert_to_int(block_size), 1)
+    table_name = WeVoteSetting._meta.db_table
+    update_sql = "UPDATE {table_name} SET integer_value = COALESCE(integer_value, 0) + %s " \
+                 "WHERE name = %s RETURNING integer_value".format(table_name=table_name)
+    insert_sql = "INSERT INTO {table_name} (name, value_type, integer_value, admin_app) " \
+                 "VALUES (%s, %s, 0, FALSE) ON CONFLICT (name) DO NOTHING".format(table_name=table_name)
+    with connection.cursor() as cursor:
+        cursor.execute(update_sql, [block_size, we_vote_id_last_setting_name])
+        returned_row = cursor.fetchone()
+        if returned_row is None:
+            # First id of this kind on this server: create the setting, then reserve
+            cursor.execute(insert_sql, [we_vote_id_last_setting_name, WeVoteSetting.INTEGER])
+            cursor.execute(update_sql, [block_size, we_vote_id_last_setting_name])
+            returned_row = cursor.fetchone()
+    last_integer = convert_to_int(returned_row[0])
+    return last_integer - block_size + 1, last_integer
+
+
 def fetch_next_we_vote_id_integer(we_vote_id_last_setting_name):
-    we_vote_settings_manager = WeVoteSettingsManager()
-    we_vote_id_last_integer = we_vote_settings_manager.fetch_setting(we_vote_id_last_setting_name)
-    we_vote_id_next_integer = convert_to_int(we_vote_id_last_integer)
-    we_vote_id_next_integer += 1
-    we_vote_settings_manager.save_setting(we_vote_id_last_setting_name, we_vote_id_next_integer)
-    return we_vote_id_next_integer
+    """
+    Hand out the next integer from this process's reserved block, reserving a new block when it runs out.
+    Integers left in a block when the process stops are never used, so there can be gaps.
+    :param we_vote_id_last_setting_name:
+    :return:
+    """
+    with we_vote_id_integer_blocks_lock:
+        integer_block = we_vote_id_integer_blocks.get(we_vote_id_last_setting_name)
+        if integer_block is not None and integer_block['next_integer'] <= integer_block['last_integer']:
+            we_vote_id_next_integer = integer_block['next_integer']
+            integer_block['next_integer'] += 1
+            return we_vote_id_next_integer
+        if not connection.in_atomic_block:
+            # The block is committed as soon as it is reserved, so this process can keep it
+            first_integer, last_integer = reserve_we_vote_id_integer_block(we_vote_id_last_setting_name)
+            we_vote_id_integer_blocks[we_vote_id_last_setting_name] = {
+                'next_integer': first_integer + 1,
+                'last_integer': last_integer,
+            }
+            return first_integer
+    # In the caller's transaction a block could be rolled back after this process started handing it out, so we only
+    #  reserve the one integer, which is rolled back together with whatever the caller saves with it
+    first_integer, last_integer = reserve_we_vote_id_integer_block(we_vote_id_last_setting_name, 1)
+    return first_integer
+
+
+def fetch_next_we_vote_id_integer_list(we_vote_id_last_setting_name, number_needed=1):
+    """
+    For bulk importers: reserve all the integers needed with one statement
+    :param we_vote_id_last_setting_name:
+    :param number_needed:
+    :return: list of integers
+    """
+    if not positive_value_exists(number_needed):
+        return []
+    first_integer, last_integer = reserve_we_vote_id_integer_block(we_vote_id_last_setting_name, number_needed)
+    return list(range(first_integer, last_integer + 1))
 
 
 def fetch_next_we_vote_id_activity_comment_integer():
@@ -485,6 +559,10 @@ def fetch_next_we_vote_id_polling_location_integer():
     return fetch_next_we_vote_id_integer('we_vote_id_last_polling_location_integer')
 
 
+def fetch_next_we_vote_id_polling_location_integer_list(number_needed):
+    return fetch_next_we_vote_id_integer_list('we_vote_id_last_polling_location_integer', number_needed)
+
+
 def fetch_next_we_vote_id_quick_info_integer():
     return fetch_next_we_vote_id_integer('we_vote_id_last_quick_info_integer')
 
@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from wevote_settings.models import fetch_next_we_vote_id_integer, fetch_next_we_vote_id_integer_list, \
+    WE_VOTE_ID_BLOCK_SIZE, we_vote_id_integer_blocks, WeVoteSetting, WeVoteSettingsManager
+
+
+# Inheriting from TransactionTestCase, since blocks are only kept by a process when they are reserved outside of a
+#  transaction
+class WeVoteIdIntegerBlockTestCase(TransactionTestCase):
+    databases = ["default", "readonly"]
+
+    def setUp(self):
+        we_vote_id_integer_blocks.clear()
+        self.we_vote_settings_manager = WeVoteSettingsManager()
+        self.we_vote_settings_manager.save_setting('we_vote_id_last_test_integer', 100)
+
+    def test_integers_are_unique_and_reserved_in_blocks(self):
+        integer_list = [fetch_next_we_vote_id_integer('we_vote_id_last_test_integer')
+                        for _ in range(WE_VOTE_ID_BLOCK_SIZE + 1)]
+        self.assertEqual(integer_list, list(range(101, 101 + WE_VOTE_ID_BLOCK_SIZE + 1)))
+        # Two blocks reserved
+        self.assertEqual(WeVoteSetting.objects.get(name='we_vote_id_last_test_integer').integer_value,
+                         100 + 2 * WE_VOTE_ID_BLOCK_SIZE)
+
+    def test_block_is_not_kept_from_caller_transaction(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_test_integer'), 101)
+                self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_test_integer'), 102)
+                raise ValueError("caller failed after the integers were reserved")
+        # Rolled back together with what the caller saved, and no block was kept that could hand them out again
+        self.assertEqual(WeVoteSetting.objects.get(name='we_vote_id_last_test_integer').integer_value, 100)
+        self.assertEqual(we_vote_id_integer_blocks, {})
+
+        # A block this process already holds is used inside a transaction too
+        self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_test_integer'), 101)
+        with transaction.atomic():
+            self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_test_integer'), 102)
+        self.assertEqual(WeVoteSetting.objects.get(name='we_vote_id_last_test_integer').integer_value,
+                         100 + WE_VOTE_ID_BLOCK_SIZE)
+
+    def test_first_integer_creates_setting(self):
+        self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_brand_new_integer'), 1)
+        self.assertEqual(WeVoteSetting.objects.filter(name='we_vote_id_last_brand_new_integer').count(), 1)
+        self.assertEqual(WeVoteSetting.objects.get(name='we_vote_id_last_brand_new_integer').value_type,
+                         WeVoteSetting.INTEGER)
+
+
+class WeVoteIdIntegerListTestCase(TestCase):
+    databases = ["default", "readonly"]
+
+    def test_list_is_reserved_at_once(self):
+        WeVoteSettingsManager.save_setting('we_vote_id_last_test_integer', 100)
+        with self.assertNumQueries(1):
+            integer_list = fetch_next_we_vote_id_integer_list('we_vote_id_last_test_integer', 1500)
+        self.assertEqual(integer_list, list(range(101, 1601)))
+        self.assertEqual(fetch_next_we_vote_id_integer('we_vote_id_last_test_integer'), 1601)
+        self.assertEqual(fetch_next_we_vote_id_integer_list('we_vote_id_last_test_integer', 0), [])